@@ -0,0 +1,43 @@
+"""添加Webhook入站消息队列表
+
+Revision ID: 011_add_ingest_queue
+Revises: 010_fix_cost_usd_field_length
+Create Date: 2026-01-05 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '011_add_ingest_queue'
+down_revision = '010_fix_cost_usd_field_length'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 创建入站消息队列表（Webhook先落库再由工作池异步处理）
+    op.create_table(
+        'ingest_queue',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('platform', sa.String(length=50), nullable=False),
+        sa.Column('payload', postgresql.JSON(astext_type=sa.Text()), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('lock_token', sa.String(length=36), nullable=True),
+        sa.Column('locked_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('available_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    op.create_index(op.f('ix_ingest_queue_id'), 'ingest_queue', ['id'])
+    op.create_index('idx_ingest_queue_status_available', 'ingest_queue', ['status', 'available_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('idx_ingest_queue_status_available', table_name='ingest_queue')
+    op.drop_index(op.f('ix_ingest_queue_id'), table_name='ingest_queue')
+    op.drop_table('ingest_queue')
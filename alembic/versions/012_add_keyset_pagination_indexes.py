@@ -0,0 +1,39 @@
+"""添加键集分页索引
+
+Revision ID: 012_add_keyset_pagination_indexes
+Revises: 011_add_ingest_queue
+Create Date: 2026-01-06 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '012_add_keyset_pagination_indexes'
+down_revision = '011_add_ingest_queue'
+branch_labels = None
+depends_on = None
+
+# (索引名, 表名, 列) - 与分页排序键 (排序列, id) 一致
+KEYSET_INDEXES = [
+    ('idx_conversations_received_at_id', 'conversations', ['received_at', 'id']),
+    ('idx_conversations_ai_reply_at_id', 'conversations', ['ai_reply_at', 'id']),
+    ('idx_customers_created_at_id', 'customers', ['created_at', 'id']),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in KEYSET_INDEXES:
+        try:
+            op.create_index(name, table, columns, unique=False)
+        except Exception:
+            # 索引可能已存在
+            pass
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(KEYSET_INDEXES):
+        try:
+            op.drop_index(name, table_name=table)
+        except Exception:
+            pass
@@ -0,0 +1,56 @@
+"""添加AI回复汇总分桶表
+
+Revision ID: 013_add_ai_reply_rollups
+Revises: 012_add_keyset_pagination_indexes
+Create Date: 2026-01-07 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '013_add_ai_reply_rollups'
+down_revision = '012_add_keyset_pagination_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 按小时/按天的AI回复计数（历史数据使用 scripts/tools/backfill_ai_reply_rollups.py 回填）
+    op.create_table(
+        'ai_reply_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('granularity', sa.String(length=10), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('platform', sa.String(length=20), nullable=False),
+        sa.Column('page_id', sa.String(length=100), nullable=False, server_default=''),
+        sa.Column('message_type', sa.String(length=20), nullable=False),
+        sa.Column('reply_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint(
+            'granularity', 'bucket_start', 'platform', 'page_id', 'message_type',
+            name='uq_ai_reply_rollups_bucket'
+        )
+    )
+    op.create_index(op.f('ix_ai_reply_rollups_id'), 'ai_reply_rollups', ['id'])
+    op.create_index('idx_ai_reply_rollups_granularity_bucket', 'ai_reply_rollups', ['granularity', 'bucket_start'])
+
+    # 每天收到AI回复的客户（去重客户数）
+    op.create_table(
+        'ai_reply_rollup_customers',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('customer_id', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('date', 'customer_id', name='uq_ai_reply_rollup_customers_date_customer')
+    )
+    op.create_index(op.f('ix_ai_reply_rollup_customers_id'), 'ai_reply_rollup_customers', ['id'])
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_ai_reply_rollup_customers_id'), table_name='ai_reply_rollup_customers')
+    op.drop_table('ai_reply_rollup_customers')
+    op.drop_index('idx_ai_reply_rollups_granularity_bucket', table_name='ai_reply_rollups')
+    op.drop_index(op.f('ix_ai_reply_rollups_id'), table_name='ai_reply_rollups')
+    op.drop_table('ai_reply_rollups')
@@ -0,0 +1,94 @@
+"""高频问题按规范化指纹去重
+
+Revision ID: 014_add_frequent_question_fingerprint
+Revises: 013_add_ai_reply_rollups
+Create Date: 2026-01-08 10:00:00.000000
+
+"""
+import hashlib
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '014_add_frequent_question_fingerprint'
+down_revision = '013_add_ai_reply_rollups'
+branch_labels = None
+depends_on = None
+
+MAX_SAMPLE_RESPONSES = 5
+
+
+def _fingerprint(text: str) -> str:
+    """与 src.utils.text.question_fingerprint 一致（迁移中保留一份副本，避免依赖应用代码）"""
+    folded = unicodedata.normalize("NFKC", text or "").casefold()
+    normalized = "".join(
+        ch for ch in folded
+        if unicodedata.category(ch)[0] not in ("P", "S", "Z", "C")
+    )
+    return hashlib.sha256((normalized or folded.strip()).encode("utf-8")).hexdigest()
+
+
+def upgrade() -> None:
+    op.add_column('frequent_questions', sa.Column('question_fingerprint', sa.String(length=64), nullable=True))
+
+    # 回填指纹，并把指纹相同的问题合并到id最小的一行
+    bind = op.get_bind()
+    table = sa.table(
+        'frequent_questions',
+        sa.column('id', sa.Integer),
+        sa.column('question_text', sa.String),
+        sa.column('question_fingerprint', sa.String),
+        sa.column('occurrence_count', sa.Integer),
+        sa.column('first_seen', sa.DateTime(timezone=True)),
+        sa.column('last_seen', sa.DateTime(timezone=True)),
+        sa.column('sample_responses', sa.JSON(none_as_null=True)),
+    )
+    rows = bind.execute(sa.select(table).order_by(table.c.id)).fetchall()
+    merged = {}
+    duplicates = []
+    for row in rows:
+        fingerprint = _fingerprint(row.question_text)
+        keeper = merged.get(fingerprint)
+        if keeper is None:
+            merged[fingerprint] = {
+                "id": row.id,
+                "occurrence_count": row.occurrence_count or 0,
+                "first_seen": row.first_seen,
+                "last_seen": row.last_seen,
+                "sample_responses": list(row.sample_responses or []),
+            }
+            continue
+        keeper["occurrence_count"] += row.occurrence_count or 0
+        if row.first_seen and (keeper["first_seen"] is None or row.first_seen < keeper["first_seen"]):
+            keeper["first_seen"] = row.first_seen
+        if row.last_seen and (keeper["last_seen"] is None or row.last_seen > keeper["last_seen"]):
+            keeper["last_seen"] = row.last_seen
+        keeper["sample_responses"].extend(row.sample_responses or [])
+        duplicates.append(row.id)
+
+    for fingerprint, keeper in merged.items():
+        bind.execute(
+            table.update()
+            .where(table.c.id == keeper["id"])
+            .values(
+                question_fingerprint=fingerprint,
+                occurrence_count=keeper["occurrence_count"],
+                first_seen=keeper["first_seen"],
+                last_seen=keeper["last_seen"],
+                sample_responses=keeper["sample_responses"][-MAX_SAMPLE_RESPONSES:] or None,
+            )
+        )
+    if duplicates:
+        bind.execute(table.delete().where(table.c.id.in_(duplicates)))
+
+    with op.batch_alter_table('frequent_questions') as batch_op:
+        batch_op.alter_column('question_fingerprint', existing_type=sa.String(length=64), nullable=False)
+        batch_op.create_index('idx_frequent_questions_fingerprint', ['question_fingerprint'], unique=True)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('frequent_questions') as batch_op:
+        batch_op.drop_index('idx_frequent_questions_fingerprint')
+        batch_op.drop_column('question_fingerprint')
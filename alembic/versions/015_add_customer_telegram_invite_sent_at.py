@@ -0,0 +1,54 @@
+"""客户已收到Telegram群组链接的标记
+
+Revision ID: 015_add_customer_telegram_invite_sent_at
+Revises: 014_add_frequent_question_fingerprint
+Create Date: 2026-01-09 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '015_add_customer_telegram_invite_sent_at'
+down_revision = '014_add_frequent_question_fingerprint'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('customers', sa.Column('telegram_invite_sent_at', sa.DateTime(timezone=True), nullable=True))
+
+    # 回填：AI回复中出现过通用链接关键词的客户，标记为最早一条这类回复的时间
+    # （只含群组名/邀请码的回复使用 scripts/tools/backfill_telegram_invites.py 按 config.yaml 中的主群组补充回填）
+    customers = sa.table(
+        'customers',
+        sa.column('id', sa.Integer),
+        sa.column('telegram_invite_sent_at', sa.DateTime(timezone=True)),
+    )
+    conversations = sa.table(
+        'conversations',
+        sa.column('customer_id', sa.Integer),
+        sa.column('ai_replied', sa.Boolean),
+        sa.column('ai_reply_content', sa.Text),
+        sa.column('ai_reply_at', sa.DateTime(timezone=True)),
+    )
+    reply = sa.func.lower(conversations.c.ai_reply_content)
+    invite_replies = sa.and_(
+        conversations.c.customer_id == customers.c.id,
+        conversations.c.ai_replied == sa.true(),
+        sa.or_(reply.like('%t.me%'), reply.like('%telegram%')),
+    )
+    first_sent_at = sa.select(
+        sa.func.coalesce(sa.func.min(conversations.c.ai_reply_at), sa.func.now())
+    ).where(invite_replies).scalar_subquery()
+
+    op.get_bind().execute(
+        customers.update()
+        .where(sa.exists().where(invite_replies))
+        .values(telegram_invite_sent_at=first_sent_at)
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('customers') as batch_op:
+        batch_op.drop_column('telegram_invite_sent_at')
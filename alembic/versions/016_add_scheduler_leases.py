@@ -0,0 +1,30 @@
+"""后台调度器主节点租约表
+
+Revision ID: 016_add_scheduler_leases
+Revises: 015_add_customer_telegram_invite_sent_at
+Create Date: 2026-01-10 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '016_add_scheduler_leases'
+down_revision = '015_add_customer_telegram_invite_sent_at'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # PostgreSQL 使用 advisory lock 选举，不使用该表；保留以便切换数据库时无需额外迁移
+    op.create_table(
+        'scheduler_leases',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('holder_id', sa.String(length=200), nullable=False),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('scheduler_leases')
@@ -0,0 +1,72 @@
+"""对话按 (platform, platform_message_id) 唯一（入站消息重投去重）
+
+Revision ID: 017_add_conversation_platform_message_unique
+Revises: 016_add_scheduler_leases
+Create Date: 2026-01-11 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '017_add_conversation_platform_message_unique'
+down_revision = '016_add_scheduler_leases'
+branch_labels = None
+depends_on = None
+
+# 引用 conversations.id 的表（合并重复对话时改为指向保留的记录）
+REFERENCING_TABLES = ('collected_data', 'reviews', 'prompt_usage_logs')
+
+
+def upgrade() -> None:
+    # 合并已有的重复对话：保留id最小的一行，缺少AI回复时取重复行中的回复
+    bind = op.get_bind()
+    conversations = sa.table(
+        'conversations',
+        sa.column('id', sa.Integer),
+        sa.column('platform', sa.String),
+        sa.column('platform_message_id', sa.String),
+        sa.column('ai_replied', sa.Boolean),
+        sa.column('ai_reply_content', sa.Text),
+        sa.column('ai_reply_at', sa.DateTime(timezone=True)),
+    )
+    duplicated = (
+        sa.select(conversations.c.platform, conversations.c.platform_message_id)
+        .where(conversations.c.platform_message_id.isnot(None))
+        .group_by(conversations.c.platform, conversations.c.platform_message_id)
+        .having(sa.func.count() > 1)
+    )
+    for platform, message_id in bind.execute(duplicated).fetchall():
+        rows = bind.execute(
+            sa.select(conversations)
+            .where(conversations.c.platform == platform, conversations.c.platform_message_id == message_id)
+            .order_by(conversations.c.id)
+        ).fetchall()
+        keeper, duplicates = rows[0], rows[1:]
+        duplicate_ids = [row.id for row in duplicates]
+
+        replied = next((row for row in rows if row.ai_replied), None)
+        if replied is not None and not keeper.ai_replied:
+            bind.execute(
+                conversations.update()
+                .where(conversations.c.id == keeper.id)
+                .values(ai_replied=True, ai_reply_content=replied.ai_reply_content,
+                        ai_reply_at=replied.ai_reply_at)
+            )
+        for table_name in REFERENCING_TABLES:
+            table = sa.table(table_name, sa.column('conversation_id', sa.Integer))
+            bind.execute(
+                table.update()
+                .where(table.c.conversation_id.in_(duplicate_ids))
+                .values(conversation_id=keeper.id)
+            )
+        bind.execute(conversations.delete().where(conversations.c.id.in_(duplicate_ids)))
+
+    op.create_index(
+        'idx_conversations_platform_message', 'conversations',
+        ['platform', 'platform_message_id'], unique=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_conversations_platform_message', table_name='conversations')
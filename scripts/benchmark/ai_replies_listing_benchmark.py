@@ -0,0 +1,193 @@
+"""
+AI回复列表查询基准测试
+
+在测试数据库中生成带 raw_data 的对话数据，逐页读取 /statistics/ai-replies 的数据，
+比较每种实现的吞吐（行/秒）、每页内存峰值和每页SQL数：
+
+- orm_lazy:   旧实现，加载完整 Conversation 行，逐行访问 conv.customer.name（N+1 查询）
+- orm_eager:  加载完整 Conversation 行，同一条SQL关联客户（contains_eager）
+- projection: 列投影读模型（ConversationRepository.list_ai_replied_page）
+
+用法:
+    python scripts/benchmark/ai_replies_listing_benchmark.py --rows 20000 --page-size 50
+    python scripts/benchmark/ai_replies_listing_benchmark.py --database-url postgresql://... --skip-seed
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import contains_eager, sessionmaker
+
+
+def seed(session, rows: int, customers: int, raw_data_bytes: int):
+    """生成测试数据：每条对话都已AI回复，并带一个 raw_data JSON"""
+    from src.core.database.models import Conversation, Customer, MessageType, Platform
+
+    customer_objs = [
+        Customer(platform=Platform.FACEBOOK, platform_user_id=f"bench_{i}", name=f"客户{i}")
+        for i in range(customers)
+    ]
+    session.add_all(customer_objs)
+    session.flush()
+
+    base = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    blob = "x" * raw_data_bytes
+    batch = []
+    for i in range(rows):
+        at = base + timedelta(seconds=i)
+        batch.append(Conversation(
+            customer_id=customer_objs[i % customers].id,
+            platform=Platform.FACEBOOK,
+            platform_message_id=f"bench_msg_{i}",
+            message_type=MessageType.MESSAGE,
+            content="请问iPhone贷款怎么办理？" * 20,
+            raw_data={"payload": blob, "index": i},
+            ai_replied=True,
+            ai_reply_content="您好，感谢咨询，我们的客服会尽快联系您。",
+            ai_reply_at=at,
+            received_at=at,
+        ))
+        if len(batch) >= 1000:
+            session.add_all(batch)
+            session.flush()
+            batch = []
+    session.add_all(batch)
+    session.commit()
+
+
+def _format_orm(conversations) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": conv.id,
+            "customer_name": conv.customer.name if conv.customer else None,
+            "user_message": conv.content[:200] if conv.content else None,
+            "ai_reply": conv.ai_reply_content,
+            "ai_reply_at": conv.ai_reply_at.isoformat() if conv.ai_reply_at else None,
+        }
+        for conv in conversations
+    ]
+
+
+def fetch_orm_lazy(session, offset: int, limit: int):
+    from src.core.database.models import Conversation, Customer
+    conversations = session.query(Conversation)\
+        .join(Customer, Conversation.customer_id == Customer.id)\
+        .filter(Conversation.ai_replied == True, Conversation.ai_reply_content.isnot(None))\
+        .order_by(Conversation.ai_reply_at.desc())\
+        .offset(offset).limit(limit).all()
+    return _format_orm(conversations)
+
+
+def fetch_orm_eager(session, offset: int, limit: int):
+    from src.core.database.models import Conversation, Customer
+    conversations = session.query(Conversation)\
+        .join(Customer, Conversation.customer_id == Customer.id)\
+        .options(contains_eager(Conversation.customer))\
+        .filter(Conversation.ai_replied == True, Conversation.ai_reply_content.isnot(None))\
+        .order_by(Conversation.ai_reply_at.desc())\
+        .offset(offset).limit(limit).all()
+    return _format_orm(conversations)
+
+
+def fetch_projection(session, offset: int, limit: int):
+    from src.core.database.repositories import ConversationRepository
+    page = ConversationRepository(session).list_ai_replied_page(limit=limit, offset=offset)
+    return [item.to_dict() for item in page.items]
+
+
+MODES: Dict[str, Callable] = {
+    "orm_lazy": fetch_orm_lazy,
+    "orm_eager": fetch_orm_eager,
+    "projection": fetch_projection,
+}
+
+
+def run_mode(Session, engine, mode: str, pages: int, page_size: int) -> Dict[str, Any]:
+    """逐页读取，每页使用新的会话（与请求级会话一致）"""
+    fetch = MODES[mode]
+    statements = {"count": 0}
+
+    def count_statement(*args):
+        statements["count"] += 1
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        total_rows = 0
+        peak_bytes: List[int] = []
+        started = time.perf_counter()
+        for page in range(pages):
+            session = Session()
+            tracemalloc.start()
+            try:
+                rows = fetch(session, page * page_size, page_size)
+                peak_bytes.append(tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+                session.close()
+            total_rows += len(rows)
+        elapsed = time.perf_counter() - started
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+
+    return {
+        "mode": mode,
+        "rows": total_rows,
+        "rows_per_sec": round(total_rows / elapsed, 1) if elapsed else 0.0,
+        "peak_kib_per_page": round(sum(peak_bytes) / len(peak_bytes) / 1024, 1) if peak_bytes else 0.0,
+        "queries_per_page": round(statements["count"] / pages, 1) if pages else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI回复列表查询基准测试")
+    parser.add_argument("--database-url", default="sqlite:///./ai_replies_benchmark.db", help="测试数据库地址")
+    parser.add_argument("--rows", type=int, default=20000, help="生成的对话数 (默认: 20000)")
+    parser.add_argument("--customers", type=int, default=2000, help="生成的客户数 (默认: 2000)")
+    parser.add_argument("--raw-data-bytes", type=int, default=2048, help="每条对话 raw_data 的大小 (默认: 2048)")
+    parser.add_argument("--page-size", type=int, default=50, help="每页行数 (默认: 50)")
+    parser.add_argument("--pages", type=int, default=20, help="每种模式读取的页数 (默认: 20)")
+    parser.add_argument("--skip-seed", action="store_true", help="不生成数据，使用库中已有数据")
+    parser.add_argument("--modes", default=",".join(MODES), help="要运行的模式，逗号分隔")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出结果")
+    args = parser.parse_args()
+
+    from src.core.database.connection import Base
+
+    engine = create_engine(args.database_url)
+    Session = sessionmaker(bind=engine)
+    if not args.skip_seed:
+        Base.metadata.drop_all(engine)
+        Base.metadata.create_all(engine)
+        session = Session()
+        try:
+            seed(session, args.rows, args.customers, args.raw_data_bytes)
+        finally:
+            session.close()
+
+    results = [
+        run_mode(Session, engine, mode.strip(), args.pages, args.page_size)
+        for mode in args.modes.split(",") if mode.strip()
+    ]
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{'模式':<12}{'行/秒':>12}{'每页内存峰值(KiB)':>20}{'每页SQL数':>12}")
+    print("=" * 58)
+    for r in results:
+        print(f"{r['mode']:<12}{r['rows_per_sec']:>12}{r['peak_kib_per_page']:>20}{r['queries_per_page']:>12}")
+
+
+if __name__ == "__main__":
+    main()
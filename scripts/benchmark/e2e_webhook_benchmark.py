@@ -0,0 +1,427 @@
+"""
+端到端基准测试：Messenger Webhook 到回复发送
+
+在本进程中启动模拟的 Graph API / OpenAI / Telegram 服务（见 fake_services.py，可配置延迟和错误注入），
+以子进程方式启动应用（uvicorn；默认使用临时SQLite库，--database-url 可指定本地PostgreSQL），
+然后按目标速率（开环，不等待上一条响应）回放带 X-Hub-Signature-256 签名的 Messenger Webhook，统计：
+
+- 吞吐量：实际发送速率、Webhook 确认速率、回复发送速率
+- Webhook 确认延迟：POST /webhook 开始到收到响应
+- Webhook 到发送延迟：POST /webhook 开始到模拟 Graph API 收到发给该用户的消息（按用户先进先出匹配）
+
+结果以JSON输出到标准输出（--output 同时写入文件），包含运行参数、git版本、模拟服务统计和应用
+/metrics 中的直方图摘要；--baseline 指定上一次的结果文件时附带各项指标的变化。
+harness_loop_lag_max_ms 较大时说明压测进程本身已饱和，结果不可信（降低速率或模拟服务延迟）。
+
+用法:
+    python scripts/benchmark/e2e_webhook_benchmark.py --rate 20 --duration 30
+    python scripts/benchmark/e2e_webhook_benchmark.py --rate 50 --events 2000 --openai-latency 1.2 --openai-error-rate 0.05
+    python scripts/benchmark/e2e_webhook_benchmark.py --database-url postgresql://localhost/bench --workers 2
+    python scripts/benchmark/e2e_webhook_benchmark.py --output runs/after.json --baseline runs/before.json
+    python scripts/benchmark/e2e_webhook_benchmark.py --max-send-p95-ms 3000    # 超过阈值时退出码为1
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(Path(__file__).parent))
+
+import httpx
+
+from fake_services import BENCH_APP_ENV, add_fault_arguments, build_services, use_bench_env
+
+# 模拟的客户消息（回放时随机选择，相同文本会命中应用的回复缓存，与线上情况一致）
+CUSTOMER_MESSAGES = [
+    "Hi, how much is the premium plan?",
+    "Do you ship to Canada?",
+    "What are your opening hours?",
+    "Is this still available?",
+    "Can I pay with PayPal?",
+    "I ordered last week but haven't received anything yet, order #A{n}",
+    "你好，请问这个多少钱？",
+    "请问可以分期付款吗？",
+    "How do I cancel my subscription?",
+    "Do you have this in size M?",
+]
+
+# 每次运行都需要对比的关键指标（--baseline）
+COMPARED_FIELDS = [
+    ("throughput", "ack_per_second"),
+    ("throughput", "replies_per_second"),
+    ("ack_latency_ms", "p50"),
+    ("ack_latency_ms", "p95"),
+    ("ack_latency_ms", "p99"),
+    ("send_latency_ms", "p50"),
+    ("send_latency_ms", "p95"),
+    ("send_latency_ms", "p99"),
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _summarize(values: List[float]) -> Dict[str, Any]:
+    """延迟分布（毫秒）"""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def pct(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000, 2)
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 2),
+        "p50": pct(0.50),
+        "p90": pct(0.90),
+        "p95": pct(0.95),
+        "p99": pct(0.99),
+        "max": round(ordered[-1] * 1000, 2),
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=project_root,
+            capture_output=True, text=True, timeout=10).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=project_root,
+            capture_output=True, text=True, timeout=30).stdout.strip()
+        return f"{revision}-dirty" if revision and dirty else (revision or None)
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class WebhookReplayer:
+    """生成并签名 Messenger Webhook，记录确认延迟，并与模拟 Graph API 收到的发送请求匹配"""
+
+    def __init__(self, app_secret: str, pages: int, senders: int, seed: int, unique_texts: bool = False):
+        self.app_secret = app_secret.encode()
+        self.page_ids = [f"10{i:013d}" for i in range(1, pages + 1)]
+        self.senders = senders
+        self.unique_texts = unique_texts
+        self.rng = random.Random(seed)
+        self._sequence = 0
+
+        self.measuring = False
+        self.pending: Dict[str, Deque[float]] = defaultdict(deque)
+        self.ack_latencies: List[float] = []
+        self.send_latencies: List[float] = []
+        self.statuses: Dict[str, int] = defaultdict(int)
+        self.acked = 0
+        self.replies = 0
+        self.unmatched_sends = 0
+        self.first_post_at: Optional[float] = None
+        self.last_post_at: Optional[float] = None
+        self.last_ack_at: Optional[float] = None
+        self.last_reply_at: Optional[float] = None
+
+    def _sender_id(self) -> str:
+        # senders=0 时每条消息来自新用户，否则在固定数量的用户中随机选择
+        index = self._sequence if self.senders <= 0 else self.rng.randrange(self.senders)
+        return f"24{index:014d}"
+
+    def build_event(self) -> Dict[str, Any]:
+        """生成一条Webhook（请求体、签名头、发送者）"""
+        self._sequence += 1
+        page_id = self.rng.choice(self.page_ids)
+        sender_id = self._sender_id()
+        now_ms = int(time.time() * 1000)
+        text = self.rng.choice(CUSTOMER_MESSAGES).format(n=self._sequence)
+        if self.unique_texts:
+            text = f"{text} ({self._sequence})"
+        payload = {
+            "object": "page",
+            "entry": [{
+                "id": page_id,
+                "time": now_ms,
+                "messaging": [{
+                    "sender": {"id": sender_id},
+                    "recipient": {"id": page_id},
+                    "timestamp": now_ms,
+                    "message": {"mid": f"m_bench_{now_ms}_{self._sequence}", "text": text},
+                }],
+            }],
+        }
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        signature = hmac.new(self.app_secret, body, hashlib.sha256).hexdigest()
+        return {
+            "body": body,
+            "sender_id": sender_id,
+            "headers": {"Content-Type": "application/json", "X-Hub-Signature-256": f"sha256={signature}"},
+        }
+
+    def on_send(self, recipient_id: str, arrived: float):
+        """模拟 Graph API 收到发送请求（回调）"""
+        queue = self.pending.get(recipient_id)
+        if not queue:
+            if self.measuring:
+                self.unmatched_sends += 1
+            return
+        started = queue.popleft()
+        if self.measuring:
+            self.send_latencies.append(arrived - started)
+            self.replies += 1
+            self.last_reply_at = arrived
+
+    async def post(self, client: httpx.AsyncClient, url: str, event: Dict[str, Any]):
+        """发送一条Webhook（发送前登记，回复可能在确认之前到达）"""
+        started = time.perf_counter()
+        queue = self.pending[event["sender_id"]]
+        queue.append(started)
+        if self.measuring:
+            self.first_post_at = self.first_post_at or started
+            self.last_post_at = started
+        try:
+            response = await client.post(url, content=event["body"], headers=event["headers"])
+            status = str(response.status_code)
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        finished = time.perf_counter()
+
+        if status != "200":
+            # 未被接收的消息不会有回复
+            try:
+                queue.remove(started)
+            except ValueError:
+                pass
+        if not self.measuring:
+            return
+        self.statuses[status] += 1
+        if status == "200":
+            self.acked += 1
+            self.ack_latencies.append(finished - started)
+            self.last_ack_at = finished
+
+    def outstanding(self) -> int:
+        return sum(len(queue) for queue in self.pending.values())
+
+
+async def _monitor_loop_lag(lags: List[float], stop: asyncio.Event):
+    """压测进程自身的事件循环延迟（过大时结果不可信）"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - started - 0.01)
+
+
+async def _wait_ready(client: httpx.AsyncClient, base_url: str, process: asyncio.subprocess.Process, timeout: float):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.returncode is not None:
+            raise RuntimeError(f"App exited with code {process.returncode}")
+        try:
+            if (await client.get(f"{base_url}/health/simple")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.05)
+    raise TimeoutError(f"App not ready after {timeout}s")
+
+
+async def _replay(replayer: WebhookReplayer, client: httpx.AsyncClient, url: str, count: int, rate: float):
+    """开环回放：第i条在 start + i/rate 时发出，不等待之前的响应"""
+    events = [replayer.build_event() for _ in range(count)]
+    tasks = []
+    started = time.perf_counter()
+    for i, event in enumerate(events):
+        delay = started + i / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(replayer.post(client, url, event)))
+    await asyncio.gather(*tasks)
+
+
+async def _drain(replayer: WebhookReplayer, timeout: float):
+    """等待已确认消息的回复（部分消息可能被过滤/转人工，不会有回复）"""
+    deadline = time.perf_counter() + timeout
+    while replayer.outstanding() and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    events = args.events or int(args.rate * args.duration)
+    replayer = WebhookReplayer(
+        BENCH_APP_ENV["FACEBOOK_APP_SECRET"], args.pages, args.senders, args.seed, args.unique_texts)
+    services = build_services(args, on_send=replayer.on_send)
+    await services.start()
+
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        # 不连接外部共享状态（redis），只使用进程内实现
+        for key in ("RATE_LIMIT_REDIS_URL", "CONVERSATION_HISTORY_REDIS_URL", "METRICS_SHARED_DIR"):
+            env.pop(key, None)
+        env.update(services.app_env())
+        env["DATABASE_URL"] = args.database_url or f"sqlite:///{Path(tmp) / 'bench.db'}"
+        env.setdefault("LOG_ASYNC", "true")
+
+        log_file = open(Path(tmp) / "app.log", "wb")
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "uvicorn", "src.main:app", "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(args.workers), "--log-level", "warning", "--no-access-log",
+            cwd=project_root, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+
+        lags: List[float] = []
+        stop_monitor = asyncio.Event()
+        limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+        try:
+            async with httpx.AsyncClient(timeout=args.request_timeout, limits=limits) as client:
+                await _wait_ready(client, base_url, process, args.startup_timeout)
+                webhook_url = f"{base_url}/webhook"
+
+                # 预热（不计入结果）：首条消息的延迟导入、数据库连接建立等
+                if args.warmup_events:
+                    await _replay(replayer, client, webhook_url, args.warmup_events, max(1.0, args.warmup_events))
+                    await _drain(replayer, args.drain_timeout)
+                replayer.pending.clear()
+
+                monitor = asyncio.create_task(_monitor_loop_lag(lags, stop_monitor))
+                replayer.measuring = True
+                await _replay(replayer, client, webhook_url, events, args.rate)
+                await _drain(replayer, args.drain_timeout)
+                replayer.measuring = False
+                stop_monitor.set()
+                await monitor
+
+                try:
+                    app_metrics = (await client.get(f"{base_url}/metrics", timeout=30)).json()
+                except (httpx.HTTPError, ValueError) as e:
+                    app_metrics = {"error": str(e)}
+        finally:
+            if process.returncode is None:
+                process.terminate()
+                try:
+                    await asyncio.wait_for(process.wait(), timeout=15)
+                except asyncio.TimeoutError:
+                    process.kill()
+            log_file.close()
+            await services.stop()
+            if process.returncode not in (0, None, -15) and not replayer.acked:
+                print((Path(tmp) / "app.log").read_text(errors="replace")[-4000:], file=sys.stderr)
+
+    post_window = (replayer.last_post_at - replayer.first_post_at) if replayer.first_post_at else 0.0
+    ack_window = (replayer.last_ack_at - replayer.first_post_at) if replayer.last_ack_at else 0.0
+    reply_window = (replayer.last_reply_at - replayer.first_post_at) if replayer.last_reply_at else 0.0
+    return {
+        "benchmark": "e2e_webhook",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "config": {
+            "events": events,
+            "target_rate": args.rate,
+            "workers": args.workers,
+            "pages": args.pages,
+            "senders": args.senders,
+            "unique_texts": args.unique_texts,
+            "database": "postgresql" if args.database_url and args.database_url.startswith("postgres") else "sqlite",
+            "fake_latency_seconds": {name: getattr(args, f"{name}_latency") for name in ("graph", "openai", "telegram")},
+            "fake_error_rate": {name: getattr(args, f"{name}_error_rate") for name in ("graph", "openai", "telegram")},
+            "jitter": args.jitter,
+            "seed": args.seed,
+        },
+        "throughput": {
+            "offered_per_second": round((events - 1) / post_window, 2) if post_window > 0 else None,
+            "ack_per_second": round(replayer.acked / ack_window, 2) if ack_window > 0 else None,
+            "replies_per_second": round(replayer.replies / reply_window, 2) if reply_window > 0 else None,
+        },
+        "webhooks": {
+            "sent": events,
+            "acked": replayer.acked,
+            "status_counts": dict(replayer.statuses),
+            "replies": replayer.replies,
+            "reply_ratio": round(replayer.replies / replayer.acked, 4) if replayer.acked else 0.0,
+            "without_reply": replayer.outstanding(),
+            "unmatched_sends": replayer.unmatched_sends,
+        },
+        "ack_latency_ms": _summarize(replayer.ack_latencies),
+        "send_latency_ms": _summarize(replayer.send_latencies),
+        "harness_loop_lag_max_ms": round(max(lags) * 1000, 2) if lags else 0.0,
+        "fake_services": services.get_stats(),
+        "app_metrics": {
+            "ingest_queue": app_metrics.get("ingest_queue"),
+            "histograms": app_metrics.get("metrics"),
+        },
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """与上一次结果对比关键指标（变化百分比，正数表示变大）"""
+    comparison = {"baseline_revision": baseline.get("git_revision"), "baseline_timestamp": baseline.get("timestamp")}
+    for section, field in COMPARED_FIELDS:
+        current = (report.get(section) or {}).get(field)
+        previous = (baseline.get(section) or {}).get(field)
+        entry: Dict[str, Any] = {"baseline": previous, "current": current}
+        if isinstance(current, (int, float)) and isinstance(previous, (int, float)) and previous:
+            entry["change_percent"] = round((current - previous) / previous * 100, 1)
+        comparison[f"{section}.{field}"] = entry
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Messenger Webhook 到回复发送的端到端基准测试")
+    parser.add_argument("--rate", type=float, default=10.0, help="目标Webhook速率（条/秒，默认: 10）")
+    parser.add_argument("--duration", type=float, default=30.0, help="回放时长（秒，默认: 30；指定 --events 时忽略）")
+    parser.add_argument("--events", type=int, default=0, help="回放的Webhook条数")
+    parser.add_argument("--warmup-events", type=int, default=5, help="预热条数（不计入结果，默认: 5）")
+    parser.add_argument("--pages", type=int, default=3, help="页面数（默认: 3）")
+    parser.add_argument("--senders", type=int, default=0,
+                        help="发送者数量（默认: 0，每条消息来自新用户；>0 时在固定用户中随机选择，包含历史对话）")
+    parser.add_argument("--unique-texts", action="store_true",
+                        help="每条消息文本唯一（不命中回复缓存，每条消息都调用模拟OpenAI）")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn 工作进程数（SQLite 建议为1）")
+    parser.add_argument("--database-url", default=None, help="数据库地址（默认: 临时SQLite文件）")
+    parser.add_argument("--max-connections", type=int, default=200, help="压测客户端最大连接数")
+    parser.add_argument("--request-timeout", type=float, default=30.0, help="Webhook请求超时（秒）")
+    parser.add_argument("--startup-timeout", type=float, default=60.0, help="等待应用启动的上限（秒）")
+    parser.add_argument("--drain-timeout", type=float, default=30.0, help="回放结束后等待剩余回复的上限（秒）")
+    add_fault_arguments(parser)
+    parser.add_argument("--output", default=None, help="结果JSON文件路径")
+    parser.add_argument("--baseline", default=None, help="上一次的结果JSON文件，输出各项指标的变化")
+    parser.add_argument("--max-send-p95-ms", type=float, default=None,
+                        help="Webhook到发送 p95 的上限（毫秒），超过时退出码为1（用于回归检查）")
+    args = parser.parse_args()
+
+    # 占位凭证：应用和本进程都不会读取 .env 中的真实凭证，所有外部请求只发往模拟服务
+    use_bench_env()
+    report = asyncio.run(run(args))
+    if args.baseline:
+        report["comparison"] = compare(report, json.loads(Path(args.baseline).read_text(encoding="utf-8")))
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    print(output)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(output, encoding="utf-8")
+
+    if args.max_send_p95_ms is not None:
+        p95 = report["send_latency_ms"].get("p95")
+        if p95 is None or p95 > args.max_send_p95_ms:
+            print(f"FAIL: webhook-to-send p95 {p95}ms > {args.max_send_p95_ms}ms", file=sys.stderr)
+            sys.exit(1)
+        print(f"OK: webhook-to-send p95 {p95}ms <= {args.max_send_p95_ms}ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
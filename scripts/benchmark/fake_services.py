@@ -0,0 +1,338 @@
+"""
+本地模拟的外部服务：Graph API、OpenAI Chat Completions、Telegram Bot API
+
+供端到端基准测试使用（e2e_webhook_benchmark.py 在同一进程的事件循环中启动），也可单独启动用于手工联调。
+每个服务可配置响应延迟（基础延迟 ± 抖动）和错误注入比例（返回5xx，由应用的重试逻辑处理），
+并统计收到的请求数；Graph API 在每次成功发送消息时回调 on_send(recipient_id, 到达时间)。
+
+应用通过以下环境变量指向模拟服务：
+    FACEBOOK_GRAPH_API_URL=http://127.0.0.1:<graph_port>/v18.0
+    OPENAI_BASE_URL=http://127.0.0.1:<openai_port>/v1
+    TELEGRAM_API_URL=http://127.0.0.1:<telegram_port>
+
+用法（单独启动）:
+    python scripts/benchmark/fake_services.py --graph-port 9001 --openai-port 9002 --telegram-port 9003
+    python scripts/benchmark/fake_services.py --openai-latency 1.5 --openai-error-rate 0.1
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+# 应用启动所需的配置（占位凭证，只会发送到模拟服务）
+BENCH_APP_ENV = {
+    "FACEBOOK_APP_ID": "bench-app",
+    "FACEBOOK_APP_SECRET": "bench-app-secret",
+    "FACEBOOK_ACCESS_TOKEN": "EAAGbenchtoken",
+    "FACEBOOK_VERIFY_TOKEN": "bench-verify",
+    "OPENAI_API_KEY": "sk-bench",
+    "TELEGRAM_BOT_TOKEN": "123456:bench",
+    "TELEGRAM_CHAT_ID": "-1001234567890",
+    "SECRET_KEY": "bench-secret-key-for-local-benchmarks-only",
+}
+
+# 模拟的AI回复（长度与 max_tokens=45 的真实回复相近）
+FAKE_REPLIES = [
+    "Thanks for reaching out! Our premium plan is $29/month. Want me to send the details?",
+    "Hi! Yes, we ship worldwide. Delivery usually takes 5-7 business days.",
+    "您好！这款目前有现货，今天下单明天发货，请问需要哪个颜色？",
+    "Great question! You can cancel anytime from your account settings, no fees.",
+]
+
+
+@dataclass
+class FaultProfile:
+    """响应延迟与错误注入配置"""
+
+    latency: float = 0.0  # 基础延迟（秒）
+    jitter: float = 0.0  # 延迟在 latency ± latency*jitter 间均匀分布
+    error_rate: float = 0.0  # 返回5xx的比例（0-1）
+
+    def sample_delay(self, rng: random.Random) -> float:
+        if self.latency <= 0:
+            return 0.0
+        spread = self.latency * self.jitter
+        return max(0.0, self.latency + rng.uniform(-spread, spread))
+
+    def should_fail(self, rng: random.Random) -> bool:
+        return self.error_rate > 0 and rng.random() < self.error_rate
+
+
+class FakeService:
+    """模拟服务基类：统计请求数/注入的错误数，按 FaultProfile 延迟响应"""
+
+    name = ""
+
+    def __init__(self, profile: Optional[FaultProfile] = None, seed: int = 0):
+        self.profile = profile or FaultProfile()
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.injected_errors = 0
+        self.calls: Dict[str, int] = {}
+        self.app = Starlette(routes=self.routes())
+
+    def routes(self) -> List[Route]:
+        raise NotImplementedError
+
+    async def _begin(self, kind: str) -> bool:
+        """记录请求并等待模拟延迟；返回是否注入错误"""
+        self.requests += 1
+        self.calls[kind] = self.calls.get(kind, 0) + 1
+        failed = self.profile.should_fail(self.rng)
+        delay = self.profile.sample_delay(self.rng)
+        if delay:
+            await asyncio.sleep(delay)
+        if failed:
+            self.injected_errors += 1
+        return failed
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "injected_errors": self.injected_errors,
+            "calls": dict(self.calls),
+        }
+
+
+class FakeGraphAPI(FakeService):
+    """Graph API：发送消息、用户资料，其他请求返回空列表"""
+
+    name = "graph"
+
+    def __init__(
+        self,
+        profile: Optional[FaultProfile] = None,
+        seed: int = 0,
+        on_send: Optional[Callable[[str, float], None]] = None
+    ):
+        self.on_send = on_send
+        self._message_ids = itertools.count(1)
+        super().__init__(profile, seed)
+
+    def routes(self) -> List[Route]:
+        return [
+            Route("/{version}/{page_id}/messages", self.send_message, methods=["POST"]),
+            Route("/{version}/{node}", self.get_node, methods=["GET"]),
+            Route("/{path:path}", self.fallback, methods=["GET", "POST", "DELETE"]),
+        ]
+
+    @staticmethod
+    def _error() -> JSONResponse:
+        return JSONResponse(
+            {"error": {"message": "Injected error", "type": "OAuthException", "code": 2, "is_transient": True}},
+            status_code=500)
+
+    async def send_message(self, request: Request) -> JSONResponse:
+        arrived = time.perf_counter()
+        body = await request.json()
+        if await self._begin("send_message"):
+            return self._error()
+        recipient_id = str((body.get("recipient") or {}).get("id", ""))
+        if self.on_send is not None:
+            self.on_send(recipient_id, arrived)
+        return JSONResponse(
+            {"recipient_id": recipient_id, "message_id": f"m_fake_{next(self._message_ids)}"},
+            headers={"X-App-Usage": json.dumps({"call_count": 1, "total_cputime": 1, "total_time": 1})})
+
+    async def get_node(self, request: Request) -> JSONResponse:
+        if await self._begin("get_node"):
+            return self._error()
+        node = request.path_params["node"]
+        return JSONResponse({
+            "id": node,
+            "name": f"Bench User {node[-4:]}",
+            "first_name": "Bench",
+            "last_name": f"User {node[-4:]}",
+            "profile_pic": "",
+        })
+
+    async def fallback(self, request: Request) -> JSONResponse:
+        if await self._begin("other"):
+            return self._error()
+        return JSONResponse({"data": []})
+
+
+class FakeOpenAI(FakeService):
+    """OpenAI Chat Completions"""
+
+    name = "openai"
+
+    def routes(self) -> List[Route]:
+        return [Route("/v1/chat/completions", self.chat_completions, methods=["POST"])]
+
+    async def chat_completions(self, request: Request) -> JSONResponse:
+        body = await request.json()
+        if await self._begin("chat_completions"):
+            return JSONResponse({"error": {"message": "Injected error", "type": "server_error"}}, status_code=500)
+        reply = self.rng.choice(FAKE_REPLIES)
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+        completion_tokens = len(reply) // 4
+        return JSONResponse({
+            "id": f"chatcmpl-fake{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+
+class FakeTelegram(FakeService):
+    """Telegram Bot API（sendMessage 等方法统一返回成功）"""
+
+    name = "telegram"
+
+    def routes(self) -> List[Route]:
+        return [Route("/bot{token}/{method}", self.call_method, methods=["GET", "POST"])]
+
+    async def call_method(self, request: Request) -> JSONResponse:
+        method = request.path_params["method"]
+        if await self._begin(method):
+            return JSONResponse({"ok": False, "error_code": 500, "description": "Injected error"}, status_code=500)
+        return JSONResponse({
+            "ok": True,
+            "result": {"message_id": self.requests, "date": int(time.time()), "chat": {"id": 0}},
+        })
+
+
+class FakeServices:
+    """在当前事件循环中启动三个模拟服务（各自监听一个本地端口）"""
+
+    def __init__(
+        self,
+        graph: FakeGraphAPI,
+        openai: FakeOpenAI,
+        telegram: FakeTelegram,
+        host: str = "127.0.0.1"
+    ):
+        self.services = {"graph": graph, "openai": openai, "telegram": telegram}
+        self.host = host
+        self.ports: Dict[str, int] = {}
+        self._servers: List[uvicorn.Server] = []
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def graph(self) -> FakeGraphAPI:
+        return self.services["graph"]
+
+    async def start(self, ports: Optional[Dict[str, int]] = None):
+        """启动服务（端口为0时由系统分配）"""
+        ports = ports or {}
+        for name, service in self.services.items():
+            config = uvicorn.Config(
+                service.app, host=self.host, port=ports.get(name, 0),
+                log_level="warning", access_log=False, lifespan="off")
+            server = uvicorn.Server(config)
+            task = asyncio.create_task(server.serve())
+            while not server.started:
+                if task.done():
+                    task.result()
+                await asyncio.sleep(0.01)
+            self.ports[name] = server.servers[0].sockets[0].getsockname()[1]
+            self._servers.append(server)
+            self._tasks.append(task)
+
+    async def stop(self):
+        for server in self._servers:
+            server.should_exit = True
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._servers.clear()
+        self._tasks.clear()
+
+    def app_env(self) -> Dict[str, str]:
+        """应用指向模拟服务所需的环境变量（占位凭证 + 三个服务地址）"""
+        from src.core.config.constants import FACEBOOK_GRAPH_API_VERSION
+        base = f"http://{self.host}"
+        return {
+            **BENCH_APP_ENV,
+            "FACEBOOK_GRAPH_API_URL": f"{base}:{self.ports['graph']}/{FACEBOOK_GRAPH_API_VERSION}",
+            "OPENAI_BASE_URL": f"{base}:{self.ports['openai']}/v1",
+            "TELEGRAM_API_URL": f"{base}:{self.ports['telegram']}",
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {name: service.get_stats() for name, service in self.services.items()}
+
+
+def add_fault_arguments(parser: argparse.ArgumentParser) -> None:
+    """各服务的延迟/错误注入参数（基准测试脚本复用）"""
+    defaults = {"graph": 0.05, "openai": 0.6, "telegram": 0.05}
+    for name, latency in defaults.items():
+        parser.add_argument(f"--{name}-latency", type=float, default=latency,
+                            help=f"模拟{name}服务的基础响应延迟（秒，默认: {latency}）")
+        parser.add_argument(f"--{name}-error-rate", type=float, default=0.0,
+                            help=f"模拟{name}服务返回5xx的比例（0-1，默认: 0）")
+    parser.add_argument("--jitter", type=float, default=0.2, help="延迟抖动比例（默认: 0.2，即 ±20%%）")
+    parser.add_argument("--seed", type=int, default=1, help="延迟/错误注入的随机种子")
+
+
+def build_services(args: argparse.Namespace, on_send: Optional[Callable[[str, float], None]] = None) -> FakeServices:
+    def profile(name: str) -> FaultProfile:
+        return FaultProfile(getattr(args, f"{name}_latency"), args.jitter, getattr(args, f"{name}_error_rate"))
+
+    return FakeServices(
+        graph=FakeGraphAPI(profile("graph"), seed=args.seed, on_send=on_send),
+        openai=FakeOpenAI(profile("openai"), seed=args.seed + 1),
+        telegram=FakeTelegram(profile("telegram"), seed=args.seed + 2),
+    )
+
+
+async def _serve_forever(args: argparse.Namespace):
+    services = build_services(args)
+    await services.start({"graph": args.graph_port, "openai": args.openai_port, "telegram": args.telegram_port})
+    for key, value in services.app_env().items():
+        print(f"{key}={value}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await services.stop()
+
+
+def use_bench_env() -> None:
+    """当前进程使用占位凭证（导入 src 配置之前调用，不读取 .env 中的真实凭证）"""
+    os.environ.update(BENCH_APP_ENV)
+    os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的 Graph API / OpenAI / Telegram 服务")
+    parser.add_argument("--graph-port", type=int, default=9001)
+    parser.add_argument("--openai-port", type=int, default=9002)
+    parser.add_argument("--telegram-port", type=int, default=9003)
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+    use_bench_env()
+    try:
+        asyncio.run(_serve_forever(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+关键词匹配基准测试
+
+生成不同数量的关键词（中英文混合，分布在多个分类中）和一批消息，比较：
+
+- naive:     旧实现，每个分类对 lower() 后的消息逐个关键词做子串检查
+- automaton: KeywordMatcher（Aho-Corasick，一次扫描返回所有分类的命中）
+
+用法:
+    python scripts/benchmark/keyword_matcher_benchmark.py
+    python scripts/benchmark/keyword_matcher_benchmark.py --keywords 100,1000,5000 --messages 2000
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.utils.keyword_matcher import DEFAULT_KEYWORD_CATEGORIES, KeywordMatcher
+
+CJK = "借款贷价格利息申请办理咨询了解手机苹果型号容量身份证服务客服可靠真实问题错误满意感谢"
+LATIN = "abcdefghijklmnopqrstuvwxyz"
+
+
+def make_categories(rng: random.Random, total: int, category_count: int) -> Dict[str, List[str]]:
+    """内置分类 + 随机生成的关键词，凑满 total 个"""
+    categories = {category: list(keywords) for category, keywords in DEFAULT_KEYWORD_CATEGORIES.items()}
+    remaining = max(0, total - sum(len(keywords) for keywords in categories.values()))
+    for i in range(remaining):
+        if rng.random() < 0.5:
+            keyword = "".join(rng.choice(CJK) for _ in range(rng.randint(2, 4)))
+        else:
+            keyword = "".join(rng.choice(LATIN) for _ in range(rng.randint(4, 9)))
+        categories.setdefault(f"generated_{i % category_count}", []).append(keyword)
+    return categories
+
+
+def make_messages(rng: random.Random, count: int, length: int) -> List[str]:
+    samples = ["请问iPhone贷款怎么办理？", "价格是多少", "How to apply for a loan?", "你好", "我想咨询一下利息"]
+    messages = []
+    for _ in range(count):
+        filler = "".join(rng.choice(CJK + LATIN + " ") for _ in range(length))
+        messages.append(rng.choice(samples) + filler)
+    return messages
+
+
+def naive_match(categories: Dict[str, List[str]], text: str) -> Dict[str, List[str]]:
+    hits: Dict[str, List[str]] = {}
+    message_lower = text.lower()
+    for category, keywords in categories.items():
+        matched = [keyword for keyword in keywords if keyword.lower() in message_lower]
+        if matched:
+            hits[category] = matched
+    return hits
+
+
+def run(keyword_count: int, messages: List[str], category_count: int, seed: int) -> Dict[str, Any]:
+    categories = make_categories(random.Random(seed), keyword_count, category_count)
+
+    started = time.perf_counter()
+    matcher = KeywordMatcher(categories)
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    for message in messages:
+        naive_match(categories, message)
+    naive_us = (time.perf_counter() - started) / len(messages) * 1e6
+
+    started = time.perf_counter()
+    for message in messages:
+        matcher.match(message)
+    automaton_us = (time.perf_counter() - started) / len(messages) * 1e6
+
+    return {
+        "keywords": len(matcher),
+        "compile_ms": round(compile_ms, 1),
+        "naive_us_per_message": round(naive_us, 1),
+        "automaton_us_per_message": round(automaton_us, 1),
+        "speedup": round(naive_us / automaton_us, 1) if automaton_us else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="关键词匹配基准测试")
+    parser.add_argument("--keywords", default="200,1000,5000,20000", help="关键词数量，逗号分隔")
+    parser.add_argument("--categories", type=int, default=20, help="生成关键词分布的分类数 (默认: 20)")
+    parser.add_argument("--messages", type=int, default=2000, help="消息数 (默认: 2000)")
+    parser.add_argument("--message-length", type=int, default=80, help="每条消息附加的随机字符数 (默认: 80)")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出结果")
+    args = parser.parse_args()
+
+    messages = make_messages(random.Random(args.seed), args.messages, args.message_length)
+    results = [
+        run(int(count), messages, args.categories, args.seed)
+        for count in args.keywords.split(",") if count.strip()
+    ]
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{'关键词数':>10}{'编译(ms)':>12}{'逐个检查(us/条)':>18}{'自动机(us/条)':>16}{'加速':>8}")
+    print("=" * 64)
+    for r in results:
+        print(f"{r['keywords']:>10}{r['compile_ms']:>12}{r['naive_us_per_message']:>18}"
+              f"{r['automaton_us_per_message']:>16}{r['speedup']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+日志管道基准测试：日志吞吐量与事件循环停顿
+
+在事件循环中模拟Webhook突发流量：一个协程连续记录N条Webhook日志（每条之间让出事件循环），
+另一个协程每1ms醒来一次并记录实际延迟（即事件循环停顿）。控制台输出重定向到 /dev/null，
+文件日志写入临时目录。
+
+对比三种模式：
+- legacy: 旧实现，记录完整请求体，每个处理器各自执行未预编译的脱敏，在事件循环中同步写文件
+- sync:   新的脱敏和摘要日志，在事件循环中同步写入（LOG_ASYNC=false）
+- async:  新的脱敏和摘要日志，QueueHandler 入队，后台线程写入（LOG_ASYNC=true）
+
+用法:
+    python scripts/benchmark/logging_benchmark.py --events 20000
+    python scripts/benchmark/logging_benchmark.py --events 20000 --no-sampling
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Dict, List
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+
+def _webhook_body(i: int) -> Dict[str, Any]:
+    return {
+        "object": "page",
+        "entry": [{
+            "id": "102345678901234",
+            "time": 1700000000000 + i,
+            "messaging": [{
+                "sender": {"id": f"2468{i:012d}"},
+                "recipient": {"id": "102345678901234"},
+                "timestamp": 1700000000000 + i,
+                "message": {"mid": f"m_{'x' * 60}{i}", "text": "Hi, how much is the premium plan? " * 3},
+            }],
+        }],
+    }
+
+
+class _LegacySensitiveDataFilter(logging.Filter):
+    """旧的脱敏过滤器（每条记录整体转小写，每次调用都重新查找正则）"""
+
+    KEYWORDS = ['token', 'password', 'secret', 'key', 'api_key', 'access_token', 'refresh_token', 'auth', 'credential']
+    PATTERNS = [r'[A-Za-z0-9]{32,}', r'sk-[A-Za-z0-9]+', r'EAAG[A-Za-z0-9]+']
+
+    def filter(self, record):
+        record.msg = self._sanitize(str(record.msg))
+        return True
+
+    def _sanitize(self, text):
+        text_lower = text.lower()
+        if not any(keyword in text_lower for keyword in self.KEYWORDS):
+            return text
+        for pattern in self.PATTERNS:
+            text = re.sub(pattern, '[REDACTED]', text)
+        text = re.sub(r'(EAAG[A-Za-z0-9]{10})[A-Za-z0-9]+', r'\1[REDACTED]', text)
+        return re.sub(r'(sk-[A-Za-z0-9]{10})[A-Za-z0-9]+', r'\1[REDACTED]', text)
+
+
+def _configure(mode: str, log_file: Path, sampling: bool) -> None:
+    from src.core.config.constants import LOG_FILE_BACKUP_COUNT, LOG_FILE_MAX_BYTES
+    from src.core.logging.config import LocalTimeFormatter, setup_logging
+
+    if mode == "legacy":
+        from src.core.logging.config import stop_logging
+        stop_logging()
+        root = logging.getLogger()
+        root.handlers.clear()
+        root.setLevel(logging.INFO)
+        legacy_filter = _LegacySensitiveDataFilter()
+        formatter = LocalTimeFormatter(fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                                       datefmt='%Y-%m-%d %H:%M:%S')
+        file_handler = RotatingFileHandler(
+            log_file, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUP_COUNT, encoding='utf-8')
+        for handler in (logging.StreamHandler(), file_handler):
+            handler.setFormatter(formatter)
+            handler.addFilter(legacy_filter)
+            root.addHandler(handler)
+    else:
+        setup_logging(log_level="INFO", log_file=log_file, max_bytes=LOG_FILE_MAX_BYTES,
+                      backup_count=LOG_FILE_BACKUP_COUNT, use_queue=(mode == "async"), sampling=sampling)
+
+
+async def _run(mode: str, events: int) -> Dict[str, Any]:
+    from src.core.logging import WEBHOOK_EVENT_SAMPLE_KEY, webhook_event_fields, webhook_log_extra
+
+    logger = logging.getLogger("benchmark.webhook")
+    bodies = [_webhook_body(i) for i in range(events)]
+    lags: List[float] = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - started - 0.001)
+
+    async def producer():
+        for i, body in enumerate(bodies):
+            if mode == "legacy":
+                logger.info(f"Received webhook event: {body}")
+            else:
+                fields = webhook_event_fields(body)
+                logger.info(
+                    f"Received webhook event: object={fields['object']} entries={fields['entries']} "
+                    f"events={fields['events']} pages={','.join(fields['page_ids'])}",
+                    extra=webhook_log_extra(WEBHOOK_EVENT_SAMPLE_KEY, fields))
+            if i % 10 == 0:
+                await asyncio.sleep(0)
+        done.set()
+
+    ticker_task = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await producer()
+    elapsed = time.perf_counter() - started
+    await ticker_task
+
+    lags.sort()
+    return {
+        "mode": mode,
+        "events": events,
+        "events_per_second": round(events / elapsed),
+        "loop_stall_p50_ms": round(statistics.median(lags) * 1000, 3) if lags else 0.0,
+        "loop_stall_p99_ms": round(lags[int(len(lags) * 0.99)] * 1000, 3) if lags else 0.0,
+        "loop_stall_max_ms": round(lags[-1] * 1000, 3) if lags else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日志吞吐量与事件循环停顿基准测试")
+    parser.add_argument("--events", type=int, default=20000, help="每种模式记录的Webhook事件数 (默认: 20000)")
+    parser.add_argument("--no-sampling", action="store_true", help="关闭高频事件采样（只比较写入方式）")
+    args = parser.parse_args()
+
+    from src.core.logging.config import get_logging_stats, stop_logging
+
+    results = []
+    real_stderr = sys.stderr
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        for mode in ("legacy", "sync", "async"):
+            sys.stderr = devnull  # 控制台处理器在创建时绑定 sys.stderr
+            try:
+                _configure(mode, Path(tmp) / f"{mode}.log", sampling=not args.no_sampling)
+                result = asyncio.run(_run(mode, args.events))
+                flush_started = time.perf_counter()
+                stats = get_logging_stats()
+                stop_logging()
+                result["drain_seconds"] = round(time.perf_counter() - flush_started, 3)
+                result["sampled_out"] = stats["sampled_out"] if mode != "legacy" else 0
+                result["dropped"] = stats["dropped"]
+                for handler in logging.getLogger().handlers:
+                    handler.close()
+                logging.getLogger().handlers.clear()
+            finally:
+                sys.stderr = real_stderr
+            result["file_bytes"] = (Path(tmp) / f"{mode}.log").stat().st_size
+            results.append(result)
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+OpenAI 调用对事件循环影响的基准测试
+
+在进程内启动应用（httpx ASGITransport，不需要真实服务器），同时保持 N 个
+模拟的 OpenAI 请求处于进行中，测量 Webhook 端点的响应延迟（p50/p95/p99）。
+
+对比三种模式：
+- blocking:   旧实现，在协程中直接调用同步客户端（会冻结事件循环）
+- threadpool: OPENAI_ASYNC_CLIENT=false，同步客户端在线程池中执行
+- async:      OPENAI_ASYNC_CLIENT=true，共享 AsyncOpenAI 客户端
+
+用法:
+    python scripts/benchmark/openai_event_loop_benchmark.py --inflight 20 --latency 0.5
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import httpx
+
+
+def _fake_response() -> Any:
+    message = SimpleNamespace(content="您好，请问有什么可以帮您？")
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=message)],
+        usage=SimpleNamespace(total_tokens=42)
+    )
+
+
+class FakeSyncCompletions:
+    """模拟同步SDK：阻塞当前线程直到响应返回"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def create(self, **kwargs):
+        time.sleep(self.latency)
+        return _fake_response()
+
+
+class FakeAsyncCompletions:
+    """模拟异步SDK：等待期间让出事件循环"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def create(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        return _fake_response()
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * pct))
+    return sorted_values[index]
+
+
+async def run_mode(mode: str, inflight: int, latency: float, probes: int) -> Dict[str, Any]:
+    """运行单个模式，返回Webhook延迟统计"""
+    from src.core.config import settings
+    from src.ai.reply_generator import ReplyGenerator
+    from src.main import app
+
+    generator = ReplyGenerator.__new__(ReplyGenerator)
+    messages = [{"role": "user", "content": "你好"}]
+
+    if mode == "async":
+        settings.openai_async_client = True
+        generator.client = SimpleNamespace(chat=SimpleNamespace(completions=FakeAsyncCompletions(latency)))
+        call = lambda: generator._create_chat_completion(messages)
+    elif mode == "threadpool":
+        settings.openai_async_client = False
+        generator.client = SimpleNamespace(chat=SimpleNamespace(completions=FakeSyncCompletions(latency)))
+        call = lambda: generator._create_chat_completion(messages)
+    else:
+        completions = FakeSyncCompletions(latency)
+
+        async def call():
+            return completions.create(model="fake", messages=messages)
+
+    # 不含消息的Webhook事件：只走解析和响应路径，测量的是事件循环的调度延迟
+    webhook_body = {"object": "page", "entry": []}
+    latencies: List[float] = []
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # 预热
+        await client.post("/webhook", json=webhook_body)
+
+        started = time.perf_counter()
+        completions_task = asyncio.gather(*[call() for _ in range(inflight)])
+
+        # 探测请求按固定节奏发出，延迟从计划发送时间算起：
+        # 事件循环被阻塞时请求无法按时发出，这段等待也计入延迟（避免协调遗漏）
+        interval = latency / max(probes, 1) * 2
+        for i in range(probes):
+            scheduled = started + i * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            response = await client.post("/webhook", json=webhook_body)
+            latencies.append((time.perf_counter() - scheduled) * 1000)
+            assert response.status_code == 200
+
+        await completions_task
+        total_seconds = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "inflight": inflight,
+        "simulated_latency_ms": latency * 1000,
+        "probes": len(latencies),
+        "webhook_p50_ms": round(_percentile(latencies, 0.50), 2),
+        "webhook_p95_ms": round(_percentile(latencies, 0.95), 2),
+        "webhook_p99_ms": round(_percentile(latencies, 0.99), 2),
+        "webhook_max_ms": round(latencies[-1], 2) if latencies else 0.0,
+        "webhook_mean_ms": round(statistics.mean(latencies), 2) if latencies else 0.0,
+        "total_seconds": round(total_seconds, 3),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="OpenAI 调用对事件循环影响的基准测试")
+    parser.add_argument("--inflight", type=int, default=20, help="同时进行的AI请求数 (默认: 20)")
+    parser.add_argument("--latency", type=float, default=0.5, help="模拟的单次AI请求耗时（秒）(默认: 0.5)")
+    parser.add_argument("--probes", type=int, default=50, help="Webhook探测请求数 (默认: 50)")
+    parser.add_argument(
+        "--modes",
+        default="blocking,threadpool,async",
+        help="要运行的模式，逗号分隔 (默认: blocking,threadpool,async)"
+    )
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出结果")
+    args = parser.parse_args()
+
+    results = []
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        results.append(await run_mode(mode, args.inflight, args.latency, args.probes))
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{'模式':<12}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}{'总耗时(s)':>12}")
+    print("=" * 64)
+    for r in results:
+        print(
+            f"{r['mode']:<12}{r['webhook_p50_ms']:>10}{r['webhook_p95_ms']:>10}"
+            f"{r['webhook_p99_ms']:>10}{r['webhook_max_ms']:>10}{r['total_seconds']:>12}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+"""
+冷启动基准测试：进程启动到第一次 /health/simple 成功响应的时间
+
+每轮启动一个新的 uvicorn 进程，每10ms轮询一次 /health/simple，记录第一次返回200的时间，
+然后结束进程。可对比 LAZY_ROUTERS=true（默认）与 false（启动时导入全部路由）。
+
+作为回归检查使用时指定 --max-seconds，中位数超过阈值时以退出码1结束。
+
+用法:
+    python scripts/benchmark/startup_benchmark.py --runs 5
+    python scripts/benchmark/startup_benchmark.py --compare-eager
+    python scripts/benchmark/startup_benchmark.py --max-seconds 3.0
+    python scripts/benchmark/startup_benchmark.py --profile    # 同时输出最慢的导入模块
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import httpx
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_once(env: Dict[str, str], timeout: float, profile: bool) -> Dict[str, Any]:
+    """启动一个进程，返回到第一次健康检查成功的秒数（以及启动耗时报告）"""
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=project_root, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        with httpx.Client(timeout=1.0) as client:
+            while time.perf_counter() - started < timeout:
+                if process.poll() is not None:
+                    raise RuntimeError(f"Server exited with code {process.returncode}")
+                try:
+                    if client.get(f"{base_url}/health/simple").status_code == 200:
+                        result = {"seconds": time.perf_counter() - started}
+                        if profile:
+                            result["startup"] = client.get(f"{base_url}/metrics", timeout=10).json().get("startup")
+                        return result
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.01)
+        raise TimeoutError(f"/health/simple not ready after {timeout}s")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def run_mode(lazy: bool, runs: int, timeout: float, profile: bool) -> Dict[str, Any]:
+    env = dict(os.environ)
+    env["LAZY_ROUTERS"] = "true" if lazy else "false"
+    if profile:
+        env["STARTUP_PROFILE"] = "true"
+
+    samples: List[float] = []
+    last_startup: Optional[Dict[str, Any]] = None
+    for _ in range(runs):
+        result = measure_once(env, timeout, profile)
+        samples.append(result["seconds"])
+        last_startup = result.get("startup", last_startup)
+
+    report = {
+        "mode": "lazy" if lazy else "eager",
+        "runs": runs,
+        "median_seconds": round(statistics.median(samples), 3),
+        "min_seconds": round(min(samples), 3),
+        "max_seconds": round(max(samples), 3),
+    }
+    if last_startup is not None:
+        report["startup"] = last_startup
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷启动到第一次 /health/simple 响应的时间")
+    parser.add_argument("--runs", type=int, default=3, help="每种模式启动的次数 (默认: 3)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="单次启动等待上限（秒）")
+    parser.add_argument("--compare-eager", action="store_true", help="同时测量 LAZY_ROUTERS=false")
+    parser.add_argument("--profile", action="store_true", help="启用 STARTUP_PROFILE 并输出最慢的导入模块")
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="延迟加载模式中位数的上限，超过时退出码为1（用于回归检查）")
+    args = parser.parse_args()
+
+    reports = [run_mode(True, args.runs, args.timeout, args.profile)]
+    if args.compare_eager:
+        reports.append(run_mode(False, args.runs, args.timeout, args.profile))
+    print(json.dumps(reports, indent=2, ensure_ascii=False))
+
+    if args.max_seconds is not None:
+        median = reports[0]["median_seconds"]
+        if median > args.max_seconds:
+            print(f"FAIL: time to first /health/simple {median:.3f}s > {args.max_seconds:.3f}s")
+            sys.exit(1)
+        print(f"OK: time to first /health/simple {median:.3f}s <= {args.max_seconds:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
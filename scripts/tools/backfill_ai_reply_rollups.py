@@ -0,0 +1,90 @@
+"""
+从历史对话回填AI回复汇总分桶（ai_reply_rollups / ai_reply_rollup_customers）
+
+按天重建并逐天提交，可重复执行（重建会覆盖指定日期已有的分桶）。
+
+用法:
+    python scripts/tools/backfill_ai_reply_rollups.py
+    python scripts/tools/backfill_ai_reply_rollups.py --start-date 2026-01-01 --end-date 2026-01-31
+"""
+import argparse
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from dotenv import load_dotenv
+import logging
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _parse_date(value: str) -> date:
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"日期格式错误: {value}，请使用 YYYY-MM-DD 格式")
+
+
+def _earliest_reply_date(db):
+    """最早一条AI回复的日期，没有AI回复时返回None"""
+    from sqlalchemy import func
+    from src.core.database.models import Conversation
+
+    earliest = db.query(func.min(Conversation.ai_reply_at))\
+        .filter(Conversation.ai_replied == True)\
+        .scalar()
+    if earliest is None:
+        return None
+    if earliest.tzinfo is None:
+        earliest = earliest.replace(tzinfo=timezone.utc)
+    return earliest.astimezone(timezone.utc).date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回填AI回复汇总分桶")
+    parser.add_argument("--start-date", type=_parse_date, help="开始日期（默认：最早一条AI回复的日期）")
+    parser.add_argument("--end-date", type=_parse_date, help="结束日期，包含（默认：今天，UTC）")
+    args = parser.parse_args()
+
+    from src.core.database.connection import SessionLocal
+    from src.statistics.rollups import AIReplyRollups
+
+    db = SessionLocal()
+    try:
+        start_date = args.start_date or _earliest_reply_date(db)
+        end_date = args.end_date or datetime.now(timezone.utc).date()
+        if start_date is None:
+            print("没有AI回复记录，无需回填")
+            return
+        if start_date > end_date:
+            print(f"开始日期 {start_date} 晚于结束日期 {end_date}")
+            sys.exit(1)
+
+        print(f"回填AI回复汇总: {start_date} ~ {end_date}")
+        rollups = AIReplyRollups(db)
+        started = time.perf_counter()
+        days = replies = 0
+        target_date = start_date
+        while target_date <= end_date:
+            result = rollups.rebuild(target_date, target_date)
+            days += result["days"]
+            replies += result["replies"]
+            if result["replies"]:
+                print(f"  {target_date}: {result['replies']} 条回复")
+            target_date += timedelta(days=1)
+
+        print(f"完成: {days} 天, {replies} 条回复, 耗时 {time.perf_counter() - started:.1f}s")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+回填客户已收到Telegram群组链接的标记（customers.telegram_invite_sent_at）
+
+迁移 015 已按通用关键词（t.me / telegram）回填；本脚本再按 config.yaml 中配置的主群组
+（群组名、邀请码）检查尚未标记客户的AI回复。按客户ID分批处理，可重复执行。
+
+用法:
+    python scripts/tools/backfill_telegram_invites.py
+    python scripts/tools/backfill_telegram_invites.py --batch-size 500 --dry-run
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from dotenv import load_dotenv
+import logging
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def backfill_batch(db, customer_ids, main_group, dry_run=False) -> int:
+    """检查一批客户的AI回复，标记收到过群组链接的客户，返回标记数"""
+    from src.core.database.models import Conversation
+    from src.core.database.repositories import CustomerRepository
+    from src.utils.telegram_link import contains_telegram_link
+
+    first_sent = {}
+    rows = db.query(Conversation.customer_id, Conversation.ai_reply_content, Conversation.ai_reply_at)\
+        .filter(
+            Conversation.customer_id.in_(customer_ids),
+            Conversation.ai_replied == True,
+            Conversation.ai_reply_content.isnot(None)
+        )\
+        .order_by(Conversation.customer_id, Conversation.ai_reply_at)\
+        .yield_per(1000)
+    for customer_id, reply, reply_at in rows:
+        if customer_id not in first_sent and contains_telegram_link(reply, main_group):
+            first_sent[customer_id] = reply_at
+
+    if not dry_run:
+        customer_repo = CustomerRepository(db)
+        for customer_id, sent_at in first_sent.items():
+            customer_repo.mark_telegram_invite_sent(customer_id, sent_at)
+    return len(first_sent)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回填客户已收到Telegram群组链接的标记")
+    parser.add_argument("--batch-size", type=int, default=1000, help="每批处理的客户数 (默认: 1000)")
+    parser.add_argument("--dry-run", action="store_true", help="只统计，不写入")
+    args = parser.parse_args()
+
+    from src.core.database.connection import SessionLocal
+    from src.core.database.models import Customer
+    from src.utils.telegram_link import configured_main_group
+
+    main_group = configured_main_group()
+    print(f"主群组: {main_group or '(未配置，只使用通用关键词)'}")
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        last_id = 0
+        checked = marked = 0
+        while True:
+            customer_ids = [
+                row[0] for row in db.query(Customer.id)
+                .filter(Customer.id > last_id, Customer.telegram_invite_sent_at.is_(None))
+                .order_by(Customer.id)
+                .limit(args.batch_size)
+            ]
+            if not customer_ids:
+                break
+            marked += backfill_batch(db, customer_ids, main_group, dry_run=args.dry_run)
+            checked += len(customer_ids)
+            last_id = customer_ids[-1]
+
+        action = "可标记" if args.dry_run else "已标记"
+        print(f"完成: 检查 {checked} 位未标记客户, {action} {marked} 位, 耗时 {time.perf_counter() - started:.1f}s")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
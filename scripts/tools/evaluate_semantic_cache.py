@@ -0,0 +1,202 @@
+"""
+离线评估语义回复缓存
+
+按时间顺序回放历史 conversations 中每位客户的首次咨询（已AI回复的第一条消息）：
+每条消息先在之前的消息中查找同一页面最相似的一条，再把自己加入索引。
+对每个相似度阈值统计：
+
+- hit_rate:           相似度达到阈值（会直接复用历史回复）的比例
+- reply_similarity:   命中时复用的回复与当时实际回复的平均相似度（回复质量的近似指标）
+- acceptable_rate:    命中中回复相似度 >= --acceptable 的比例
+- identical_rate:     命中中复用回复与实际回复规范化后完全相同的比例
+
+回放时每条消息都加入索引（线上命中的消息不会再加入），因此命中率略高于线上的实际值。
+加 --write-index 时把全部首次咨询及拟合的IDF写入索引目录，供 SEMANTIC_CACHE_PATH 使用。
+
+用法:
+    python scripts/tools/evaluate_semantic_cache.py --days 30
+    python scripts/tools/evaluate_semantic_cache.py --thresholds 0.8,0.85,0.9,0.95 --json
+    python scripts/tools/evaluate_semantic_cache.py --write-index ./data/semantic_cache
+"""
+import argparse
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from dotenv import load_dotenv
+import logging
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def load_first_contacts(db, since, limit) -> List[Dict[str, Any]]:
+    """每位客户第一条已AI回复的消息（按接收时间排序）"""
+    from src.core.database.models import Conversation
+    from src.statistics.rollups import page_id_from_raw_data
+
+    query = db.query(
+        Conversation.id,
+        Conversation.customer_id,
+        Conversation.content,
+        Conversation.ai_reply_content,
+        Conversation.raw_data
+    ).filter(
+        Conversation.ai_replied == True,
+        Conversation.ai_reply_content.isnot(None),
+        Conversation.content.isnot(None)
+    )
+    if since is not None:
+        query = query.filter(Conversation.received_at >= since)
+    query = query.order_by(Conversation.received_at.asc(), Conversation.id.asc())
+
+    seen_customers = set()
+    samples = []
+    for row in query.yield_per(1000):
+        if row.customer_id in seen_customers:
+            continue
+        seen_customers.add(row.customer_id)
+        samples.append({
+            "conversation_id": row.id,
+            "message": row.content,
+            "reply": row.ai_reply_content,
+            "page_id": page_id_from_raw_data(row.raw_data),
+        })
+        if limit and len(samples) >= limit:
+            break
+    return samples
+
+
+def replay(samples: List[Dict[str, Any]], dimensions: int) -> List[Dict[str, Any]]:
+    """回放：每条消息在之前的消息中找最相似的一条"""
+    from src.ai.semantic_cache import HashedNgramVectorizer, SemanticIndex
+    from src.utils.text import question_fingerprint
+
+    vectorizer = HashedNgramVectorizer(dimensions)
+    vectorizer.fit_idf(sample["message"] for sample in samples)
+    index = SemanticIndex(directory=None, dimensions=dimensions, max_entries=len(samples) + 1)
+
+    results = []
+    for sample in samples:
+        vector = vectorizer.transform(sample["message"])
+        found = index.search(vector, sample["page_id"])
+        if found is not None:
+            entry, similarity = found
+            reply_similarity = float(
+                vectorizer.transform(entry["reply"]) @ vectorizer.transform(sample["reply"]))
+            results.append({
+                "similarity": similarity,
+                "reply_similarity": reply_similarity,
+                "identical": question_fingerprint(entry["reply"]) == question_fingerprint(sample["reply"]),
+            })
+        else:
+            results.append(None)
+        index.add(vector, sample["page_id"], {"reply": sample["reply"]})
+    return results
+
+
+def summarize(results: List[Any], threshold: float, acceptable: float) -> Dict[str, Any]:
+    hits = [r for r in results if r is not None and r["similarity"] >= threshold]
+    return {
+        "threshold": threshold,
+        "messages": len(results),
+        "hits": len(hits),
+        "hit_rate": round(len(hits) / len(results), 4) if results else 0.0,
+        "reply_similarity": round(sum(r["reply_similarity"] for r in hits) / len(hits), 4) if hits else None,
+        "acceptable_rate": round(
+            sum(1 for r in hits if r["reply_similarity"] >= acceptable) / len(hits), 4) if hits else None,
+        "identical_rate": round(sum(1 for r in hits if r["identical"]) / len(hits), 4) if hits else None,
+    }
+
+
+def write_index(samples: List[Dict[str, Any]], directory: str, prompt_version: str, dimensions: int) -> int:
+    """把首次咨询写入语义缓存索引目录（覆盖已有索引）"""
+    import shutil
+    from src.ai.semantic_cache import SemanticReplyCache
+
+    shutil.rmtree(directory, ignore_errors=True)
+    cache = SemanticReplyCache(directory=directory, dimensions=dimensions, max_entries=len(samples) + 1)
+    cache.index.save_idf(cache.vectorizer.fit_idf(sample["message"] for sample in samples))
+    added = 0
+    for sample in samples:
+        if cache.add(sample["message"], sample["reply"], prompt_version,
+                     page_id=sample["page_id"] or None, conversation_id=sample["conversation_id"]):
+            added += 1
+    return added
+
+
+def default_prompt_version() -> str:
+    """当前默认提示词（未参与A/B测试时）的版本标识"""
+    from src.ai.prompt_templates import PromptTemplates
+    from src.ai.reply_generator import ReplyGenerator
+
+    templates = PromptTemplates()
+    system_prompt = templates.build_system_prompt(prompt_type=templates.templates.get("prompt_type"))
+    return ReplyGenerator._prompt_version_key(None, system_prompt)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线评估语义回复缓存")
+    parser.add_argument("--days", type=int, help="只回放最近N天的对话（默认：全部）")
+    parser.add_argument("--limit", type=int, help="最多回放的首次咨询数")
+    parser.add_argument("--thresholds", default="0.8,0.85,0.9,0.95", help="相似度阈值，逗号分隔")
+    parser.add_argument("--acceptable", type=float, default=0.5, help="回复相似度达到该值视为可接受 (默认: 0.5)")
+    parser.add_argument("--dimensions", type=int, help="向量维度（默认：SEMANTIC_CACHE_DIMENSIONS）")
+    parser.add_argument("--write-index", metavar="DIR", help="把全部首次咨询写入该索引目录")
+    parser.add_argument("--prompt-version", help="写入索引时使用的提示词版本标识（默认：当前默认提示词）")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出结果")
+    args = parser.parse_args()
+
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        print("需要安装 numpy: pip install numpy")
+        sys.exit(1)
+
+    from src.core.config.constants import SEMANTIC_CACHE_DIMENSIONS
+    from src.core.database.connection import SessionLocal
+
+    dimensions = args.dimensions or SEMANTIC_CACHE_DIMENSIONS
+    since = datetime.now(timezone.utc) - timedelta(days=args.days) if args.days else None
+
+    db = SessionLocal()
+    try:
+        samples = load_first_contacts(db, since, args.limit)
+    finally:
+        db.close()
+    if not samples:
+        print("没有可回放的首次咨询")
+        return
+
+    results = replay(samples, dimensions)
+    thresholds = [float(t) for t in args.thresholds.split(",") if t.strip()]
+    summary = [summarize(results, threshold, args.acceptable) for threshold in thresholds]
+
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        print(f"回放 {len(samples)} 条首次咨询")
+        print(f"{'阈值':>6}{'命中数':>8}{'命中率':>10}{'回复相似度':>12}{'可接受率':>10}{'完全相同':>10}")
+        print("=" * 60)
+        for s in summary:
+            print(f"{s['threshold']:>6}{s['hits']:>8}{s['hit_rate']:>10}"
+                  f"{s['reply_similarity'] if s['reply_similarity'] is not None else '-':>12}"
+                  f"{s['acceptable_rate'] if s['acceptable_rate'] is not None else '-':>10}"
+                  f"{s['identical_rate'] if s['identical_rate'] is not None else '-':>10}")
+
+    if args.write_index:
+        prompt_version = args.prompt_version or default_prompt_version()
+        added = write_index(samples, args.write_index, prompt_version, dimensions)
+        print(f"已写入索引 {args.write_index}: {added} 条（提示词版本 {prompt_version}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,50 @@
 """对话上下文管理"""
+import logging
 from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
 from src.core.database.models import Conversation, Customer, Platform, MessageType
 from src.core.database.connection import get_db
 from src.core.database.repositories import CustomerRepository, ConversationRepository
 
+logger = logging.getLogger(__name__)
+
 
 class ConversationManager:
     """管理对话上下文和历史记录"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, async_db=None):
+        """
+        Args:
+            db: 数据库会话
+            async_db: 异步数据库会话（可选，提供时客户和对话的写入走异步路径）
+        """
         self.db = db
+        self.async_db = async_db
         self.customer_repo = CustomerRepository(db)
         self.conversation_repo = ConversationRepository(db)
+        if async_db is not None:
+            from src.core.database.repositories import AsyncCustomerRepository, AsyncConversationRepository
+            self.async_customer_repo = AsyncCustomerRepository(async_db)
+            self.async_conversation_repo = AsyncConversationRepository(async_db)
+    
+    @staticmethod
+    def _to_platform_enum(platform: Optional[str]) -> Platform:
+        """转换platform字符串为枚举"""
+        try:
+            return Platform[platform.upper()] if platform else Platform.FACEBOOK
+        except (KeyError, AttributeError):
+            return Platform.FACEBOOK  # 默认值
+    
+    @staticmethod
+    def _to_message_type_enum(message_type: Any) -> MessageType:
+        """转换message_type字符串为枚举"""
+        message_type_enum = None
+        if message_type:
+            try:
+                message_type_enum = MessageType[message_type.upper()] if isinstance(message_type, str) else message_type
+            except (KeyError, AttributeError):
+                message_type_enum = MessageType.MESSAGE  # 默认值
+        return message_type_enum or MessageType.MESSAGE
     
     async def get_conversation_history(
         self,
@@ -20,62 +52,42 @@ class ConversationManager:
         limit: int = 10
     ) -> List[Dict[str, Any]]:
         """
-        获取对话历史（带缓存）
+        获取对话历史
+        
+        最近的对话记录保存在客户的历史窗口中（由 save_conversation / update_ai_reply 维护），
+        窗口已加载时不查询数据库；limit 超过窗口大小时直接查询数据库。
         
         Args:
             customer_id: 客户 ID
-            limit: 返回的最大消息数
+            limit: 返回的最大对话记录数
         
         Returns:
-            对话历史列表
+            对话历史列表（按时间正序）
         """
-        # 尝试从缓存获取
-        from src.core.cache import conversation_cache
+        from src.core.cache import HistoryTurn, get_history_store, history_messages
         
-        cache_key = f"conversation_history:{customer_id}:{limit}"
-        cached_history = await conversation_cache.get(cache_key)
-        if cached_history is not None:
-            return cached_history
+        store = get_history_store()
+        if limit > store.window:
+            conversations = self.conversation_repo.get_customer_conversations(
+                customer_id=customer_id,
+                skip=0,
+                limit=limit
+            )
+            return history_messages([HistoryTurn.from_model(conv) for conv in reversed(conversations)])
         
-        # 使用Repository获取对话历史
-        conversations = self.conversation_repo.get_customer_conversations(
-            customer_id=customer_id,
-            skip=0,
-            limit=limit
-        )
-        # 按时间倒序排列
-        conversations = sorted(conversations, key=lambda x: x.created_at, reverse=True)
-        
-        from datetime import timezone
-        
-        history = []
-        for conv in reversed(conversations):  # 按时间正序
-            # 确保时间有时区信息
-            received_at = conv.received_at
-            if received_at and received_at.tzinfo is None:
-                received_at = received_at.replace(tzinfo=timezone.utc)
-            
-            history.append({
-                "role": "user",
-                "content": conv.content,
-                "timestamp": received_at.isoformat() if received_at else None
-            })
-            
-            if conv.ai_replied and conv.ai_reply_content:
-                ai_reply_at = conv.ai_reply_at
-                if ai_reply_at and ai_reply_at.tzinfo is None:
-                    ai_reply_at = ai_reply_at.replace(tzinfo=timezone.utc)
-                
-                history.append({
-                    "role": "assistant",
-                    "content": conv.ai_reply_content,
-                    "timestamp": ai_reply_at.isoformat() if ai_reply_at else None
-                })
-        
-        # 缓存结果
-        await conversation_cache.set(cache_key, history)
-        
-        return history
+        turns = store.get(customer_id)
+        if turns is None:
+            token = store.load_token()
+            conversations = self.conversation_repo.get_customer_conversations(
+                customer_id=customer_id,
+                skip=0,
+                limit=store.window
+            )
+            # 查询结果按接收时间倒序
+            turns = tuple(HistoryTurn.from_model(conv) for conv in reversed(conversations))
+            store.put(customer_id, turns, token)
+        
+        return history_messages(turns[-limit:] if limit > 0 else ())
     
     def save_conversation(
         self,
@@ -100,55 +112,93 @@ class ConversationManager:
             raw_data: 原始数据
         
         Returns:
-            创建的对话记录
+            对话记录（同一平台消息已保存过时返回已有记录，如入站队列重投）
         """
         # 使用platform_message_id或facebook_message_id
         msg_id = platform_message_id or facebook_message_id
         
-        # 转换platform字符串为枚举
-        platform_enum = None
-        try:
-            platform_enum = Platform[platform.upper()] if platform else Platform.FACEBOOK
-        except (KeyError, AttributeError):
-            platform_enum = Platform.FACEBOOK  # 默认值
-        
-        # 转换message_type字符串为枚举
-        message_type_enum = None
-        if message_type:
-            try:
-                message_type_enum = MessageType[message_type.upper()] if isinstance(message_type, str) else message_type
-            except (KeyError, AttributeError):
-                message_type_enum = MessageType.MESSAGE  # 默认值
-        
-        # 使用Repository创建对话
-        conversation = self.conversation_repo.create_conversation(
+        # 使用Repository创建对话（按平台消息ID去重）
+        conversation, created = self.conversation_repo.get_or_create_conversation(
             customer_id=customer_id,
-            platform=platform_enum,
+            platform=self._to_platform_enum(platform),
             platform_message_id=msg_id,
-            message_type=message_type_enum or MessageType.MESSAGE,
+            message_type=self._to_message_type_enum(message_type),
             content=content or "",
             raw_data=raw_data
         )
+        self._after_save(conversation, created)
+        
+        return conversation
+    
+    async def save_conversation_async(
+        self,
+        customer_id: int,
+        platform_message_id: str = None,
+        facebook_message_id: str = None,
+        platform: str = "facebook",
+        message_type: str = None,
+        content: str = None,
+        raw_data: Dict[str, Any] = None
+    ) -> Conversation:
+        """
+        保存对话记录（有异步会话时走异步Repository，否则回退到同步实现）
+        
+        参数与 save_conversation 相同
+        """
+        if self.async_db is None:
+            return self.save_conversation(
+                customer_id=customer_id,
+                platform_message_id=platform_message_id,
+                facebook_message_id=facebook_message_id,
+                platform=platform,
+                message_type=message_type,
+                content=content,
+                raw_data=raw_data
+            )
         
+        conversation, created = await self.async_conversation_repo.get_or_create_conversation(
+            customer_id=customer_id,
+            platform=self._to_platform_enum(platform),
+            platform_message_id=platform_message_id or facebook_message_id,
+            message_type=self._to_message_type_enum(message_type),
+            content=content or "",
+            raw_data=raw_data
+        )
+        self._after_save(conversation, created)
         return conversation
     
+    @staticmethod
+    def _after_save(conversation: Conversation, created: bool) -> None:
+        """新对话追加到客户的历史窗口；重复投递的消息已在窗口中，不再追加"""
+        if not created:
+            logger.info(
+                f"Conversation for message {conversation.platform_message_id} already exists "
+                f"(id={conversation.id}), reusing it")
+            return
+        from src.core.cache import get_history_store
+        get_history_store().record_message(conversation)
+    
     def update_ai_reply(
         self,
         conversation_id: int,
-        reply_content: str
+        reply_content: str,
+        page_id: Optional[str] = None
     ) -> Conversation:
         """
-        更新 AI 回复
+        更新 AI 回复，并计入AI回复汇总分桶（仅首次回复计入）；回复含Telegram群组链接时记录客户已收到链接
         
         Args:
             conversation_id: 对话 ID
             reply_content: 回复内容
+            page_id: 页面 ID（汇总维度，未提供时从 raw_data 获取）
         
         Returns:
             更新的对话记录
         """
         # 使用Repository更新对话
         from datetime import datetime, timezone
+        existing = self.conversation_repo.get(conversation_id)
+        already_replied = bool(existing and existing.ai_replied)
         conversation = self.conversation_repo.update(
             id=conversation_id,
             ai_replied=True,
@@ -156,8 +206,34 @@ class ConversationManager:
             ai_reply_at=datetime.now(timezone.utc)
         )
         
+        if conversation:
+            from src.core.cache import get_history_store
+            get_history_store().record_reply(conversation)
+            self._record_telegram_invite(conversation)
+        
+        if conversation and not already_replied:
+            try:
+                from src.statistics.rollups import AIReplyRollups
+                AIReplyRollups(self.db).record_reply(conversation, page_id=page_id)
+            except Exception as e:
+                # 汇总偏差由对账任务修正，不影响回复流程
+                self.db.rollback()
+                logger.warning(f"Failed to update AI reply rollups: {str(e)}")
+        
         return conversation
     
+    def _record_telegram_invite(self, conversation: Conversation) -> None:
+        """回复中含Telegram群组链接时记录客户已收到链接"""
+        from src.utils.telegram_link import contains_telegram_link
+        if not contains_telegram_link(conversation.ai_reply_content):
+            return
+        try:
+            self.customer_repo.mark_telegram_invite_sent(conversation.customer_id, conversation.ai_reply_at)
+        except Exception as e:
+            # 未记录时下次回复会再附带一次链接，不影响回复流程
+            self.db.rollback()
+            logger.warning(f"Failed to record Telegram invite for customer {conversation.customer_id}: {str(e)}")
+    
     async def get_or_create_customer(
         self,
         platform_user_id: str = None,
@@ -175,51 +251,57 @@ class ConversationManager:
             name: 客户姓名
         
         Returns:
-            客户对象
+            客户对象（缓存命中时为只读的 CustomerSnapshot，属性与 Customer 一致）
         """
         # 使用platform_user_id或facebook_id
         user_id = platform_user_id or facebook_id
         
-        # 转换platform字符串为枚举
-        platform_enum = None
-        try:
-            platform_enum = Platform[platform.upper()] if platform else Platform.FACEBOOK
-        except (KeyError, AttributeError):
-            platform_enum = Platform.FACEBOOK  # 默认值
+        platform_enum = self._to_platform_enum(platform)
         
         # 尝试从缓存获取
-        from src.core.cache import customer_cache
+        from src.core.cache import customer_cache, CustomerSnapshot
         
-        cache_key = f"customer:{platform_enum.value}:{user_id}"
-        cached_customer = await customer_cache.get(cache_key)
+        cache_key = ("customer", platform_enum.value, user_id)
+        cached_customer = customer_cache.get_sync(cache_key)
         if cached_customer is not None:
-            # 如果提供了新名称且客户名称为空，更新并清除缓存
+            # 如果提供了新名称且客户名称为空，更新并刷新缓存
             if name and not cached_customer.name:
-                cached_customer = self.customer_repo.update(
-                    id=cached_customer.id,
-                    name=name
-                )
-                await customer_cache.set(cache_key, cached_customer)
+                customer = await self._update_customer_name(cached_customer.id, name)
+                if customer is None:
+                    # 客户记录已不存在，回退到数据库查询
+                    customer_cache.delete_sync(cache_key)
+                    return await self.get_or_create_customer(platform_user_id, facebook_id, platform, name)
+                cached_customer = CustomerSnapshot.from_model(customer)
+                customer_cache.set_sync(cache_key, cached_customer)
             return cached_customer
         
         # 使用Repository获取或创建客户
-        customer = self.customer_repo.get_or_create(
-            platform=platform_enum,
-            platform_user_id=user_id,
-            name=name,
-            facebook_id=facebook_id or user_id  # 兼容字段
-        )
+        if self.async_db is not None:
+            customer = await self.async_customer_repo.get_or_create(
+                platform=platform_enum,
+                platform_user_id=user_id,
+                name=name,
+                facebook_id=facebook_id or user_id  # 兼容字段
+            )
+        else:
+            customer = self.customer_repo.get_or_create(
+                platform=platform_enum,
+                platform_user_id=user_id,
+                name=name,
+                facebook_id=facebook_id or user_id  # 兼容字段
+            )
         
         # 如果客户已存在但信息不完整，更新信息
         if name and not customer.name:
-            customer = self.customer_repo.update(
-                id=customer.id,
-                name=name
-            )
+            customer = await self._update_customer_name(customer.id, name)
         
-        # 缓存客户信息
-        await customer_cache.set(cache_key, customer)
+        # 缓存客户信息快照（ORM实例在会话关闭后不可用，不能放入缓存）
+        customer_cache.set_sync(cache_key, CustomerSnapshot.from_model(customer))
         
         return customer
-
-
+    
+    async def _update_customer_name(self, customer_id: int, name: str) -> Customer:
+        """更新客户名称"""
+        if self.async_db is not None:
+            return await self.async_customer_repo.update(id=customer_id, name=name)
+        return self.customer_repo.update(id=customer_id, name=name)
@@ -0,0 +1,76 @@
+"""OpenAI 客户端管理 - 进程级共享的异步客户端与并发控制"""
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Optional, Tuple
+
+import httpx
+
+from src.core.config import settings
+from src.core.config.constants import (
+    OPENAI_KEEPALIVE_CONNECTIONS,
+    OPENAI_MAX_RETRIES,
+)
+
+if TYPE_CHECKING:
+    import openai
+
+logger = logging.getLogger(__name__)
+
+_async_client: Optional["openai.AsyncOpenAI"] = None
+_semaphore: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = None
+
+
+def get_async_openai_client() -> "openai.AsyncOpenAI":
+    """
+    获取进程级共享的 AsyncOpenAI 客户端
+
+    所有 ReplyGenerator 共用同一个客户端，复用底层 httpx 连接池（keep-alive），
+    避免每条消息都重新建立 TLS 连接。
+    """
+    global _async_client
+    if _async_client is None:
+        import openai
+
+        max_connections = max(settings.openai_max_concurrency, OPENAI_KEEPALIVE_CONNECTIONS)
+        _async_client = openai.AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            base_url=settings.openai_base_url,
+            timeout=settings.openai_timeout,
+            max_retries=OPENAI_MAX_RETRIES,
+            http_client=httpx.AsyncClient(
+                timeout=settings.openai_timeout,
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=OPENAI_KEEPALIVE_CONNECTIONS,
+                ),
+            ),
+        )
+        logger.info(
+            f"Shared AsyncOpenAI client created (timeout={settings.openai_timeout}s, "
+            f"max_concurrency={settings.openai_max_concurrency})")
+    return _async_client
+
+
+def get_openai_semaphore() -> asyncio.Semaphore:
+    """
+    获取限制 OpenAI 并发请求数的信号量
+
+    信号量与事件循环绑定，事件循环变化时（如测试中每个用例使用新循环）重新创建。
+    """
+    global _semaphore
+    loop = asyncio.get_running_loop()
+    if _semaphore is None or _semaphore[0] is not loop:
+        _semaphore = (loop, asyncio.Semaphore(max(1, settings.openai_max_concurrency)))
+    return _semaphore[1]
+
+
+async def close_async_openai_client():
+    """关闭共享客户端（应用关闭时调用）"""
+    global _async_client
+    if _async_client is not None:
+        client = _async_client
+        _async_client = None
+        try:
+            await client.close()
+        except Exception as e:
+            logger.warning(f"Failed to close AsyncOpenAI client: {e}")
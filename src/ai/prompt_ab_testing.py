@@ -51,8 +51,14 @@ class PromptVersionRepository(BaseRepository[PromptVersion]):
 class PromptABTesting:
     """提示词A/B测试管理器"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, write_buffer=None):
+        """
+        Args:
+            db: 数据库会话
+            write_buffer: 写后缓冲（WriteBehindBuffer），提供时使用日志批量写入
+        """
         self.db = db
+        self.write_buffer = write_buffer
         self.version_repo = PromptVersionRepository(db)
     
     def select_version(self, customer_id: int) -> Optional[PromptVersion]:
@@ -107,7 +113,7 @@ class PromptABTesting:
         """
         try:
             # 创建使用日志
-            usage_log = PromptUsageLog(
+            values = dict(
                 prompt_version_id=prompt_version_id,
                 customer_id=customer_id,
                 conversation_id=conversation_id,
@@ -116,13 +122,16 @@ class PromptABTesting:
                 success=success,
                 used_at=datetime.now(timezone.utc)
             )
+            if self.write_buffer is not None:
+                self.write_buffer.add(PromptUsageLog, **values)
+            else:
+                self.db.add(PromptUsageLog(**values))
             
-            self.db.add(usage_log)
-            
-            # 更新版本统计
+            # 更新版本统计（未缓冲的使用日志在同一次提交中写入）
             self.version_repo.increment_usage(prompt_version_id, response_time_ms)
-            
-            self.db.commit()
+            if self.write_buffer is None:
+                # 版本不存在时 increment_usage 直接返回、不提交，使用日志仍需写入
+                self.db.commit()
         except Exception as e:
             logger.error(f"Failed to record prompt usage: {e}", exc_info=True)
             self.db.rollback()
@@ -0,0 +1,241 @@
+"""AI回复缓存
+
+客户的首条消息高度重复（“how much”、“price?”、“legit?”），提示词版本、规范化后的消息
+和近期历史都相同时，模型给出的回复可以直接复用，省去一次 OpenAI 调用。
+
+- 缓存键：模型、提示词版本（及内容摘要）、规范化消息指纹、最近 REPLY_CACHE_HISTORY_MESSAGES 条历史的摘要
+- 内存层：全局 reply_cache（CacheManager，TTL + LRU，指标在 /metrics 的 caches.reply 中）
+- 持久化层（可选）：REPLY_CACHE_PATH 指定的 SQLite 文件，重启后仍可命中，同样按TTL过期、按LRU淘汰
+- 只缓存模型原始回复，Telegram 群组链接等按客户追加的内容在命中后照常处理
+- 全局开关 REPLY_CACHE_ENABLED，单个页面可在 page_settings 中设置 reply_cache_enabled: false
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from src.core.cache import CacheManager, reply_cache
+from src.core.config import settings
+from src.core.config.constants import (
+    REPLY_CACHE_HISTORY_MESSAGES,
+    REPLY_CACHE_MAX_SIZE,
+    REPLY_CACHE_TTL_SECONDS,
+)
+from src.utils.text import question_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# 每写入多少次清理一次持久化文件中过期和超出上限的条目
+_PRUNE_EVERY_WRITES = 100
+
+
+@dataclass(frozen=True)
+class CachedReply:
+    """缓存的模型回复"""
+    reply: str
+    tokens_used: int = 0
+
+
+def history_signature(history: List[Dict[str, Any]], limit: int = REPLY_CACHE_HISTORY_MESSAGES) -> str:
+    """最近 limit 条历史消息（角色 + 规范化内容）的摘要"""
+    recent = history[-limit:] if limit else []
+    parts = [f"{msg.get('role')}:{question_fingerprint(msg.get('content') or '')}" for msg in recent]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+class _SQLiteReplyStore:
+    """回复缓存的SQLite持久化层（同一进程内共享一个连接，写操作加锁）"""
+
+    def __init__(self, path: str, max_size: int):
+        self.path = path
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS reply_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_reply_cache_accessed_at ON reply_cache (accessed_at)")
+        self.prune()
+
+    def get(self, key: str) -> Optional[CachedReply]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM reply_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE reply_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return CachedReply(**json.loads(row[0]))
+
+    def set(self, key: str, value: CachedReply, ttl_seconds: float) -> None:
+        now = time.time()
+        payload = json.dumps({"reply": value.reply, "tokens_used": value.tokens_used}, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO reply_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, payload, now + ttl_seconds, now)
+            )
+            self._writes += 1
+            prune = self._writes % _PRUNE_EVERY_WRITES == 0
+        if prune:
+            self.prune()
+
+    def prune(self) -> int:
+        """删除过期条目和超出上限的最久未访问条目"""
+        with self._lock:
+            expired = self._conn.execute(
+                "DELETE FROM reply_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+            evicted = self._conn.execute(
+                "DELETE FROM reply_cache WHERE key IN ("
+                "SELECT key FROM reply_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_size,)
+            ).rowcount
+        return expired + evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM reply_cache")
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM reply_cache").fetchone()[0]
+
+
+class ReplyCache:
+    """AI回复缓存（内存LRU + 可选SQLite持久化）"""
+
+    def __init__(
+        self,
+        memory: Optional[CacheManager] = None,
+        path: Optional[str] = None,
+        ttl_seconds: float = REPLY_CACHE_TTL_SECONDS,
+        max_size: int = REPLY_CACHE_MAX_SIZE
+    ):
+        """
+        Args:
+            memory: 内存层（默认全局 reply_cache）
+            path: SQLite持久化文件路径，不提供时只缓存在内存
+            ttl_seconds: 缓存有效期
+            max_size: 持久化文件的最大条目数
+        """
+        self.memory = memory if memory is not None else reply_cache
+        self.ttl_seconds = ttl_seconds
+        self.store: Optional[_SQLiteReplyStore] = None
+        if path:
+            try:
+                self.store = _SQLiteReplyStore(path, max_size)
+            except sqlite3.Error as e:
+                logger.warning(f"Reply cache persistence disabled, cannot open {path}: {e}")
+
+        self.hits = 0
+        self.misses = 0
+        self.persisted_hits = 0
+        self.saved_tokens = 0
+
+    def is_enabled(self, page_id: Optional[str] = None) -> bool:
+        """全局开关开启且页面未关闭回复缓存"""
+        if not settings.reply_cache_enabled:
+            return False
+        if page_id:
+            from src.config.page_settings import page_settings
+            return page_settings.get_page_config(page_id).get("reply_cache_enabled", True) is not False
+        return True
+
+    def make_key(
+        self,
+        prompt_version: str,
+        message_content: str,
+        history: List[Dict[str, Any]],
+        model: Optional[str] = None
+    ) -> str:
+        """
+        计算缓存键
+
+        Args:
+            prompt_version: 提示词版本标识（应包含提示词内容摘要，提示词修改后不会命中旧回复）
+            message_content: 客户消息
+            history: 对话历史（role/content）
+            model: 模型名称（默认当前配置的模型）
+        """
+        parts = [
+            model or settings.openai_model,
+            prompt_version,
+            question_fingerprint(message_content),
+            history_signature(history),
+        ]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedReply]:
+        """查找缓存的回复（内存未命中时查持久化文件，命中后回填内存）"""
+        cached = self.memory.get_sync(key)
+        if cached is None and self.store is not None:
+            try:
+                cached = self.store.get(key)
+            except sqlite3.Error as e:
+                logger.warning(f"Reply cache lookup failed: {e}")
+                cached = None
+            if cached is not None:
+                self.persisted_hits += 1
+                self.memory.set_sync(key, cached)
+
+        if cached is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.saved_tokens += cached.tokens_used
+        return cached
+
+    def set(self, key: str, reply: str, tokens_used: Optional[int] = None) -> None:
+        """缓存模型回复"""
+        if not reply:
+            return
+        value = CachedReply(reply=reply, tokens_used=tokens_used or 0)
+        self.memory.set_sync(key, value)
+        if self.store is not None:
+            try:
+                self.store.set(key, value, self.ttl_seconds)
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to persist reply cache entry: {e}")
+
+    def clear(self) -> None:
+        """清空内存和持久化文件中的缓存"""
+        self.memory.clear_sync()
+        if self.store is not None:
+            self.store.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": settings.reply_cache_enabled,
+            "persistent": self.store is not None,
+            "size": len(self.memory),
+            "persisted_size": self.store.count() if self.store is not None else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "persisted_hits": self.persisted_hits,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "saved_tokens": self.saved_tokens,
+        }
+
+
+_reply_cache: Optional[ReplyCache] = None
+
+
+def get_reply_cache() -> ReplyCache:
+    """获取进程级共享的回复缓存（首次调用时按配置打开持久化文件）"""
+    global _reply_cache
+    if _reply_cache is None:
+        _reply_cache = ReplyCache(path=settings.reply_cache_path)
+    return _reply_cache
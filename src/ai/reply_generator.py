@@ -1,12 +1,20 @@
 """AI 回复生成器"""
-import openai
 import re
 from typing import List, Dict, Any, Optional
 from src.core.config import settings
 from src.ai.prompt_templates import PromptTemplates
 from src.ai.conversation_manager import ConversationManager
+from src.ai.reply_cache import get_reply_cache
+from src.ai.semantic_cache import get_semantic_cache
 from src.core.exceptions import APIError, ProcessingError
 from src.core.database.models import Conversation
+from src.utils.keyword_matcher import (
+    CATEGORY_BUSINESS_INTENT,
+    CATEGORY_BUYING_SELLING,
+    get_keyword_index,
+    preset_reply_category,
+)
+from src.utils.telegram_link import configured_main_group, contains_telegram_link
 from sqlalchemy.orm import Session
 import logging
 
@@ -18,11 +26,27 @@ class ReplyGenerator:
     
     def __init__(self, db: Session):
         self.db = db
-        self.client = openai.OpenAI(api_key=settings.openai_api_key)
+        if settings.openai_async_client:
+            # 进程级共享的异步客户端（复用连接池）
+            from src.ai.openai_client import get_async_openai_client
+            self.client = get_async_openai_client()
+        else:
+            import openai
+            self.client = openai.OpenAI(
+                api_key=settings.openai_api_key,
+                base_url=settings.openai_base_url,
+                timeout=settings.openai_timeout
+            )
         self.templates = PromptTemplates()
         self.conversation_manager = ConversationManager(db)
+        self.reply_cache = get_reply_cache()
+        self.semantic_cache = get_semantic_cache()
     
-    def _is_spam_or_invalid(self, message_content: str) -> bool:
+    def _is_spam_or_invalid(
+        self,
+        message_content: str,
+        keyword_hits: Optional[Dict[str, List[str]]] = None
+    ) -> bool:
         """
         Detect spam or invalid messages with intelligent intent detection
         
@@ -34,6 +58,7 @@ class ReplyGenerator:
         
         Args:
             message_content: Message content
+            keyword_hits: Keyword index hits for the message (scanned here if not provided)
         
         Returns:
             Whether the message is spam or invalid
@@ -73,45 +98,22 @@ class ReplyGenerator:
                 logger.info(f"Detected spam/invalid message (high repeat ratio): {message_content[:50]}")
                 return True
         
-        message_lower = content_stripped.lower()
+        if keyword_hits is None:
+            keyword_hits = get_keyword_index().match(content_stripped)
         
         # Step 2: Buying/selling intent keywords (SPAM)
         # These indicate "buy/sell phone" intent, should be marked as spam
         # Even if they contain product keywords like "手机", they are spam
-        buying_selling_keywords = [
-            # Chinese
-            "买手机", "卖手机", "购买手机", "出售手机", "我要买", "我想买", 
-            "我要卖", "我想卖", "收购", "回收", "买iphone", "卖iphone",
-            # English
-            "buy phone", "sell phone", "purchase phone", "want to buy", 
-            "want to sell", "looking to buy", "looking to sell", "buy iphone", "sell iphone"
-        ]
-        
         # Check for buying/selling intent
-        has_buying_selling_intent = any(keyword in message_lower for keyword in buying_selling_keywords)
+        has_buying_selling_intent = CATEGORY_BUYING_SELLING in keyword_hits
         if has_buying_selling_intent:
             logger.info(f"Detected spam message (buying/selling intent): {message_content[:50]}")
             return True  # Mark as spam
         
         # Step 3: Business-related intent keywords (MUST REPLY)
         # These indicate "consult loan" intent, must reply
-        business_intent_keywords = [
-            # Loan related
-            "贷款", "借款", "借钱", "借", "贷", "loan", "borrow", "lend",
-            # Inquiry related
-            "咨询", "了解", "询问", "问", "help", "inquiry", "question", "想了解", "想咨询",
-            # Application related
-            "办理", "申请", "apply", "application", "怎么", "如何", "how",
-            # Price related
-            "价格", "费用", "价钱", "多少钱", "price", "cost", "interest", "利息", "利率",
-            # Legitimacy related
-            "legit", "legitimate", "真实", "真的", "可靠", "reliable", "可信",
-            # Question mark (indicates inquiry)
-            "?", "？"
-        ]
-        
         # Check for business intent
-        has_business_intent = any(keyword in message_lower for keyword in business_intent_keywords)
+        has_business_intent = CATEGORY_BUSINESS_INTENT in keyword_hits
         if has_business_intent:
             logger.info(f"Message contains business intent keyword, will reply: {message_content[:50]}")
             return False  # Not spam, must reply
@@ -122,30 +124,41 @@ class ReplyGenerator:
         logger.info(f"Message does not match any intent keywords, allowing reply: {message_content[:50]}")
         return False  # Allow reply
     
-    async def _check_preset_reply(self, customer_id: int, message_content: str) -> Optional[str]:
+    async def _check_preset_reply(
+        self,
+        customer_id: int,
+        message_content: str,
+        keyword_hits: Optional[Dict[str, List[str]]] = None,
+        history: Optional[List[Dict[str, Any]]] = None
+    ) -> Optional[str]:
         """
         检查是否应该使用预设回复（用于前三个标准问题）
         
         Args:
             customer_id: 客户 ID
             message_content: 消息内容
+            keyword_hits: 关键词命中结果（未提供时扫描一次消息）
+            history: 对话历史（未提供时读取）
         
         Returns:
             预设回复内容，如果不匹配则返回 None
         """
-        preset_replies = self.templates.templates.get("preset_replies", {})
+        keyword_index = get_keyword_index()
+        preset_replies = keyword_index.config.get("ai_templates", {}).get("preset_replies", {})
         if not preset_replies:
             return None
         
-        # 获取对话历史，统计已发送的AI回复数量
-        history = await self.conversation_manager.get_conversation_history(customer_id, limit=10)
+        # 统计已发送的AI回复数量
+        if history is None:
+            history = await self.conversation_manager.get_conversation_history(customer_id, limit=10)
         ai_reply_count = sum(1 for msg in history if msg.get("role") == "assistant")
         
         # 只在前三个问题中使用预设回复（即AI回复数量少于3条时）
         if ai_reply_count >= 3:
             return None
         
-        message_lower = message_content.lower()
+        if keyword_hits is None:
+            keyword_hits = keyword_index.match(message_content)
         
         # 检查每个预设回复模板（按优先级顺序）
         # 优先匹配更具体的问题类型
@@ -155,12 +168,10 @@ class ReplyGenerator:
             if key not in preset_replies:
                 continue
             
-            preset = preset_replies[key]
-            keywords = preset.get("keywords", [])
-            reply = preset.get("reply", "")
+            reply = preset_replies[key].get("reply", "")
             
             # 检查是否匹配关键词
-            if any(keyword.lower() in message_lower for keyword in keywords):
+            if preset_reply_category(key) in keyword_hits:
                 logger.info(f"Using preset reply '{key}' for customer {customer_id} (AI reply count: {ai_reply_count}/3)")
                 return reply
         
@@ -176,52 +187,45 @@ class ReplyGenerator:
         Returns:
             True if customer has received Telegram link, False otherwise
         """
-        # Check all conversations for this customer
-        from src.core.database.repositories.conversation_repo import ConversationRepository
-        conversation_repo = ConversationRepository(self.db)
-        conversations = conversation_repo.get_customer_ai_replied_conversations(customer_id)
-        
-        # Check if any reply contains Telegram group link
-        from src.core.config import yaml_config
-        telegram_config = yaml_config.get("telegram_groups", {})
-        main_group = telegram_config.get("main_group", "@your_group")
-        
-        # Keywords that indicate Telegram group link was sent
-        telegram_keywords = [
-            "t.me", "telegram", "telegram group", "telegram群组", "join our telegram"
-        ]
-        
-        # Add main_group to keywords if it's configured
-        if main_group and main_group != "@your_group":
-            # Add full group link/name
-            telegram_keywords.append(main_group.lower())
-            
-            # Extract different formats from the group link
-            # Handle formats like: https://t.me/+bNivsOGSM6ZlMGJl, @group_name, t.me/group_name
-            if "t.me" in main_group.lower():
-                # Extract the group identifier from URL
-                if "/" in main_group:
-                    parts = main_group.split("/")
-                    if len(parts) > 1:
-                        # Get the last part (group name or invite code)
-                        group_id = parts[-1].lower()
-                        telegram_keywords.append(group_id)
-                        # Also check without + prefix if present
-                        if group_id.startswith("+"):
-                            telegram_keywords.append(group_id[1:])
-            elif "@" in main_group:
-                # Handle @group_name format
-                telegram_keywords.append(main_group.replace("@", "").lower())
-                telegram_keywords.append(main_group.lower())
-        
-        for conv in conversations:
-            if conv.ai_reply_content:
-                reply_lower = conv.ai_reply_content.lower()
-                # Check if reply contains Telegram group link
-                if any(keyword in reply_lower for keyword in telegram_keywords):
-                    return True
+        # 发送含链接的回复时记录在 customers.telegram_invite_sent_at（按主键查询，已发送的结果会缓存）
+        from src.core.database.repositories import CustomerRepository
+        return CustomerRepository(self.db).has_received_telegram_invite(customer_id)
+    
+    async def _create_chat_completion(self, messages: List[Dict[str, str]]):
+        """
+        调用 OpenAI Chat Completions（不阻塞事件循环）
+        
+        异步模式下直接 await 共享的 AsyncOpenAI 客户端；同步模式下在线程池中执行。
+        两种模式都受全局信号量限制并发数，并使用单次请求超时。
+        """
+        from src.ai.openai_client import get_openai_semaphore
+        from src.monitoring.metrics import openai_request_seconds, openai_tokens
+        
+        kwargs = {
+            "model": settings.openai_model,
+            "messages": messages,
+            "temperature": settings.openai_temperature,
+            "max_tokens": 45,  # 严格控制为50字以内（留出buffer）
+            "timeout": settings.openai_timeout,
+        }
+        
+        async with get_openai_semaphore():
+            # 只统计请求本身的耗时（不含等待信号量的时间）
+            with openai_request_seconds.time(model=settings.openai_model):
+                if settings.openai_async_client:
+                    response = await self.client.chat.completions.create(**kwargs)
+                else:
+                    import asyncio
+                    from functools import partial
+                    loop = asyncio.get_running_loop()
+                    response = await loop.run_in_executor(
+                        None, partial(self.client.chat.completions.create, **kwargs)
+                    )
         
-        return False
+        total_tokens = getattr(getattr(response, "usage", None), "total_tokens", None)
+        if isinstance(total_tokens, (int, float)):
+            openai_tokens.observe(total_tokens, model=settings.openai_model)
+        return response
     
     def _ensure_telegram_link_in_reply(self, reply: str, customer_id: int) -> str:
         """
@@ -239,29 +243,12 @@ class ReplyGenerator:
             return reply
         
         # Check if reply already contains Telegram link
-        from src.core.config import yaml_config
-        telegram_config = yaml_config.get("telegram_groups", {})
-        main_group = telegram_config.get("main_group", "@your_group")
-        
-        reply_lower = reply.lower()
-        telegram_keywords = ["t.me", "telegram", "telegram group", "telegram群组", "join our telegram"]
-        
-        # Also check for the actual group link/name
-        if main_group and main_group != "@your_group":
-            # Check if reply contains the group link/name
-            if main_group.lower() in reply_lower:
-                return reply  # Already contains Telegram link
-            # Check for partial match (e.g., if group is "t.me/+abc123", check for "+abc123")
-            if "/" in main_group:
-                group_id = main_group.split("/")[-1].lower()
-                if group_id in reply_lower or group_id.replace("+", "") in reply_lower:
-                    return reply
-        
-        if any(keyword in reply_lower for keyword in telegram_keywords):
-            return reply  # Already contains Telegram link
+        main_group = configured_main_group()
+        if contains_telegram_link(reply, main_group):
+            return reply
         
         # Add Telegram group link to reply
-        if main_group and main_group != "@your_group":
+        if main_group:
             # Format: "Reply content. Join our Telegram group: [link]"
             if not reply.endswith(('.', '!', '?')):
                 reply += "."
@@ -275,7 +262,8 @@ class ReplyGenerator:
         customer_id: int,
         message_content: str,
         customer_name: Optional[str] = None,
-        conversation_id: Optional[int] = None
+        conversation_id: Optional[int] = None,
+        page_id: Optional[str] = None
     ) -> Optional[str]:
         """
         生成 AI 回复
@@ -284,29 +272,34 @@ class ReplyGenerator:
             customer_id: 客户 ID
             message_content: 客户消息内容
             customer_name: 客户姓名
+            conversation_id: 对话 ID（用于记录A/B测试使用情况）
+            page_id: 页面 ID（用于判断页面是否关闭了回复缓存）
         
         Returns:
             AI 生成的回复内容，如果是垃圾信息则返回 None
         """
+        # 垃圾信息检测和预设回复共用一次关键词扫描
+        keyword_hits = get_keyword_index().match(message_content)
+        
         # 检测垃圾信息或无效沟通
-        if self._is_spam_or_invalid(message_content):
+        if self._is_spam_or_invalid(message_content, keyword_hits):
             logger.info(f"Skipping reply generation for spam/invalid message from customer {customer_id}")
             return None
         
+        # 对话历史：预设回复判断和构建提示词共用
+        history = await self.conversation_manager.get_conversation_history(customer_id, limit=10)
+        
         # 检查是否应该使用预设回复（前三个标准问题）
-        preset_reply = await self._check_preset_reply(customer_id, message_content)
+        preset_reply = await self._check_preset_reply(customer_id, message_content, keyword_hits, history)
         if preset_reply:
             # Ensure Telegram link is included in preset reply if needed
             preset_reply = self._ensure_telegram_link_in_reply(preset_reply, customer_id)
             return preset_reply
         
+        # openai SDK 导入较慢（约0.7秒），只在真正调用模型时加载，不拖慢进程启动
+        import openai
+        
         try:
-            # 获取对话历史
-            history = await self.conversation_manager.get_conversation_history(
-                customer_id,
-                limit=10
-            )
-            
             # A/B测试：选择提示词版本
             prompt_version = None
             system_prompt = None
@@ -327,6 +320,25 @@ class ReplyGenerator:
                 prompt_type = self.templates.templates.get("prompt_type")
                 system_prompt = self.templates.build_system_prompt(prompt_type=prompt_type)
             
+            # 回复缓存：相同提示词版本、相同消息和近期历史时复用之前的模型回复
+            prompt_key = self._prompt_version_key(prompt_version, system_prompt)
+            cache_key = None
+            if self.reply_cache.is_enabled(page_id):
+                cache_key = self.reply_cache.make_key(prompt_key, message_content, history)
+                cached_reply = self._get_cached_reply(cache_key, customer_id)
+                if cached_reply:
+                    return self._ensure_telegram_link_in_reply(cached_reply, customer_id)
+            
+            # 语义缓存：首次咨询（还没有AI回复）与历史首次咨询足够相似时复用当时的回复
+            first_contact = not any(msg.get("role") == "assistant" for msg in history)
+            use_semantic_cache = first_contact and self.semantic_cache.is_enabled(page_id)
+            if use_semantic_cache:
+                match = await self._get_semantic_reply(prompt_key, message_content, page_id, customer_id)
+                if match:
+                    if cache_key:
+                        self.reply_cache.set(cache_key, match.reply, match.tokens_used)
+                    return self._ensure_telegram_link_in_reply(match.reply, customer_id)
+            
             # 构建消息列表
             messages = [
                 {
@@ -354,20 +366,17 @@ class ReplyGenerator:
             start_time = time.time()
             
             try:
-                response = self.client.chat.completions.create(
-                    model=settings.openai_model,
-                    messages=messages,
-                    temperature=settings.openai_temperature,
-                    max_tokens=45  # 严格控制为50字以内（留出buffer）
-                )
+                response = await self._create_chat_completion(messages)
                 
                 response_time_ms = (time.time() - start_time) * 1000
                 
                 # 记录API使用
                 tokens_used = None
+                from src.core.database.write_buffer import get_telemetry_buffer
+                write_buffer = get_telemetry_buffer()
                 try:
                     from src.monitoring.api_usage_tracker import APIUsageTracker, APIType
-                    usage_tracker = APIUsageTracker(self.db)
+                    usage_tracker = APIUsageTracker(self.db, write_buffer=write_buffer)
                     
                     # 计算token使用量
                     tokens_used = response.usage.total_tokens if hasattr(response, 'usage') else None
@@ -388,7 +397,7 @@ class ReplyGenerator:
                 if prompt_version and conversation_id:
                     try:
                         from src.ai.prompt_ab_testing import PromptABTesting
-                        ab_testing = PromptABTesting(self.db)
+                        ab_testing = PromptABTesting(self.db, write_buffer=write_buffer)
                         ab_testing.record_usage(
                             prompt_version_id=prompt_version.id,
                             customer_id=customer_id,
@@ -401,13 +410,19 @@ class ReplyGenerator:
                         logger.warning(f"Failed to record A/B testing usage: {e}")
                 
                 reply = response.choices[0].message.content.strip()
+                if cache_key:
+                    self.reply_cache.set(cache_key, reply, tokens_used)
+                if use_semantic_cache:
+                    await self._add_semantic_reply(
+                        prompt_key, message_content, reply, page_id, tokens_used, conversation_id)
             except Exception as e:
                 response_time_ms = (time.time() - start_time) * 1000
                 
                 # 记录失败的API调用
                 try:
                     from src.monitoring.api_usage_tracker import APIUsageTracker, APIType
-                    usage_tracker = APIUsageTracker(self.db)
+                    from src.core.database.write_buffer import get_telemetry_buffer
+                    usage_tracker = APIUsageTracker(self.db, write_buffer=get_telemetry_buffer())
                     usage_tracker.record_api_call(
                         api_type=APIType.OPENAI.value,
                         endpoint="chat.completions",
@@ -442,6 +457,101 @@ class ReplyGenerator:
                 f"生成回复时发生错误: {str(e)}"
             )
     
+    @staticmethod
+    def _prompt_version_key(prompt_version: Any, system_prompt: str) -> str:
+        """提示词版本标识：A/B版本号（或默认提示词）加提示词内容摘要"""
+        import hashlib
+        version_code = getattr(prompt_version, "version_code", None) or "default"
+        digest = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+        return f"{version_code}:{digest}:{settings.openai_temperature}"
+    
+    def _get_cached_reply(self, cache_key: str, customer_id: int) -> Optional[str]:
+        """查找缓存的回复，命中时通过 APIUsageTracker 记录节省的token"""
+        import time
+        start_time = time.time()
+        cached = self.reply_cache.get(cache_key)
+        if cached is None:
+            return None
+        
+        self._record_cache_hit(cached.tokens_used, (time.time() - start_time) * 1000, customer_id)
+        logger.info(f"Using cached reply for customer {customer_id}")
+        return cached.reply
+    
+    async def _get_semantic_reply(
+        self,
+        prompt_key: str,
+        message_content: str,
+        page_id: Optional[str],
+        customer_id: int
+    ):
+        """在语义缓存中查找相似的首次咨询（向量计算在线程池中执行）"""
+        import asyncio
+        import time
+        from functools import partial
+        
+        start_time = time.time()
+        try:
+            match = await asyncio.get_running_loop().run_in_executor(
+                None, partial(self.semantic_cache.lookup, message_content, prompt_key, page_id)
+            )
+        except Exception as e:
+            logger.warning(f"Semantic cache lookup failed: {e}")
+            return None
+        if match is None:
+            return None
+        
+        self._record_cache_hit(
+            match.tokens_used,
+            (time.time() - start_time) * 1000,
+            customer_id,
+            {"semantic": True, "similarity": match.similarity, "source_conversation_id": match.conversation_id}
+        )
+        logger.info(f"Using semantically cached reply for customer {customer_id} (similarity {match.similarity})")
+        return match
+    
+    async def _add_semantic_reply(
+        self,
+        prompt_key: str,
+        message_content: str,
+        reply: str,
+        page_id: Optional[str],
+        tokens_used: Optional[int],
+        conversation_id: Optional[int]
+    ) -> None:
+        """把首次咨询及其模型回复加入语义缓存"""
+        import asyncio
+        from functools import partial
+        
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None,
+                partial(self.semantic_cache.add, message_content, reply, prompt_key,
+                        page_id, tokens_used, conversation_id)
+            )
+        except Exception as e:
+            logger.warning(f"Failed to add reply to semantic cache: {e}")
+    
+    def _record_cache_hit(
+        self,
+        saved_tokens: int,
+        response_time_ms: float,
+        customer_id: int,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """通过 APIUsageTracker 记录缓存命中"""
+        try:
+            from src.monitoring.api_usage_tracker import APIUsageTracker
+            from src.core.database.write_buffer import get_telemetry_buffer
+            usage_tracker = APIUsageTracker(self.db, write_buffer=get_telemetry_buffer())
+            usage_tracker.record_reply_cache_hit(
+                saved_tokens=saved_tokens,
+                response_time_ms=response_time_ms,
+                model=settings.openai_model,
+                metadata={"customer_id": customer_id, **(metadata or {})}
+            )
+        except Exception as e:
+            logger.warning(f"Failed to record reply cache hit: {e}")
+    
     def generate_greeting(self) -> str:
         """生成问候语"""
         return self.templates.get_greeting()
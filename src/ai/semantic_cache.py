@@ -0,0 +1,423 @@
+"""语义回复缓存（近似消息复用历史回复）
+
+精确缓存（reply_cache.py）只能命中规范化后完全相同的消息，而客户的首条消息大多是
+同一问题的不同说法（“多少钱”、“价格多少？”、“how much is it”）。语义缓存把消息向量化后
+在同一页面、同一提示词版本的历史首条消息中找最相似的一条，余弦相似度超过页面阈值时
+直接复用当时的AI回复。
+
+- 向量化：字符 1~3-gram 哈希到固定维度（带符号哈希）+ 次线性TF + 可选IDF，本地计算，无需网络
+- 索引：NumPy 扁平索引（矩阵乘法求余弦相似度），向量文件以 memmap 方式映射，重启后直接加载；
+  IDF 由 scripts/tools/evaluate_semantic_cache.py --write-index 从历史对话拟合
+- 只用于首次咨询（历史中还没有AI回复），后续对话依赖上下文，不复用
+- 需要安装 numpy（requirements-optional.txt）；未安装或 SEMANTIC_CACHE_ENABLED=false 时不启用。
+  单个页面可设置 semantic_cache_enabled: false 或 semantic_cache_threshold 覆盖全局阈值
+"""
+import json
+import logging
+import os
+import threading
+import unicodedata
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.core.config import settings
+from src.core.config.constants import (
+    SEMANTIC_CACHE_DIMENSIONS,
+    SEMANTIC_CACHE_DUPLICATE_SIMILARITY,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+)
+
+try:
+    import numpy as np
+except ImportError:  # 可选依赖
+    np = None
+
+logger = logging.getLogger(__name__)
+
+_INITIAL_CAPACITY = 1024
+
+
+def normalize_for_embedding(text: str) -> str:
+    """NFKC规范化、大小写折叠，标点/符号/空白统一为单个空格"""
+    folded = unicodedata.normalize("NFKC", text or "").casefold()
+    chars = [
+        ch if unicodedata.category(ch)[0] in ("L", "N") else " "
+        for ch in folded
+    ]
+    return " ".join("".join(chars).split())
+
+
+class HashedNgramVectorizer:
+    """字符 n-gram 哈希向量化（TF-IDF，L2归一化）"""
+
+    def __init__(
+        self,
+        dimensions: int = SEMANTIC_CACHE_DIMENSIONS,
+        ngram_range: Tuple[int, int] = (1, 3),
+        idf: Any = None
+    ):
+        """
+        Args:
+            dimensions: 向量维度（哈希桶数）
+            ngram_range: 字符 n-gram 的最小和最大长度
+            idf: 每个哈希桶的IDF权重（None 表示不加权）
+        """
+        self.dimensions = dimensions
+        self.ngram_range = ngram_range
+        self.idf = idf
+
+    def _ngrams(self, text: str) -> Counter:
+        normalized = normalize_for_embedding(text)
+        if not normalized:
+            return Counter()
+        padded = f" {normalized} "
+        grams: Counter = Counter()
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            for i in range(len(padded) - n + 1):
+                gram = padded[i:i + n]
+                if gram.strip():
+                    grams[gram] += 1
+        return grams
+
+    def _buckets(self, grams: Counter) -> Dict[int, float]:
+        weights: Dict[int, float] = {}
+        for gram, count in grams.items():
+            h = zlib.crc32(gram.encode("utf-8"))
+            bucket = h % self.dimensions
+            sign = 1.0 if (h >> 31) & 1 else -1.0
+            weights[bucket] = weights.get(bucket, 0.0) + sign * (1.0 + np.log(count))
+        return weights
+
+    def transform(self, text: str):
+        """文本 -> float32 单位向量（空文本返回零向量）"""
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for bucket, weight in self._buckets(self._ngrams(text)).items():
+            vector[bucket] = weight
+        if self.idf is not None:
+            vector *= self.idf
+        norm = float(np.linalg.norm(vector))
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def fit_idf(self, texts: Iterable[str]):
+        """按哈希桶统计文档频率，计算平滑IDF"""
+        df = np.zeros(self.dimensions, dtype=np.float64)
+        total = 0
+        for text in texts:
+            total += 1
+            for bucket in self._buckets(self._ngrams(text)):
+                df[bucket] += 1
+        self.idf = (np.log((1 + total) / (1 + df)) + 1.0).astype(np.float32)
+        return self.idf
+
+
+@dataclass(frozen=True)
+class SemanticMatch:
+    """语义缓存命中结果"""
+    reply: str
+    similarity: float
+    tokens_used: int = 0
+    conversation_id: Optional[int] = None
+
+
+class SemanticIndex:
+    """
+    NumPy 扁平向量索引
+
+    directory 为 None 时只在内存中；否则向量保存在 vectors.f32（memmap），
+    条目元数据追加写入 entries.jsonl，IDF 保存在 idf.npy。
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        dimensions: int = SEMANTIC_CACHE_DIMENSIONS,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES
+    ):
+        self.directory = directory
+        self.dimensions = dimensions
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: List[Dict[str, Any]] = []
+        self._group_ids: Dict[str, int] = {}
+        self._groups = np.zeros(_INITIAL_CAPACITY, dtype=np.int32)
+        self._vectors = None
+        self.idf = None
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load()
+        if self._vectors is None:
+            self._vectors = self._allocate(_INITIAL_CAPACITY)
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.directory, "vectors.f32")
+
+    @property
+    def _entries_path(self) -> str:
+        return os.path.join(self.directory, "entries.jsonl")
+
+    @property
+    def _idf_path(self) -> str:
+        return os.path.join(self.directory, "idf.npy")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _allocate(self, capacity: int, path: Optional[str] = None):
+        if path is None:
+            return np.zeros((capacity, self.dimensions), dtype=np.float32)
+        return np.memmap(path, dtype=np.float32, mode="w+", shape=(capacity, self.dimensions))
+
+    def _load(self) -> None:
+        if os.path.exists(self._idf_path):
+            idf = np.load(self._idf_path)
+            if idf.shape == (self.dimensions,):
+                self.idf = idf.astype(np.float32)
+        if not os.path.exists(self._vectors_path):
+            self._vectors = self._allocate(_INITIAL_CAPACITY, self._vectors_path)
+            return
+
+        row_bytes = self.dimensions * 4
+        capacity = os.path.getsize(self._vectors_path) // row_bytes
+        if capacity == 0:
+            self._vectors = self._allocate(_INITIAL_CAPACITY, self._vectors_path)
+            return
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+",
+                                  shape=(capacity, self.dimensions))
+
+        entries = []
+        truncated = False
+        if os.path.exists(self._entries_path):
+            with open(self._entries_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        truncated = True  # 写入中断的最后一行
+                        break
+        # 向量先于元数据写入，行数以两者中较小的为准
+        self._entries = entries[:capacity]
+        if truncated or len(entries) > capacity:
+            with open(self._entries_path, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(entry, ensure_ascii=False) + "\n" for entry in self._entries)
+        self._groups = np.zeros(capacity, dtype=np.int32)
+        for row, entry in enumerate(self._entries):
+            self._groups[row] = self._group_id(entry["group"])
+        logger.info(f"Semantic cache loaded {len(self._entries)} entries from {self.directory}")
+
+    def _group_id(self, group: str) -> int:
+        if group not in self._group_ids:
+            self._group_ids[group] = len(self._group_ids) + 1
+        return self._group_ids[group]
+
+    def _grow(self) -> None:
+        capacity = self._vectors.shape[0] * 2
+        count = len(self._entries)
+        if self.directory:
+            tmp_path = self._vectors_path + ".tmp"
+            grown = self._allocate(capacity, tmp_path)
+            grown[:count] = self._vectors[:count]
+            grown.flush()
+            del self._vectors
+            os.replace(tmp_path, self._vectors_path)
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+",
+                                      shape=(capacity, self.dimensions))
+        else:
+            grown = self._allocate(capacity)
+            grown[:count] = self._vectors[:count]
+            self._vectors = grown
+        groups = np.zeros(capacity, dtype=np.int32)
+        groups[:count] = self._groups[:count]
+        self._groups = groups
+
+    def search(self, vector, group: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """同一分组内最相似的条目及其余弦相似度"""
+        with self._lock:
+            count = len(self._entries)
+            group_id = self._group_ids.get(group)
+            if not count or group_id is None:
+                return None
+            scores = self._vectors[:count] @ vector
+            scores[self._groups[:count] != group_id] = -1.0
+            row = int(np.argmax(scores))
+            score = float(scores[row])
+            if score < 0:
+                return None
+            return self._entries[row], score
+
+    def add(self, vector, group: str, entry: Dict[str, Any]) -> bool:
+        """追加条目，达到上限时不再追加"""
+        with self._lock:
+            count = len(self._entries)
+            if count >= self.max_entries:
+                return False
+            if count >= self._vectors.shape[0]:
+                self._grow()
+            entry = {**entry, "group": group}
+            self._vectors[count] = vector
+            self._groups[count] = self._group_id(group)
+            if self.directory:
+                self._vectors.flush()
+                with open(self._entries_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._entries.append(entry)
+            return True
+
+    def save_idf(self, idf) -> None:
+        """保存IDF（之后加载索引的进程使用同一权重）"""
+        self.idf = idf
+        if self.directory:
+            np.save(self._idf_path, idf)
+
+
+class SemanticReplyCache:
+    """按页面和提示词版本分组的语义回复缓存"""
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        dimensions: int = SEMANTIC_CACHE_DIMENSIONS,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES
+    ):
+        self.available = np is not None
+        self.directory = directory
+        self.dimensions = dimensions
+        self.max_entries = max_entries
+        self._index: Optional[SemanticIndex] = None
+        self._vectorizer: Optional[HashedNgramVectorizer] = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+
+    @property
+    def index(self) -> SemanticIndex:
+        """首次使用时加载（或创建）索引"""
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._vectorizer = HashedNgramVectorizer(self.dimensions)
+                    index = SemanticIndex(self.directory, self.dimensions, self.max_entries)
+                    self._vectorizer.idf = index.idf
+                    self._index = index
+        return self._index
+
+    @property
+    def vectorizer(self) -> HashedNgramVectorizer:
+        if self._vectorizer is None:
+            self.index  # 加载索引时创建向量化器（使用索引保存的IDF）
+        return self._vectorizer
+
+    @staticmethod
+    def _page_config(page_id: Optional[str]) -> Dict[str, Any]:
+        if not page_id:
+            return {}
+        from src.config.page_settings import page_settings
+        return page_settings.get_page_config(page_id)
+
+    def is_enabled(self, page_id: Optional[str] = None) -> bool:
+        """已安装numpy、全局开关开启且页面未关闭语义缓存"""
+        if not (self.available and settings.semantic_cache_enabled):
+            return False
+        return self._page_config(page_id).get("semantic_cache_enabled", True) is not False
+
+    def threshold(self, page_id: Optional[str] = None) -> float:
+        """页面的相似度阈值（未配置时使用全局阈值）"""
+        return float(self._page_config(page_id).get(
+            "semantic_cache_threshold", settings.semantic_cache_threshold))
+
+    @staticmethod
+    def _group(prompt_version: str, page_id: Optional[str]) -> str:
+        return f"{page_id or ''}|{prompt_version}"
+
+    def lookup(
+        self,
+        message_content: str,
+        prompt_version: str,
+        page_id: Optional[str] = None
+    ) -> Optional[SemanticMatch]:
+        """
+        查找相似消息的历史回复（阻塞，调用方应在线程池中执行）
+
+        Args:
+            message_content: 客户消息
+            prompt_version: 提示词版本标识
+            page_id: 页面ID
+        """
+        vector = self.vectorizer.transform(message_content)
+        result = self.index.search(vector, self._group(prompt_version, page_id))
+        if result is None or result[1] < self.threshold(page_id):
+            self.misses += 1
+            return None
+
+        entry, similarity = result
+        self.hits += 1
+        self.saved_tokens += int(entry.get("tokens_used") or 0)
+        return SemanticMatch(
+            reply=entry["reply"],
+            similarity=round(similarity, 4),
+            tokens_used=int(entry.get("tokens_used") or 0),
+            conversation_id=entry.get("conversation_id")
+        )
+
+    def add(
+        self,
+        message_content: str,
+        reply: str,
+        prompt_version: str,
+        page_id: Optional[str] = None,
+        tokens_used: Optional[int] = None,
+        conversation_id: Optional[int] = None
+    ) -> bool:
+        """
+        加入一条首次咨询及其回复（与已有条目几乎相同时不重复加入）
+
+        Returns:
+            是否加入
+        """
+        if not reply or not normalize_for_embedding(message_content):
+            return False
+        group = self._group(prompt_version, page_id)
+        vector = self.vectorizer.transform(message_content)
+        existing = self.index.search(vector, group)
+        if existing is not None and existing[1] >= SEMANTIC_CACHE_DUPLICATE_SIMILARITY:
+            return False
+        return self.index.add(vector, group, {
+            "reply": reply,
+            "tokens_used": tokens_used or 0,
+            "conversation_id": conversation_id,
+            "message": message_content[:200],
+        })
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.available and settings.semantic_cache_enabled,
+            "available": self.available,
+            "entries": len(self._index) if self._index is not None else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "saved_tokens": self.saved_tokens,
+        }
+
+
+_semantic_cache: Optional[SemanticReplyCache] = None
+
+
+def get_semantic_cache() -> SemanticReplyCache:
+    """获取进程级共享的语义缓存（索引文件在首次查找时加载）"""
+    global _semantic_cache
+    if _semantic_cache is None:
+        if np is None and settings.semantic_cache_enabled:
+            logger.warning("SEMANTIC_CACHE_ENABLED is set but 'numpy' is not installed, semantic cache disabled")
+        _semantic_cache = SemanticReplyCache(directory=settings.semantic_cache_path)
+    return _semantic_cache
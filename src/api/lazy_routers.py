@@ -0,0 +1,166 @@
+"""
+延迟加载的路由
+
+管理、监控、统计等路由会导入数据库模型、page_token_manager（读取 .page_tokens.json）、
+page_settings（解析YAML）等模块，冷启动时会推迟第一个Webhook的响应。这些路由只在：
+
+- 第一次请求匹配其路径前缀时（请求前导入并注册）
+- 或启动完成后的后台预加载（warm_up，模块导入在线程池中执行）
+
+才导入并注册到应用。Webhook 路由（Facebook / Instagram / Telegram）始终在启动时注册。
+"""
+import asyncio
+import importlib
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Tuple
+
+from src.core.config.constants import LAZY_ROUTER_WARMUP_DELAY_SECONDS, LAZY_ROUTER_WARMUP_MODULES
+
+logger = logging.getLogger(__name__)
+
+# 请求这些路径时需要完整的OpenAPI文档，先加载全部路由
+_DOCS_PATHS = ("/docs", "/redoc", "/openapi.json")
+
+
+class LazyRouter(NamedTuple):
+    """延迟注册的路由：模块路径 + 路由覆盖的路径前缀 + 路由对象属性名"""
+    module: str
+    prefixes: Tuple[str, ...]
+    attr: str = "router"
+
+    def matches(self, path: str) -> bool:
+        return any(path == prefix or path.startswith(prefix + "/") for prefix in self.prefixes)
+
+
+class LazyRouterLoader:
+    """
+    延迟注册路由的加载器（配合 LazyRouterMiddleware 在请求到达路由前完成注册）
+
+    导入在线程池中执行（不阻塞事件循环上的其他请求），注册（include_router）在事件循环线程中执行。
+    导入失败的路由记录错误，不影响其他路由和请求（请求返回404）。
+    """
+
+    def __init__(self, routers: Iterable[LazyRouter] = ()):
+        self.routers: List[LazyRouter] = list(routers)
+        self.app: Any = None
+        self.loaded: Dict[str, float] = {}  # 模块 -> 导入+注册耗时（秒）
+        self.errors: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def bind(self, app: Any) -> None:
+        """绑定FastAPI应用（路由注册到该应用）"""
+        self.app = app
+
+    @property
+    def pending(self) -> List[LazyRouter]:
+        return [r for r in self.routers if r.module not in self.loaded and r.module not in self.errors]
+
+    def load(self, router: LazyRouter) -> bool:
+        """同步导入并注册路由（已注册时直接返回）"""
+        with self._lock:
+            if router.module in self.loaded:
+                return True
+            if router.module in self.errors:
+                return False
+            started = time.perf_counter()
+            try:
+                module = importlib.import_module(router.module)
+                self.app.include_router(getattr(module, router.attr))
+            except Exception as e:
+                logger.error(f"Failed to load router {router.module}: {e}", exc_info=True)
+                self.errors[router.module] = str(e)
+                return False
+            self.loaded[router.module] = time.perf_counter() - started
+            # 路由变化后重新生成OpenAPI文档
+            self.app.openapi_schema = None
+            logger.info(f"Router {router.module} loaded in {self.loaded[router.module] * 1000:.0f}ms")
+            return True
+
+    def load_all(self) -> None:
+        """同步加载全部路由（LAZY_ROUTERS=false 或需要完整路由表时）"""
+        for router in self.pending:
+            self.load(router)
+
+    async def load_async(self, routers: Iterable[LazyRouter]) -> None:
+        """在线程池中导入模块，再在事件循环中注册路由"""
+        loop = asyncio.get_running_loop()
+        for router in routers:
+            if router.module in self.loaded or router.module in self.errors:
+                continue
+            try:
+                await loop.run_in_executor(None, importlib.import_module, router.module)
+            except Exception:
+                pass  # 由 load() 重新导入并记录错误
+            self.load(router)
+
+    async def warm_up(
+        self,
+        delay_seconds: float = LAZY_ROUTER_WARMUP_DELAY_SECONDS,
+        modules: Tuple[str, ...] = LAZY_ROUTER_WARMUP_MODULES
+    ) -> None:
+        """
+        启动后的后台预加载：加载剩余路由和重量级模块（如openai SDK），
+        避免第一个管理请求或第一条需要AI回复的消息承担导入耗时
+        """
+        try:
+            await asyncio.sleep(delay_seconds)
+            await self.load_async(self.pending)
+            loop = asyncio.get_running_loop()
+            for name in modules:
+                try:
+                    await loop.run_in_executor(None, importlib.import_module, name)
+                except Exception as e:
+                    logger.warning(f"Failed to preload module {name}: {e}")
+            logger.info(f"Lazy routers warmed up ({len(self.loaded)} loaded, {len(self.errors)} failed)")
+        except asyncio.CancelledError:
+            pass
+
+    def get_status(self) -> Dict[str, Any]:
+        """加载状态（用于 /metrics）"""
+        return {
+            "loaded": {module: round(seconds * 1000, 1) for module, seconds in self.loaded.items()},
+            "pending": [r.module for r in self.pending],
+            "errors": dict(self.errors),
+        }
+
+
+class LazyRouterMiddleware:
+    """
+    请求到达路由前注册其路径对应的延迟路由（全部注册后只剩一次列表判断）
+
+    用法: app.add_middleware(LazyRouterMiddleware, loader=lazy_router_loader)
+    """
+
+    def __init__(self, app: Any, loader: LazyRouterLoader):
+        self.app = app
+        self.loader = loader
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket"):
+            pending = self.loader.pending
+            if pending:
+                path = scope.get("path", "")
+                if path in _DOCS_PATHS:
+                    await self.loader.load_async(pending)
+                else:
+                    matched = [r for r in pending if r.matches(path)]
+                    if matched:
+                        await self.loader.load_async(matched)
+        await self.app(scope, receive, send)
+
+
+# 延迟注册的非Webhook路由（顺序与原先的注册顺序一致）
+NON_WEBHOOK_ROUTERS = (
+    LazyRouter("src.api.v1.statistics.api", ("/statistics",)),
+    LazyRouter("src.api.v1.monitoring.api", ("/monitoring",)),
+    LazyRouter("src.api.v1.monitoring.api_usage", ("/api-usage",)),
+    LazyRouter("src.api.v1.admin.api", ("/admin",)),
+    LazyRouter("src.api.v1.admin.templates", ("/templates",)),
+    LazyRouter("src.api.v1.admin.ab_testing", ("/ab-testing",)),
+    LazyRouter("src.api.v1.admin.deployment", ("/admin/deployment",)),
+)
+
+# 全局加载器（由 src.main 绑定应用）
+lazy_router_loader = LazyRouterLoader(NON_WEBHOOK_ROUTERS)
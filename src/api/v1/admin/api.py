@@ -11,38 +11,66 @@ from src.api.middleware.auth import AuthMiddleware
 router = APIRouter(prefix="/admin", tags=["admin"])
 
 
+def _pagination_info(result, page: int, page_size: int) -> Dict[str, Any]:
+    """生成分页信息（next_cursor 用于继续翻页）"""
+    info = {
+        "page": page,
+        "page_size": page_size,
+        "has_more": result.has_more,
+        "next_cursor": result.next_cursor,
+        "total": result.total,
+        "total_is_estimate": result.total_is_estimate,
+    }
+    if result.total is not None:
+        info["total_pages"] = (result.total + page_size - 1) // page_size
+    return info
+
+
 @router.get("/conversations")
 async def list_conversations(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
     status: Optional[str] = None,
     platform: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，传入后忽略 page"),
+    include_total: bool = Query(False, description="是否返回总数（额外执行一次统计查询，PostgreSQL下为规划器估计值）"),
     db: Session = Depends(get_db),
     # user: str = Depends(AuthMiddleware.verify_token)  # 启用认证
 ) -> Dict[str, Any]:
     """
     获取对话列表
     
+    按 (received_at, id) 键集分页：第一页和带 cursor 的请求不使用 OFFSET，
+    深度翻页的开销与第一页相同。
+    
     Args:
-        page: 页码
+        page: 页码（兼容旧分页，深页较慢，建议使用 cursor）
         page_size: 每页数量
         status: 状态过滤
         platform: 平台过滤
+        cursor: 分页游标
+        include_total: 是否返回总数
         db: 数据库会话
     
     Returns:
         对话列表和分页信息
     """
     from src.core.database.repositories.conversation_repo import ConversationRepository
+    from src.core.exceptions import ValidationError
     conversation_repo = ConversationRepository(db)
     
-    conversations, total = conversation_repo.get_by_filters(
-        status=status,
-        platform=platform,
-        skip=(page - 1) * page_size,
-        limit=page_size,
-        order_by_desc=True
-    )
+    try:
+        result = conversation_repo.list_page(
+            status=status,
+            platform=platform,
+            limit=page_size,
+            cursor=cursor,
+            offset=(page - 1) * page_size,
+            with_total=include_total
+        )
+    except ValidationError as e:
+        return {"error": e.message}
+    conversations = result.items
     
     return {
         "data": [
@@ -58,12 +86,7 @@ async def list_conversations(
             }
             for conv in conversations
         ],
-        "pagination": {
-            "page": page,
-            "page_size": page_size,
-            "total": total,
-            "total_pages": (total + page_size - 1) // page_size
-        }
+        "pagination": _pagination_info(result, page, page_size)
     }
 
 
@@ -144,9 +167,12 @@ async def get_statistics(
     # 按平台统计
     platform_stats = conversation_repo.get_platform_stats_by_time_range(start_date)
     
-    # AI回复率
-    ai_replied_count = conversation_repo.count_ai_replied_by_time_range(start_date)
+    # AI回复数（读取AI回复汇总分桶）
+    from src.statistics.rollups import AIReplyRollups
+    rollups = AIReplyRollups(db)
+    ai_replied_count = rollups.count(start_date, end_date)
     
+    # AI回复率
     ai_reply_rate = (ai_replied_count / total_conversations * 100) if total_conversations > 0 else 0
     
     return {
@@ -165,6 +191,10 @@ async def get_statistics(
         },
         "by_platform": {
             str(platform): count for platform, count in platform_stats
+        },
+        "ai_replies": {
+            "by_platform": rollups.distribution(start_date, end_date, "platform"),
+            "by_message_type": rollups.distribution(start_date, end_date, "message_type")
         }
     }
 
@@ -174,19 +204,25 @@ async def list_customers(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
     platform: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，传入后忽略 page"),
+    include_total: bool = Query(False, description="是否返回总数（额外执行一次统计查询，PostgreSQL下为规划器估计值）"),
     db: Session = Depends(get_db)
 ) -> Dict[str, Any]:
-    """获取客户列表"""
-    query = db.query(Customer)
-    
-    if platform:
-        query = query.filter(Customer.platform == platform)
-    
-    total = query.count()
-    
-    customers = query.order_by(desc(Customer.created_at)).offset(
-        (page - 1) * page_size
-    ).limit(page_size).all()
+    """获取客户列表（按 (created_at, id) 键集分页）"""
+    from src.core.database.repositories.customer_repo import CustomerRepository
+    from src.core.exceptions import ValidationError
+    
+    try:
+        result = CustomerRepository(db).list_page(
+            platform=platform,
+            limit=page_size,
+            cursor=cursor,
+            offset=(page - 1) * page_size,
+            with_total=include_total
+        )
+    except ValidationError as e:
+        return {"error": e.message}
+    customers = result.items
     
     return {
         "data": [
@@ -200,11 +236,6 @@ async def list_customers(
             }
             for customer in customers
         ],
-        "pagination": {
-            "page": page,
-            "page_size": page_size,
-            "total": total,
-            "total_pages": (total + page_size - 1) // page_size
-        }
+        "pagination": _pagination_info(result, page, page_size)
     }
 
@@ -102,3 +102,17 @@ async def get_recent_replies(limit: int = 20):
         logger.error(f"Error getting recent replies: {str(e)}", exc_info=True)
         return {"success": False, "error": str(e)}
 
+
+@router.get("/auto-reply")
+async def get_auto_reply_scan_stats():
+    """
+    获取自动回复扫描状态
+
+    返回最近一次扫描的汇总、每个页面的扫描耗时和未回复积压，以及 Graph API 用量
+    """
+    try:
+        from src.auto_reply.auto_reply_scheduler import auto_reply_scheduler
+        return {"success": True, "data": auto_reply_scheduler.get_scan_stats()}
+    except Exception as e:
+        logger.error(f"Error getting auto-reply scan stats: {str(e)}", exc_info=True)
+        return {"success": False, "error": str(e)}
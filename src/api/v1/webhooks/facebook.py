@@ -2,9 +2,11 @@
 from fastapi import APIRouter, Request, Response, HTTPException, Query, BackgroundTasks
 from typing import Dict, Any
 import logging
+from src.core.logging import WEBHOOK_EVENT_SAMPLE_KEY, webhook_event_fields, webhook_log_extra
 from src.facebook.api_client import FacebookAPIClient
 from src.facebook.message_parser import FacebookMessageParser
 from src.core.config import settings
+from src.core.exceptions import QueueFullError
 
 logger = logging.getLogger(__name__)
 
@@ -73,7 +75,11 @@ async def handle_webhook(request: Request, background_tasks: BackgroundTasks):
     """
     try:
         body = await request.json()
-        logger.info(f"Received webhook event: {body}")
+        fields = webhook_event_fields(body)
+        logger.info(
+            f"Received webhook event: object={fields['object']} entries={fields['entries']} "
+            f"events={fields['events']} pages={','.join(fields['page_ids'])}",
+            extra=webhook_log_extra(WEBHOOK_EVENT_SAMPLE_KEY, fields))
         
         # 解析事件
         parser = FacebookMessageParser()
@@ -83,18 +89,35 @@ async def handle_webhook(request: Request, background_tasks: BackgroundTasks):
             logger.info("No messages to process")
             return {"status": "ok"}
         
-        # 在后台处理消息（使用统一处理器）
-        from src.main_processor import process_platform_message
         for message_data in parsed_messages:
             # 添加平台标识
             message_data["platform"] = "facebook"
-            background_tasks.add_task(process_platform_message, "facebook", message_data)
+        
+        # 写入持久化入站队列，由工作池异步处理（队列未启动或写入失败时回退到后台任务）
+        from src.processors.ingest_queue import ingest_queue
+        enqueued = False
+        if ingest_queue.running:
+            try:
+                await ingest_queue.enqueue("facebook", parsed_messages)
+                enqueued = True
+            except QueueFullError as e:
+                logger.warning(f"Ingest queue is full, rejecting facebook webhook: {e.message}")
+                raise HTTPException(status_code=503, detail=e.message)
+            except Exception as e:
+                logger.error(f"Failed to enqueue facebook messages, falling back to background tasks: {str(e)}", exc_info=True)
+        
+        if not enqueued:
+            from src.main_processor import process_platform_message
+            for message_data in parsed_messages:
+                background_tasks.add_task(process_platform_message, "facebook", message_data)
         
         return {
             "status": "ok",
             "processed_count": len(parsed_messages)
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing webhook: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
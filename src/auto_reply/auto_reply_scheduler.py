@@ -1,9 +1,10 @@
 """Auto-reply scheduler - Periodically scan and reply to unreplied product-related messages"""
 import asyncio
 import logging
+import time
 import httpx
 from datetime import datetime, timezone, timedelta
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
 
 from src.core.database.connection import SessionLocal
@@ -11,23 +12,19 @@ from src.core.database.models import Conversation, Customer, Platform, MessageTy
 from src.core.database.repositories import ConversationRepository
 from src.ai.reply_generator import ReplyGenerator
 from src.facebook.api_client import FacebookAPIClient
+from src.facebook.usage_pacer import graph_api_usage_pacer
 from src.core.config import settings
+from src.core.config.constants import (
+    AUTO_REPLY_PAGE_CONCURRENCY,
+    AUTO_REPLY_MESSAGE_CONCURRENCY
+)
 from src.config.page_token_manager import page_token_manager
 from src.config.page_settings import page_settings
 from src.ai.conversation_manager import ConversationManager
+from src.utils.keyword_matcher import CATEGORY_PRODUCT, get_keyword_index
 
 logger = logging.getLogger(__name__)
 
-# Product keywords list (consistent with reply_generator.py)
-PRODUCT_KEYWORDS = [
-    "iphone", "ip", "苹果", "apple", "loan", "borrow", "lend", "贷款", "借款",
-    "借", "贷", "price", "cost", "费用", "价格", "多少钱", "interest", "利息",
-    "model", "型号", "容量", "storage", "apple id", "id card", "身份证",
-    "咨询", "了解", "询问", "办理", "申请", "apply", "怎么", "如何", "how",
-    "服务", "service", "客服", "customer service", "legit", "legitimate",
-    "真实", "真的", "可靠", "reliable", "可信", "?", "？"
-]
-
 # Start date: December 13, 2025
 START_DATE = datetime(2025, 12, 13, 0, 0, 0, tzinfo=timezone.utc)
 
@@ -40,8 +37,7 @@ def contains_product_keyword(message_content: str) -> bool:
     if not message_content:
         return False
 
-    message_lower = message_content.lower()
-    return any(keyword in message_lower for keyword in PRODUCT_KEYWORDS)
+    return CATEGORY_PRODUCT in get_keyword_index().match(message_content)
 
 
 class AutoReplyScheduler:
@@ -51,6 +47,9 @@ class AutoReplyScheduler:
         self.running = False
         self.task = None
         self.api_client = None
+        # 每个页面最近一次扫描的耗时和积压（供监控接口使用）
+        self.page_scan_stats: Dict[str, Dict[str, Any]] = {}
+        self.last_scan: Optional[Dict[str, Any]] = None
 
     async def start(self):
         """Start auto-reply scheduler"""
@@ -104,8 +103,6 @@ class AutoReplyScheduler:
 
     async def _check_and_reply_unanswered_messages(self):
         """Check and reply to unreplied product-related messages from all enabled pages"""
-        db = SessionLocal()
-
         try:
             # Get all enabled pages
             enabled_pages = await self._get_enabled_pages()
@@ -117,25 +114,39 @@ class AutoReplyScheduler:
             logger.info(
                 f"Scanning {len(enabled_pages)} enabled pages for unreplied messages...")
 
+            started = time.perf_counter()
+            started_at = datetime.now(timezone.utc)
+
+            # Scan pages concurrently (bounded); each page uses its own database session
+            semaphore = asyncio.Semaphore(AUTO_REPLY_PAGE_CONCURRENCY)
+            results = await asyncio.gather(*(
+                self._scan_page_with_limit(semaphore, page_id, page_token)
+                for page_id, page_token in enabled_pages.items()
+            ))
+
             # Statistics
             total_scanned = 0
             total_unreplied = 0
             total_replied = 0
             total_errors = 0
 
-            # Scan each enabled page
-            for page_id, page_token in enabled_pages.items():
-                try:
-                    page_stats = await self._scan_and_reply_page(db, page_id, page_token)
-                    total_scanned += 1
-                    total_unreplied += page_stats.get("unreplied_count", 0)
-                    total_replied += page_stats.get("replied_count", 0)
-                    total_errors += page_stats.get("error_count", 0)
-                except Exception as e:
-                    logger.error(
-                        f"Error scanning page {page_id}: {str(e)}", exc_info=True)
+            for page_id, page_stats in results:
+                if page_stats is None:
                     total_errors += 1
                     continue
+                total_scanned += 1
+                total_unreplied += page_stats.get("unreplied_count", 0)
+                total_replied += page_stats.get("replied_count", 0)
+                total_errors += page_stats.get("error_count", 0)
+
+            self.last_scan = {
+                "started_at": started_at.isoformat(),
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                "pages_scanned": total_scanned,
+                "unreplied_count": total_unreplied,
+                "replied_count": total_replied,
+                "error_count": total_errors,
+            }
 
             # Log summary
             logger.info(
@@ -143,14 +154,69 @@ class AutoReplyScheduler:
                 f"scanned {total_scanned} pages, "
                 f"found {total_unreplied} unreplied messages, "
                 f"replied to {total_replied}, "
-                f"errors: {total_errors}"
+                f"errors: {total_errors}, "
+                f"took {self.last_scan['duration_ms']}ms"
             )
 
         except Exception as e:
             logger.error(
                 f"Failed to check unreplied messages: {str(e)}", exc_info=True)
-        finally:
-            db.close()
+
+    async def _scan_page_with_limit(
+        self,
+        semaphore: asyncio.Semaphore,
+        page_id: str,
+        page_token: str
+    ) -> Tuple[str, Optional[Dict[str, int]]]:
+        """
+        在并发上限内扫描单个页面，并记录扫描耗时和积压
+
+        Returns:
+            (页面ID, 统计字典)，扫描异常时统计字典为None
+        """
+        async with semaphore:
+            started = time.perf_counter()
+            db = SessionLocal()
+            try:
+                page_stats = await self._scan_and_reply_page(db, page_id, page_token)
+            except Exception as e:
+                logger.error(
+                    f"Error scanning page {page_id}: {str(e)}", exc_info=True)
+                page_stats = None
+            finally:
+                db.close()
+            self._record_page_scan(page_id, time.perf_counter() - started, page_stats)
+            return page_id, page_stats
+
+    def _record_page_scan(
+        self,
+        page_id: str,
+        duration_seconds: float,
+        page_stats: Optional[Dict[str, int]]
+    ) -> None:
+        """记录页面扫描耗时和积压（积压 = 发现的未回复消息数 - 本次已回复数）"""
+        failed = page_stats is None
+        page_stats = page_stats or {}
+        unreplied = page_stats.get("unreplied_count", 0)
+        replied = page_stats.get("replied_count", 0)
+        self.page_scan_stats[page_id] = {
+            "last_scan_at": datetime.now(timezone.utc).isoformat(),
+            "scan_duration_ms": round(duration_seconds * 1000, 1),
+            "unreplied_count": unreplied,
+            "replied_count": replied,
+            "error_count": 1 if failed else page_stats.get("error_count", 0),
+            "backlog": max(0, unreplied - replied),
+            "graph_api_usage_percent": graph_api_usage_pacer.usage_percent(page_id),
+        }
+
+    def get_scan_stats(self) -> Dict[str, Any]:
+        """获取最近一次扫描的汇总和每个页面的耗时/积压（用于监控接口）"""
+        return {
+            "running": self.running,
+            "last_scan": self.last_scan,
+            "pages": dict(self.page_scan_stats),
+            "graph_api_usage": graph_api_usage_pacer.get_stats(),
+        }
 
     async def _get_enabled_pages(self) -> Dict[str, str]:
         """
@@ -218,36 +284,21 @@ class AutoReplyScheduler:
             reply_generator = ReplyGenerator(db)
             conversation_manager = ConversationManager(db)
 
-            # Batch process messages (process in batches of 5 to avoid overwhelming the system)
-            batch_size = 5
-            total_batches = (len(unreplied_messages) +
-                             batch_size - 1) // batch_size
-
-            for batch_idx in range(total_batches):
-                start_idx = batch_idx * batch_size
-                end_idx = min(start_idx + batch_size, len(unreplied_messages))
-                batch_messages = unreplied_messages[start_idx:end_idx]
+            # Process messages concurrently (bounded), pacing each one by Graph API usage
+            semaphore = asyncio.Semaphore(AUTO_REPLY_MESSAGE_CONCURRENCY)
 
-                logger.info(
-                    f"Processing batch {batch_idx + 1}/{total_batches} "
-                    f"({len(batch_messages)} messages) for page {page_id}"
-                )
-
-                # Process batch concurrently
-                batch_tasks = [
-                    self._process_single_message(
+            async def process(msg_data: Dict[str, Any]) -> None:
+                async with semaphore:
+                    await graph_api_usage_pacer.pace(page_id)
+                    await self._process_single_message(
                         db, msg_data, page_id, page_client,
                         reply_generator, conversation_manager, stats
                     )
-                    for msg_data in batch_messages
-                ]
-
-                # Wait for batch to complete
-                await asyncio.gather(*batch_tasks, return_exceptions=True)
 
-                # Delay between batches to avoid rate limiting
-                if batch_idx < total_batches - 1:
-                    await asyncio.sleep(2.0)  # 2 second delay between batches
+            await asyncio.gather(
+                *(process(msg_data) for msg_data in unreplied_messages),
+                return_exceptions=True
+            )
 
             await page_client.close()
 
@@ -325,7 +376,8 @@ class AutoReplyScheduler:
                 customer_id=customer.id,
                 message_content=message_content,
                 customer_name=customer.name,
-                conversation_id=conversation.id
+                conversation_id=conversation.id,
+                page_id=page_id
             )
 
             if not ai_reply:
@@ -344,7 +396,7 @@ class AutoReplyScheduler:
 
                 # Update conversation record
                 conversation_manager.update_ai_reply(
-                    conversation.id, ai_reply)
+                    conversation.id, ai_reply, page_id=page_id)
 
                 stats["replied_count"] += 1
                 logger.info(
@@ -9,6 +9,8 @@ from src.config.page_settings import page_settings
 from src.ai.reply_generator import ReplyGenerator
 from src.statistics.tracker import StatisticsTracker
 from src.facebook.message_parser import MessageType
+from src.utils.keyword_matcher import QUESTION_CATEGORIES, get_keyword_index
+from src.core.exceptions import RateLimitExceededError
 import logging
 
 logger = logging.getLogger(__name__)
@@ -65,7 +67,8 @@ class AutoReplyService(BaseBusinessService):
                 customer_id=customer_id,
                 message_content=message_data.get("content", ""),
                 customer_name=customer.name if customer else None,
-                conversation_id=conversation_id
+                conversation_id=conversation_id,
+                page_id=page_id
             )
         except Exception as e:
             logger.error(f"AI回复生成失败: {str(e)}", exc_info=True)
@@ -115,16 +118,6 @@ class AutoReplyService(BaseBusinessService):
         # 检查是否包含群组邀请
         group_invitation_sent = "t.me" in ai_reply or "telegram" in ai_reply.lower()
         
-        # 记录高频问题
-        if message_summary:
-            question_category = self._categorize_question(message_summary)
-            stats_tracker = StatisticsTracker(db)
-            stats_tracker.record_frequent_question(
-                question_text=message_summary,
-                category=question_category,
-                sample_response=ai_reply[:200]
-            )
-        
         # 实时监控：记录AI回复事件
         try:
             from src.monitoring.realtime import realtime_monitor
@@ -159,12 +152,14 @@ class AutoReplyService(BaseBusinessService):
                     if post_id:
                         await platform_client.comment_on_post(post_id, ai_reply)
             
+            self._record_frequent_question(db, message_summary, ai_reply)
+            
             # 更新对话记录中的 AI 回复信息
             conversation_id = context.get("conversation_id")
             if conversation_id:
                 from src.ai.conversation_manager import ConversationManager
                 conversation_manager = ConversationManager(db)
-                conversation_manager.update_ai_reply(conversation_id, ai_reply)
+                conversation_manager.update_ai_reply(conversation_id, ai_reply, page_id=page_id)
             
             # 记录成功
             try:
@@ -179,8 +174,14 @@ class AutoReplyService(BaseBusinessService):
                 "group_invitation_sent": group_invitation_sent,
                 "message": "AI回复发送成功"
             }
+        except RateLimitExceededError as e:
+            # 限流属于暂时性错误，不计入失败率也不发送告警，由调用方重试；
+            # 高频问题在重投后实际发送时再记录，避免每次重试重复计数
+            logger.warning(f"AI reply to {sender_id} deferred by rate limit: {str(e)}")
+            raise
         except Exception as e:
             logger.error(f"Error sending AI reply: {str(e)}", exc_info=True)
+            self._record_frequent_question(db, message_summary, ai_reply)
             
             # 发送错误通知
             error_msg = str(e)
@@ -218,6 +219,16 @@ class AutoReplyService(BaseBusinessService):
                 "message": f"AI回复生成成功，但发送失败: {str(e)}"
             }
     
+    def _record_frequent_question(self, db: Session, message_summary: Optional[str], ai_reply: str):
+        """记录高频问题（每条消息只在最终发送尝试后记录一次）"""
+        if not message_summary:
+            return
+        StatisticsTracker(db).record_frequent_question(
+            question_text=message_summary,
+            category=self._categorize_question(message_summary),
+            sample_response=ai_reply[:200]
+        )
+    
     def _categorize_question(self, question_text: str) -> str:
         """
         分类问题（从原AIReplyHandler提取）
@@ -228,18 +239,11 @@ class AutoReplyService(BaseBusinessService):
         Returns:
             问题分类
         """
-        question_lower = question_text.lower()
-        
-        if any(keyword in question_lower for keyword in ["价格", "价格", "price", "cost", "费用", "收费"]):
-            return "价格咨询"
-        elif any(keyword in question_lower for keyword in ["如何", "怎么", "how", "how to", "方法", "步骤"]):
-            return "使用指导"
-        elif any(keyword in question_lower for keyword in ["问题", "错误", "problem", "error", "bug", "故障"]):
-            return "问题反馈"
-        elif any(keyword in question_lower for keyword in ["功能", "feature", "功能", "特性"]):
-            return "功能介绍"
-        else:
-            return "一般咨询"
+        keyword_hits = get_keyword_index().match(question_text)
+        for category, label in QUESTION_CATEGORIES:
+            if category in keyword_hits:
+                return label
+        return "一般咨询"
     
     async def _send_error_notification(
         self,
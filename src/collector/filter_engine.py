@@ -2,8 +2,14 @@
 from typing import Dict, Any, List, Optional
 from sqlalchemy.orm import Session
 from src.core.database.models import Conversation, Priority
-from src.core.config import yaml_config
-import re
+from src.utils.keyword_matcher import (
+    CATEGORY_FILTER_BLOCK,
+    CATEGORY_FILTER_SPAM,
+    CATEGORY_SENTIMENT_NEGATIVE,
+    CATEGORY_SENTIMENT_POSITIVE,
+    get_keyword_index,
+    priority_rule_category,
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,7 +20,8 @@ class FilterEngine:
     
     def __init__(self, db: Session):
         self.db = db
-        self.filter_config = yaml_config.get("filtering", {})
+        self.keyword_index = get_keyword_index()
+        self.filter_config = self.keyword_index.config.get("filtering", {})
         self.keyword_config = self.filter_config.get("keyword_filter", {})
         self.sentiment_config = self.filter_config.get("sentiment_filter", {})
         self.priority_config = self.filter_config.get("priority_rules", [])
@@ -22,7 +29,8 @@ class FilterEngine:
     def filter_message(
         self,
         conversation: Conversation,
-        message_content: str
+        message_content: str,
+        keyword_hits: Optional[Dict[str, List[str]]] = None
     ) -> Dict[str, Any]:
         """
         过滤消息
@@ -30,6 +38,7 @@ class FilterEngine:
         Args:
             conversation: 对话记录
             message_content: 消息内容
+            keyword_hits: 调用方已计算的关键词命中结果（未提供时扫描一次消息）
         
         Returns:
             过滤结果，包含是否被过滤、原因、优先级等
@@ -41,9 +50,12 @@ class FilterEngine:
             "should_review": True
         }
         
+        if keyword_hits is None:
+            keyword_hits = self.keyword_index.match(message_content)
+        
         # 关键词过滤
         if self.keyword_config.get("enabled", True):
-            keyword_result = self._check_keywords(message_content)
+            keyword_result = self._check_keywords(message_content, keyword_hits)
             if keyword_result["blocked"]:
                 result["filtered"] = True
                 result["filter_reason"] = f"包含屏蔽关键词: {keyword_result['matched_keywords']}"
@@ -56,36 +68,37 @@ class FilterEngine:
                 return result
         
         # 优先级判断
-        priority = self._determine_priority(message_content)
+        priority = self._determine_priority(message_content, keyword_hits)
         result["priority"] = priority
         
         # 情感分析过滤（简化版，实际可以使用 AI）
         if self.sentiment_config.get("enabled", True):
-            sentiment_result = self._analyze_sentiment(message_content)
+            sentiment_result = self._analyze_sentiment(message_content, keyword_hits)
             if sentiment_result["is_negative"] and self.sentiment_config.get("priority_negative", True):
                 result["priority"] = Priority.HIGH
         
         return result
     
-    def _check_keywords(self, message_content: str) -> Dict[str, Any]:
+    def _check_keywords(
+        self,
+        message_content: str,
+        keyword_hits: Optional[Dict[str, List[str]]] = None
+    ) -> Dict[str, Any]:
         """
         检查关键词
         
         Args:
             message_content: 消息内容
+            keyword_hits: 关键词命中结果
         
         Returns:
             关键词检查结果
         """
-        message_lower = message_content.lower()
+        if keyword_hits is None:
+            keyword_hits = self.keyword_index.match(message_content)
         
         # 检查屏蔽关键词
-        block_keywords = self.keyword_config.get("block_keywords", [])
-        matched_block = []
-        for keyword in block_keywords:
-            if keyword.lower() in message_lower:
-                matched_block.append(keyword)
-        
+        matched_block = keyword_hits.get(CATEGORY_FILTER_BLOCK, [])
         if matched_block:
             return {
                 "blocked": True,
@@ -94,12 +107,7 @@ class FilterEngine:
             }
         
         # 检查垃圾信息关键词
-        spam_keywords = self.keyword_config.get("spam_keywords", [])
-        matched_spam = []
-        for keyword in spam_keywords:
-            if keyword.lower() in message_lower:
-                matched_spam.append(keyword)
-        
+        matched_spam = keyword_hits.get(CATEGORY_FILTER_SPAM, [])
         if matched_spam:
             return {
                 "blocked": False,
@@ -113,31 +121,37 @@ class FilterEngine:
             "matched_keywords": []
         }
     
-    def _determine_priority(self, message_content: str) -> Priority:
+    def _determine_priority(
+        self,
+        message_content: str,
+        keyword_hits: Optional[Dict[str, List[str]]] = None
+    ) -> Priority:
         """
         确定消息优先级
         
         Args:
             message_content: 消息内容
+            keyword_hits: 关键词命中结果
         
         Returns:
             优先级
         """
-        message_lower = message_content.lower()
+        if keyword_hits is None:
+            keyword_hits = self.keyword_index.match(message_content)
         
         # 按配置的优先级规则检查
-        for rule in self.priority_config:
+        for index, rule in enumerate(self.priority_config):
             condition = rule.get("condition", "")
-            keywords = rule.get("keywords", [])
+            matched = priority_rule_category(index) in keyword_hits
             priority_str = rule.get("priority", "low")
             
             # 检查是否匹配条件
             if condition == "包含紧急关键词":
-                if any(keyword.lower() in message_lower for keyword in keywords):
+                if matched:
                     return Priority.URGENT if priority_str == "high" else Priority.HIGH
             
             elif condition == "包含购买意向":
-                if any(keyword.lower() in message_lower for keyword in keywords):
+                if matched:
                     return Priority.MEDIUM if priority_str == "medium" else Priority.LOW
             
             elif condition == "默认":
@@ -151,32 +165,26 @@ class FilterEngine:
         
         return Priority.LOW
     
-    def _analyze_sentiment(self, message_content: str) -> Dict[str, Any]:
+    def _analyze_sentiment(
+        self,
+        message_content: str,
+        keyword_hits: Optional[Dict[str, List[str]]] = None
+    ) -> Dict[str, Any]:
         """
         简单的情感分析（基于关键词）
         
         Args:
             message_content: 消息内容
+            keyword_hits: 关键词命中结果
         
         Returns:
             情感分析结果
         """
-        message_lower = message_content.lower()
-        
-        # 负面情感关键词
-        negative_keywords = [
-            "不满", "投诉", "问题", "错误", "失败", "糟糕",
-            "disappointed", "complaint", "problem", "error", "bad"
-        ]
-        
-        # 正面情感关键词
-        positive_keywords = [
-            "满意", "感谢", "好", "棒", "优秀",
-            "satisfied", "thanks", "good", "great", "excellent"
-        ]
-        
-        negative_count = sum(1 for keyword in negative_keywords if keyword in message_lower)
-        positive_count = sum(1 for keyword in positive_keywords if keyword in message_lower)
+        if keyword_hits is None:
+            keyword_hits = self.keyword_index.match(message_content)
+        
+        negative_count = len(keyword_hits.get(CATEGORY_SENTIMENT_NEGATIVE, []))
+        positive_count = len(keyword_hits.get(CATEGORY_SENTIMENT_POSITIVE, []))
         
         return {
             "is_negative": negative_count > positive_count,
@@ -5,7 +5,17 @@ from .cache_manager import (
     conversation_cache,
     customer_cache,
     config_cache,
-    prompt_cache
+    prompt_cache,
+    reply_cache,
+    history_cache,
+    get_cache_stats
+)
+from .snapshots import CustomerSnapshot
+from .history_store import (
+    ConversationHistoryStore,
+    HistoryTurn,
+    get_history_store,
+    history_messages
 )
 
 __all__ = [
@@ -14,6 +24,13 @@ __all__ = [
     "conversation_cache",
     "customer_cache",
     "config_cache",
-    "prompt_cache"
+    "prompt_cache",
+    "reply_cache",
+    "history_cache",
+    "get_cache_stats",
+    "CustomerSnapshot",
+    "ConversationHistoryStore",
+    "HistoryTurn",
+    "get_history_store",
+    "history_messages"
 ]
-
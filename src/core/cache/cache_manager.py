@@ -1,195 +1,253 @@
 """缓存管理器"""
-from typing import Any, Optional, Dict, Callable
-from datetime import datetime, timezone, timedelta
-from dataclasses import dataclass
+from typing import Any, Optional, Dict, Callable, Hashable, List, Tuple
+from datetime import timedelta
+from collections import OrderedDict
 import asyncio
 import logging
+import threading
+import time
 
-logger = logging.getLogger(__name__)
+from src.core.config.constants import (
+    CACHE_DEFAULT_MAX_SIZE,
+    CONVERSATION_HISTORY_TTL_SECONDS,
+    REPLY_CACHE_MAX_SIZE,
+    REPLY_CACHE_TTL_SECONDS,
+)
 
+logger = logging.getLogger(__name__)
 
-@dataclass
-class CacheEntry:
-    """缓存条目"""
-    key: str
-    value: Any
-    expires_at: Optional[datetime]
-    created_at: datetime
+_MISSING = object()
 
 
 class CacheManager:
-    """缓存管理器 - 简单的内存缓存实现"""
-    
-    def __init__(self, default_ttl: Optional[timedelta] = None):
+    """
+    缓存管理器 - 有界 LRU + TTL 内存缓存
+
+    - 同时提供同步接口（get_sync/set_sync，可在同步Repository和线程池中使用）
+      和异步接口（get/set，兼容原有调用方式）
+    - 读操作不加锁：依赖 dict/OrderedDict 单步操作在 GIL 下的原子性；
+      写操作使用极短的线程锁，不会阻塞事件循环
+    - 超过 max_size 时淘汰最久未使用的条目
+    - 只应缓存不可变的普通数据（DTO快照、dict、list），不要缓存ORM实例：
+      会话关闭后ORM实例处于detached状态，跨会话使用会出错
+    """
+
+    def __init__(
+        self,
+        default_ttl: Optional[timedelta] = None,
+        max_size: int = CACHE_DEFAULT_MAX_SIZE,
+        name: str = "default"
+    ):
         """
         初始化缓存管理器
-        
+
         Args:
             default_ttl: 默认TTL（Time To Live），如果为None则不设置过期时间
+            max_size: 最大条目数，超过后按LRU淘汰
+            name: 缓存名称（用于指标）
         """
-        self._cache: Dict[str, CacheEntry] = {}
-        self._default_ttl = default_ttl
-        self._lock = asyncio.Lock()
-    
-    async def get(self, key: str) -> Optional[Any]:
+        self.name = name
+        self.max_size = max_size
+        self._default_ttl = default_ttl.total_seconds() if default_ttl else None
+        # key -> (value, 过期时间(monotonic) 或 None)
+        self._cache: "OrderedDict[Hashable, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._write_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    # ---- 同步接口 ----
+
+    def get_sync(self, key: Hashable, default: Any = None) -> Any:
         """
-        获取缓存值
-        
+        获取缓存值（不加锁）
+
         Args:
             key: 缓存键
-        
+            default: 不存在或已过期时的返回值
+
         Returns:
-            缓存值，如果不存在或已过期则返回None
+            缓存值，如果不存在或已过期则返回default
         """
-        async with self._lock:
-            entry = self._cache.get(key)
-            
-            if entry is None:
-                return None
-            
-            # 检查是否过期
-            if entry.expires_at and datetime.now(timezone.utc) > entry.expires_at:
-                del self._cache[key]
-                return None
-            
-            return entry.value
-    
-    async def set(
-        self,
-        key: str,
-        value: Any,
-        ttl: Optional[timedelta] = None
-    ) -> None:
+        entry = self._cache.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        value, expires_at = entry
+        if expires_at is not None and time.monotonic() > expires_at:
+            # 只删除仍是同一条目的键，避免误删并发写入的新值
+            with self._write_lock:
+                if self._cache.get(key) is entry:
+                    del self._cache[key]
+                    self.expirations += 1
+            self.misses += 1
+            return default
+
+        try:
+            self._cache.move_to_end(key)
+        except KeyError:
+            pass  # 并发删除，不影响本次返回
+        self.hits += 1
+        return value
+
+    def set_sync(self, key: Hashable, value: Any, ttl: Optional[timedelta] = None) -> None:
         """
         设置缓存值
-        
+
         Args:
             key: 缓存键
             value: 缓存值
             ttl: TTL（Time To Live），如果为None则使用默认TTL
         """
-        async with self._lock:
-            expires_at = None
-            if ttl:
-                expires_at = datetime.now(timezone.utc) + ttl
-            elif self._default_ttl:
-                expires_at = datetime.now(timezone.utc) + self._default_ttl
-            
-            entry = CacheEntry(
-                key=key,
-                value=value,
-                expires_at=expires_at,
-                created_at=datetime.now(timezone.utc)
-            )
-            
-            self._cache[key] = entry
-    
-    async def delete(self, key: str) -> bool:
-        """
-        删除缓存值
-        
-        Args:
-            key: 缓存键
-        
-        Returns:
-            是否成功删除
-        """
-        async with self._lock:
-            if key in self._cache:
+        seconds = ttl.total_seconds() if ttl else self._default_ttl
+        expires_at = time.monotonic() + seconds if seconds else None
+        with self._write_lock:
+            self._cache[key] = (value, expires_at)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+                self.evictions += 1
+
+    def delete_sync(self, key: Hashable) -> bool:
+        """删除缓存值，返回是否存在"""
+        with self._write_lock:
+            return self._cache.pop(key, _MISSING) is not _MISSING
+
+    def clear_sync(self) -> None:
+        """清空所有缓存"""
+        with self._write_lock:
+            self._cache.clear()
+
+    def cleanup_expired_sync(self) -> int:
+        """清理过期的缓存条目，返回清理数量"""
+        now = time.monotonic()
+        with self._write_lock:
+            expired_keys = [
+                key for key, (_, expires_at) in self._cache.items()
+                if expires_at is not None and expires_at < now
+            ]
+            for key in expired_keys:
                 del self._cache[key]
-                return True
-            return False
-    
+            self.expirations += len(expired_keys)
+        return len(expired_keys)
+
+    # ---- 异步接口（兼容原有调用方式）----
+
+    async def get(self, key: Hashable) -> Optional[Any]:
+        """获取缓存值，如果不存在或已过期则返回None"""
+        return self.get_sync(key)
+
+    async def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[timedelta] = None
+    ) -> None:
+        """设置缓存值"""
+        self.set_sync(key, value, ttl)
+
+    async def delete(self, key: Hashable) -> bool:
+        """删除缓存值"""
+        return self.delete_sync(key)
+
     async def clear(self) -> None:
         """清空所有缓存"""
-        async with self._lock:
-            self._cache.clear()
-    
+        self.clear_sync()
+
     async def get_or_set(
         self,
-        key: str,
+        key: Hashable,
         factory: Callable[[], Any],
         ttl: Optional[timedelta] = None
     ) -> Any:
         """
         获取缓存值，如果不存在则调用factory生成并缓存
-        
+
         Args:
             key: 缓存键
             factory: 生成值的函数（可以是同步或异步）
             ttl: TTL
-        
+
         Returns:
             缓存值或新生成的值
         """
-        value = await self.get(key)
-        if value is not None:
+        value = self.get_sync(key, _MISSING)
+        if value is not _MISSING:
             return value
-        
+
         # 生成新值
         if asyncio.iscoroutinefunction(factory):
             value = await factory()
         else:
             value = factory()
-        
-        await self.set(key, value, ttl)
+
+        self.set_sync(key, value, ttl)
         return value
-    
+
     async def cleanup_expired(self) -> int:
-        """
-        清理过期的缓存条目
-        
-        Returns:
-            清理的条目数量
-        """
-        async with self._lock:
-            now = datetime.now(timezone.utc)
-            expired_keys = [
-                key for key, entry in self._cache.items()
-                if entry.expires_at and entry.expires_at < now
-            ]
-            
-            for key in expired_keys:
-                del self._cache[key]
-            
-            return len(expired_keys)
-    
+        """清理过期的缓存条目"""
+        return self.cleanup_expired_sync()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
     def get_stats(self) -> Dict[str, Any]:
         """获取缓存统计信息"""
-        async def _get_stats():
-            async with self._lock:
-                total_entries = len(self._cache)
-                expired_count = sum(
-                    1 for entry in self._cache.values()
-                    if entry.expires_at and entry.expires_at < datetime.now(timezone.utc)
-                )
-                
-                return {
-                    "total_entries": total_entries,
-                    "expired_entries": expired_count,
-                    "active_entries": total_entries - expired_count
-                }
-        
-        # 同步调用（简化处理）
+        lookups = self.hits + self.misses
         return {
-            "total_entries": len(self._cache),
-            "active_entries": len(self._cache)
+            "name": self.name,
+            "size": len(self._cache),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
         }
 
 
 # 全局缓存管理器实例
 # 对话历史缓存：TTL 5分钟
-conversation_cache = CacheManager(default_ttl=timedelta(minutes=5))
+conversation_cache = CacheManager(default_ttl=timedelta(minutes=5), name="conversation")
 
 # 客户信息缓存：TTL 10分钟
-customer_cache = CacheManager(default_ttl=timedelta(minutes=10))
+customer_cache = CacheManager(default_ttl=timedelta(minutes=10), name="customer")
 
 # 配置缓存：TTL 1小时
-config_cache = CacheManager(default_ttl=timedelta(hours=1))
+config_cache = CacheManager(default_ttl=timedelta(hours=1), name="config")
 
 # 提示词模板缓存：TTL 1小时
-prompt_cache = CacheManager(default_ttl=timedelta(hours=1))
+prompt_cache = CacheManager(default_ttl=timedelta(hours=1), name="prompt")
+
+# AI回复缓存（src/ai/reply_cache.py 的内存层）
+reply_cache = CacheManager(
+    default_ttl=timedelta(seconds=REPLY_CACHE_TTL_SECONDS),
+    max_size=REPLY_CACHE_MAX_SIZE,
+    name="reply"
+)
+
+# 对话历史窗口（src/core/cache/history_store.py 的进程内后端）
+history_cache = CacheManager(
+    default_ttl=timedelta(seconds=CONVERSATION_HISTORY_TTL_SECONDS),
+    name="history"
+)
 
 # 默认缓存管理器（无TTL）
-cache_manager = CacheManager()
+cache_manager = CacheManager(name="default")
+
+_ALL_CACHES: List[CacheManager] = [
+    conversation_cache,
+    customer_cache,
+    config_cache,
+    prompt_cache,
+    reply_cache,
+    history_cache,
+    cache_manager,
+]
+
 
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """获取所有全局缓存的统计信息（用于 /metrics）"""
+    return {cache.name: cache.get_stats() for cache in _ALL_CACHES}
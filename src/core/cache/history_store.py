@@ -0,0 +1,375 @@
+"""对话历史窗口 - 按客户保存最近若干轮对话，生成回复时不再查询和重建历史
+
+- 每位客户保存最近 CONVERSATION_HISTORY_WINDOW 条对话记录的紧凑元组（HistoryTurn），
+  首次读取时从数据库加载一次，之后由写入路径维护：
+  新建对话时追加到窗口末尾（超出窗口的最早一条被挤出），更新AI回复时原地替换对应的一条
+- 只维护已加载的窗口：客户窗口不在缓存中时写入路径什么也不做，下次读取时从数据库加载
+- 默认保存在进程内（全局 history_cache，TTL + LRU，指标在 /metrics 的 caches.history 中）；
+  配置 CONVERSATION_HISTORY_REDIS_URL 后保存在 Redis 中，多个工作进程共享同一份窗口
+- 多个工作进程（WEB_CONCURRENCY>1）且未配置 Redis 时不使用窗口：其他进程写入的对话不会
+  更新本进程的窗口，每次都从数据库读取历史
+"""
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from src.core.config.constants import (
+    CACHE_DEFAULT_MAX_SIZE,
+    CONVERSATION_HISTORY_REDIS_KEY_PREFIX,
+    CONVERSATION_HISTORY_TTL_SECONDS,
+    CONVERSATION_HISTORY_WINDOW,
+)
+from .cache_manager import CacheManager, history_cache
+
+logger = logging.getLogger(__name__)
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    """时间转为带时区的ISO格式（数据库返回的无时区时间按UTC处理）"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.isoformat()
+
+
+class HistoryTurn(NamedTuple):
+    """一条对话记录：客户消息及（可选的）AI回复"""
+    conversation_id: int
+    content: str
+    timestamp: Optional[str] = None
+    reply: Optional[str] = None
+    reply_timestamp: Optional[str] = None
+
+    @classmethod
+    def from_model(cls, conversation: Any) -> "HistoryTurn":
+        """从 Conversation ORM 实例创建"""
+        replied = bool(conversation.ai_replied and conversation.ai_reply_content)
+        return cls(
+            conversation_id=conversation.id,
+            content=conversation.content,
+            timestamp=_isoformat(conversation.received_at),
+            reply=conversation.ai_reply_content if replied else None,
+            reply_timestamp=_isoformat(conversation.ai_reply_at) if replied else None,
+        )
+
+
+def history_messages(turns: Sequence[HistoryTurn]) -> List[Dict[str, Any]]:
+    """把对话记录展开为按时间正序的 role/content/timestamp 消息列表"""
+    messages = []
+    for turn in turns:
+        messages.append({"role": "user", "content": turn.content, "timestamp": turn.timestamp})
+        if turn.reply:
+            messages.append({"role": "assistant", "content": turn.reply, "timestamp": turn.reply_timestamp})
+    return messages
+
+
+class InMemoryHistoryBackend:
+    """进程内历史窗口（窗口是不可变元组，写入时整体替换，读取不加锁）"""
+
+    def __init__(self, cache: Optional[CacheManager] = None):
+        self.cache = cache if cache is not None else history_cache
+        # 串行化同一进程内的“读取-修改-写回”
+        self._lock = threading.Lock()
+
+    def get(self, customer_id: int) -> Optional[Tuple[HistoryTurn, ...]]:
+        return self.cache.get_sync(customer_id)
+
+    def put(self, customer_id: int, turns: Tuple[HistoryTurn, ...]) -> None:
+        self.cache.set_sync(customer_id, turns)
+
+    def append(self, customer_id: int, turn: HistoryTurn, window: int) -> bool:
+        with self._lock:
+            turns = self.cache.get_sync(customer_id)
+            if turns is None:
+                return False
+            self.cache.set_sync(customer_id, (turns + (turn,))[-window:])
+            return True
+
+    def update_reply(self, customer_id: int, turn: HistoryTurn) -> bool:
+        with self._lock:
+            turns = self.cache.get_sync(customer_id)
+            if turns is None:
+                return False
+            for i, existing in enumerate(turns):
+                if existing.conversation_id == turn.conversation_id:
+                    self.cache.set_sync(customer_id, turns[:i] + (turn,) + turns[i + 1:])
+                    return True
+            return False
+
+    def delete(self, customer_id: int) -> None:
+        self.cache.delete_sync(customer_id)
+
+    def clear(self) -> None:
+        self.cache.clear_sync()
+
+
+class DisabledHistoryBackend:
+    """不保存窗口：读取始终未命中，调用方每次从数据库加载"""
+
+    def get(self, customer_id: int) -> Optional[Tuple[HistoryTurn, ...]]:
+        return None
+
+    def put(self, customer_id: int, turns: Tuple[HistoryTurn, ...]) -> None:
+        pass
+
+    def append(self, customer_id: int, turn: HistoryTurn, window: int) -> bool:
+        return False
+
+    def update_reply(self, customer_id: int, turn: HistoryTurn) -> bool:
+        return False
+
+    def delete(self, customer_id: int) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+
+# 按对话ID原子替换列表中的一条记录（多个工作进程并发追加时下标会变化，不能先读再 LSET）
+_UPDATE_TURN_LUA_SCRIPT = """
+local items = redis.call('LRANGE', KEYS[1], 0, -1)
+local prefix = ARGV[1]
+for i, raw in ipairs(items) do
+    if string.sub(raw, 1, #prefix) == prefix then
+        redis.call('LSET', KEYS[1], i - 1, ARGV[2])
+        return 1
+    end
+end
+return 0
+"""
+
+
+class RedisHistoryBackend:
+    """
+    Redis 共享历史窗口
+
+    每位客户一个列表，元素为 JSON 数组形式的 HistoryTurn。任何兼容 Redis 协议的
+    同步客户端（redis.Redis 或测试中的假实现）都可以使用。
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        key_prefix: str = CONVERSATION_HISTORY_REDIS_KEY_PREFIX,
+        ttl_seconds: int = CONVERSATION_HISTORY_TTL_SECONDS
+    ):
+        self.client = client
+        self.key_prefix = key_prefix
+        self.ttl_seconds = ttl_seconds
+
+    def _key(self, customer_id: int) -> str:
+        return f"{self.key_prefix}{customer_id}"
+
+    @staticmethod
+    def _encode(turn: HistoryTurn) -> str:
+        return json.dumps(list(turn), ensure_ascii=False, separators=(",", ":"))
+
+    def get(self, customer_id: int) -> Optional[Tuple[HistoryTurn, ...]]:
+        items = self.client.lrange(self._key(customer_id), 0, -1)
+        if not items:
+            return None
+        return tuple(HistoryTurn(*json.loads(item)) for item in items)
+
+    def put(self, customer_id: int, turns: Tuple[HistoryTurn, ...]) -> None:
+        key = self._key(customer_id)
+        pipe = self.client.pipeline()
+        pipe.delete(key)
+        if turns:
+            pipe.rpush(key, *(self._encode(turn) for turn in turns))
+            pipe.expire(key, self.ttl_seconds)
+        pipe.execute()
+
+    def append(self, customer_id: int, turn: HistoryTurn, window: int) -> bool:
+        key = self._key(customer_id)
+        pipe = self.client.pipeline()
+        pipe.rpushx(key, self._encode(turn))
+        pipe.ltrim(key, -window, -1)
+        pipe.expire(key, self.ttl_seconds)
+        return bool(pipe.execute()[0])
+
+    def update_reply(self, customer_id: int, turn: HistoryTurn) -> bool:
+        prefix = f"[{turn.conversation_id},"
+        return bool(self.client.eval(
+            _UPDATE_TURN_LUA_SCRIPT, 1, self._key(customer_id), prefix, self._encode(turn)))
+
+    def delete(self, customer_id: int) -> None:
+        self.client.delete(self._key(customer_id))
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(match=f"{self.key_prefix}*"):
+            self.client.delete(key)
+
+
+def _local_history_backend(workers: int):
+    """未使用 Redis 时的后端：单进程使用进程内窗口，多进程不使用窗口"""
+    if workers > 1:
+        logger.warning(
+            f"WEB_CONCURRENCY={workers} without a shared CONVERSATION_HISTORY_REDIS_URL: "
+            "per-worker history windows would go stale, reading conversation history from the database")
+        return DisabledHistoryBackend()
+    return InMemoryHistoryBackend()
+
+
+def create_history_backend(redis_url: Optional[str] = None, workers: int = 1):
+    """
+    根据配置创建历史窗口后端
+
+    配置了 Redis 地址时使用共享后端（需要安装 redis 包）；否则单进程使用进程内后端，
+    多个工作进程时不使用窗口（进程内窗口看不到其他进程写入的对话）。
+
+    Args:
+        redis_url: 共享窗口的 Redis 地址
+        workers: 工作进程数（WEB_CONCURRENCY）
+    """
+    if not redis_url:
+        return _local_history_backend(workers)
+    try:
+        import redis
+    except ImportError:
+        logger.warning("CONVERSATION_HISTORY_REDIS_URL is set but 'redis' is not installed")
+        return _local_history_backend(workers)
+    return RedisHistoryBackend(redis.Redis.from_url(redis_url))
+
+
+class ConversationHistoryStore:
+    """
+    按客户维护的对话历史窗口
+
+    后端出错时读取返回未命中（调用方回退到数据库），写入时删除该客户的窗口，
+    不影响消息处理流程。
+    """
+
+    def __init__(self, backend: Any = None, window: int = CONVERSATION_HISTORY_WINDOW):
+        """
+        Args:
+            backend: 存储后端（默认进程内后端）
+            window: 每位客户保留的对话记录数
+        """
+        self.backend = backend if backend is not None else InMemoryHistoryBackend()
+        self.window = window
+        self._lock = threading.Lock()
+        # 写入序号：加载期间该客户有新写入时，丢弃加载结果，避免旧数据覆盖刚追加的记录
+        self._write_seq = 0
+        self._last_writes: "OrderedDict[int, int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get(self, customer_id: int) -> Optional[Tuple[HistoryTurn, ...]]:
+        """读取客户的历史窗口，未加载时返回None"""
+        try:
+            turns = self.backend.get(customer_id)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Conversation history lookup failed for customer {customer_id}: {e}")
+            turns = None
+        if turns is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return turns
+
+    def load_token(self) -> int:
+        """开始从数据库加载前获取的写入序号（传给 put）"""
+        return self._write_seq
+
+    def put(self, customer_id: int, turns: Sequence[HistoryTurn], token: Optional[int] = None) -> bool:
+        """
+        保存从数据库加载的历史窗口
+
+        Args:
+            customer_id: 客户 ID
+            turns: 按时间正序的对话记录（只保留最近 window 条）
+            token: load_token() 的返回值，加载期间该客户有新写入时不保存
+
+        Returns:
+            是否已保存
+        """
+        if token is not None and self._last_writes.get(customer_id, -1) > token:
+            return False
+        try:
+            self.backend.put(customer_id, tuple(turns)[-self.window:])
+            return True
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Failed to store conversation history for customer {customer_id}: {e}")
+            return False
+
+    def record_message(self, conversation: Any) -> None:
+        """新建对话后调用：追加到客户的历史窗口"""
+        if conversation is None:
+            return
+        self._mark_write(conversation.customer_id)
+        self._apply(conversation.customer_id, self.backend.append,
+                    HistoryTurn.from_model(conversation), self.window)
+
+    def record_reply(self, conversation: Any) -> None:
+        """更新AI回复后调用：替换窗口中对应的记录"""
+        if conversation is None:
+            return
+        self._mark_write(conversation.customer_id)
+        self._apply(conversation.customer_id, self.backend.update_reply, HistoryTurn.from_model(conversation))
+
+    def invalidate(self, customer_id: int) -> None:
+        """删除客户的历史窗口（无法原地更新的写入后调用）"""
+        self._mark_write(customer_id)
+        try:
+            self.backend.delete(customer_id)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Failed to invalidate conversation history for customer {customer_id}: {e}")
+
+    def clear(self) -> None:
+        """清空所有历史窗口"""
+        self.backend.clear()
+        with self._lock:
+            self._last_writes.clear()
+
+    def _mark_write(self, customer_id: int) -> None:
+        with self._lock:
+            self._write_seq += 1
+            self._last_writes[customer_id] = self._write_seq
+            self._last_writes.move_to_end(customer_id)
+            while len(self._last_writes) > CACHE_DEFAULT_MAX_SIZE:
+                self._last_writes.popitem(last=False)
+
+    def _apply(self, customer_id: int, operation, *args) -> None:
+        try:
+            operation(customer_id, *args)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Failed to update conversation history for customer {customer_id}: {e}")
+            try:
+                self.backend.delete(customer_id)
+            except Exception:
+                pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "window": self.window,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "errors": self.errors,
+        }
+
+
+_history_store: Optional[ConversationHistoryStore] = None
+
+
+def get_history_store() -> ConversationHistoryStore:
+    """获取进程级共享的对话历史窗口（首次调用时按配置创建后端）"""
+    global _history_store
+    if _history_store is None:
+        from src.core.config import settings
+        _history_store = ConversationHistoryStore(
+            backend=create_history_backend(
+                settings.conversation_history_redis_url, workers=settings.web_concurrency))
+    return _history_store
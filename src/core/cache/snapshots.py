@@ -0,0 +1,32 @@
+"""缓存快照 - 缓存中保存的只读数据对象（不持有数据库会话）"""
+from dataclasses import dataclass
+from typing import Any, Optional
+
+
+@dataclass(frozen=True)
+class CustomerSnapshot:
+    """客户信息快照，属性名与 Customer 模型一致，可在只读场景代替ORM实例"""
+    id: int
+    platform: Any
+    platform_user_id: Optional[str] = None
+    facebook_id: Optional[str] = None
+    name: Optional[str] = None
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    company_name: Optional[str] = None
+    location: Optional[str] = None
+
+    @classmethod
+    def from_model(cls, customer: Any) -> "CustomerSnapshot":
+        """从 Customer ORM 实例（或另一个快照）创建快照"""
+        return cls(
+            id=customer.id,
+            platform=customer.platform,
+            platform_user_id=customer.platform_user_id,
+            facebook_id=customer.facebook_id,
+            name=customer.name,
+            email=customer.email,
+            phone=customer.phone,
+            company_name=customer.company_name,
+            location=customer.location,
+        )
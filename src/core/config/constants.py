@@ -44,9 +44,15 @@ INSTAGRAM_GRAPH_API_BASE_URL = f"https://graph.instagram.com/{INSTAGRAM_GRAPH_AP
 FACEBOOK_DEBUG_TOKEN_URL = f"{FACEBOOK_GRAPH_API_BASE_URL}/debug_token"
 FACEBOOK_ME_ACCOUNTS_URL = f"{FACEBOOK_GRAPH_API_BASE_URL}/me/accounts"
 
+# Graph API 批量请求
+GRAPH_BATCH_MAX_REQUESTS = 50  # 单个批量请求最多包含的子请求数（Graph API上限）
+FACEBOOK_MESSAGE_FIELDS = "id,message,from,created_time,attachments"
+
 # 默认配置值
 DEFAULT_OPENAI_MODEL = "gpt-4o-mini"
 DEFAULT_OPENAI_TEMPERATURE = 0.7
+OPENAI_MAX_RETRIES = 2  # SDK内置重试次数（仅重试连接错误、429和5xx）
+OPENAI_KEEPALIVE_CONNECTIONS = 10  # 共享客户端保持的空闲连接数
 DEFAULT_SERVER_HOST = "0.0.0.0"
 DEFAULT_SERVER_PORT = 8000
 
@@ -54,6 +60,10 @@ DEFAULT_SERVER_PORT = 8000
 DEFAULT_LOG_LEVEL = "INFO"
 LOG_FILE_MAX_BYTES = 10 * 1024 * 1024  # 10MB
 LOG_FILE_BACKUP_COUNT = 10
+LOG_QUEUE_MAX_SIZE = 10000  # 异步日志队列上限（写日志的线程跟不上时丢弃新记录并计数，不阻塞事件循环）
+LOG_SAMPLE_WINDOW_SECONDS = 60  # 高频事件采样窗口
+LOG_SAMPLE_BURST = 20  # 每个窗口内每类高频事件完整记录的条数
+LOG_SAMPLE_EVERY = 50  # 超过 LOG_SAMPLE_BURST 后每N条记录1条（WARNING及以上不采样）
 
 # 数据库相关
 # 连接池配置（生产环境优化）
@@ -81,4 +91,85 @@ FACEBOOK_API_RATE_LIMIT = 200  # 每小时200次调用（保守估计）
 FACEBOOK_API_WINDOW_SECONDS = 3600  # 1小时窗口
 INSTAGRAM_API_RATE_LIMIT = 200  # Instagram使用相同的限制
 INSTAGRAM_API_WINDOW_SECONDS = 3600
-
+RATE_LIMIT_ACQUIRE_TIMEOUT_SECONDS = 60  # 等待限流配额的最长时间，超过后放弃本次发送（由入站队列重试）
+RATE_LIMIT_MAX_KEYS = 10000  # 进程内限流器超过该键数时清理已恢复的键
+RATE_LIMIT_REDIS_KEY_PREFIX = "ratelimit:"
+
+# 出站HTTP连接池（Graph API / Telegram）
+HTTP_POOL_HOST_MAX_CONNECTIONS = {  # 按主机的最大并发连接数
+    "graph.facebook.com": 50,
+    "graph.instagram.com": 20,
+    "api.telegram.org": 10,
+}
+HTTP_POOL_DEFAULT_MAX_CONNECTIONS = 20  # 未单独配置主机的最大连接数
+HTTP_POOL_MAX_KEEPALIVE_CONNECTIONS = 20  # 每个主机保持的空闲连接数
+HTTP_POOL_KEEPALIVE_EXPIRY_SECONDS = 60.0  # 空闲连接保持时间
+
+# Graph API 用量自适应节流（依据 X-App-Usage / X-Business-Use-Case-Usage 响应头）
+GRAPH_USAGE_SLOWDOWN_PERCENT = 70  # 用量超过该百分比后开始降低并发
+GRAPH_USAGE_THROTTLE_PERCENT = 90  # 用量超过该百分比后串行请求并在请求间等待
+GRAPH_USAGE_MAX_DELAY_SECONDS = 30.0  # 节流时单次请求前的最长等待时间
+GRAPH_USAGE_STALE_SECONDS = 300  # 超过该时间未更新的用量数据视为过期
+
+# 自动回复扫描
+AUTO_REPLY_PAGE_CONCURRENCY = 3  # 同时扫描的页面数
+AUTO_REPLY_CONVERSATION_CONCURRENCY = 5  # 单个页面同时拉取的对话消息数（用量升高时自动降低）
+AUTO_REPLY_MESSAGE_CONCURRENCY = 5  # 单个页面同时处理的未回复消息数
+
+
+# 缓存
+CACHE_DEFAULT_MAX_SIZE = 10000  # 每个内存缓存的最大条目数（超过后按LRU淘汰）
+
+# AI回复缓存
+REPLY_CACHE_TTL_SECONDS = 3600  # 缓存回复的有效期
+REPLY_CACHE_MAX_SIZE = 5000  # 内存和持久化文件中的最大条目数（超过后按LRU淘汰）
+REPLY_CACHE_HISTORY_MESSAGES = 4  # 参与缓存键的最近历史消息数
+SEMANTIC_CACHE_DIMENSIONS = 1024  # 语义缓存的向量维度（字符n-gram哈希桶数）
+SEMANTIC_CACHE_MAX_ENTRIES = 50000  # 语义缓存索引的最大条目数（达到后不再追加）
+SEMANTIC_CACHE_DUPLICATE_SIMILARITY = 0.99  # 与已有条目相似度达到该值时不重复加入
+
+# 对话历史窗口
+CONVERSATION_HISTORY_WINDOW = 10  # 每位客户保留的最近对话记录数（生成回复时使用的历史）
+CONVERSATION_HISTORY_TTL_SECONDS = 1800  # 客户无新消息超过该时间后释放窗口
+CONVERSATION_HISTORY_REDIS_KEY_PREFIX = "history:"
+
+# 后台调度器主节点选举（多工作进程部署时只有一个进程运行调度器）
+LEADER_ELECTION_INTERVAL_SECONDS = 10  # 获取/确认主节点身份的间隔
+LEADER_LEASE_TTL_SECONDS = 30  # 租约有效期（主节点崩溃后其他进程最多等待该时间接管）
+LEADER_LEASE_NAME = "schedulers"
+LEADER_ELECTION_LOCK_KEY = 7262651338  # PostgreSQL advisory lock 的键
+
+# 启动
+LAZY_ROUTER_WARMUP_DELAY_SECONDS = 5.0  # 启动完成后延迟多久在后台预加载管理/监控路由和AI SDK
+LAZY_ROUTER_WARMUP_MODULES = ("openai", "src.ai.reply_generator")  # 预加载的重量级模块（首条消息不再承担导入耗时）
+STARTUP_PROFILE_TOP_MODULES = 25  # 启动耗时分析报告中列出的最慢模块数
+
+# 指标（/metrics 直方图的固定桶上界，修改后各工作进程的快照在全部重启前无法合并）
+METRICS_LATENCY_BUCKETS_SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRICS_DB_BUCKETS_SECONDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+METRICS_TOKEN_BUCKETS = (50, 100, 200, 400, 800, 1200, 1600, 2400, 3200, 4800)
+METRICS_RESPONSE_TIME_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+METRICS_SNAPSHOT_INTERVAL_SECONDS = 15  # 配置 METRICS_SHARED_DIR 时每个工作进程写入快照的间隔
+METRICS_SNAPSHOT_MAX_AGE_SECONDS = 60  # 超过该时间未更新的快照视为进程已退出，不再合并
+
+# 统计
+STATISTICS_RECONCILE_INTERVAL_SECONDS = 900  # 每日统计对账（从明细表全量重算）间隔
+FREQUENT_QUESTION_MAX_SAMPLE_RESPONSES = 5  # 每个高频问题保留的最近示例回复数
+
+# 关键词索引
+KEYWORD_INDEX_RELOAD_CHECK_SECONDS = 5.0  # 检查 config.yaml 是否修改（修改后重新编译关键词索引）的最短间隔
+
+# 遥测明细写后缓冲（APIUsageLog / PromptUsageLog / CustomerInteraction）
+WRITE_BEHIND_BATCH_SIZE = 200  # 积压达到该行数时立即批量写入
+WRITE_BEHIND_FLUSH_INTERVAL_SECONDS = 2.0  # 定时批量写入间隔
+WRITE_BEHIND_MAX_PENDING = 10000  # 最大积压行数（数据库不可用时超过后丢弃新行）
+WRITE_BEHIND_MAX_ATTEMPTS = 3  # 同一批行的最大写入次数
+
+# Webhook入站队列
+INGEST_QUEUE_BATCH_SIZE = 20  # 单次从数据库领取的最大消息数
+INGEST_QUEUE_POLL_INTERVAL_SECONDS = 1.0  # 队列空闲时的轮询间隔（新消息入队会立即唤醒）
+INGEST_QUEUE_VISIBILITY_TIMEOUT_SECONDS = 300  # 领取后未ack的消息超过该时间会被重新投递
+INGEST_QUEUE_MAX_ATTEMPTS = MAX_RETRY_ATTEMPTS  # 超过该投递次数的消息标记为failed（死信）
+INGEST_QUEUE_SHUTDOWN_TIMEOUT_SECONDS = 20  # 关闭时等待处理中消息完成的最长时间
+INGEST_QUEUE_BACKLOG_REFRESH_SECONDS = 5.0  # 本地积压计数的最长有效期，过期后入队前从数据库重新统计（多进程共享积压）
+INGEST_QUEUE_BACKLOG_RECHECK_RATIO = 0.8  # 本地积压计数达到上限的该比例时，每次入队都从数据库重新统计
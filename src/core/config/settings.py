@@ -29,12 +29,14 @@ class Settings(BaseSettings):
     # Database
     database_url: str = Field(..., env="DATABASE_URL")
     database_echo: bool = Field(False, env="DATABASE_ECHO")
+    database_async: bool = Field(False, env="DATABASE_ASYNC")  # 消息管道使用异步会话（需安装asyncpg/aiosqlite）
     
     # Facebook
     facebook_app_id: str = Field(..., env="FACEBOOK_APP_ID")
     facebook_app_secret: str = Field(..., env="FACEBOOK_APP_SECRET")
     facebook_access_token: str = Field(..., env="FACEBOOK_ACCESS_TOKEN")
     facebook_verify_token: str = Field(..., env="FACEBOOK_VERIFY_TOKEN")
+    facebook_graph_api_url: Optional[str] = Field(None, env="FACEBOOK_GRAPH_API_URL")  # 覆盖Graph API根地址（含版本号，基准测试时指向本地模拟服务）
     
     # Instagram (可选，如果未设置则使用Facebook的配置)
     instagram_access_token: Optional[str] = Field(None, env="INSTAGRAM_ACCESS_TOKEN")
@@ -44,11 +46,21 @@ class Settings(BaseSettings):
     # OpenAI
     openai_api_key: str = Field(..., env="OPENAI_API_KEY")
     openai_model: str = Field("gpt-4o-mini", env="OPENAI_MODEL")
+    openai_base_url: Optional[str] = Field(None, env="OPENAI_BASE_URL")  # 兼容OpenAI接口的服务地址（不设置时使用官方地址）
     openai_temperature: float = Field(0.7, env="OPENAI_TEMPERATURE")
+    openai_async_client: bool = Field(True, env="OPENAI_ASYNC_CLIENT")  # 使用共享AsyncOpenAI客户端（false时在线程池中调用同步客户端）
+    openai_timeout: float = Field(20.0, env="OPENAI_TIMEOUT")  # 单次请求超时（秒）
+    openai_max_concurrency: int = Field(8, env="OPENAI_MAX_CONCURRENCY")  # 同时进行的最大请求数
+    reply_cache_enabled: bool = Field(True, env="REPLY_CACHE_ENABLED")  # 相同提示词版本+相同消息+相同近期历史时复用AI回复
+    reply_cache_path: Optional[str] = Field(None, env="REPLY_CACHE_PATH")  # 回复缓存的SQLite持久化文件（不设置时只缓存在内存）
+    semantic_cache_enabled: bool = Field(False, env="SEMANTIC_CACHE_ENABLED")  # 首次咨询与历史消息足够相似时复用回复（需安装numpy）
+    semantic_cache_path: Optional[str] = Field(None, env="SEMANTIC_CACHE_PATH")  # 语义缓存索引目录（不设置时只保存在内存）
+    semantic_cache_threshold: float = Field(0.9, env="SEMANTIC_CACHE_THRESHOLD")  # 余弦相似度阈值（页面可单独配置）
     
     # Telegram
     telegram_bot_token: str = Field(..., env="TELEGRAM_BOT_TOKEN")
     telegram_chat_id: str = Field(..., env="TELEGRAM_CHAT_ID")
+    telegram_api_url: str = Field("https://api.telegram.org", env="TELEGRAM_API_URL")
     
     # ManyChat
     manychat_api_key: Optional[str] = Field(None, env="MANYCHAT_API_KEY")
@@ -58,10 +70,35 @@ class Settings(BaseSettings):
     botcake_api_key: Optional[str] = Field(None, env="BOTCAKE_API_KEY")
     botcake_api_url: str = Field("https://api.botcake.com", env="BOTCAKE_API_URL")
     
+    # Webhook入站队列
+    ingest_queue_enabled: bool = Field(True, env="INGEST_QUEUE_ENABLED")
+    ingest_queue_workers: int = Field(4, env="INGEST_QUEUE_WORKERS")  # 并发处理消息的工作协程数
+    ingest_queue_max_pending: int = Field(5000, env="INGEST_QUEUE_MAX_PENDING")  # 积压上限，超过后Webhook返回503（0表示不限制）
+    
+    # 后台调度器（摘要通知、自动回复扫描、统计对账）只在选举出的主节点进程运行
+    scheduler_leader_election: bool = Field(True, env="SCHEDULER_LEADER_ELECTION")  # false时每个进程都运行调度器（仅单进程部署）
+    
+    # 统计
+    statistics_incremental: bool = Field(True, env="STATISTICS_INCREMENTAL")  # 每日统计增量更新（false时每条消息全量重算）
+    write_behind_enabled: bool = Field(True, env="WRITE_BEHIND_ENABLED")  # API用量/A/B使用/交互明细缓冲后批量写入
+    
+    # 出站限流（配置后多个工作进程共享Graph API配额，需安装redis）
+    rate_limit_redis_url: Optional[str] = Field(None, env="RATE_LIMIT_REDIS_URL")
+    # 对话历史窗口（配置后多个工作进程共享，需安装redis；未配置时保存在进程内）
+    conversation_history_redis_url: Optional[str] = Field(None, env="CONVERSATION_HISTORY_REDIS_URL")
+    
+    # 出站HTTP连接池
+    http_pool_http2: bool = Field(True, env="HTTP_POOL_HTTP2")  # 对Graph API/Telegram启用HTTP/2（需安装h2）
+    
     # Server
     host: str = Field("0.0.0.0", env="HOST")
     port: int = Field(8000, env="PORT")
+    web_concurrency: int = Field(1, env="WEB_CONCURRENCY")  # uvicorn 工作进程数
     debug: bool = Field(False, env="DEBUG")
+    log_format: str = Field("text", env="LOG_FORMAT")  # text 或 json（每行一个JSON对象，便于日志平台解析）
+    log_async: bool = Field(True, env="LOG_ASYNC")  # 日志在后台线程中脱敏、格式化和写入（false时在调用线程中同步写入）
+    lazy_routers: bool = Field(True, env="LAZY_ROUTERS")  # 管理/监控/统计路由在首次请求（或启动后后台预加载）时才导入
+    metrics_shared_dir: Optional[str] = Field(None, env="METRICS_SHARED_DIR")  # 多工作进程时各进程写入指标快照的目录，/metrics 合并所有进程
     
     # Security
     secret_key: str = Field(..., env="SECRET_KEY")
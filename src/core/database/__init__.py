@@ -1,5 +1,13 @@
 """数据库相关模块"""
-from .connection import engine, SessionLocal, Base, get_db
+from .connection import (
+    engine,
+    SessionLocal,
+    Base,
+    get_db,
+    get_async_engine,
+    get_async_session_factory,
+    get_async_db,
+)
 from .models import (
     Customer,
     Conversation,
@@ -10,6 +18,8 @@ from .models import (
     ReplyTemplate,
     PromptVersion,
     PromptUsageLog,
+    IngestMessage,
+    IngestStatus,
     MessageType,
     ReviewStatus,
     Priority,
@@ -21,6 +31,9 @@ __all__ = [
     'SessionLocal',
     'Base',
     'get_db',
+    'get_async_engine',
+    'get_async_session_factory',
+    'get_async_db',
     'Customer',
     'Conversation',
     'Review',
@@ -30,6 +43,8 @@ __all__ = [
     'ReplyTemplate',
     'PromptVersion',
     'PromptUsageLog',
+    'IngestMessage',
+    'IngestStatus',
     'MessageType',
     'ReviewStatus',
     'Priority',
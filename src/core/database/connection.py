@@ -3,6 +3,7 @@ from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
+from typing import Optional
 from src.core.config import settings
 from src.core.config.constants import (
     DB_POOL_SIZE,
@@ -66,3 +67,92 @@ def get_db():
     finally:
         db.close()
 
+
+
+# ---------------------------------------------------------------------------
+# 异步引擎（可选，DATABASE_ASYNC=true 时由消息管道使用）
+# PostgreSQL 使用 asyncpg，SQLite 使用 aiosqlite；首次使用时才创建，未安装驱动不影响同步路径
+# ---------------------------------------------------------------------------
+
+_async_engine = None
+_async_session_factory = None
+
+
+def get_async_database_url(database_url: Optional[str] = None) -> str:
+    """
+    将同步数据库URL转换为异步驱动URL
+    
+    Args:
+        database_url: 同步数据库URL（默认使用配置）
+        
+    Returns:
+        异步驱动URL
+    """
+    url = database_url or settings.database_url
+    if url.startswith("postgres://"):
+        # Heroku/Zeabur 风格的旧前缀
+        url = "postgresql://" + url[len("postgres://"):]
+    
+    if url.startswith("postgresql+asyncpg://") or url.startswith("sqlite+aiosqlite://"):
+        return url
+    if url.startswith("postgresql://"):
+        return "postgresql+asyncpg://" + url[len("postgresql://"):]
+    if url.startswith("postgresql+psycopg2://"):
+        return "postgresql+asyncpg://" + url[len("postgresql+psycopg2://"):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+
+def get_async_engine():
+    """获取异步数据库引擎（懒加载）"""
+    global _async_engine
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        
+        async_url = get_async_database_url()
+        if "sqlite" in async_url:
+            _async_engine = create_async_engine(
+                async_url,
+                echo=settings.database_echo,
+                poolclass=NullPool,
+            )
+        else:
+            _async_engine = create_async_engine(
+                async_url,
+                echo=settings.database_echo,
+                **pool_config,
+                # asyncpg 通过 server_settings 设置会话时区
+                connect_args={"server_settings": {"timezone": "UTC"}},
+            )
+    return _async_engine
+
+
+def get_async_session_factory():
+    """获取异步会话工厂（懒加载）"""
+    global _async_session_factory
+    if _async_session_factory is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+        
+        # expire_on_commit=False：提交后对象属性仍可直接访问（异步会话中无法隐式刷新）
+        _async_session_factory = async_sessionmaker(
+            bind=get_async_engine(),
+            autoflush=False,
+            expire_on_commit=False,
+        )
+    return _async_session_factory
+
+
+async def get_async_db():
+    """获取异步数据库会话"""
+    async with get_async_session_factory()() as db:
+        yield db
+
+
+async def dispose_async_engine():
+    """释放异步引擎连接池（应用关闭时调用）"""
+    global _async_engine, _async_session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = None
+    _async_session_factory = None
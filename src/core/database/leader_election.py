@@ -0,0 +1,304 @@
+"""后台调度器的主节点选举
+
+多个工作进程（uvicorn --workers N / WEB_CONCURRENCY）都会处理请求，但摘要通知、
+自动回复扫描和统计对账只应由一个进程运行，否则页面扫描、Graph API调用和Telegram摘要会重复N次。
+
+- PostgreSQL：在一个专用连接上持有会话级 advisory lock（pg_try_advisory_lock），
+  主节点进程退出或连接断开时数据库自动释放锁
+- 其他数据库（SQLite）：scheduler_leases 表中的租约行，主节点定期续约，
+  租约过期（主节点崩溃或卡住）后其他进程接管
+- 每个进程定期尝试获取/确认主节点身份：当选时启动调度器，失去身份时停止调度器
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from src.core.config.constants import (
+    LEADER_ELECTION_INTERVAL_SECONDS,
+    LEADER_ELECTION_LOCK_KEY,
+    LEADER_LEASE_NAME,
+    LEADER_LEASE_TTL_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def default_holder_id() -> str:
+    """当前进程的标识（主机名:进程号:随机后缀）"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class AdvisoryLockBackend:
+    """PostgreSQL 会话级 advisory lock（锁随专用连接存在）"""
+
+    name = "advisory_lock"
+
+    def __init__(self, engine: Any, lock_key: int = LEADER_ELECTION_LOCK_KEY):
+        self.engine = engine
+        self.lock_key = lock_key
+        self._conn = None
+
+    def acquire(self, holder_id: str) -> bool:
+        """尝试获取锁（已持有时确认连接仍然可用）"""
+        if self._conn is not None:
+            try:
+                self._conn.execute(text("SELECT 1"))
+                self._conn.commit()
+                return True
+            except Exception as e:
+                logger.warning(f"Lost leader advisory lock connection: {e}")
+                self._close()
+                return False
+
+        conn = self.engine.connect()
+        try:
+            acquired = conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": self.lock_key}).scalar()
+            conn.commit()
+        except Exception:
+            conn.close()
+            raise
+        if not acquired:
+            conn.close()
+            return False
+        self._conn = conn
+        return True
+
+    def release(self, holder_id: str) -> None:
+        if self._conn is None:
+            return
+        try:
+            self._conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.lock_key})
+            self._conn.commit()
+        except Exception as e:
+            logger.warning(f"Failed to release leader advisory lock: {e}")
+        finally:
+            self._close()
+
+    def _close(self) -> None:
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+
+
+class LeaseBackend:
+    """scheduler_leases 表中的租约行（适用于SQLite等不支持advisory lock的数据库）"""
+
+    name = "lease"
+
+    def __init__(
+        self,
+        session_factory: Callable,
+        lease_name: str = LEADER_LEASE_NAME,
+        ttl_seconds: float = LEADER_LEASE_TTL_SECONDS
+    ):
+        self.session_factory = session_factory
+        self.lease_name = lease_name
+        self.ttl_seconds = ttl_seconds
+
+    def acquire(self, holder_id: str) -> bool:
+        """获取或续约租约：租约由自己持有或已过期时更新，不存在时创建"""
+        from src.core.database.models import SchedulerLease
+
+        now = _utcnow()
+        expires_at = now + timedelta(seconds=self.ttl_seconds)
+        db = self.session_factory()
+        try:
+            updated = db.query(SchedulerLease)\
+                .filter(
+                    SchedulerLease.name == self.lease_name,
+                    (SchedulerLease.holder_id == holder_id) | (SchedulerLease.expires_at < now)
+                )\
+                .update({"holder_id": holder_id, "expires_at": expires_at}, synchronize_session=False)
+            if updated:
+                db.commit()
+                return True
+            if db.get(SchedulerLease, self.lease_name) is not None:
+                db.rollback()
+                return False
+            db.add(SchedulerLease(name=self.lease_name, holder_id=holder_id, expires_at=expires_at))
+            try:
+                db.commit()
+                return True
+            except IntegrityError:
+                db.rollback()
+                return False
+        finally:
+            db.close()
+
+    def release(self, holder_id: str) -> None:
+        """释放租约（置为已过期，其他进程下次检查时即可接管）"""
+        from src.core.database.models import SchedulerLease
+
+        db = self.session_factory()
+        try:
+            db.query(SchedulerLease)\
+                .filter(SchedulerLease.name == self.lease_name, SchedulerLease.holder_id == holder_id)\
+                .update({"expires_at": _utcnow() - timedelta(seconds=1)}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+
+def create_leader_backend(engine: Any = None, session_factory: Optional[Callable] = None):
+    """按数据库类型创建选举后端：PostgreSQL 使用 advisory lock，其他数据库使用租约行"""
+    if engine is None or session_factory is None:
+        from src.core.database.connection import SessionLocal, engine as default_engine
+        engine = engine or default_engine
+        session_factory = session_factory or SessionLocal
+    if engine.dialect.name == "postgresql":
+        return AdvisoryLockBackend(engine)
+    return LeaseBackend(session_factory)
+
+
+class LeaderElector:
+    """
+    主节点选举循环
+
+    每 interval_seconds 尝试获取（或确认、续约）主节点身份；当选后调用 on_elected，
+    失去身份或停止时调用 on_demoted。后端出错按失去身份处理，避免两个进程同时运行调度器。
+    """
+
+    def __init__(
+        self,
+        backend: Any = None,
+        on_elected: Optional[Callable[[], Awaitable[None]]] = None,
+        on_demoted: Optional[Callable[[], Awaitable[None]]] = None,
+        holder_id: Optional[str] = None,
+        interval_seconds: float = LEADER_ELECTION_INTERVAL_SECONDS
+    ):
+        """
+        Args:
+            backend: 选举后端（默认按数据库类型创建）
+            on_elected: 当选时调用的协程函数
+            on_demoted: 失去主节点身份时调用的协程函数
+            holder_id: 当前进程标识（默认在首次选举时生成，fork出的工作进程各不相同）
+            interval_seconds: 检查间隔（应小于租约有效期）
+        """
+        self._backend = backend
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.holder_id = holder_id
+        self.interval_seconds = interval_seconds
+        self.is_leader = False
+        self.leader_since: Optional[datetime] = None
+        self.last_check: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.elections = 0
+        self.running = False
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = create_leader_backend()
+        return self._backend
+
+    async def start(self):
+        """启动选举循环（立即进行第一次选举）"""
+        if self.running:
+            return
+        self.running = True
+        await self.check()
+        self.task = asyncio.create_task(self._run_periodic())
+        logger.info(f"Leader election started (holder {self.holder_id}, backend {self.backend.name})")
+
+    async def stop(self):
+        """停止选举循环，是主节点时先停止调度器再释放身份"""
+        if not self.running:
+            return
+        self.running = False
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        if self.is_leader:
+            await self._demote()
+            try:
+                await self._run_backend(self.backend.release, self.holder_id)
+            except Exception as e:
+                logger.warning(f"Failed to release scheduler leadership: {e}")
+
+    async def check(self) -> bool:
+        """获取或确认主节点身份，返回当前是否为主节点"""
+        if self.holder_id is None:
+            self.holder_id = default_holder_id()
+        try:
+            acquired = await self._run_backend(self.backend.acquire, self.holder_id)
+            self.last_error = None
+        except Exception as e:
+            logger.warning(f"Leader election check failed: {e}")
+            self.last_error = str(e)
+            acquired = False
+        self.last_check = _utcnow()
+
+        if acquired and not self.is_leader:
+            self.is_leader = True
+            self.leader_since = self.last_check
+            self.elections += 1
+            logger.info(f"This worker ({self.holder_id}) is now the scheduler leader")
+            if self.on_elected:
+                try:
+                    await self.on_elected()
+                except Exception as e:
+                    logger.error(f"Failed to start leader tasks: {e}", exc_info=True)
+        elif not acquired and self.is_leader:
+            logger.warning(f"This worker ({self.holder_id}) lost scheduler leadership")
+            await self._demote()
+        return self.is_leader
+
+    async def _demote(self):
+        self.is_leader = False
+        self.leader_since = None
+        if self.on_demoted:
+            try:
+                await self.on_demoted()
+            except Exception as e:
+                logger.error(f"Failed to stop leader tasks: {e}", exc_info=True)
+
+    async def _run_backend(self, func: Callable, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+    async def _run_periodic(self):
+        while self.running:
+            try:
+                await asyncio.sleep(self.interval_seconds)
+                await self.check()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Leader election loop error: {e}", exc_info=True)
+
+    def get_status(self) -> Dict[str, Any]:
+        """主节点状态（用于 /health）"""
+        return {
+            "enabled": self.running,
+            "is_leader": self.is_leader,
+            "holder_id": self.holder_id,
+            "backend": self._backend.name if self._backend is not None else None,
+            "leader_since": self.leader_since.isoformat() if self.leader_since else None,
+            "last_check": self.last_check.isoformat() if self.last_check else None,
+            "last_error": self.last_error,
+            "elections": self.elections,
+        }
+
+
+# 全局选举实例（回调由 main.py 在启动时设置）
+scheduler_leader = LeaderElector()
@@ -63,6 +63,9 @@ class Customer(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    # 首次发送含Telegram群组链接的回复的时间（为空表示尚未发送）
+    telegram_invite_sent_at = Column(DateTime(timezone=True))
+
     # 关系
     conversations = relationship("Conversation", back_populates="customer")
     reviews = relationship("Review", back_populates="customer")
@@ -109,6 +112,11 @@ class Conversation(Base):
     collected_data = relationship(
         "CollectedData", back_populates="conversation")
 
+    __table_args__ = (
+        # 同一平台消息只保存一条（入站队列重投、自动回复扫描同步时去重）
+        Index('idx_conversations_platform_message', 'platform', 'platform_message_id', unique=True),
+    )
+
 
 class CollectedData(Base):
     """收集的资料表"""
@@ -268,4 +276,40 @@ class PromptUsageLog(Base):
     
     __table_args__ = (
         Index('idx_prompt_usage_version_date', 'prompt_version_id', 'used_at'),
-    )
\ No newline at end of file
+    )
+
+class IngestStatus(str, enum.Enum):
+    """入站队列消息状态枚举"""
+    PENDING = "pending"  # 等待处理
+    PROCESSING = "processing"  # 已被工作协程领取
+    FAILED = "failed"  # 超过最大重试次数（死信）
+
+
+class IngestMessage(Base):
+    """Webhook入站消息队列表（持久化，进程重启不丢消息）"""
+    __tablename__ = "ingest_queue"
+
+    id = Column(Integer, primary_key=True, index=True)
+    platform = Column(String(50), nullable=False)  # facebook, instagram
+    payload = Column(JSON, nullable=False)  # 解析后的消息数据
+    status = Column(String(20), nullable=False, default=IngestStatus.PENDING.value)
+    attempts = Column(Integer, nullable=False, default=0)  # 已投递次数
+    lock_token = Column(String(36))  # 领取令牌（用于ack校验，防止超时重投后误删）
+    locked_at = Column(DateTime(timezone=True))  # 领取时间（用于可见性超时）
+    available_at = Column(DateTime(timezone=True), nullable=False)  # 可被领取的最早时间（重试退避）
+    last_error = Column(Text)  # 最后一次失败原因
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index('idx_ingest_queue_status_available', 'status', 'available_at'),
+    )
+
+
+class SchedulerLease(Base):
+    """后台调度器主节点租约（不支持advisory lock的数据库使用，见 leader_election.py）"""
+    __tablename__ = "scheduler_leases"
+
+    name = Column(String(50), primary_key=True)  # 租约名称
+    holder_id = Column(String(200), nullable=False)  # 持有租约的进程标识
+    expires_at = Column(DateTime(timezone=True), nullable=False)  # 租约到期时间（到期前需续约）
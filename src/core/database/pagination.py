@@ -0,0 +1,209 @@
+"""键集（游标）分页工具
+
+OFFSET 分页需要扫描并丢弃前面所有行，页码越深越慢；同时每次 count() 都要全表统计。
+键集分页按 (排序列, id) 定位到上一页最后一行之后，任意深度的页面开销相同。
+"""
+import base64
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+from src.core.exceptions import ValidationError
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Page:
+    """一页查询结果"""
+    items: List[Any]
+    next_cursor: Optional[str]  # 下一页游标，没有更多数据时为None
+    has_more: bool
+    total: Optional[int] = None  # 仅在请求总数时提供
+    total_is_estimate: bool = False
+
+
+def encode_cursor(*values: Any) -> str:
+    """将排序键编码为不透明游标（URL安全的base64）"""
+    payload = [
+        {"dt": value.isoformat()} if isinstance(value, datetime) else value
+        for value in values
+    ]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int = 2) -> List[Any]:
+    """
+    解码游标
+
+    Raises:
+        ValidationError: 游标格式无效
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw.decode("utf-8"))
+        if not isinstance(payload, list) or len(payload) != size:
+            raise ValueError("unexpected cursor size")
+        return [
+            datetime.fromisoformat(value["dt"]) if isinstance(value, dict) else value
+            for value in payload
+        ]
+    except (ValueError, TypeError, KeyError, UnicodeDecodeError):
+        raise ValidationError("无效的分页游标", field="cursor")
+
+
+def keyset_page(
+    query: Query,
+    sort_column: Any,
+    id_column: Any,
+    limit: int,
+    cursor: Optional[str] = None,
+    descending: bool = True
+) -> Page:
+    """
+    按 (sort_column, id_column) 键集分页
+
+    排序列为NULL的行无法稳定定位，不参与键集分页。
+
+    Args:
+        query: 已应用过滤条件的查询
+        sort_column: 排序列（如 received_at）
+        id_column: 主键列（用于打破排序列相同的并列）
+        limit: 每页数量
+        cursor: 上一页返回的 next_cursor，None 表示第一页
+        descending: 是否倒序
+
+    Returns:
+        Page
+    """
+    query = _sortable(query, sort_column)
+    if cursor:
+        sort_value, id_value = decode_cursor(cursor)
+        if descending:
+            query = query.filter(or_(
+                sort_column < sort_value,
+                and_(sort_column == sort_value, id_column < id_value)
+            ))
+        else:
+            query = query.filter(or_(
+                sort_column > sort_value,
+                and_(sort_column == sort_value, id_column > id_value)
+            ))
+
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    return _build_page(query.limit(limit + 1).all(), limit, sort_column, id_column)
+
+
+def offset_page(
+    query: Query,
+    sort_column: Any,
+    id_column: Any,
+    limit: int,
+    offset: int,
+    descending: bool = True
+) -> Page:
+    """
+    兼容旧的页码/偏移量分页（不做count，多取一行判断是否还有下一页）
+
+    与键集分页相同，排序列为NULL的行不参与分页；返回的 next_cursor 可以让调用方
+    从任意页切换到键集分页。
+    """
+    query = _sortable(query, sort_column)
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+    return _build_page(query.offset(offset).limit(limit + 1).all(), limit, sort_column, id_column)
+
+
+def _sortable(query: Query, sort_column: Any) -> Query:
+    """排除排序列为NULL的行（两种分页方式返回同一组数据）"""
+    return query.filter(sort_column.isnot(None))
+
+
+def _build_page(rows: List[Any], limit: int, sort_column: Any, id_column: Any) -> Page:
+    has_more = len(rows) > limit
+    items = rows[:limit]
+    next_cursor = None
+    if has_more and items:
+        last = items[-1]
+        sort_value = getattr(last, sort_column.key)
+        if sort_value is not None:
+            next_cursor = encode_cursor(sort_value, getattr(last, id_column.key))
+    return Page(items=items, next_cursor=next_cursor, has_more=has_more)
+
+
+def paginate(
+    query: Query,
+    sort_column: Any,
+    id_column: Any,
+    limit: int,
+    cursor: Optional[str] = None,
+    offset: int = 0,
+    with_total: bool = False,
+    descending: bool = True
+) -> Page:
+    """
+    分页入口：有游标或从第一页开始时使用键集分页，否则使用兼容的偏移量分页
+
+    Args:
+        query: 已应用过滤条件的查询
+        sort_column: 排序列
+        id_column: 主键列
+        limit: 每页数量
+        cursor: 游标
+        offset: 偏移量（仅在没有游标时使用）
+        with_total: 是否返回总数（PostgreSQL为规划器估计值）
+        descending: 是否倒序
+
+    Returns:
+        Page
+    """
+    if cursor or offset <= 0:
+        page = keyset_page(query, sort_column, id_column, limit, cursor, descending)
+    else:
+        page = offset_page(query, sort_column, id_column, limit, offset, descending)
+    if with_total:
+        page.total, page.total_is_estimate = estimate_count(_sortable(query, sort_column))
+    return page
+
+
+def estimate_count(query: Query) -> Tuple[int, bool]:
+    """
+    估算查询结果总数
+
+    PostgreSQL 使用查询规划器的行数估计（EXPLAIN，不扫描数据）；
+    其他数据库或估算失败时退回精确的 count()。
+
+    Returns:
+        (总数, 是否为估计值)
+    """
+    session = query.session
+    try:
+        bind = session.get_bind()
+        if bind.dialect.name == "postgresql":
+            compiled = query.order_by(None).statement.compile(
+                dialect=bind.dialect,
+                compile_kwargs={"literal_binds": True}
+            )
+            # 使用保存点：EXPLAIN 失败时不影响外层事务
+            with session.begin_nested():
+                plan = session.connection().exec_driver_sql(
+                    f"EXPLAIN (FORMAT JSON) {compiled}"
+                ).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]["Plan"]["Plan Rows"]), True
+    except Exception as e:
+        logger.debug(f"Planner row estimate unavailable, using count(): {e}")
+    return query.order_by(None).count(), False
@@ -0,0 +1,63 @@
+"""列表接口使用的只读模型 - 只查询需要的列，不构造ORM实例"""
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """数据库返回无时区的时间时按UTC处理"""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _enum_value(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return value.value if hasattr(value, "value") else str(value)
+
+
+@dataclass(frozen=True)
+class AIReplyListItem:
+    """AI回复列表的一行（对话列 + customers.name）"""
+    id: int
+    customer_id: int
+    customer_name: Optional[str]
+    platform: Any
+    message_type: Any
+    user_message: Optional[str]  # 已在数据库端截断
+    ai_reply_content: Optional[str]
+    ai_reply_at: Optional[datetime]
+    received_at: Optional[datetime]
+
+    @classmethod
+    def from_row(cls, row: Any) -> "AIReplyListItem":
+        """从投影查询结果行创建"""
+        return cls(
+            id=row.id,
+            customer_id=row.customer_id,
+            customer_name=row.customer_name,
+            platform=row.platform,
+            message_type=row.message_type,
+            user_message=row.user_message,
+            ai_reply_content=row.ai_reply_content,
+            ai_reply_at=row.ai_reply_at,
+            received_at=row.received_at,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为接口响应格式（时间为带时区的ISO格式）"""
+        ai_reply_at = _as_utc(self.ai_reply_at)
+        received_at = _as_utc(self.received_at)
+        return {
+            "id": self.id,
+            "conversation_id": self.id,
+            "customer_id": self.customer_id,
+            "customer_name": self.customer_name,
+            "platform": _enum_value(self.platform),
+            "message_type": _enum_value(self.message_type),
+            "user_message": self.user_message or None,
+            "ai_reply": self.ai_reply_content,
+            "ai_reply_at": ai_reply_at.isoformat() if ai_reply_at else None,
+            "received_at": received_at.isoformat() if received_at else None,
+        }
@@ -1,11 +1,15 @@
 """数据访问层 - Repository模式"""
-from .base import BaseRepository
-from .customer_repo import CustomerRepository
-from .conversation_repo import ConversationRepository
+from .base import BaseRepository, AsyncBaseRepository
+from .customer_repo import CustomerRepository, AsyncCustomerRepository
+from .conversation_repo import ConversationRepository, AsyncConversationRepository
 from .statistics_repo import (
     DailyStatisticsRepository,
     CustomerInteractionRepository,
-    FrequentQuestionRepository
+    FrequentQuestionRepository,
+    AIReplyRollupRepository,
+    AsyncDailyStatisticsRepository,
+    AsyncCustomerInteractionRepository,
+    AsyncFrequentQuestionRepository
 )
 from .collected_data_repo import CollectedDataRepository
 from .review_repo import ReviewRepository
@@ -17,7 +21,14 @@ __all__ = [
     'DailyStatisticsRepository',
     'CustomerInteractionRepository',
     'FrequentQuestionRepository',
+    'AIReplyRollupRepository',
     'CollectedDataRepository',
     'ReviewRepository',
+    'AsyncBaseRepository',
+    'AsyncCustomerRepository',
+    'AsyncConversationRepository',
+    'AsyncDailyStatisticsRepository',
+    'AsyncCustomerInteractionRepository',
+    'AsyncFrequentQuestionRepository',
 ]
 
@@ -1,18 +1,79 @@
 """Repository基类"""
+import functools
+import inspect
 import time
 import logging
+from contextvars import ContextVar
 from typing import Generic, TypeVar, Type, Optional, List, Dict, Any
+from sqlalchemy import select, func
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 from src.core.database.connection import Base
 from src.core.exceptions import DatabaseError
+from src.monitoring.metrics import db_query_seconds
 
 logger = logging.getLogger(__name__)
 
 ModelType = TypeVar("ModelType", bound=Base)
 
+# 当前是否已在某个Repository方法内（嵌套调用如 update -> get 只按最外层方法计时一次）
+_in_repository_call: ContextVar[bool] = ContextVar("in_repository_call", default=False)
 
-class BaseRepository(Generic[ModelType]):
+
+def _timed(func):
+    """记录Repository公开方法的耗时到 db_query_duration_seconds（标签为具体Repository类名和方法名）"""
+    method = func.__name__
+    
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(self, *args, **kwargs):
+            if _in_repository_call.get():
+                return await func(self, *args, **kwargs)
+            token = _in_repository_call.set(True)
+            started = time.perf_counter()
+            try:
+                return await func(self, *args, **kwargs)
+            finally:
+                db_query_seconds.observe(
+                    time.perf_counter() - started, repository=type(self).__name__, method=method)
+                _in_repository_call.reset(token)
+        async_wrapper.__timed__ = True
+        return async_wrapper
+    
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if _in_repository_call.get():
+            return func(self, *args, **kwargs)
+        token = _in_repository_call.set(True)
+        started = time.perf_counter()
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            db_query_seconds.observe(
+                time.perf_counter() - started, repository=type(self).__name__, method=method)
+            _in_repository_call.reset(token)
+    wrapper.__timed__ = True
+    return wrapper
+
+
+def _instrument_methods(cls) -> None:
+    """为类中直接定义的公开方法加上计时（子类通过 __init_subclass__ 自动处理）"""
+    for name, value in list(vars(cls).items()):
+        if name.startswith("_") or not inspect.isfunction(value) or getattr(value, "__timed__", False):
+            continue
+        setattr(cls, name, _timed(value))
+
+
+class _TimedRepositoryMixin:
+    """子类定义时自动为其公开方法加上计时"""
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        _instrument_methods(cls)
+
+
+class BaseRepository(_TimedRepositoryMixin, Generic[ModelType]):
     """Repository基类 - 提供通用的数据访问方法"""
     
     def __init__(self, db: Session, model: Type[ModelType]):
@@ -186,3 +247,117 @@ class BaseRepository(Generic[ModelType]):
         except SQLAlchemyError as e:
             raise DatabaseError(f"Failed to count {self.model.__name__}: {str(e)}", operation="count")
 
+
+
+class AsyncBaseRepository(_TimedRepositoryMixin, Generic[ModelType]):
+    """异步Repository基类 - 基于AsyncSession，接口与BaseRepository保持一致"""
+    
+    def __init__(self, db: AsyncSession, model: Type[ModelType]):
+        """
+        初始化Repository
+        
+        Args:
+            db: 异步数据库会话
+            model: 数据模型类
+        """
+        self.db = db
+        self.model = model
+    
+    def _log_query_performance(self, operation: str, duration: float, threshold: float = 1.0):
+        """记录查询性能（如果超过阈值）"""
+        if duration > threshold:
+            logger.warning(
+                f"Slow query detected: {self.model.__name__}.{operation} "
+                f"took {duration:.3f}s (threshold: {threshold}s)"
+            )
+    
+    async def get(self, id: int) -> Optional[ModelType]:
+        """根据ID获取记录"""
+        start_time = time.time()
+        try:
+            result = await self.db.get(self.model, id)
+            self._log_query_performance("get", time.time() - start_time)
+            return result
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Failed to get {self.model.__name__}: {str(e)}", operation="get")
+    
+    async def get_by(self, **kwargs) -> Optional[ModelType]:
+        """根据条件获取单条记录"""
+        try:
+            result = await self.db.execute(select(self.model).filter_by(**kwargs).limit(1))
+            return result.scalars().first()
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Failed to get {self.model.__name__}: {str(e)}", operation="get_by")
+    
+    async def get_all(self, skip: int = 0, limit: int = 100, **kwargs) -> List[ModelType]:
+        """获取多条记录"""
+        start_time = time.time()
+        try:
+            stmt = select(self.model)
+            if kwargs:
+                stmt = stmt.filter_by(**kwargs)
+            result = await self.db.execute(stmt.offset(skip).limit(limit))
+            self._log_query_performance("get_all", time.time() - start_time)
+            return list(result.scalars().all())
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Failed to get all {self.model.__name__}: {str(e)}", operation="get_all")
+    
+    async def create(self, **kwargs) -> ModelType:
+        """创建新记录"""
+        try:
+            instance = self.model(**kwargs)
+            self.db.add(instance)
+            await self.db.commit()
+            await self.db.refresh(instance)
+            return instance
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise DatabaseError(f"Failed to create {self.model.__name__}: {str(e)}", operation="create")
+    
+    async def update(self, id: int, **kwargs) -> Optional[ModelType]:
+        """更新记录"""
+        try:
+            instance = await self.get(id)
+            if not instance:
+                return None
+            
+            for key, value in kwargs.items():
+                if hasattr(instance, key):
+                    setattr(instance, key, value)
+            
+            await self.db.commit()
+            await self.db.refresh(instance)
+            return instance
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise DatabaseError(f"Failed to update {self.model.__name__}: {str(e)}", operation="update")
+    
+    async def delete(self, id: int) -> bool:
+        """删除记录"""
+        try:
+            instance = await self.get(id)
+            if not instance:
+                return False
+            
+            await self.db.delete(instance)
+            await self.db.commit()
+            return True
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            raise DatabaseError(f"Failed to delete {self.model.__name__}: {str(e)}", operation="delete")
+    
+    async def count(self, **kwargs) -> int:
+        """统计记录数"""
+        try:
+            stmt = select(func.count()).select_from(self.model)
+            if kwargs:
+                stmt = stmt.filter_by(**kwargs)
+            result = await self.db.execute(stmt)
+            return result.scalar() or 0
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Failed to count {self.model.__name__}: {str(e)}", operation="count")
+
+
+# 基类自身的通用方法（子类中定义的方法由 __init_subclass__ 处理）
+_instrument_methods(BaseRepository)
+_instrument_methods(AsyncBaseRepository)
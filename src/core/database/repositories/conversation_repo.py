@@ -1,10 +1,16 @@
 """对话Repository"""
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from src.core.database.repositories.base import BaseRepository
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session, joinedload, contains_eager
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.core.database.repositories.base import BaseRepository, AsyncBaseRepository
 from src.core.database.models import Conversation, Customer, Platform, MessageType
+from src.core.database.pagination import Page, paginate
+from src.core.database.read_models import AIReplyListItem
+from src.core.config.constants import MAX_MESSAGE_PREVIEW_LENGTH
 from src.core.cache.cache_manager import conversation_cache
+from src.core.exceptions import DatabaseError
 
 
 class ConversationRepository(BaseRepository[Conversation]):
@@ -21,6 +27,9 @@ class ConversationRepository(BaseRepository[Conversation]):
         """
         根据平台消息ID获取对话（带缓存）
         
+        缓存中只保存 平台消息ID -> 对话ID 的映射（不会变化），返回的始终是绑定到
+        当前会话的ORM实例：命中时按主键从会话identity map读取，不再执行条件查询。
+        
         Args:
             platform: 平台类型
             platform_message_id: 平台消息ID
@@ -28,18 +37,14 @@ class ConversationRepository(BaseRepository[Conversation]):
         Returns:
             对话实例或None
         """
-        import asyncio
-        
-        # 生成缓存键
-        cache_key = f"conversation:{platform.value}:{platform_message_id}"
+        cache_key = ("conversation_id", platform.value, platform_message_id)
         
-        # 尝试从缓存获取
-        try:
-            cached = asyncio.run(conversation_cache.get(cache_key))
-            if cached:
-                return cached
-        except Exception:
-            pass  # 缓存失败不影响查询
+        conversation_id = conversation_cache.get_sync(cache_key)
+        if conversation_id is not None:
+            result = self.db.get(Conversation, conversation_id)
+            if result is not None and result.platform_message_id == platform_message_id:
+                return result
+            conversation_cache.delete_sync(cache_key)  # 记录已删除
         
         # 从数据库查询
         result = self.get_by(
@@ -49,14 +54,7 @@ class ConversationRepository(BaseRepository[Conversation]):
         
         # 缓存结果（如果存在）
         if result:
-            try:
-                asyncio.run(conversation_cache.set(
-                    cache_key,
-                    result,
-                    ttl=timedelta(minutes=5)
-                ))
-            except Exception:
-                pass  # 缓存失败不影响返回结果
+            conversation_cache.set_sync(cache_key, result.id, ttl=timedelta(minutes=5))
         
         return result
     
@@ -101,6 +99,45 @@ class ConversationRepository(BaseRepository[Conversation]):
         
         return self.create(**conversation_data)
     
+    def get_or_create_conversation(
+        self,
+        customer_id: int,
+        platform: Platform,
+        platform_message_id: str,
+        message_type: MessageType,
+        content: str,
+        raw_data: Optional[dict] = None,
+        **kwargs
+    ) -> Tuple[Conversation, bool]:
+        """
+        按平台消息ID获取对话，不存在时创建（同一条消息重复投递时复用已有记录）
+        
+        (platform, platform_message_id) 有唯一索引：并发插入同一条消息时，
+        插入失败的一方读取另一方已写入的记录。
+        
+        Returns:
+            (对话实例, 是否新创建)
+        """
+        if platform_message_id:
+            existing = self.get_by_platform_message_id(platform, platform_message_id)
+            if existing is not None:
+                return existing, False
+        try:
+            return self.create_conversation(
+                customer_id=customer_id,
+                platform=platform,
+                platform_message_id=platform_message_id,
+                message_type=message_type,
+                content=content,
+                raw_data=raw_data,
+                **kwargs
+            ), True
+        except DatabaseError:
+            existing = self.get_by_platform_message_id(platform, platform_message_id) if platform_message_id else None
+            if existing is None:
+                raise
+            return existing, False
+    
     def get_customer_conversations(
         self,
         customer_id: int,
@@ -121,7 +158,7 @@ class ConversationRepository(BaseRepository[Conversation]):
         # 使用索引优化查询：customer_id + received_at
         return self.db.query(self.model)\
             .filter(self.model.customer_id == customer_id)\
-            .order_by(self.model.received_at.desc())\
+            .order_by(self.model.received_at.desc(), self.model.id.desc())\
             .offset(skip)\
             .limit(limit)\
             .all()
@@ -172,7 +209,13 @@ class ConversationRepository(BaseRepository[Conversation]):
             更新的记录数
         """
         from datetime import datetime, timezone
+        from src.core.cache import get_history_store
         
+        customer_ids = [
+            row[0] for row in self.db.query(self.model.customer_id)
+            .filter(self.model.id.in_(conversation_ids))
+            .distinct()
+        ]
         updated = self.db.query(self.model)\
             .filter(self.model.id.in_(conversation_ids))\
             .update({
@@ -182,6 +225,10 @@ class ConversationRepository(BaseRepository[Conversation]):
             }, synchronize_session=False)
         
         self.db.commit()
+        # 批量更新不返回记录，删除相关客户的历史窗口，下次读取时重新加载
+        history_store = get_history_store()
+        for customer_id in customer_ids:
+            history_store.invalidate(customer_id)
         return updated
     
     def count_by_time_range(self, start_time: datetime) -> int:
@@ -279,13 +326,7 @@ class ConversationRepository(BaseRepository[Conversation]):
             (对话列表, 总数)
         """
         from sqlalchemy import desc
-        query = self.db.query(self.model)
-        
-        if status:
-            query = query.filter(self.model.status == status)
-        
-        if platform:
-            query = query.filter(self.model.platform == platform)
+        query = self._filtered_query(status, platform)
         
         total = query.count()
         
@@ -298,9 +339,51 @@ class ConversationRepository(BaseRepository[Conversation]):
         
         return conversations, total
     
+    def _filtered_query(self, status: Optional[str] = None, platform: Optional[Platform] = None):
+        query = self.db.query(self.model)
+        
+        if status:
+            query = query.filter(self.model.status == status)
+        
+        if platform:
+            query = query.filter(self.model.platform == platform)
+        
+        return query
+    
+    def list_page(
+        self,
+        status: Optional[str] = None,
+        platform: Optional[Platform] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        offset: int = 0,
+        with_total: bool = False
+    ) -> Page:
+        """
+        按 (received_at, id) 倒序分页获取对话列表（键集分页，不做全表count）
+        
+        Args:
+            status: 状态过滤
+            platform: 平台过滤
+            limit: 每页数量
+            cursor: 上一页返回的游标
+            offset: 没有游标时的偏移量（兼容页码分页）
+            with_total: 是否返回（估计的）总数
+            
+        Returns:
+            Page
+        """
+        return paginate(
+            self._filtered_query(status, platform),
+            self.model.received_at, self.model.id,
+            limit, cursor=cursor, offset=offset, with_total=with_total
+        )
+    
     def get_by_id_with_relations(self, conversation_id: int) -> Optional[Conversation]:
         """
-        根据ID获取对话（包含关联数据，带缓存）
+        根据ID获取对话（包含关联数据）
+        
+        ORM实例不跨会话缓存：同一会话内重复读取由identity map保证不重复查询。
         
         Args:
             conversation_id: 对话ID
@@ -308,34 +391,10 @@ class ConversationRepository(BaseRepository[Conversation]):
         Returns:
             对话实例或None
         """
-        import asyncio
-        
-        # 生成缓存键
-        cache_key = f"conversation:id:{conversation_id}"
-        
-        # 尝试从缓存获取
-        try:
-            cached = asyncio.run(conversation_cache.get(cache_key))
-            if cached:
-                return cached
-        except Exception:
-            pass
-        
-        # 从数据库查询
-        result = self.get_by_id(conversation_id)
-        
-        # 缓存结果（如果存在）
-        if result:
-            try:
-                asyncio.run(conversation_cache.set(
-                    cache_key,
-                    result,
-                    ttl=timedelta(minutes=5)
-                ))
-            except Exception:
-                pass
-        
-        return result
+        return self.db.query(Conversation)\
+            .options(joinedload(Conversation.customer))\
+            .filter(Conversation.id == conversation_id)\
+            .first()
     
     def count_by_time_range(self, start_time: datetime) -> int:
         """
@@ -427,8 +486,26 @@ class ConversationRepository(BaseRepository[Conversation]):
         Returns:
             (对话列表, 总数)
         """
+        query = self._ai_replied_query(start_date, end_date)
+        
+        total = query.count()
+        
+        conversations = query\
+            .order_by(self.model.ai_reply_at.desc())\
+            .offset(skip)\
+            .limit(limit)\
+            .all()
+        
+        return conversations, total
+    
+    def _ai_replied_query(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ):
         query = self.db.query(self.model)\
             .join(Customer, self.model.customer_id == Customer.id)\
+            .options(contains_eager(self.model.customer))\
             .filter(
                 self.model.ai_replied == True,
                 self.model.ai_reply_content.isnot(None)
@@ -440,13 +517,180 @@ class ConversationRepository(BaseRepository[Conversation]):
         if end_date:
             query = query.filter(self.model.ai_reply_at <= end_date)
         
-        total = query.count()
+        return query
+    
+    def list_ai_replied_page(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        offset: int = 0,
+        with_total: bool = False
+    ) -> Page:
+        """
+        按 (ai_reply_at, id) 倒序分页获取AI回复列表（键集分页）
         
-        conversations = query\
-            .order_by(self.model.ai_reply_at.desc())\
-            .offset(skip)\
-            .limit(limit)\
-            .all()
+        只查询列表需要的列并在同一条SQL中关联 customers.name：不加载 raw_data，
+        用户消息在数据库端截断，也不会逐行懒加载客户。
         
-        return conversations, total
+        Args:
+            start_date: 开始日期
+            end_date: 结束日期
+            limit: 每页数量
+            cursor: 上一页返回的游标
+            offset: 没有游标时的偏移量（兼容旧分页参数）
+            with_total: 是否返回（估计的）总数
+            
+        Returns:
+            Page，items 为 AIReplyListItem
+        """
+        query = self.db.query(
+            self.model.id,
+            self.model.customer_id,
+            Customer.name.label("customer_name"),
+            self.model.platform,
+            self.model.message_type,
+            func.substr(self.model.content, 1, MAX_MESSAGE_PREVIEW_LENGTH).label("user_message"),
+            self.model.ai_reply_content,
+            self.model.ai_reply_at,
+            self.model.received_at
+        ).join(Customer, self.model.customer_id == Customer.id)\
+            .filter(
+                self.model.ai_replied == True,
+                self.model.ai_reply_content.isnot(None)
+            )
+        
+        if start_date:
+            query = query.filter(self.model.ai_reply_at >= start_date)
+        
+        if end_date:
+            query = query.filter(self.model.ai_reply_at <= end_date)
+        
+        page = paginate(
+            query, self.model.ai_reply_at, self.model.id,
+            limit, cursor=cursor, offset=offset, with_total=with_total
+        )
+        page.items = [AIReplyListItem.from_row(row) for row in page.items]
+        return page
+
 
+class AsyncConversationRepository(AsyncBaseRepository[Conversation]):
+    """对话数据访问层（异步，供消息管道使用）"""
+    
+    def __init__(self, db: AsyncSession):
+        super().__init__(db, Conversation)
+    
+    async def get_by_platform_message_id(
+        self,
+        platform: Platform,
+        platform_message_id: str
+    ) -> Optional[Conversation]:
+        """根据平台消息ID获取对话"""
+        return await self.get_by(
+            platform=platform,
+            platform_message_id=platform_message_id
+        )
+    
+    async def create_conversation(
+        self,
+        customer_id: int,
+        platform: Platform,
+        platform_message_id: str,
+        message_type: MessageType,
+        content: str,
+        raw_data: Optional[dict] = None,
+        **kwargs
+    ) -> Conversation:
+        """创建对话记录（字段处理与ConversationRepository.create_conversation一致）"""
+        conversation_data = {
+            "customer_id": customer_id,
+            "platform": platform,
+            "platform_message_id": platform_message_id,
+            "message_type": message_type,
+            "content": content,
+            "raw_data": raw_data,
+            **kwargs
+        }
+        
+        # 兼容字段：如果是Facebook，也设置facebook_message_id
+        if platform == Platform.FACEBOOK:
+            conversation_data["facebook_message_id"] = platform_message_id
+        
+        return await self.create(**conversation_data)
+    
+    async def get_or_create_conversation(
+        self,
+        customer_id: int,
+        platform: Platform,
+        platform_message_id: str,
+        message_type: MessageType,
+        content: str,
+        raw_data: Optional[dict] = None,
+        **kwargs
+    ) -> Tuple[Conversation, bool]:
+        """按平台消息ID获取或创建对话（与ConversationRepository.get_or_create_conversation一致）"""
+        if platform_message_id:
+            existing = await self.get_by_platform_message_id(platform, platform_message_id)
+            if existing is not None:
+                return existing, False
+        try:
+            return await self.create_conversation(
+                customer_id=customer_id,
+                platform=platform,
+                platform_message_id=platform_message_id,
+                message_type=message_type,
+                content=content,
+                raw_data=raw_data,
+                **kwargs
+            ), True
+        except DatabaseError:
+            existing = (
+                await self.get_by_platform_message_id(platform, platform_message_id)
+                if platform_message_id else None
+            )
+            if existing is None:
+                raise
+            return existing, False
+    
+    async def get_customer_conversations(
+        self,
+        customer_id: int,
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[Conversation]:
+        """获取客户的所有对话（按接收时间倒序）"""
+        result = await self.db.execute(
+            select(self.model)
+            .where(self.model.customer_id == customer_id)
+            .order_by(self.model.received_at.desc(), self.model.id.desc())
+            .offset(skip)
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+    
+    async def get_unreplied_conversations(
+        self,
+        start_time: Optional[datetime] = None,
+        limit: int = 100
+    ) -> List[Conversation]:
+        """批量获取未回复的对话"""
+        stmt = select(self.model).where(
+            self.model.ai_replied == False,
+            self.model.content.isnot(None),
+            self.model.content != ""
+        )
+        if start_time:
+            stmt = stmt.where(self.model.received_at >= start_time)
+        
+        result = await self.db.execute(
+            stmt.order_by(self.model.received_at.asc()).limit(limit)
+        )
+        return list(result.scalars().all())
+    
+    async def count_by_time_range(self, start_time: datetime) -> int:
+        """统计指定时间范围内的对话数量"""
+        result = await self.db.execute(
+            select(func.count(self.model.id)).where(self.model.received_at >= start_time)
+        )
+        return result.scalar() or 0
@@ -1,8 +1,12 @@
 """客户Repository"""
 from typing import Optional, List
+from datetime import datetime, timezone
 from sqlalchemy.orm import Session
-from src.core.database.repositories.base import BaseRepository
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.core.database.repositories.base import BaseRepository, AsyncBaseRepository
 from src.core.database.models import Customer, Platform
+from src.core.database.pagination import Page, paginate
+from src.core.cache.cache_manager import customer_cache
 
 
 class CustomerRepository(BaseRepository[Customer]):
@@ -69,4 +73,113 @@ class CustomerRepository(BaseRepository[Customer]):
             customer = self.create(**customer_data)
         
         return customer
+    
+    def has_received_telegram_invite(self, customer_id: int) -> bool:
+        """
+        客户是否已收到过Telegram群组链接（按主键查询 telegram_invite_sent_at）
+        
+        已发送是终态，只缓存已发送的结果；未发送时每次查询，避免其他进程标记后仍重复发送。
+        """
+        cache_key = ("telegram_invite_sent", customer_id)
+        if customer_cache.get_sync(cache_key):
+            return True
+        
+        sent_at = self.db.query(self.model.telegram_invite_sent_at)\
+            .filter(self.model.id == customer_id)\
+            .scalar()
+        if sent_at is None:
+            return False
+        customer_cache.set_sync(cache_key, True)
+        return True
+    
+    def mark_telegram_invite_sent(self, customer_id: int, sent_at: Optional[datetime] = None) -> bool:
+        """
+        记录客户已收到Telegram群组链接（只记录第一次）
+        
+        Args:
+            customer_id: 客户ID
+            sent_at: 发送时间（默认当前时间）
+            
+        Returns:
+            是否为首次记录
+        """
+        updated = self.db.query(self.model)\
+            .filter(self.model.id == customer_id, self.model.telegram_invite_sent_at.is_(None))\
+            .update({"telegram_invite_sent_at": sent_at or datetime.now(timezone.utc)}, synchronize_session=False)
+        self.db.commit()
+        customer_cache.set_sync(("telegram_invite_sent", customer_id), True)
+        return bool(updated)
+    
+    def list_page(
+        self,
+        platform: Optional[Platform] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        offset: int = 0,
+        with_total: bool = False
+    ) -> Page:
+        """
+        按 (created_at, id) 倒序分页获取客户列表（键集分页，不做全表count）
+        
+        Args:
+            platform: 平台过滤
+            limit: 每页数量
+            cursor: 上一页返回的游标
+            offset: 没有游标时的偏移量（兼容页码分页）
+            with_total: 是否返回（估计的）总数
+            
+        Returns:
+            Page
+        """
+        query = self.db.query(self.model)
+        if platform:
+            query = query.filter(self.model.platform == platform)
+        return paginate(
+            query, self.model.created_at, self.model.id,
+            limit, cursor=cursor, offset=offset, with_total=with_total
+        )
 
+
+class AsyncCustomerRepository(AsyncBaseRepository[Customer]):
+    """客户数据访问层（异步）"""
+    
+    def __init__(self, db: AsyncSession):
+        super().__init__(db, Customer)
+    
+    async def get_by_platform_user_id(
+        self,
+        platform: Platform,
+        platform_user_id: str
+    ) -> Optional[Customer]:
+        """根据平台用户ID获取客户"""
+        return await self.get_by(
+            platform=platform,
+            platform_user_id=platform_user_id
+        )
+    
+    async def get_or_create(
+        self,
+        platform: Platform,
+        platform_user_id: str,
+        name: Optional[str] = None,
+        **kwargs
+    ) -> Customer:
+        """获取或创建客户（字段处理与CustomerRepository.get_or_create一致）"""
+        customer = await self.get_by_platform_user_id(platform, platform_user_id)
+        
+        if not customer:
+            customer_data = {
+                "platform": platform,
+                "platform_user_id": platform_user_id,
+                **kwargs
+            }
+            if name:
+                customer_data["name"] = name
+            
+            # 兼容字段：如果是Facebook，也设置facebook_id
+            if platform == Platform.FACEBOOK:
+                customer_data["facebook_id"] = platform_user_id
+            
+            customer = await self.create(**customer_data)
+        
+        return customer
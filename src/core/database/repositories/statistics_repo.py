@@ -1,9 +1,20 @@
 """统计数据Repository"""
-from typing import Optional
-from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import date, datetime, timezone
+from sqlalchemy import JSON, case, cast, func, literal_column
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from src.core.database.repositories.base import BaseRepository
-from src.core.database.statistics_models import DailyStatistics, CustomerInteraction, FrequentQuestion
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.core.config.constants import FREQUENT_QUESTION_MAX_SAMPLE_RESPONSES
+from src.core.database.repositories.base import BaseRepository, AsyncBaseRepository
+from src.core.database.statistics_models import (
+    DailyStatistics,
+    CustomerInteraction,
+    FrequentQuestion,
+    AIReplyRollup,
+    AIReplyRollupCustomer
+)
+from src.utils.text import question_fingerprint
 
 
 class DailyStatisticsRepository(BaseRepository[DailyStatistics]):
@@ -22,6 +33,40 @@ class DailyStatisticsRepository(BaseRepository[DailyStatistics]):
         if not stats:
             stats = self.create(date=target_date)
         return stats
+    
+    def increment_counters(self, target_date: date, **deltas: int) -> DailyStatistics:
+        """
+        原子增加指定日期的计数字段（UPDATE ... SET x = x + n），并刷新转化率
+        
+        Args:
+            target_date: 日期
+            **deltas: 字段名 -> 增量，如 total_messages=1
+            
+        Returns:
+            更新后的统计数据
+        """
+        stats = self.get_or_create_by_date(target_date)
+        values = {
+            getattr(DailyStatistics, field): func.coalesce(getattr(DailyStatistics, field), 0) + delta
+            for field, delta in deltas.items() if delta
+        }
+        if values:
+            self.db.query(DailyStatistics)\
+                .filter(DailyStatistics.id == stats.id)\
+                .update(values, synchronize_session=False)
+            self.db.flush()
+            self.db.refresh(stats)
+            stats.lead_conversion_rate = format_conversion_rate(stats.successful_leads, stats.group_invitations_sent)
+            stats.order_conversion_rate = format_conversion_rate(stats.successful_orders, stats.successful_leads)
+        self.db.commit()
+        return stats
+
+
+def format_conversion_rate(numerator: Optional[int], denominator: Optional[int]) -> str:
+    """格式化转化率（分母为0时返回0%）"""
+    if not denominator:
+        return "0%"
+    return f"{((numerator or 0) / denominator) * 100:.1f}%"
 
 
 class CustomerInteractionRepository(BaseRepository[CustomerInteraction]):
@@ -65,6 +110,123 @@ class CustomerInteractionRepository(BaseRepository[CustomerInteraction]):
             group_invitation_sent=group_invitation_sent,
             **kwargs
         )
+    
+    def has_interaction(self, customer_id: int, target_date: date, **filters) -> bool:
+        """客户在指定日期是否有（满足条件的）交互记录，走 customer_id+date 索引"""
+        query = self.db.query(CustomerInteraction.id).filter(
+            CustomerInteraction.customer_id == customer_id,
+            CustomerInteraction.date == target_date
+        )
+        for field, value in filters.items():
+            query = query.filter(getattr(CustomerInteraction, field) == value)
+        return query.first() is not None
+    
+    def mark_flag(self, customer_id: int, target_date: date, flag: str) -> int:
+        """
+        将客户在指定日期尚未标记的交互记录的布尔字段置为True
+        
+        Returns:
+            更新的记录数
+        """
+        column = getattr(CustomerInteraction, flag)
+        updated = self.db.query(CustomerInteraction)\
+            .filter(
+                CustomerInteraction.customer_id == customer_id,
+                CustomerInteraction.date == target_date,
+                column.isnot(True)
+            )\
+            .update({column: True}, synchronize_session=False)
+        self.db.commit()
+        return updated
+
+
+def _sample_entry(sample_response: str, seen_at: datetime) -> Dict[str, str]:
+    return {"response": sample_response[:200], "time": seen_at.isoformat()}
+
+
+def _appended_samples(dialect_name: str, excluded) -> object:
+    """SET 表达式：把新的示例回复追加到 sample_responses 末尾，超过上限时去掉最早的一条"""
+    limit = FREQUENT_QUESTION_MAX_SAMPLE_RESPONSES
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import JSONB
+        appended = func.coalesce(
+            cast(FrequentQuestion.sample_responses, JSONB),
+            cast(literal_column("'[]'"), JSONB)
+        ).op("||")(cast(excluded.sample_responses, JSONB))
+        trimmed = case((func.jsonb_array_length(appended) > limit, appended.op("-")(0)), else_=appended)
+        return cast(trimmed, JSON)
+
+    appended = func.json_insert(
+        func.coalesce(FrequentQuestion.sample_responses, literal_column("'[]'")),
+        literal_column("'$[#]'"),
+        func.json(func.json_extract(excluded.sample_responses, literal_column("'$[0]'")))
+    )
+    return case(
+        (func.json_array_length(appended) > limit, func.json_remove(appended, literal_column("'$[0]'"))),
+        else_=appended
+    )
+
+
+def build_frequent_question_upsert(
+    dialect_name: str,
+    question_text: str,
+    category: Optional[str] = None,
+    sample_response: Optional[str] = None
+):
+    """
+    构建高频问题的原子upsert（INSERT ... ON CONFLICT (question_fingerprint) DO UPDATE ... RETURNING）
+
+    一条语句完成计数加一、更新最后出现时间/分类并追加示例回复；
+    仅支持 PostgreSQL 和 SQLite，其他数据库返回None。
+    """
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+
+    now = datetime.now(timezone.utc)
+    stmt = insert(FrequentQuestion).values(
+        question_text=question_text,
+        question_fingerprint=question_fingerprint(question_text),
+        question_category=category,
+        occurrence_count=1,
+        first_seen=now,
+        last_seen=now,
+        sample_responses=[_sample_entry(sample_response, now)] if sample_response else None
+    )
+    excluded = stmt.excluded
+    set_ = {
+        "occurrence_count": func.coalesce(FrequentQuestion.occurrence_count, 0) + 1,
+        "last_seen": excluded.last_seen,
+        "question_category": func.coalesce(excluded.question_category, FrequentQuestion.question_category),
+    }
+    if sample_response:
+        set_["sample_responses"] = _appended_samples(dialect_name, excluded)
+    return stmt.on_conflict_do_update(
+        index_elements=[FrequentQuestion.question_fingerprint],
+        set_=set_
+    ).returning(FrequentQuestion)
+
+
+def _occurrence_update(
+    question: FrequentQuestion,
+    category: Optional[str],
+    sample_response: Optional[str],
+    now: datetime
+) -> Dict[str, Any]:
+    """先读后写路径：已有问题再次出现时要更新的字段"""
+    update_data = {
+        "occurrence_count": (question.occurrence_count or 0) + 1,
+        "last_seen": now,
+    }
+    if category:
+        update_data["question_category"] = category
+    if sample_response:
+        samples = list(question.sample_responses or []) + [_sample_entry(sample_response, now)]
+        update_data["sample_responses"] = samples[-FREQUENT_QUESTION_MAX_SAMPLE_RESPONSES:]
+    return update_data
 
 
 class FrequentQuestionRepository(BaseRepository[FrequentQuestion]):
@@ -74,18 +236,260 @@ class FrequentQuestionRepository(BaseRepository[FrequentQuestion]):
         super().__init__(db, FrequentQuestion)
     
     def get_by_question_text(self, question_text: str) -> Optional[FrequentQuestion]:
-        """根据问题文本获取记录"""
-        return self.get_by(question_text=question_text)
+        """根据问题文本获取记录（按规范化指纹匹配）"""
+        return self.get_by(question_fingerprint=question_fingerprint(question_text))
     
-    def increment_occurrence(self, question_text: str) -> FrequentQuestion:
-        """增加问题出现次数"""
+    def increment_occurrence(
+        self,
+        question_text: str,
+        category: Optional[str] = None,
+        sample_response: Optional[str] = None
+    ) -> FrequentQuestion:
+        """
+        增加问题出现次数（不存在时创建），同时更新分类和示例回复
+        
+        PostgreSQL/SQLite 使用单条原子upsert，并发写入同一问题时不会丢失计数或违反唯一约束。
+        """
+        stmt = build_frequent_question_upsert(
+            self.db.get_bind().dialect.name, question_text, category, sample_response
+        )
+        if stmt is None:
+            return self._increment_occurrence_fallback(question_text, category, sample_response)
+        question = self.db.scalars(stmt, execution_options={"populate_existing": True}).one()
+        self.db.commit()
+        return question
+    
+    def _increment_occurrence_fallback(
+        self,
+        question_text: str,
+        category: Optional[str],
+        sample_response: Optional[str]
+    ) -> FrequentQuestion:
+        """不支持 ON CONFLICT 的数据库：先读后写"""
+        now = datetime.now(timezone.utc)
         question = self.get_by_question_text(question_text)
-        if question:
-            question = self.update(
-                id=question.id,
-                occurrence_count=question.occurrence_count + 1
+        if not question:
+            return self.create(
+                question_text=question_text,
+                question_category=category,
+                occurrence_count=1,
+                sample_responses=[_sample_entry(sample_response, now)] if sample_response else None
             )
-        else:
-            question = self.create(question_text=question_text, occurrence_count=1)
-        return question
+        return self.update(question.id, **_occurrence_update(question, category, sample_response, now))
+    
+    def get_top(self, limit: int = 20) -> List[FrequentQuestion]:
+        """出现次数最多的问题（走 occurrence_count 索引）"""
+        return self.db.query(FrequentQuestion)\
+            .order_by(FrequentQuestion.occurrence_count.desc())\
+            .limit(limit)\
+            .all()
+
+
+class AIReplyRollupRepository(BaseRepository[AIReplyRollup]):
+    """AI回复汇总访问层（查询开销与分桶数相关，与对话行数无关）"""
+    
+    def __init__(self, db: Session):
+        super().__init__(db, AIReplyRollup)
+    
+    def increment(
+        self,
+        granularity: str,
+        bucket_start: datetime,
+        platform: str,
+        page_id: str,
+        message_type: str,
+        delta: int = 1
+    ) -> None:
+        """
+        原子增加分桶计数（UPDATE ... SET reply_count = reply_count + n，分桶不存在时插入）
+        
+        不提交事务，由调用方提交。
+        """
+        key = {
+            "granularity": granularity,
+            "bucket_start": bucket_start,
+            "platform": platform,
+            "page_id": page_id or "",
+            "message_type": message_type,
+        }
+        if self._add_to_bucket(key, delta):
+            return
+        try:
+            with self.db.begin_nested():
+                self.db.add(AIReplyRollup(reply_count=delta, **key))
+        except IntegrityError:
+            # 并发请求已插入同一分桶
+            self._add_to_bucket(key, delta)
+    
+    def _add_to_bucket(self, key: Dict, delta: int) -> int:
+        return self.db.query(AIReplyRollup)\
+            .filter_by(**key)\
+            .update({AIReplyRollup.reply_count: AIReplyRollup.reply_count + delta}, synchronize_session=False)
+    
+    def add_customer(self, target_date: date, customer_id: int) -> bool:
+        """
+        记录客户当天收到过AI回复
+        
+        Returns:
+            是否为该客户当天第一次记录
+        """
+        exists = self.db.query(AIReplyRollupCustomer.id)\
+            .filter_by(date=target_date, customer_id=customer_id)\
+            .first()
+        if exists:
+            return False
+        try:
+            with self.db.begin_nested():
+                self.db.add(AIReplyRollupCustomer(date=target_date, customer_id=customer_id))
+            return True
+        except IntegrityError:
+            return False
+    
+    def sum_by(
+        self,
+        granularity: str,
+        start: datetime,
+        end: datetime,
+        dimension: Optional[str] = None
+    ) -> List[Tuple]:
+        """
+        汇总 [start, end) 内的分桶
+        
+        Args:
+            granularity: hour 或 day
+            start: 开始时间（包含）
+            end: 结束时间（不包含）
+            dimension: 分组维度（platform、page_id、message_type、bucket_start），None 表示只求总数
+            
+        Returns:
+            [(维度值, 回复数), ...]；dimension 为 None 时为 [(None, 回复数)]
+        """
+        total = func.sum(AIReplyRollup.reply_count)
+        filters = (
+            AIReplyRollup.granularity == granularity,
+            AIReplyRollup.bucket_start >= start,
+            AIReplyRollup.bucket_start < end,
+        )
+        if dimension is None:
+            return [(None, self.db.query(total).filter(*filters).scalar() or 0)]
+        column = getattr(AIReplyRollup, dimension)
+        return self.db.query(column, total)\
+            .filter(*filters)\
+            .group_by(column)\
+            .order_by(column)\
+            .all()
+    
+    def count_customers(self, target_date: date) -> int:
+        """当天收到AI回复的不同客户数"""
+        return self.db.query(func.count(AIReplyRollupCustomer.id))\
+            .filter(AIReplyRollupCustomer.date == target_date)\
+            .scalar() or 0
+    
+    def delete_range(self, start: datetime, end: datetime, start_date: date, end_date: date) -> None:
+        """删除 [start, end) 内的所有分桶及 [start_date, end_date) 的去重客户记录（重建前调用，不提交）"""
+        self.db.query(AIReplyRollup)\
+            .filter(AIReplyRollup.bucket_start >= start, AIReplyRollup.bucket_start < end)\
+            .delete(synchronize_session=False)
+        self.db.query(AIReplyRollupCustomer)\
+            .filter(AIReplyRollupCustomer.date >= start_date, AIReplyRollupCustomer.date < end_date)\
+            .delete(synchronize_session=False)
+
+
+
+class AsyncDailyStatisticsRepository(AsyncBaseRepository[DailyStatistics]):
+    """每日统计数据访问层（异步）"""
+    
+    def __init__(self, db: AsyncSession):
+        super().__init__(db, DailyStatistics)
+    
+    async def get_by_date(self, target_date: date) -> Optional[DailyStatistics]:
+        """根据日期获取统计数据"""
+        return await self.get_by(date=target_date)
+    
+    async def get_or_create_by_date(self, target_date: date) -> DailyStatistics:
+        """获取或创建指定日期的统计数据"""
+        stats = await self.get_by_date(target_date)
+        if not stats:
+            stats = await self.create(date=target_date)
+        return stats
+
+
+class AsyncCustomerInteractionRepository(AsyncBaseRepository[CustomerInteraction]):
+    """客户交互记录访问层（异步）"""
+    
+    def __init__(self, db: AsyncSession):
+        super().__init__(db, CustomerInteraction)
+    
+    async def get_by_customer_and_date(
+        self,
+        customer_id: int,
+        target_date: date
+    ) -> list[CustomerInteraction]:
+        """根据客户ID和日期获取交互记录"""
+        return await self.get_all(
+            customer_id=customer_id,
+            date=target_date
+        )
+    
+    async def create_interaction(
+        self,
+        customer_id: int,
+        date: date,
+        platform: str,
+        message_type: str,
+        message_summary: str,
+        extracted_info: dict,
+        ai_replied: bool = False,
+        group_invitation_sent: bool = False,
+        **kwargs
+    ) -> CustomerInteraction:
+        """创建客户交互记录"""
+        return await self.create(
+            customer_id=customer_id,
+            date=date,
+            platform=platform,
+            message_type=message_type,
+            message_summary=message_summary,
+            extracted_info=extracted_info,
+            ai_replied=ai_replied,
+            group_invitation_sent=group_invitation_sent,
+            **kwargs
+        )
 
+
+class AsyncFrequentQuestionRepository(AsyncBaseRepository[FrequentQuestion]):
+    """高频问题访问层（异步）"""
+    
+    def __init__(self, db: AsyncSession):
+        super().__init__(db, FrequentQuestion)
+    
+    async def get_by_question_text(self, question_text: str) -> Optional[FrequentQuestion]:
+        """根据问题文本获取记录（按规范化指纹匹配）"""
+        return await self.get_by(question_fingerprint=question_fingerprint(question_text))
+    
+    async def increment_occurrence(
+        self,
+        question_text: str,
+        category: Optional[str] = None,
+        sample_response: Optional[str] = None
+    ) -> FrequentQuestion:
+        """增加问题出现次数（原子upsert，不支持时先读后写）"""
+        stmt = build_frequent_question_upsert(
+            self.db.get_bind().dialect.name, question_text, category, sample_response
+        )
+        if stmt is None:
+            now = datetime.now(timezone.utc)
+            question = await self.get_by_question_text(question_text)
+            if question:
+                return await self.update(
+                    id=question.id, **_occurrence_update(question, category, sample_response, now))
+            return await self.create(
+                question_text=question_text,
+                question_category=category,
+                occurrence_count=1,
+                sample_responses=[_sample_entry(sample_response, now)] if sample_response else None
+            )
+        result = await self.db.execute(stmt, execution_options={"populate_existing": True})
+        question = result.scalars().one()
+        await self.db.commit()
+        return question
@@ -1,8 +1,9 @@
 """统计数据模型"""
-from sqlalchemy import Column, Integer, String, DateTime, JSON, Date, Boolean, Index
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Date, Boolean, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.sql.expression import text
 from src.core.database.connection import Base
+from src.utils.text import question_fingerprint
 
 
 class DailyStatistics(Base):
@@ -78,7 +79,13 @@ class FrequentQuestion(Base):
     __tablename__ = "frequent_questions"
     
     id = Column(Integer, primary_key=True, index=True)
-    question_text = Column(String(500), nullable=False, unique=True, index=True)  # 问题文本
+    question_text = Column(String(500), nullable=False, unique=True, index=True)  # 问题文本（该指纹首次出现时的原文）
+    # 规范化问题文本的指纹（upsert的冲突键，几乎相同的问题聚合到同一行）
+    question_fingerprint = Column(
+        String(64),
+        nullable=False,
+        default=lambda context: question_fingerprint(context.get_current_parameters()["question_text"])
+    )
     question_category = Column(String(50))  # 问题分类
     occurrence_count = Column(Integer, default=1)  # 出现次数
     first_seen = Column(DateTime(timezone=True), server_default=func.now())  # 首次出现时间
@@ -90,5 +97,45 @@ class FrequentQuestion(Base):
     __table_args__ = (
         Index('idx_category', 'question_category'),
         Index('idx_count', 'occurrence_count'),
+        Index('idx_frequent_questions_fingerprint', 'question_fingerprint', unique=True),
+    )
+
+
+
+class AIReplyRollup(Base):
+    """AI回复汇总表（按小时/按天分桶，维度：平台、页面、消息类型）"""
+    __tablename__ = "ai_reply_rollups"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String(10), nullable=False)  # hour, day
+    bucket_start = Column(DateTime(timezone=True), nullable=False)  # 分桶开始时间（UTC）
+    
+    # 维度（未知页面为空字符串，保证唯一约束生效）
+    platform = Column(String(20), nullable=False)
+    page_id = Column(String(100), nullable=False, default="")
+    message_type = Column(String(20), nullable=False)
+    
+    reply_count = Column(Integer, nullable=False, default=0)  # AI回复数
+    
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        UniqueConstraint(
+            'granularity', 'bucket_start', 'platform', 'page_id', 'message_type',
+            name='uq_ai_reply_rollups_bucket'
+        ),
+        Index('idx_ai_reply_rollups_granularity_bucket', 'granularity', 'bucket_start'),
     )
 
+
+class AIReplyRollupCustomer(Base):
+    """每天收到AI回复的客户（用于去重客户数，每个客户每天一行）"""
+    __tablename__ = "ai_reply_rollup_customers"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    date = Column(Date, nullable=False)
+    customer_id = Column(Integer, nullable=False)
+    
+    __table_args__ = (
+        UniqueConstraint('date', 'customer_id', name='uq_ai_reply_rollup_customers_date_customer'),
+    )
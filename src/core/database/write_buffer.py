@@ -0,0 +1,252 @@
+"""遥测明细的写后缓冲（write-behind）
+
+一条入站消息原先会为 APIUsageLog、PromptUsageLog、CustomerInteraction 各自单独提交一次事务。
+这些行只追加、不在请求内被读取，缓冲后按数量或时间阈值用一次 executemany 批量写入：
+
+- 批量：同一张表的行合并为一条多行INSERT（PostgreSQL 下为 insertmanyvalues 批量插入）
+- 有界：积压超过 max_pending 后丢弃新行并计数，数据库不可用时不会耗尽内存
+- 隔离：每张表单独提交，某张表写入失败只重试该表，超过最大次数后丢弃该批
+- 关闭时排空：stop() 写入剩余行；未经 lifespan 退出时由 atexit 兜底
+"""
+import asyncio
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from src.core.config.constants import (
+    WRITE_BEHIND_BATCH_SIZE,
+    WRITE_BEHIND_FLUSH_INTERVAL_SECONDS,
+    WRITE_BEHIND_MAX_ATTEMPTS,
+    WRITE_BEHIND_MAX_PENDING,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """按表缓冲只追加的行，由后台任务批量写入"""
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable] = None,
+        batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+        flush_interval_seconds: float = WRITE_BEHIND_FLUSH_INTERVAL_SECONDS,
+        max_pending: int = WRITE_BEHIND_MAX_PENDING,
+        max_attempts: int = WRITE_BEHIND_MAX_ATTEMPTS
+    ):
+        """
+        Args:
+            session_factory: 创建数据库会话的工厂（默认 SessionLocal）
+            batch_size: 积压达到该行数时立即写入
+            flush_interval_seconds: 定时写入间隔
+            max_pending: 最大积压行数，超过后丢弃新行
+            max_attempts: 同一批行的最大写入次数
+        """
+        self._session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+
+        self._pending: Dict[Any, List[Dict[str, Any]]] = {}
+        self._attempts: Dict[Any, int] = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+        self.running = False
+        self.task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._atexit_registered = False
+
+        self.flushed_rows = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dropped_rows = 0
+        self.last_flush_at: Optional[datetime] = None
+
+    @property
+    def session_factory(self) -> Callable:
+        if self._session_factory is None:
+            from src.core.database.connection import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory
+
+    @property
+    def pending_count(self) -> int:
+        return self._count
+
+    def add(self, model: Any, **values: Any) -> None:
+        """
+        缓冲一行（同一张表的每行应提供相同的字段）
+
+        未启动后台任务时立即写入，与直接提交的行为一致。
+        """
+        with self._lock:
+            if self._count >= self.max_pending:
+                self.dropped_rows += 1
+                if self.dropped_rows % 100 == 1:
+                    logger.warning(
+                        f"Write-behind buffer full ({self.max_pending} rows), "
+                        f"dropped {self.dropped_rows} rows so far")
+                return
+            self._pending.setdefault(model, []).append(values)
+            self._count += 1
+            full = self._count >= self.batch_size
+
+        if not self.running:
+            self.flush()
+        elif full:
+            self._wake()
+
+    def has_pending(self, model: Any, **filters: Any) -> bool:
+        """是否有尚未写入且字段匹配的行"""
+        with self._lock:
+            return any(
+                all(row.get(field) == value for field, value in filters.items())
+                for row in self._pending.get(model, [])
+            )
+
+    def flush(self) -> int:
+        """
+        立即写入所有缓冲的行（阻塞，在线程池或同步代码中调用）
+
+        Returns:
+            写入的行数
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending, self._count = self._pending, {}, 0
+            if not pending:
+                return 0
+
+            written = 0
+            db = self.session_factory()
+            try:
+                for model, rows in pending.items():
+                    try:
+                        db.execute(insert(model), rows)
+                        db.commit()
+                        written += len(rows)
+                        self._attempts.pop(model, None)
+                    except Exception as e:
+                        db.rollback()
+                        self.failed_flushes += 1
+                        self._retry_later(model, rows, e)
+            finally:
+                db.close()
+
+            self.flushed_rows += written
+            self.flushes += 1
+            self.last_flush_at = datetime.now(timezone.utc)
+            return written
+
+    def _retry_later(self, model: Any, rows: List[Dict[str, Any]], error: Exception) -> None:
+        name = getattr(model, "__tablename__", str(model))
+        attempts = self._attempts.get(model, 0) + 1
+        if attempts >= self.max_attempts:
+            self._attempts.pop(model, None)
+            self.dropped_rows += len(rows)
+            logger.error(
+                f"Dropping {len(rows)} buffered {name} rows after {attempts} failed writes: {error}")
+            return
+
+        self._attempts[model] = attempts
+        logger.warning(f"Failed to write {len(rows)} buffered {name} rows (attempt {attempts}): {error}")
+        with self._lock:
+            # 失败的行放回队首，超过积压上限的部分丢弃
+            room = max(0, self.max_pending - self._count)
+            requeued = rows[:room]
+            self._pending[model] = requeued + self._pending.get(model, [])
+            self._count += len(requeued)
+            self.dropped_rows += len(rows) - len(requeued)
+
+    def _wake(self):
+        if self._loop is None or self._wakeup is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+    async def start(self):
+        """启动后台写入任务"""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self.running = True
+        self.task = asyncio.create_task(self._run_periodic())
+        if not self._atexit_registered:
+            atexit.register(self._flush_at_exit)
+            self._atexit_registered = True
+        logger.info(
+            f"Write-behind buffer started (batch {self.batch_size} rows, every {self.flush_interval_seconds}s)")
+
+    async def stop(self):
+        """停止后台任务并写入剩余的行"""
+        if not self.running:
+            return
+        self.running = False
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        written = await asyncio.get_running_loop().run_in_executor(None, self.flush)
+        logger.info(f"Write-behind buffer drained ({written} rows written at shutdown)")
+
+    async def _run_periodic(self):
+        loop = asyncio.get_running_loop()
+        while self.running:
+            try:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                if self._count:
+                    await loop.run_in_executor(None, self.flush)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Write-behind flush failed: {str(e)}", exc_info=True)
+
+    def _flush_at_exit(self):
+        if self._count:
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Failed to drain write-behind buffer at exit: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓冲统计"""
+        return {
+            "running": self.running,
+            "pending_rows": self._count,
+            "flushed_rows": self.flushed_rows,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "dropped_rows": self.dropped_rows,
+            "last_flush_at": self.last_flush_at.isoformat() if self.last_flush_at else None,
+        }
+
+
+# 全局遥测写后缓冲实例
+telemetry_buffer = WriteBehindBuffer()
+
+
+def get_telemetry_buffer() -> Optional[WriteBehindBuffer]:
+    """返回已启动的全局遥测缓冲；未启用或未启动时返回None（调用方使用自己的会话直接提交）"""
+    from src.core.config import settings
+    if settings.write_behind_enabled and telemetry_buffer.running:
+        return telemetry_buffer
+    return None
@@ -1,7 +1,7 @@
 """统一异常处理"""
 from .base import AppException
 from .api import APIError
-from .business import ValidationError, DatabaseError, ProcessingError
+from .business import ValidationError, DatabaseError, ProcessingError, QueueFullError, RateLimitExceededError
 
 __all__ = [
     'AppException',
@@ -9,5 +9,7 @@ __all__ = [
     'ValidationError',
     'DatabaseError',
     'ProcessingError',
+    'QueueFullError',
+    'RateLimitExceededError',
 ]
 
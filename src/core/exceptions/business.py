@@ -29,3 +29,21 @@ class ProcessingError(AppException):
         if step:
             self.details["step"] = step
 
+
+
+class QueueFullError(AppException):
+    """队列积压超过上限（用于向上游施加背压）"""
+    
+    def __init__(self, message: str, pending: Optional[int] = None, **kwargs):
+        super().__init__(message, error_code="QUEUE_FULL", **kwargs)
+        if pending is not None:
+            self.details["pending"] = pending
+
+
+class RateLimitExceededError(AppException):
+    """在允许的等待时间内无法获得限流配额"""
+    
+    def __init__(self, message: str, retry_after: Optional[float] = None, **kwargs):
+        super().__init__(message, error_code="RATE_LIMITED", **kwargs)
+        if retry_after is not None:
+            self.details["retry_after"] = round(retry_after, 3)
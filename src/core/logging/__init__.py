@@ -1,9 +1,23 @@
 """日志配置模块"""
-from .config import setup_logging, get_logger, StructuredFormatter
+from .config import setup_logging, stop_logging, get_logger, get_logging_stats, StructuredFormatter
+from .events import (
+    TELEGRAM_UPDATE_SAMPLE_KEY,
+    WEBHOOK_EVENT_SAMPLE_KEY,
+    telegram_update_fields,
+    webhook_event_fields,
+    webhook_log_extra,
+)
 
 __all__ = [
     'setup_logging',
+    'stop_logging',
     'get_logger',
+    'get_logging_stats',
     'StructuredFormatter',
+    'TELEGRAM_UPDATE_SAMPLE_KEY',
+    'WEBHOOK_EVENT_SAMPLE_KEY',
+    'telegram_update_fields',
+    'webhook_event_fields',
+    'webhook_log_extra',
 ]
 
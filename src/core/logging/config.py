@@ -1,10 +1,20 @@
-"""结构化日志配置"""
+"""
+结构化日志配置
+
+use_queue=True 时调用线程（事件循环）只把日志记录放入内存队列，
+脱敏、格式化和写文件都在 QueueListener 的后台线程中进行。
+"""
+import atexit
 import logging
 import json
+import queue
+import re
+import threading
+import time
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from datetime import timezone, timedelta
 
 
@@ -24,9 +34,16 @@ class SensitiveDataFilter(logging.Filter):
         r'EAAG[A-Za-z0-9]+',   # Facebook token格式
     ]
     
+    # 预编译（每条日志都会经过过滤器）
+    _PATTERN_RES = [re.compile(pattern) for pattern in SENSITIVE_PATTERNS]
+    _FACEBOOK_TOKEN_RE = re.compile(r'(EAAG[A-Za-z0-9]{10})[A-Za-z0-9]+')
+    _OPENAI_KEY_RE = re.compile(r'(sk-[A-Za-z0-9]{10})[A-Za-z0-9]+')
+    
     def filter(self, record: logging.LogRecord) -> bool:
-        """过滤敏感信息"""
-        import re
+        """过滤敏感信息（同一条记录只处理一次，多个处理器共用过滤器时不会重复脱敏）"""
+        if getattr(record, "_redacted", False):
+            return True
+        record._redacted = True
         
         # 过滤消息内容
         if hasattr(record, 'msg') and record.msg:
@@ -41,29 +58,114 @@ class SensitiveDataFilter(logging.Filter):
     
     def _sanitize(self, text: str) -> str:
         """清理敏感信息"""
-        import re
-        
-        # 检查是否包含敏感关键词
+        # 检查是否包含敏感关键词（小写后逐个子串查找，比不区分大小写的正则快得多）
         text_lower = text.lower()
-        has_sensitive = any(keyword in text_lower for keyword in self.SENSITIVE_KEYWORDS)
-        
-        if not has_sensitive:
+        if not any(keyword in text_lower for keyword in self.SENSITIVE_KEYWORDS):
             return text
         
         # 替换长token
-        for pattern in self.SENSITIVE_PATTERNS:
-            text = re.sub(pattern, '[REDACTED]', text)
+        for pattern in self._PATTERN_RES:
+            text = pattern.sub('[REDACTED]', text)
         
         # 替换常见的token格式
         # Facebook token: EAAG... -> EAAG[REDACTED]
-        text = re.sub(r'(EAAG[A-Za-z0-9]{10})[A-Za-z0-9]+', r'\1[REDACTED]', text)
+        text = self._FACEBOOK_TOKEN_RE.sub(r'\1[REDACTED]', text)
         
         # OpenAI key: sk-... -> sk-[REDACTED]
-        text = re.sub(r'(sk-[A-Za-z0-9]{10})[A-Za-z0-9]+', r'\1[REDACTED]', text)
+        text = self._OPENAI_KEY_RE.sub(r'\1[REDACTED]', text)
         
         return text
 
 
+class SamplingFilter(logging.Filter):
+    """
+    高频事件采样
+    
+    带 extra={"sample_key": "..."} 的记录按类别计数：每个窗口内前 burst 条完整记录，
+    之后每 every 条记录1条，下一条被记录的日志附带被跳过的条数。
+    WARNING 及以上级别和不带 sample_key 的记录不采样。
+    """
+    
+    def __init__(
+        self,
+        window_seconds: Optional[float] = None,
+        burst: Optional[int] = None,
+        every: Optional[int] = None
+    ):
+        super().__init__()
+        from src.core.config.constants import LOG_SAMPLE_BURST, LOG_SAMPLE_EVERY, LOG_SAMPLE_WINDOW_SECONDS
+        self.window_seconds = LOG_SAMPLE_WINDOW_SECONDS if window_seconds is None else window_seconds
+        self.burst = LOG_SAMPLE_BURST if burst is None else burst
+        self.every = max(1, LOG_SAMPLE_EVERY if every is None else every)
+        self.sampled_out = 0
+        self._windows: Dict[str, List[float]] = {}  # sample_key -> [窗口开始时间, 窗口内条数, 未记录条数]
+        self._lock = threading.Lock()
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        # 多个处理器共用同一个过滤器时沿用第一次的决定
+        decision = getattr(record, "_sampled", None)
+        if decision is not None:
+            return decision
+        record._sampled = self._decide(record)
+        return record._sampled
+    
+    def _decide(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "sample_key", None)
+        if key is None or record.levelno >= logging.WARNING:
+            return True
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None or record.created - state[0] >= self.window_seconds:
+                state = self._windows[key] = [record.created, 0, state[2] if state else 0]
+            state[1] += 1
+            if state[1] > self.burst and (state[1] - self.burst) % self.every != 0:
+                state[2] += 1
+                self.sampled_out += 1
+                return False
+            skipped, state[2] = int(state[2]), 0
+        if skipped:
+            record.msg = f"{record.msg} [+{skipped} similar events not logged]"
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    把日志记录放入进程内队列（调用线程中只做入队）
+    
+    与标准 QueueHandler 不同，不在调用线程中格式化消息（由监听线程格式化）；
+    队列已满时丢弃记录并计数，而不是阻塞或打印错误。
+    """
+    
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+    
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RedactingQueueListener(QueueListener):
+    """后台线程：每条记录脱敏一次，再交给各处理器格式化和写入"""
+    
+    def __init__(self, log_queue: queue.Queue, *handlers: logging.Handler):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.redact_filter = SensitiveDataFilter()
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        self.redact_filter.filter(record)
+        return record
+    
+    def handle(self, record: logging.LogRecord) -> None:
+        super().handle(record)
+        time.sleep(0)
+
+
 class LocalTimeFormatter(logging.Formatter):
     """使用本地时区（UTC+8）的日志格式化器"""
 
@@ -88,7 +190,8 @@ class StructuredFormatter(logging.Formatter):
     def format(self, record: logging.LogRecord) -> str:
         """格式化日志记录为JSON格式"""
         log_data: Dict[str, Any] = {
-            "timestamp": datetime.utcnow().isoformat(),
+            # 使用记录创建时间（异步写入时格式化可能晚于事件发生）
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
@@ -108,12 +211,20 @@ class StructuredFormatter(logging.Formatter):
         return json.dumps(log_data, ensure_ascii=False)
 
 
+# 当前的异步日志组件（setup_logging(use_queue=True) 创建）
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+_listener: Optional[RedactingQueueListener] = None
+_sampling_filter: Optional[SamplingFilter] = None
+
+
 def setup_logging(
     log_level: str = "INFO",
     log_file: Optional[Path] = None,
     use_json: bool = False,
     max_bytes: int = 10 * 1024 * 1024,  # 10MB
-    backup_count: int = 10
+    backup_count: int = 10,
+    use_queue: bool = False,
+    sampling: bool = True
 ) -> None:
     """
     设置日志配置
@@ -124,7 +235,11 @@ def setup_logging(
         use_json: 是否使用JSON格式
         max_bytes: 日志文件最大字节数
         backup_count: 备份文件数量
+        use_queue: 是否通过队列在后台线程中脱敏、格式化和写入（不阻塞事件循环）
+        sampling: 是否对带 sample_key 的高频事件采样
     """
+    global _queue_handler, _listener, _sampling_filter
+    
     level = getattr(logging, log_level.upper(), logging.INFO)
     
     # 创建格式化器
@@ -140,18 +255,17 @@ def setup_logging(
     root_logger = logging.getLogger()
     root_logger.setLevel(level)
     
-    # 清除现有处理器
+    # 清除现有处理器（先停止之前的后台线程，写完队列中的记录）
+    stop_logging()
     root_logger.handlers.clear()
     
-    # 创建敏感信息过滤器
-    sensitive_filter = SensitiveDataFilter()
+    handlers: List[logging.Handler] = []
     
     # 控制台处理器
     console_handler = logging.StreamHandler()
     console_handler.setLevel(level)
     console_handler.setFormatter(formatter)
-    console_handler.addFilter(sensitive_filter)
-    root_logger.addHandler(console_handler)
+    handlers.append(console_handler)
     
     # 文件处理器
     if log_file:
@@ -164,8 +278,57 @@ def setup_logging(
         )
         file_handler.setLevel(level)
         file_handler.setFormatter(formatter)
-        file_handler.addFilter(sensitive_filter)
-        root_logger.addHandler(file_handler)
+        handlers.append(file_handler)
+    
+    _sampling_filter = SamplingFilter() if sampling else None
+    
+    if use_queue:
+        from src.core.config.constants import LOG_QUEUE_MAX_SIZE
+        log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_MAX_SIZE)
+        _queue_handler = NonBlockingQueueHandler(log_queue)
+        if _sampling_filter is not None:
+            _queue_handler.addFilter(_sampling_filter)
+        root_logger.addHandler(_queue_handler)
+        # 脱敏在监听线程中进行
+        _listener = RedactingQueueListener(log_queue, *handlers)
+        _listener.start()
+    else:
+        # 创建敏感信息过滤器
+        sensitive_filter = SensitiveDataFilter()
+        for handler in handlers:
+            if _sampling_filter is not None:
+                handler.addFilter(_sampling_filter)
+            handler.addFilter(sensitive_filter)
+            root_logger.addHandler(handler)
+
+
+def stop_logging() -> None:
+    """停止后台日志线程（写完队列中剩余的记录），进程退出时自动调用"""
+    global _queue_handler, _listener
+    if _listener is not None:
+        listener, _listener = _listener, None
+        try:
+            listener.stop()
+        except Exception:
+            pass
+        for handler in listener.handlers:
+            handler.close()
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+
+
+atexit.register(stop_logging)
+
+
+def get_logging_stats() -> Dict[str, Any]:
+    """日志管道状态（用于 /metrics）"""
+    return {
+        "async": _listener is not None,
+        "queue_size": _queue_handler.queue.qsize() if _queue_handler is not None else 0,
+        "dropped": _queue_handler.dropped if _queue_handler is not None else 0,
+        "sampled_out": _sampling_filter.sampled_out if _sampling_filter is not None else 0,
+    }
 
 
 def get_logger(name: str) -> logging.Logger:
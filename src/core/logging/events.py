@@ -0,0 +1,40 @@
+"""
+高频事件的日志摘要
+
+Webhook 请求体包含客户消息正文、用户ID等信息，且每条消息都会触发一次，
+因此只记录摘要字段（对象类型、页面、事件数），并以 sample_key 标记以便采样。
+"""
+from typing import Any, Dict
+
+# SamplingFilter 的采样类别
+WEBHOOK_EVENT_SAMPLE_KEY = "webhook_event"
+TELEGRAM_UPDATE_SAMPLE_KEY = "telegram_update"
+
+
+def webhook_event_fields(body: Any) -> Dict[str, Any]:
+    """Facebook / Instagram Webhook 事件摘要（不含消息内容和发送者信息）"""
+    if not isinstance(body, dict):
+        return {"object": type(body).__name__, "entries": 0, "events": 0, "page_ids": []}
+    entries = [entry for entry in body.get("entry") or [] if isinstance(entry, dict)]
+    events = sum(len(entry.get("messaging") or []) + len(entry.get("changes") or []) for entry in entries)
+    page_ids = sorted({str(entry["id"]) for entry in entries if entry.get("id")})
+    return {"object": body.get("object"), "entries": len(entries), "events": events, "page_ids": page_ids}
+
+
+def telegram_update_fields(body: Any) -> Dict[str, Any]:
+    """Telegram 更新摘要（更新类型和会话ID，不含消息文本）"""
+    if not isinstance(body, dict):
+        return {"update_id": None, "type": type(body).__name__, "chat_id": None}
+    update_type = next((key for key in body if key != "update_id"), None)
+    payload = body.get(update_type) if update_type else None
+    chat = payload.get("chat") if isinstance(payload, dict) else None
+    return {
+        "update_id": body.get("update_id"),
+        "type": update_type,
+        "chat_id": chat.get("id") if isinstance(chat, dict) else None,
+    }
+
+
+def webhook_log_extra(sample_key: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+    """logger 的 extra 参数：采样类别 + JSON日志的附加字段"""
+    return {"sample_key": sample_key, "extra_fields": fields}
@@ -1,18 +1,26 @@
 """Facebook Graph API 客户端"""
 import httpx
 import asyncio
+import json
 import time
+from urllib.parse import urlencode
 from typing import Dict, Any, Optional, List
 from src.core.config import settings
 from src.core.config.constants import (
     FACEBOOK_GRAPH_API_BASE_URL,
+    FACEBOOK_MESSAGE_FIELDS,
+    GRAPH_BATCH_MAX_REQUESTS,
     MAX_RETRY_ATTEMPTS,
     RETRY_DELAY_SECONDS,
     RETRY_BACKOFF_MULTIPLIER,
     FACEBOOK_API_RATE_LIMIT,
-    FACEBOOK_API_WINDOW_SECONDS
+    FACEBOOK_API_WINDOW_SECONDS,
+    AUTO_REPLY_CONVERSATION_CONCURRENCY
 )
-from src.utils.rate_limiter import rate_limiter
+from src.facebook.usage_pacer import graph_api_usage_pacer
+from src.monitoring.metrics import graph_send_seconds
+from src.utils.rate_limiter import graph_api_rate_limiter
+from src.utils.http_client_pool import http_client_pool
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,12 +29,13 @@ logger = logging.getLogger(__name__)
 class FacebookAPIClient:
     """Facebook Graph API 客户端封装"""
 
-    def __init__(self, access_token: Optional[str] = None):
+    def __init__(self, access_token: Optional[str] = None, base_url: Optional[str] = None):
         """
         初始化Facebook API客户端
 
         Args:
             access_token: 访问令牌，如果为None则从settings或Token管理器获取
+            base_url: Graph API 根地址（默认 FACEBOOK_GRAPH_API_URL 或官方地址，测试时可指向本地假服务器）
         """
         if access_token:
             self.access_token = access_token
@@ -34,12 +43,13 @@ class FacebookAPIClient:
             # 尝试从Token管理器获取，如果没有则使用默认Token
             from src.config.page_token_manager import page_token_manager
             self.access_token = page_token_manager.get_token() or settings.facebook_access_token
-        self.base_url = FACEBOOK_GRAPH_API_BASE_URL
-        self.client = httpx.AsyncClient(timeout=30.0)
+        self.base_url = (base_url or settings.facebook_graph_api_url or FACEBOOK_GRAPH_API_BASE_URL).rstrip("/")
+        # 从应用级连接池借用客户端，复用到 graph.facebook.com 的连接
+        self.client = http_client_pool.borrow(self.base_url)
         
-        # 配置速率限制
-        rate_limiter.set_limit(
-            "facebook_api",
+        # 配置速率限制（按页面分别计算配额）
+        graph_api_rate_limiter.set_limit(
+            "facebook_messages",
             max_requests=FACEBOOK_API_RATE_LIMIT,
             time_window_seconds=FACEBOOK_API_WINDOW_SECONDS
         )
@@ -135,48 +145,57 @@ class FacebookAPIClient:
             "messaging_type": message_type
         }
 
-        # 速率限制检查
-        if not rate_limiter.is_allowed("facebook_api", FACEBOOK_API_RATE_LIMIT, FACEBOOK_API_WINDOW_SECONDS):
-            remaining = rate_limiter.get_remaining("facebook_api", FACEBOOK_API_RATE_LIMIT, FACEBOOK_API_WINDOW_SECONDS)
-            logger.warning(f"Facebook API速率限制：已达到限制，剩余请求数: {remaining}")
-            await asyncio.sleep(1)
+        # 速率限制：等待该页面有可用配额（超时抛出RateLimitExceededError）
+        waited = await graph_api_rate_limiter.acquire("facebook_messages", page_id)
+        if waited > 0:
+            logger.warning(f"Facebook API速率限制：页面 {page_id or 'me'} 等待 {waited:.1f} 秒后发送")
         
-        # 重试机制
-        last_exception = None
-        for attempt in range(MAX_RETRY_ATTEMPTS):
-            try:
-                response = await self.client.post(url, params=params, json=data)
+        # 重试机制（发送耗时按页面记录到指标，不含上面的限流等待）
+        send_started = time.perf_counter()
+        send_outcome = "error"
+        try:
+            last_exception = None
+            for attempt in range(MAX_RETRY_ATTEMPTS):
+                try:
+                    response = await self.client.post(url, params=params, json=data)
+                    self._record_usage(response, page_id)
                 
-                # 如果成功或非临时错误，跳出重试循环
-                if response.status_code == 200:
-                    break
+                    # 如果成功或非临时错误，跳出重试循环
+                    if response.status_code == 200:
+                        break
+                
+                    # 检查是否是速率限制错误（429）
+                    if response.status_code == 429:
+                        retry_after = int(response.headers.get("Retry-After", RETRY_DELAY_SECONDS * (RETRY_BACKOFF_MULTIPLIER ** attempt)))
+                        logger.warning(f"Facebook API速率限制，等待 {retry_after} 秒后重试 (尝试 {attempt + 1}/{MAX_RETRY_ATTEMPTS})")
+                        await asyncio.sleep(retry_after)
+                        continue
+                
+                    # 5xx错误可以重试
+                    if 500 <= response.status_code < 600:
+                        if attempt < MAX_RETRY_ATTEMPTS - 1:
+                            delay = RETRY_DELAY_SECONDS * (RETRY_BACKOFF_MULTIPLIER ** attempt)
+                            logger.warning(f"Facebook API服务器错误 {response.status_code}，{delay}秒后重试 (尝试 {attempt + 1}/{MAX_RETRY_ATTEMPTS})")
+                            await asyncio.sleep(delay)
+                            continue
                 
-                # 检查是否是速率限制错误（429）
-                if response.status_code == 429:
-                    retry_after = int(response.headers.get("Retry-After", RETRY_DELAY_SECONDS * (RETRY_BACKOFF_MULTIPLIER ** attempt)))
-                    logger.warning(f"Facebook API速率限制，等待 {retry_after} 秒后重试 (尝试 {attempt + 1}/{MAX_RETRY_ATTEMPTS})")
-                    await asyncio.sleep(retry_after)
-                    continue
+                    # 其他错误不重试
+                    break
                 
-                # 5xx错误可以重试
-                if 500 <= response.status_code < 600:
+                except (httpx.TimeoutException, httpx.NetworkError) as e:
+                    last_exception = e
                     if attempt < MAX_RETRY_ATTEMPTS - 1:
                         delay = RETRY_DELAY_SECONDS * (RETRY_BACKOFF_MULTIPLIER ** attempt)
-                        logger.warning(f"Facebook API服务器错误 {response.status_code}，{delay}秒后重试 (尝试 {attempt + 1}/{MAX_RETRY_ATTEMPTS})")
+                        logger.warning(f"Facebook API网络错误，{delay}秒后重试 (尝试 {attempt + 1}/{MAX_RETRY_ATTEMPTS}): {str(e)}")
                         await asyncio.sleep(delay)
-                        continue
-                
-                # 其他错误不重试
-                break
-                
-            except (httpx.TimeoutException, httpx.NetworkError) as e:
-                last_exception = e
-                if attempt < MAX_RETRY_ATTEMPTS - 1:
-                    delay = RETRY_DELAY_SECONDS * (RETRY_BACKOFF_MULTIPLIER ** attempt)
-                    logger.warning(f"Facebook API网络错误，{delay}秒后重试 (尝试 {attempt + 1}/{MAX_RETRY_ATTEMPTS}): {str(e)}")
-                    await asyncio.sleep(delay)
-                else:
-                    raise
+                    else:
+                        raise
+        
+            if last_exception is None and response.status_code == 200:
+                send_outcome = "success"
+        finally:
+            graph_send_seconds.observe(
+                time.perf_counter() - send_started, platform="facebook", page_id=page_id or "me", outcome=send_outcome)
         
         # 如果所有重试都失败，抛出最后一个异常
         if last_exception:
@@ -317,13 +336,24 @@ class FacebookAPIClient:
             return challenge
         return None
 
-    async def get_conversations(self, page_id: str, limit: int = 25) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _record_usage(response: httpx.Response, page_id: Optional[str] = None) -> None:
+        """记录响应头中的 Graph API 用量，供自适应节流使用"""
+        graph_api_usage_pacer.update_from_headers(response.headers, page_id)
+
+    async def get_conversations(
+        self,
+        page_id: str,
+        limit: int = 25,
+        fields: str = "id,updated_time,message_count,unread_count"
+    ) -> List[Dict[str, Any]]:
         """
         Get all conversations for a page
         
         Args:
             page_id: Page ID
             limit: Maximum number of conversations to retrieve (default: 25)
+            fields: Conversation fields (may include field expansions)
         
         Returns:
             List of conversation objects
@@ -331,12 +361,13 @@ class FacebookAPIClient:
         url = f"{self.base_url}/{page_id}/conversations"
         params = {
             "access_token": self.access_token,
-            "fields": "id,updated_time,message_count,unread_count",
+            "fields": fields,
             "limit": limit
         }
         
         try:
             response = await self.client.get(url, params=params)
+            self._record_usage(response, page_id)
             
             # Handle 400 errors gracefully (API endpoint may not be available)
             if response.status_code == 400:
@@ -374,6 +405,130 @@ class FacebookAPIClient:
             logger.error(f"Error getting conversations for page {page_id}: {str(e)}", exc_info=True)
             return []  # Return empty list instead of raising
     
+    async def get_conversations_with_messages(
+        self,
+        page_id: str,
+        limit: int = 25,
+        message_limit: int = 5
+    ) -> List[Dict[str, Any]]:
+        """
+        Get conversations together with their latest messages in one request (field expansion)
+
+        Args:
+            page_id: Page ID
+            limit: Maximum number of conversations to retrieve
+            message_limit: Number of latest messages embedded per conversation
+
+        Returns:
+            List of conversation objects. ``conv["messages"]`` is the embedded message
+            list (newest first), or None when the expansion returned no message data
+        """
+        fields = (
+            f"id,updated_time,message_count,unread_count,"
+            f"messages.limit({message_limit}){{{FACEBOOK_MESSAGE_FIELDS}}}"
+        )
+        conversations = await self.get_conversations(page_id, limit=limit, fields=fields)
+        for conv in conversations:
+            embedded = conv.get("messages")
+            conv["messages"] = embedded.get("data") if isinstance(embedded, dict) else None
+        return conversations
+
+    async def batch_get(
+        self,
+        relative_urls: List[str],
+        page_id: Optional[str] = None
+    ) -> List[Optional[Any]]:
+        """
+        使用 Graph API 批量请求端点执行多个 GET 请求
+
+        每个批量请求最多包含 GRAPH_BATCH_MAX_REQUESTS 个子请求，超出时自动拆分
+        为多个批量请求并发发送。
+
+        Args:
+            relative_urls: 相对于 Graph API 根地址的请求路径（可带查询参数，不含access_token）
+            page_id: 页面ID（用于用量统计和日志）
+
+        Returns:
+            与 relative_urls 一一对应的响应体（已解析的JSON）；
+            子请求失败、超时或整个批量请求失败的位置为 None，由调用方决定是否单独重试
+        """
+        if not relative_urls:
+            return []
+        chunks = [
+            relative_urls[start:start + GRAPH_BATCH_MAX_REQUESTS]
+            for start in range(0, len(relative_urls), GRAPH_BATCH_MAX_REQUESTS)
+        ]
+        chunk_results = await asyncio.gather(*(self._post_batch(chunk, page_id) for chunk in chunks))
+        return [body for chunk_result in chunk_results for body in chunk_result]
+
+    async def _post_batch(self, relative_urls: List[str], page_id: Optional[str]) -> List[Optional[Any]]:
+        """发送单个批量请求（子请求数不超过上限）"""
+        batch = [{"method": "GET", "relative_url": url} for url in relative_urls]
+        try:
+            response = await self.client.post(
+                f"{self.base_url}/",
+                data={
+                    "access_token": self.access_token,
+                    "batch": json.dumps(batch),
+                    "include_headers": "false"
+                }
+            )
+            self._record_usage(response, page_id)
+            response.raise_for_status()
+            items = response.json()
+        except Exception as e:
+            logger.warning(f"Graph API batch request failed for page {page_id} ({len(batch)} requests): {str(e)}")
+            return [None] * len(relative_urls)
+
+        if not isinstance(items, list):
+            logger.warning(f"Unexpected Graph API batch response for page {page_id}: {str(items)[:200]}")
+            return [None] * len(relative_urls)
+
+        results: List[Optional[Any]] = []
+        for index, url in enumerate(relative_urls):
+            item = items[index] if index < len(items) else None
+            if not item:
+                # 子请求超时时对应位置为 null
+                logger.warning(f"Graph API batch item timed out: {url.split('?')[0]}")
+                results.append(None)
+                continue
+            try:
+                body = json.loads(item.get("body") or "null")
+            except (ValueError, TypeError):
+                body = None
+            if item.get("code") != 200:
+                error = body.get("error", {}) if isinstance(body, dict) else {}
+                logger.warning(
+                    f"Graph API batch item failed: {url.split('?')[0]} "
+                    f"HTTP {item.get('code')} {error.get('message', '')}"
+                )
+                results.append(None)
+                continue
+            results.append(body)
+        return results
+
+    async def get_messages_batch(
+        self,
+        conversation_ids: List[str],
+        page_id: Optional[str] = None,
+        limit: int = 10
+    ) -> Dict[str, Optional[List[Dict[str, Any]]]]:
+        """
+        批量获取多个对话的最近消息
+
+        Returns:
+            {对话ID: 消息列表（最新在前）}，获取失败的对话值为 None
+        """
+        query = urlencode({"fields": FACEBOOK_MESSAGE_FIELDS, "limit": limit})
+        bodies = await self.batch_get(
+            [f"{conversation_id}/messages?{query}" for conversation_id in conversation_ids],
+            page_id
+        )
+        return {
+            conversation_id: body.get("data", []) if isinstance(body, dict) else None
+            for conversation_id, body in zip(conversation_ids, bodies)
+        }
+
     async def get_conversation_messages(
         self, 
         conversation_id: str, 
@@ -394,12 +549,13 @@ class FacebookAPIClient:
         url = f"{self.base_url}/{conversation_id}/messages"
         params = {
             "access_token": self.access_token,
-            "fields": "id,message,from,created_time,attachments",
+            "fields": FACEBOOK_MESSAGE_FIELDS,
             "limit": limit
         }
         
         try:
             response = await self.client.get(url, params=params)
+            self._record_usage(response, page_id)
             
             # Handle 400 errors gracefully
             if response.status_code == 400:
@@ -419,99 +575,56 @@ class FacebookAPIClient:
     async def check_unreplied_messages(
         self, 
         page_id: str, 
-        threshold_minutes: int = 5
+        threshold_minutes: int = 5,
+        max_concurrency: int = AUTO_REPLY_CONVERSATION_CONCURRENCY
     ) -> List[Dict[str, Any]]:
         """
         Check for unreplied messages in a page's conversations
+
+        Conversations and their latest messages are fetched in one request via
+        field expansion. Conversations without embedded messages are fetched with
+        one Graph API batch request; items that fail in the batch fall back to
+        individual requests, whose concurrency and pacing follow the Graph API
+        usage headers (see src/facebook/usage_pacer.py).
         
         Args:
             page_id: Page ID
             threshold_minutes: Time threshold in minutes (default: 5)
+            max_concurrency: Maximum concurrent conversation fetches while usage is low
         
         Returns:
             List of unreplied message objects with conversation info
         """
         from datetime import datetime, timezone, timedelta
         
-        unreplied_messages = []
-        
         try:
-            # Get all conversations
-            conversations = await self.get_conversations(page_id, limit=50)
+            # Get all conversations with their latest messages
+            conversations = await self.get_conversations_with_messages(page_id, limit=50, message_limit=5)
             logger.info(f"Found {len(conversations)} conversations for page {page_id}")
+
+            # Conversations without embedded messages: one batch request
+            missing = [conv["id"] for conv in conversations if conv.get("messages") is None]
+            if missing:
+                fetched = await self.get_messages_batch(missing, page_id, limit=5)
+                for conv in conversations:
+                    if conv.get("messages") is None:
+                        conv["messages"] = fetched.get(conv["id"])
             
             # Calculate threshold time
             threshold_time = datetime.now(timezone.utc) - timedelta(minutes=threshold_minutes)
-            
-            for idx, conv in enumerate(conversations):
-                try:
-                    # Add delay between API calls to avoid rate limiting
-                    if idx > 0:
-                        await asyncio.sleep(0.3)  # 0.3 second delay between conversation API calls
-                    
-                    # Get the last few messages in the conversation
-                    messages = await self.get_conversation_messages(conv["id"], page_id, limit=5)
-                    
-                    if not messages:
-                        continue
-                    
-                    # Get the most recent message
-                    last_message = messages[0]
-                    
-                    # Check if message has content
-                    if not last_message.get("message"):
-                        continue
-                    
-                    # Check if message is from user (not from page)
-                    from_info = last_message.get("from", {})
-                    message_from_id = from_info.get("id")
-                    
-                    # If message is from the page itself, skip (we sent it)
-                    # Page ID format is numeric, user IDs are also numeric but different
-                    # We'll check by comparing with page_id - if they match, it's from the page
-                    if message_from_id == page_id:
-                        continue
-                    
-                    # Parse created_time
-                    created_time_str = last_message.get("created_time")
-                    if not created_time_str:
-                        continue
-                    
-                    # Parse ISO format time
-                    try:
-                        # Try standard ISO format first
-                        if created_time_str.endswith('Z'):
-                            created_time = datetime.fromisoformat(created_time_str.replace('Z', '+00:00'))
-                        else:
-                            created_time = datetime.fromisoformat(created_time_str)
-                    except:
-                        # Try parsing with strptime
-                        try:
-                            created_time = datetime.strptime(created_time_str, "%Y-%m-%dT%H:%M:%S%z")
-                        except:
-                            # If all parsing fails, skip this message
-                            logger.warning(f"Could not parse time: {created_time_str}")
-                            continue
-                    
-                    # Ensure timezone-aware
-                    if created_time.tzinfo is None:
-                        created_time = created_time.replace(tzinfo=timezone.utc)
-                    
-                    # Check if message is older than threshold
-                    if created_time <= threshold_time:
-                        # This is a potential unreplied message
-                        # We need to verify it's from a user, not from the page
-                        # For now, we'll include it and let the spam detection filter it
-                        unreplied_messages.append({
-                            "conversation_id": conv["id"],
-                            "message": last_message,
-                            "page_id": page_id,
-                            "created_time": created_time
-                        })
-                
-                except Exception as e:
-                    logger.warning(f"Error processing conversation {conv.get('id')}: {str(e)}")
-                    continue
+
+            limiter = graph_api_usage_pacer.limiter(page_id, max_concurrency)
+
+            async def inspect(conv: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+                messages = conv.get("messages")
+                if messages is None:
+                    # Batch item failed: fetch this conversation individually
+                    async with limiter:
+                        messages = await self.get_conversation_messages(conv["id"], page_id, limit=5)
+                return self._find_unreplied_message(conv, messages, page_id, threshold_time)
+
+            results = await asyncio.gather(*(inspect(conv) for conv in conversations))
+            unreplied_messages = [result for result in results if result]
             
             logger.info(f"Found {len(unreplied_messages)} potentially unreplied messages for page {page_id}")
             return unreplied_messages
@@ -530,6 +643,90 @@ class FacebookAPIClient:
             logger.error(f"Error checking unreplied messages for page {page_id}: {str(e)}", exc_info=True)
             return []
 
+    @staticmethod
+    def _find_unreplied_message(
+        conv: Dict[str, Any],
+        messages: List[Dict[str, Any]],
+        page_id: str,
+        threshold_time
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Return the last user message of a conversation if it is older than threshold_time
+
+        Args:
+            conv: Conversation object
+            messages: Latest messages of the conversation (newest first)
+            page_id: Page ID
+            threshold_time: Messages created before this time count as unreplied
+
+        Returns:
+            Unreplied message object, or None if the conversation needs no reply
+        """
+        from datetime import datetime, timezone
+
+        try:
+            if not messages:
+                return None
+            
+            # Get the most recent message
+            last_message = messages[0]
+            
+            # Check if message has content
+            if not last_message.get("message"):
+                return None
+            
+            # Check if message is from user (not from page)
+            from_info = last_message.get("from", {})
+            message_from_id = from_info.get("id")
+            
+            # If message is from the page itself, skip (we sent it)
+            # Page ID format is numeric, user IDs are also numeric but different
+            # We'll check by comparing with page_id - if they match, it's from the page
+            if message_from_id == page_id:
+                return None
+            
+            # Parse created_time
+            created_time_str = last_message.get("created_time")
+            if not created_time_str:
+                return None
+            
+            # Parse ISO format time
+            try:
+                # Try standard ISO format first
+                if created_time_str.endswith('Z'):
+                    created_time = datetime.fromisoformat(created_time_str.replace('Z', '+00:00'))
+                else:
+                    created_time = datetime.fromisoformat(created_time_str)
+            except:
+                # Try parsing with strptime
+                try:
+                    created_time = datetime.strptime(created_time_str, "%Y-%m-%dT%H:%M:%S%z")
+                except:
+                    # If all parsing fails, skip this message
+                    logger.warning(f"Could not parse time: {created_time_str}")
+                    return None
+            
+            # Ensure timezone-aware
+            if created_time.tzinfo is None:
+                created_time = created_time.replace(tzinfo=timezone.utc)
+            
+            # Check if message is older than threshold
+            if created_time <= threshold_time:
+                # This is a potential unreplied message
+                # We need to verify it's from a user, not from the page
+                # For now, we'll include it and let the spam detection filter it
+                return {
+                    "conversation_id": conv["id"],
+                    "message": last_message,
+                    "page_id": page_id,
+                    "created_time": created_time
+                }
+            return None
+        
+        except Exception as e:
+            logger.warning(f"Error processing conversation {conv.get('id')}: {str(e)}")
+            return None
+
     async def close(self):
-        """关闭 HTTP 客户端"""
-        await self.client.aclose()
+        """归还 HTTP 客户端（共享连接保持打开）"""
+        await http_client_pool.release(self.client)
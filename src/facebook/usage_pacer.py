@@ -0,0 +1,275 @@
+"""Graph API 用量自适应节流 - 根据响应头中的用量百分比调整并发和请求间隔"""
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from src.core.config.constants import (
+    GRAPH_USAGE_SLOWDOWN_PERCENT,
+    GRAPH_USAGE_THROTTLE_PERCENT,
+    GRAPH_USAGE_MAX_DELAY_SECONDS,
+    GRAPH_USAGE_STALE_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+APP_USAGE_HEADER = "x-app-usage"
+PAGE_USAGE_HEADER = "x-page-usage"
+BUSINESS_USAGE_HEADER = "x-business-use-case-usage"
+
+
+@dataclass
+class UsageSample:
+    """一次响应头中解析出的用量"""
+    percent: float  # call_count / total_time / total_cputime 中的最大值（0-100）
+    regain_seconds: float  # 被限流时预计恢复访问的秒数
+    updated_at: float  # 记录时间（monotonic）
+
+
+def _usage_percent(values: Dict[str, Any]) -> float:
+    return max(
+        float(values.get(field) or 0)
+        for field in ("call_count", "total_time", "total_cputime")
+    )
+
+
+def parse_usage_header(raw: Any) -> Optional[Dict[str, float]]:
+    """
+    解析 X-App-Usage / X-Page-Usage 响应头
+
+    Returns:
+        {"percent": 用量百分比, "regain_seconds": 0}，无法解析时返回None
+    """
+    if not isinstance(raw, str) or not raw:
+        return None
+    try:
+        values = json.loads(raw)
+        if not isinstance(values, dict):
+            return None
+        return {"percent": _usage_percent(values), "regain_seconds": 0.0}
+    except (ValueError, TypeError):
+        return None
+
+
+def parse_business_usage_header(raw: Any) -> Dict[str, Dict[str, float]]:
+    """
+    解析 X-Business-Use-Case-Usage 响应头
+
+    格式为 {业务对象ID: [{"type": ..., "call_count": ..., "estimated_time_to_regain_access": 分钟}, ...]}，
+    页面令牌的业务对象ID即页面ID。
+
+    Returns:
+        {业务对象ID: {"percent": 各用例最大用量, "regain_seconds": 最长恢复时间}}
+    """
+    if not isinstance(raw, str) or not raw:
+        return {}
+    try:
+        data = json.loads(raw)
+    except (ValueError, TypeError):
+        return {}
+    if not isinstance(data, dict):
+        return {}
+
+    result = {}
+    for object_id, use_cases in data.items():
+        if not isinstance(use_cases, list):
+            continue
+        percent = 0.0
+        regain_seconds = 0.0
+        for use_case in use_cases:
+            if not isinstance(use_case, dict):
+                continue
+            try:
+                percent = max(percent, _usage_percent(use_case))
+                regain_seconds = max(
+                    regain_seconds,
+                    float(use_case.get("estimated_time_to_regain_access") or 0) * 60
+                )
+            except (ValueError, TypeError):
+                continue
+        result[str(object_id)] = {"percent": percent, "regain_seconds": regain_seconds}
+    return result
+
+
+class GraphAPIUsagePacer:
+    """
+    Graph API 用量节流器
+
+    每次 Graph API 响应后记录应用级（X-App-Usage）和页面级
+    （X-Page-Usage / X-Business-Use-Case-Usage）用量：
+    - 用量低于 slowdown_percent 时使用最大并发，不额外等待
+    - 用量在 slowdown_percent 和 throttle_percent 之间时线性降低并发
+    - 用量达到 throttle_percent 或被限流时串行请求，并在每次请求前等待
+    """
+
+    def __init__(
+        self,
+        slowdown_percent: float = GRAPH_USAGE_SLOWDOWN_PERCENT,
+        throttle_percent: float = GRAPH_USAGE_THROTTLE_PERCENT,
+        max_delay: float = GRAPH_USAGE_MAX_DELAY_SECONDS,
+        stale_seconds: float = GRAPH_USAGE_STALE_SECONDS,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.slowdown_percent = slowdown_percent
+        self.throttle_percent = throttle_percent
+        self.max_delay = max_delay
+        self.stale_seconds = stale_seconds
+        self.clock = clock
+        self._app_usage: Optional[UsageSample] = None
+        self._page_usage: Dict[str, UsageSample] = {}
+
+    def update_from_headers(self, headers: Any, page_id: Optional[str] = None) -> None:
+        """
+        从 Graph API 响应头更新用量
+
+        Args:
+            headers: 响应头（httpx.Headers 或普通字典）
+            page_id: 请求所属的页面ID
+        """
+        try:
+            get = headers.get
+        except AttributeError:
+            return
+        now = self.clock()
+
+        app_usage = parse_usage_header(get(APP_USAGE_HEADER) or get("X-App-Usage"))
+        if app_usage:
+            self._app_usage = UsageSample(app_usage["percent"], 0.0, now)
+
+        if page_id:
+            page_usage = parse_usage_header(get(PAGE_USAGE_HEADER) or get("X-Page-Usage"))
+            if page_usage:
+                self._page_usage[page_id] = UsageSample(page_usage["percent"], 0.0, now)
+
+        business_usage = parse_business_usage_header(
+            get(BUSINESS_USAGE_HEADER) or get("X-Business-Use-Case-Usage")
+        )
+        for object_id, usage in business_usage.items():
+            current = self._page_usage.get(object_id)
+            if current and current.updated_at == now:
+                # 同一响应同时带有 X-Page-Usage 时取两者较大值
+                usage = {
+                    "percent": max(usage["percent"], current.percent),
+                    "regain_seconds": max(usage["regain_seconds"], current.regain_seconds),
+                }
+            self._page_usage[object_id] = UsageSample(usage["percent"], usage["regain_seconds"], now)
+
+    def _fresh(self, sample: Optional[UsageSample], now: float) -> Optional[UsageSample]:
+        if sample is None or now - sample.updated_at > self.stale_seconds:
+            return None
+        return sample
+
+    def usage_percent(self, page_id: Optional[str] = None) -> float:
+        """当前生效的用量百分比（应用级和页面级的较大值，过期数据忽略）"""
+        now = self.clock()
+        samples = [self._fresh(self._app_usage, now)]
+        if page_id:
+            samples.append(self._fresh(self._page_usage.get(page_id), now))
+        return max((sample.percent for sample in samples if sample), default=0.0)
+
+    def regain_seconds(self, page_id: Optional[str] = None) -> float:
+        """被限流时距离恢复访问的剩余秒数"""
+        now = self.clock()
+        sample = self._fresh(self._page_usage.get(page_id), now) if page_id else None
+        if not sample or sample.regain_seconds <= 0:
+            return 0.0
+        return max(0.0, sample.regain_seconds - (now - sample.updated_at))
+
+    def concurrency(self, page_id: Optional[str], max_concurrency: int) -> int:
+        """根据用量计算允许的并发请求数（至少为1）"""
+        usage = self.usage_percent(page_id)
+        if usage >= self.throttle_percent or self.regain_seconds(page_id) > 0:
+            return 1
+        if usage <= self.slowdown_percent:
+            return max_concurrency
+        ratio = (self.throttle_percent - usage) / (self.throttle_percent - self.slowdown_percent)
+        return max(1, int(max_concurrency * ratio))
+
+    def delay(self, page_id: Optional[str] = None) -> float:
+        """根据用量计算下一次请求前应等待的秒数"""
+        regain = self.regain_seconds(page_id)
+        if regain > 0:
+            return min(self.max_delay, regain)
+        usage = self.usage_percent(page_id)
+        if usage < self.throttle_percent:
+            return 0.0
+        ratio = min(1.0, (usage - self.throttle_percent) / max(1.0, 100 - self.throttle_percent))
+        return min(self.max_delay, max(1.0, self.max_delay * ratio))
+
+    async def pace(self, page_id: Optional[str] = None) -> float:
+        """按当前用量等待，返回等待的秒数"""
+        delay = self.delay(page_id)
+        if delay > 0:
+            logger.info(
+                f"Graph API usage {self.usage_percent(page_id):.0f}% for page {page_id or 'app'}, "
+                f"waiting {delay:.1f}s before next request"
+            )
+            await asyncio.sleep(delay)
+        return delay
+
+    def limiter(self, page_id: Optional[str], max_concurrency: int) -> "AdaptiveConcurrencyLimiter":
+        """创建随用量自动调整并发上限的限制器（每次扫描创建一个）"""
+        return AdaptiveConcurrencyLimiter(self, page_id, max_concurrency)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取当前用量（用于监控接口）"""
+        now = self.clock()
+        app_usage = self._fresh(self._app_usage, now)
+        return {
+            "app_usage_percent": app_usage.percent if app_usage else None,
+            "pages": {
+                page_id: {
+                    "usage_percent": sample.percent,
+                    "regain_seconds": round(self.regain_seconds(page_id), 1),
+                }
+                for page_id, sample in self._page_usage.items()
+                if self._fresh(sample, now)
+            },
+        }
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    自适应并发限制器
+
+    与固定大小的 Semaphore 类似，但每次获取时重新读取 GraphAPIUsagePacer 的
+    并发上限；获取成功后再按用量等待（pace），用量升高时请求会自然变慢变少。
+    """
+
+    def __init__(self, pacer: GraphAPIUsagePacer, page_id: Optional[str], max_concurrency: int):
+        self.pacer = pacer
+        self.page_id = page_id
+        self.max_concurrency = max(1, max_concurrency)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._condition:
+            while self.in_flight >= self.pacer.concurrency(self.page_id, self.max_concurrency):
+                await self._condition.wait()
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await self.pacer.pace(self.page_id)
+        except BaseException:
+            await self.release()
+            raise
+
+    async def release(self) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+
+# 全局用量节流器（所有 FacebookAPIClient 共享）
+graph_api_usage_pacer = GraphAPIUsagePacer()
@@ -2,6 +2,7 @@
 from fastapi import APIRouter, Request, Response, HTTPException, Query, BackgroundTasks
 from typing import Dict, Any
 import logging
+from src.core.logging import WEBHOOK_EVENT_SAMPLE_KEY, webhook_event_fields, webhook_log_extra
 from src.facebook.api_client import FacebookAPIClient
 from src.facebook.message_parser import FacebookMessageParser
 from src.core.config import settings
@@ -73,7 +74,11 @@ async def handle_webhook(request: Request, background_tasks: BackgroundTasks):
     """
     try:
         body = await request.json()
-        logger.info(f"Received webhook event: {body}")
+        fields = webhook_event_fields(body)
+        logger.info(
+            f"Received webhook event: object={fields['object']} entries={fields['entries']} "
+            f"events={fields['events']} pages={','.join(fields['page_ids'])}",
+            extra=webhook_log_extra(WEBHOOK_EVENT_SAMPLE_KEY, fields))
         
         # 解析事件
         parser = FacebookMessageParser()
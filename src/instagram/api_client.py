@@ -1,8 +1,9 @@
 """Instagram Graph API 客户端"""
-import httpx
 from typing import Dict, Any, Optional
 from src.core.config import settings
 from src.core.config.constants import INSTAGRAM_GRAPH_API_BASE_URL
+from src.monitoring.metrics import graph_send_seconds
+from src.utils.http_client_pool import http_client_pool
 
 
 class InstagramAPIClient:
@@ -11,7 +12,7 @@ class InstagramAPIClient:
     def __init__(self):
         self.access_token = getattr(settings, 'instagram_access_token', None) or settings.facebook_access_token
         self.base_url = INSTAGRAM_GRAPH_API_BASE_URL
-        self.client = httpx.AsyncClient(timeout=30.0)
+        self.client = http_client_pool.borrow(self.base_url)
     
     async def send_message(
         self,
@@ -35,8 +36,9 @@ class InstagramAPIClient:
             "message": {"text": message}
         }
         
-        response = await self.client.post(url, params=params, json=data)
-        response.raise_for_status()
+        with graph_send_seconds.time(platform="instagram", page_id="me"):
+            response = await self.client.post(url, params=params, json=data)
+            response.raise_for_status()
         return response.json()
     
     async def get_user_info(self, user_id: str) -> Dict[str, Any]:
@@ -105,6 +107,6 @@ class InstagramAPIClient:
         return None
     
     async def close(self):
-        """关闭 HTTP 客户端"""
-        await self.client.aclose()
+        """归还 HTTP 客户端（共享连接保持打开）"""
+        await http_client_pool.release(self.client)
 
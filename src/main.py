@@ -1,25 +1,31 @@
 """FastAPI 主应用入口"""
+# 启动耗时分析（需在其他模块导入之前启用）
+from src.utils.startup_profile import enable_import_profile, startup_profile_requested, startup_timings
+
+if startup_profile_requested():
+    enable_import_profile()
+
 # 标准库导入
+import asyncio
 import logging
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any
-from logging.handlers import RotatingFileHandler
 
 # 第三方库导入
 from fastapi import FastAPI, HTTPException, APIRouter
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 # 本地模块导入
 from src.core.config import settings
 from src.core.config.constants import FACEBOOK_GRAPH_API_BASE_URL, LOG_FILE_MAX_BYTES, LOG_FILE_BACKUP_COUNT
 from src.core.database.connection import get_db, engine, Base
-from src.core.logging.config import LocalTimeFormatter
+from src.core.logging.config import setup_logging
+from src.monitoring.metrics import RequestMetricsMiddleware
 
-# API路由导入
-from src.api.v1.admin.api import router as admin_router
-from src.api.v1.monitoring.api import router as monitoring_router
-from src.api.v1.statistics.api import router as statistics_router
+# API路由导入（Webhook路由立即导入，管理/监控/统计路由延迟加载，见 src/api/lazy_routers.py）
+from src.api.lazy_routers import LazyRouterMiddleware, lazy_router_loader
 from src.api.v1.webhooks.facebook import router as facebook_router
 from src.telegram.bot_handler import router as telegram_router
 
@@ -31,51 +37,22 @@ except (ImportError, ModuleNotFoundError):
     INSTAGRAM_AVAILABLE = False
     instagram_router = APIRouter()
 
-# 延迟导入的路由（在注册时导入）
-from src.api.v1.monitoring.api_usage import router as api_usage_router
-from src.api.v1.admin.templates import router as templates_router
-from src.api.v1.admin.ab_testing import router as ab_testing_router
-from src.api.v1.admin.deployment import router as deployment_router
-
 # 配置日志
 project_root = Path(__file__).parent.parent
 logs_dir = project_root / "logs"
 logs_dir.mkdir(exist_ok=True)
 
-# 导入敏感信息过滤器
-from src.core.logging.config import SensitiveDataFilter
-
-# 创建敏感信息过滤器
-sensitive_filter = SensitiveDataFilter()
-
-# 控制台日志处理器
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(LocalTimeFormatter(
-    fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-))
-console_handler.addFilter(sensitive_filter)
-
-# 文件日志处理器（生产环境）
-file_handler = RotatingFileHandler(
-    logs_dir / "app.log",
-    maxBytes=LOG_FILE_MAX_BYTES,
-    backupCount=LOG_FILE_BACKUP_COUNT,
-    encoding='utf-8'
+# 日志：LOG_ASYNC=true 时脱敏、格式化和写文件在后台线程中进行，事件循环只负责入队
+setup_logging(
+    log_level="INFO",
+    log_file=logs_dir / "app.log",
+    use_json=settings.log_format.lower() == "json",
+    max_bytes=LOG_FILE_MAX_BYTES,
+    backup_count=LOG_FILE_BACKUP_COUNT,
+    use_queue=settings.log_async
 )
-file_handler.setFormatter(LocalTimeFormatter(
-    fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-))
-file_handler.addFilter(sensitive_filter)
-
-# 配置根日志记录器
 # 优化：减少httpx库的详细日志（降低CPU使用）
 logging.getLogger("httpx").setLevel(logging.WARNING)
-logging.basicConfig(
-    level=logging.INFO,
-    handlers=[console_handler, file_handler]
-)
 logger = logging.getLogger(__name__)
 logger.info(f"日志文件: {logs_dir / 'app.log'}")
 
@@ -120,13 +97,16 @@ app.include_router(facebook_router)  # Facebook Webhook (兼容路由: /webhook)
 if INSTAGRAM_AVAILABLE:
     app.include_router(instagram_router)  # Instagram Webhook (/instagram/webhook)
 app.include_router(telegram_router)
-app.include_router(statistics_router)
-app.include_router(monitoring_router)
-app.include_router(api_usage_router)
-app.include_router(admin_router)
-app.include_router(templates_router)
-app.include_router(ab_testing_router)
-app.include_router(deployment_router)
+
+# 管理/监控/统计路由：首次请求对应路径时（或启动后后台预加载时）才导入注册
+lazy_router_loader.bind(app)
+if settings.lazy_routers:
+    app.add_middleware(LazyRouterMiddleware, loader=lazy_router_loader)
+else:
+    lazy_router_loader.load_all()
+
+# 请求耗时指标（最后添加，位于最外层，包含延迟加载路由的耗时）
+app.add_middleware(RequestMetricsMiddleware)
 
 
 @app.on_event("startup")
@@ -189,6 +169,68 @@ async def startup_event():
     except (ImportError, AttributeError):
         logger.info("Platform registry not available")
 
+    # 启动出站HTTP连接池（需在调度器和入站队列之前，它们会借用共享客户端）
+    try:
+        from src.utils.http_client_pool import http_client_pool
+        await http_client_pool.start()
+        app.state.http_client_pool = http_client_pool
+    except Exception as e:
+        logger.warning(
+            f"Failed to start HTTP client pool, platform clients will use per-request clients: {str(e)}")
+
+    # 启动遥测明细写后缓冲（需在入站队列和调度器处理消息之前）
+    if settings.write_behind_enabled:
+        try:
+            from src.core.database.write_buffer import telemetry_buffer
+            await telemetry_buffer.start()
+            app.state.telemetry_buffer = telemetry_buffer
+        except Exception as e:
+            logger.warning(f"Failed to start write-behind buffer, telemetry rows will be committed individually: {str(e)}")
+
+    # 启动Webhook入站队列工作池（需在数据库表创建之后）
+    if settings.ingest_queue_enabled:
+        try:
+            from src.processors.ingest_queue import ingest_queue
+            await ingest_queue.start()
+            app.state.ingest_queue = ingest_queue
+            logger.info("Ingest queue worker pool started")
+        except Exception as e:
+            logger.warning(
+                f"Failed to start ingest queue, webhooks will fall back to background tasks: {str(e)}",
+                exc_info=True)
+
+    # 启动后台调度器：启用选举时只在选举出的主节点进程运行，主节点退出后由其他进程接管
+    if settings.scheduler_leader_election:
+        try:
+            from src.core.database.leader_election import scheduler_leader
+            scheduler_leader.on_elected = _start_leader_tasks
+            scheduler_leader.on_demoted = _stop_leader_tasks
+            await scheduler_leader.start()
+            app.state.scheduler_leader = scheduler_leader
+        except Exception as e:
+            logger.error(f"Failed to start scheduler leader election: {str(e)}", exc_info=True)
+    else:
+        await _start_leader_tasks()
+
+    # 多工作进程时定期写入指标快照，/metrics 合并所有进程
+    if settings.metrics_shared_dir:
+        from src.monitoring.metrics import metrics_snapshot_loop
+        app.state.metrics_snapshot = asyncio.create_task(metrics_snapshot_loop(settings.metrics_shared_dir))
+
+    # 后台预加载剩余路由和AI SDK（不阻塞启动，第一个Webhook无需等待）
+    if settings.lazy_routers:
+        app.state.router_warmup = asyncio.create_task(lazy_router_loader.warm_up())
+
+    elapsed = startup_timings.mark("startup")
+    logger.info(f"Startup complete in {elapsed:.2f}s (imports {startup_timings.marks.get('import', 0):.2f}s)")
+    if startup_timings.profiler is not None:
+        for entry in startup_timings.profiler.top_modules():
+            logger.info(
+                f"Import profile: {entry['module']} self={entry['self_ms']}ms cumulative={entry['cumulative_ms']}ms")
+
+
+async def _start_leader_tasks():
+    """启动只应在一个进程中运行的后台调度器（摘要通知、统计对账、自动回复扫描）"""
     # 启动摘要通知调度器
     try:
         from src.telegram.summary_scheduler import SummaryScheduler
@@ -201,6 +243,15 @@ async def startup_event():
         logger.warning(
             f"Failed to start summary notification scheduler: {str(e)}")
 
+    # 启动每日统计对账任务（修正增量计数的偏差）
+    if settings.statistics_incremental:
+        try:
+            from src.statistics.reconciler import statistics_reconciler
+            await statistics_reconciler.start()
+            app.state.statistics_reconciler = statistics_reconciler
+        except Exception as e:
+            logger.warning(f"Failed to start statistics reconciler: {str(e)}")
+
     # 启动自动回复调度器（每5分钟扫描未回复的产品消息）
     try:
         from src.auto_reply.auto_reply_scheduler import auto_reply_scheduler
@@ -218,11 +269,66 @@ async def shutdown_event():
     """应用关闭时执行"""
     logger.info("Shutting down...")
 
+    if hasattr(app.state, 'router_warmup'):
+        app.state.router_warmup.cancel()
+    if hasattr(app.state, 'metrics_snapshot'):
+        app.state.metrics_snapshot.cancel()
+
+    # 停止后台调度器（是主节点时释放主节点身份，其他进程随即接管）
+    if hasattr(app.state, 'scheduler_leader'):
+        try:
+            await app.state.scheduler_leader.stop()
+        except Exception as e:
+            logger.warning(f"Failed to stop scheduler leader election: {str(e)}")
+    await _stop_leader_tasks()
+
+    # 停止入站队列（等待处理中的消息完成，未处理的消息保留在数据库中）
+    if hasattr(app.state, 'ingest_queue'):
+        try:
+            await app.state.ingest_queue.stop()
+            logger.info("Ingest queue stopped")
+        except Exception as e:
+            logger.warning(f"Failed to stop ingest queue: {str(e)}")
+
+    # 写入缓冲中剩余的遥测明细（需在入站队列和调度器停止之后，它们可能仍在写入）
+    if hasattr(app.state, 'telemetry_buffer'):
+        try:
+            await app.state.telemetry_buffer.stop()
+        except Exception as e:
+            logger.warning(f"Failed to drain write-behind buffer: {str(e)}")
+
+    # 释放异步数据库连接池（如果启用过）
+    try:
+        from src.core.database.connection import dispose_async_engine
+        await dispose_async_engine()
+    except Exception as e:
+        logger.warning(f"Failed to dispose async database engine: {str(e)}")
+
+    # 关闭共享的OpenAI客户端（需在入站队列停止之后，处理中的消息可能仍在调用AI）
+    try:
+        from src.ai.openai_client import close_async_openai_client
+        await close_async_openai_client()
+    except Exception as e:
+        logger.warning(f"Failed to close OpenAI client: {str(e)}")
+
+    # 关闭出站HTTP连接池（最后关闭，前面停止的组件可能仍在发送请求）
+    if hasattr(app.state, 'http_client_pool'):
+        try:
+            await app.state.http_client_pool.close()
+            logger.info("HTTP client pool closed")
+        except Exception as e:
+            logger.warning(f"Failed to close HTTP client pool: {str(e)}")
+
+
+async def _stop_leader_tasks():
+    """停止主节点上运行的后台调度器（失去主节点身份或关闭时调用）"""
     # 停止摘要通知调度器
     if hasattr(app.state, 'summary_scheduler'):
         try:
             scheduler = app.state.summary_scheduler
+            del app.state.summary_scheduler
             await scheduler.close()
+            scheduler.db.close()
             logger.info("Summary notification scheduler stopped")
         except Exception as e:
             logger.warning(
@@ -232,11 +338,21 @@ async def shutdown_event():
     if hasattr(app.state, 'auto_reply_scheduler'):
         try:
             scheduler = app.state.auto_reply_scheduler
+            del app.state.auto_reply_scheduler
             await scheduler.stop()
             logger.info("Auto-reply scheduler stopped")
         except Exception as e:
             logger.warning(f"Failed to stop auto-reply scheduler: {str(e)}")
 
+    # 停止统计对账任务
+    if hasattr(app.state, 'statistics_reconciler'):
+        try:
+            reconciler = app.state.statistics_reconciler
+            del app.state.statistics_reconciler
+            await reconciler.stop()
+        except Exception as e:
+            logger.warning(f"Failed to stop statistics reconciler: {str(e)}")
+
 
 @app.get("/")
 async def root() -> Dict[str, Any]:
@@ -260,12 +376,13 @@ async def health_check() -> Dict[str, Any]:
     """增强的健康检查端点（不强制依赖数据库，避免502错误）"""
     try:
         from src.monitoring.health import health_checker
+        from src.core.database.leader_election import scheduler_leader
         try:
             db = next(get_db())
-            return await health_checker.check_health(db)
+            result = await health_checker.check_health(db)
         except Exception as db_error:
             logger.warning(f"Database connection failed in health check: {db_error}")
-            return {
+            result = {
                 "status": "degraded",
                 "timestamp": datetime.utcnow().isoformat(),
                 "message": "Service is running but database connection failed",
@@ -280,6 +397,9 @@ async def health_check() -> Dict[str, Any]:
                     }
                 }
             }
+        # 当前工作进程是否为后台调度器的主节点（多工作进程部署时只有一个为 true）
+        result["scheduler_leader"] = scheduler_leader.get_status()
+        return result
     except Exception as e:
         logger.error(f"Health check failed: {e}", exc_info=True)
         return {
@@ -301,10 +421,40 @@ async def simple_health_check() -> Dict[str, Any]:
 
 
 @app.get("/metrics", tags=["monitoring"])
-async def get_metrics() -> Dict[str, Any]:
-    """获取性能指标"""
+async def get_metrics(format: str = "json"):
+    """
+    获取性能指标
+    
+    format=prometheus 时返回 Prometheus 文本格式的直方图/计数器/仪表，
+    否则返回JSON（其中 metrics 字段为各直方图的样本数、平均值和 p50/p95/p99）。
+    配置 METRICS_SHARED_DIR 时两种格式的直方图都合并所有工作进程。
+    """
+    from src.monitoring.metrics import collect_metrics
+    registry = collect_metrics(settings.metrics_shared_dir)
+    if format == "prometheus":
+        return PlainTextResponse(registry.render_prometheus(), media_type="text/plain; version=0.0.4")
+    
     from src.monitoring.health import health_checker
-    return health_checker.get_metrics()
+    from src.processors.ingest_queue import ingest_queue
+    from src.utils.http_client_pool import http_client_pool
+    from src.core.cache import get_cache_stats, get_history_store
+    from src.core.database.write_buffer import telemetry_buffer
+    from src.ai.reply_cache import get_reply_cache
+    from src.ai.semantic_cache import get_semantic_cache
+    from src.core.logging import get_logging_stats
+    metrics = health_checker.get_metrics()
+    metrics["ingest_queue"] = ingest_queue.get_stats()
+    metrics["http_pool"] = http_client_pool.get_stats()
+    metrics["write_buffer"] = telemetry_buffer.get_stats()
+    metrics["caches"] = get_cache_stats()
+    metrics["reply_cache"] = get_reply_cache().get_stats()
+    metrics["semantic_cache"] = get_semantic_cache().get_stats()
+    metrics["conversation_history"] = get_history_store().get_stats()
+    metrics["logging"] = get_logging_stats()
+    metrics["startup"] = startup_timings.get_report()
+    metrics["startup"]["lazy_routers"] = lazy_router_loader.get_status()
+    metrics["metrics"] = registry.to_dict()
+    return metrics
 
 
 @app.get("/test/webhook-config", tags=["testing"])
@@ -356,6 +506,9 @@ async def test_settings():
         )
 
 
+startup_timings.mark("import")
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
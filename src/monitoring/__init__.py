@@ -2,6 +2,7 @@
 from .api import router
 from .alerts import alert_manager, AlertLevel, Alert
 from .health import health_checker, HealthChecker
+from .metrics import metrics_registry, MetricsRegistry, Histogram
 from .realtime import realtime_monitor
 
 __all__ = [
@@ -11,5 +12,8 @@ __all__ = [
     'Alert',
     'health_checker',
     'HealthChecker',
+    'metrics_registry',
+    'MetricsRegistry',
+    'Histogram',
     'realtime_monitor'
 ]
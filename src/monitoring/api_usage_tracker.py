@@ -17,6 +17,11 @@ class APIType(str, Enum):
     TELEGRAM = "telegram"
 
 
+# OpenAI 回复生成的端点；命中回复缓存时记录为单独的端点（未实际调用API）
+OPENAI_CHAT_ENDPOINT = "chat.completions"
+REPLY_CACHE_ENDPOINT = "chat.completions.cache"
+
+
 @dataclass
 class APIUsageRecord:
     """API使用记录"""
@@ -42,8 +47,14 @@ class APIUsageTracker:
         "gpt-4": {"input": 30.00 / 1_000_000, "output": 60.00 / 1_000_000},
     }
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, write_buffer=None):
+        """
+        Args:
+            db: 数据库会话
+            write_buffer: 写后缓冲（WriteBehindBuffer），提供时日志批量写入而不是每次调用提交
+        """
         self.db = db
+        self.write_buffer = write_buffer
         self._in_memory_logs: List[APIUsageRecord] = []  # 内存中的日志（用于快速统计）
         self._max_memory_logs = 1000  # 最多保留1000条内存日志
     
@@ -101,6 +112,36 @@ class APIUsageTracker:
         # 检查错误率并触发告警
         self._check_error_rate(api_type)
     
+    def record_reply_cache_hit(
+        self,
+        saved_tokens: int,
+        response_time_ms: float,
+        model: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        记录一次AI回复缓存命中（没有调用OpenAI）
+        
+        Args:
+            saved_tokens: 生成该回复时使用的token数（即本次节省的token）
+            response_time_ms: 缓存查找耗时（毫秒）
+            model: 模型名称
+            metadata: 其他元数据
+        """
+        saved_cost = self._calculate_openai_cost(saved_tokens, model) if saved_tokens and model else 0.0
+        self.record_api_call(
+            api_type=APIType.OPENAI.value,
+            endpoint=REPLY_CACHE_ENDPOINT,
+            success=True,
+            response_time_ms=response_time_ms,
+            model=model,
+            metadata={
+                **(metadata or {}),
+                "saved_tokens": saved_tokens,
+                "saved_cost_usd": round(saved_cost, 10),
+            }
+        )
+    
     def _calculate_openai_cost(self, tokens_used: int, model: str) -> float:
         """计算OpenAI成本"""
         # 简化计算：假设50%输入，50%输出
@@ -119,7 +160,7 @@ class APIUsageTracker:
             # 检查是否有APIUsageLog模型，如果没有则只记录到内存
             from src.core.database.models import APIUsageLog
             
-            log_entry = APIUsageLog(
+            values = dict(
                 api_type=record.api_type,
                 endpoint=record.endpoint,
                 success=record.success,
@@ -128,10 +169,14 @@ class APIUsageTracker:
                 error_message=record.error_message,
                 tokens_used=record.tokens_used,
                 cost_usd=f"{record.cost_usd:.10f}" if record.cost_usd else None,  # 使用固定格式，避免科学计数法
-                metadata=record.metadata
+                extra_metadata=record.metadata
             )
             
-            self.db.add(log_entry)
+            if self.write_buffer is not None:
+                self.write_buffer.add(APIUsageLog, **values)
+                return
+            
+            self.db.add(APIUsageLog(**values))
             self.db.commit()
         except ImportError:
             # 模型不存在，只记录到内存
@@ -146,7 +191,10 @@ class APIUsageTracker:
             from src.monitoring.alerts import alert_manager, AlertLevel
             
             # 检查最近100次调用的错误率
-            recent_calls = [r for r in self._in_memory_logs if r.api_type == api_type][-100:]
+            recent_calls = [
+                r for r in self._in_memory_logs
+                if r.api_type == api_type and r.endpoint != REPLY_CACHE_ENDPOINT
+            ][-100:]
             if len(recent_calls) < 10:
                 return  # 样本太少，不检查
             
@@ -200,8 +248,8 @@ class APIUsageTracker:
         Returns:
             统计数据字典
         """
-        # 从内存日志计算（快速）
-        logs = self._in_memory_logs
+        # 从内存日志计算（快速），回复缓存命中不是实际的API调用
+        logs = [r for r in self._in_memory_logs if r.endpoint != REPLY_CACHE_ENDPOINT]
         
         if api_type:
             logs = [r for r in logs if r.api_type == api_type]
@@ -274,6 +322,64 @@ class APIUsageTracker:
             "total_cost_usd": sum(s["total_cost_usd"] for s in stats.values() if isinstance(s, dict)),
             "total_tokens": sum(s["total_tokens"] for s in stats.values() if isinstance(s, dict))
         }
+        stats["reply_cache"] = self.get_reply_cache_statistics(start_of_day, end_of_day)
         
         return stats
+    
+    def get_reply_cache_statistics(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        获取AI回复缓存的命中率和节省的token（从 api_usage_logs 统计）
+        
+        命中数为缓存命中记录数（其中 semantic_hits 为语义缓存命中），未命中数为实际调用 chat.completions 的次数。
+        
+        Args:
+            start_date: 开始时间（可选）
+            end_date: 结束时间（不包含，可选）
+        
+        Returns:
+            缓存统计数据
+        """
+        result = {
+            "hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "hit_rate": 0.0,
+            "saved_tokens": 0,
+            "saved_cost_usd": 0.0
+        }
+        try:
+            from src.core.database.models import APIUsageLog
+            
+            filters = [APIUsageLog.api_type == APIType.OPENAI.value]
+            if start_date:
+                filters.append(APIUsageLog.timestamp >= start_date)
+            if end_date:
+                filters.append(APIUsageLog.timestamp < end_date)
+            
+            misses = self.db.query(sql_func.count(APIUsageLog.id))\
+                .filter(*filters, APIUsageLog.endpoint == OPENAI_CHAT_ENDPOINT)\
+                .scalar() or 0
+            hit_metadata = self.db.query(APIUsageLog.extra_metadata)\
+                .filter(*filters, APIUsageLog.endpoint == REPLY_CACHE_ENDPOINT)\
+                .all()
+        except Exception as e:
+            logger.error(f"Failed to get reply cache statistics: {e}", exc_info=True)
+            return result
+        
+        hits = len(hit_metadata)
+        lookups = hits + misses
+        result.update(
+            hits=hits,
+            semantic_hits=sum(1 for (metadata,) in hit_metadata if (metadata or {}).get("semantic")),
+            misses=misses,
+            hit_rate=round(hits / lookups, 4) if lookups else 0.0,
+            saved_tokens=sum(int((metadata or {}).get("saved_tokens") or 0) for (metadata,) in hit_metadata),
+            saved_cost_usd=round(
+                sum(float((metadata or {}).get("saved_cost_usd") or 0) for (metadata,) in hit_metadata), 4)
+        )
+        return result
 
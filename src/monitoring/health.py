@@ -6,7 +6,9 @@ from sqlalchemy.orm import Session
 from sqlalchemy import text
 from src.core.database.connection import engine
 from src.core.config import settings
+from src.core.config.constants import METRICS_RESPONSE_TIME_BUCKETS_MS
 from src.monitoring.alerts import alert_manager, AlertLevel
+from src.monitoring.metrics import Histogram
 import logging
 
 logger = logging.getLogger(__name__)
@@ -19,7 +21,9 @@ class HealthChecker:
         self.start_time = datetime.utcnow()
         self.request_count = 0
         self.error_count = 0
-        self.response_times: list = []
+        # 固定桶直方图：记录为O(1)，不保存原始样本，p95按桶估算
+        self.response_times = Histogram(
+            "response_time_ms", "HTTP response time (ms)", buckets=METRICS_RESPONSE_TIME_BUCKETS_MS)
     
     async def check_health(self, db: Optional[Session] = None) -> Dict[str, Any]:
         """
@@ -189,27 +193,21 @@ class HealthChecker:
             }
     
     def record_request(self, response_time_ms: float, is_error: bool = False) -> None:
-        """记录请求指标"""
+        """记录请求指标（由 RequestMetricsMiddleware 对每个HTTP请求调用）"""
         self.request_count += 1
         if is_error:
             self.error_count += 1
-        
-        self.response_times.append(response_time_ms)
-        
-        # 只保留最近1000个请求的响应时间
-        if len(self.response_times) > 1000:
-            self.response_times = self.response_times[-1000:]
+        self.response_times.observe(response_time_ms)
     
     def get_metrics(self) -> Dict[str, Any]:
         """获取性能指标"""
-        if not self.response_times:
+        series = self.response_times.samples().get(())
+        if not series or not series["count"]:
             avg_response_time = 0
             p95_response_time = 0
         else:
-            sorted_times = sorted(self.response_times)
-            avg_response_time = sum(sorted_times) / len(sorted_times)
-            p95_index = int(len(sorted_times) * 0.95)
-            p95_response_time = sorted_times[p95_index] if p95_index < len(sorted_times) else sorted_times[-1]
+            avg_response_time = series["sum"] / series["count"]
+            p95_response_time = self.response_times.quantile(0.95, series["buckets"])
         
         error_rate = (self.error_count / self.request_count * 100) if self.request_count > 0 else 0
         
@@ -0,0 +1,516 @@
+"""
+进程内指标：固定桶直方图、计数器和仪表
+
+- Histogram: 桶上界在定义时固定，record 只做一次二分查找和计数加一（与样本数无关），
+  不保存原始样本；桶定义相同的直方图逐桶相加即可合并（多个工作进程）
+- Counter: 单调递增计数
+- Gauge: 抓取时调用回调读取当前值（队列深度等）；多进程合并时按 merge 相加（各进程自己的值）
+  或取最大值（各进程读到的同一个共享值，如数据库中的积压）
+- MetricsRegistry: 导出 JSON（/metrics 的 metrics 字段）和 Prometheus 文本格式（/metrics?format=prometheus）
+
+多工作进程部署时配置 METRICS_SHARED_DIR：每个进程定期把快照写入该目录，
+抓取时合并所有未过期的快照（已退出进程的快照过期后不再计入）。
+"""
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from src.core.config.constants import (
+    METRICS_DB_BUCKETS_SECONDS,
+    METRICS_LATENCY_BUCKETS_SECONDS,
+    METRICS_SNAPSHOT_INTERVAL_SECONDS,
+    METRICS_SNAPSHOT_MAX_AGE_SECONDS,
+    METRICS_TOKEN_BUCKETS,
+)
+
+logger = logging.getLogger(__name__)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """指标基类：按标签值分组的序列"""
+
+    type_name = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names: Tuple[str, ...] = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self) -> Dict[LabelValues, Any]:
+        raise NotImplementedError
+
+    def merge_series(self, key: LabelValues, data: Any) -> None:
+        raise NotImplementedError
+
+    def empty_copy(self) -> "_Metric":
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def merge_series(self, key: LabelValues, data: float) -> None:
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + float(data)
+
+    def empty_copy(self) -> "Counter":
+        return Counter(self.name, self.help, self.label_names)
+
+
+class Gauge(_Metric):
+    """
+    仪表：抓取时调用回调读取当前值，回调返回 {标签值元组: 数值}
+
+    merge 决定多进程快照的合并方式：
+    - "sum": 每个进程报告自己的值（本地队列深度等），合并时相加
+    - "max": 每个进程报告同一个共享值（数据库表积压等），合并时取最大值，避免按进程数重复计算
+    """
+
+    type_name = "gauge"
+    MERGE_MODES = ("sum", "max")
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        callback: Optional[Callable[[], Dict[LabelValues, float]]] = None,
+        merge: str = "sum"
+    ):
+        if merge not in self.MERGE_MODES:
+            raise ValueError(f"Unknown gauge merge mode: {merge}")
+        super().__init__(name, help_text, labels)
+        self.merge = merge
+        self._callbacks: List[Callable[[], Dict[LabelValues, float]]] = [callback] if callback else []
+        self._values: Dict[LabelValues, float] = {}
+
+    def add_callback(self, callback: Callable[[], Dict[LabelValues, float]]) -> None:
+        self._callbacks.append(callback)
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def samples(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            values = dict(self._values)
+        for callback in self._callbacks:
+            try:
+                for key, value in callback().items():
+                    values[tuple(str(v) for v in key)] = float(value)
+            except Exception as e:
+                logger.debug(f"Gauge callback for {self.name} failed: {e}")
+        return values
+
+    def merge_series(self, key: LabelValues, data: float) -> None:
+        with self._lock:
+            current = self._values.get(key)
+            if current is None:
+                self._values[key] = float(data)
+            elif self.merge == "max":
+                self._values[key] = max(current, float(data))
+            else:
+                self._values[key] = current + float(data)
+
+    def empty_copy(self) -> "Gauge":
+        return Gauge(self.name, self.help, self.label_names, merge=self.merge)
+
+
+class Histogram(_Metric):
+    """
+    固定桶直方图
+
+    每个序列保存各桶计数（非累计）、样本总和与样本数；分位数按桶内线性插值估算
+    （与 Prometheus histogram_quantile 相同），精度取决于桶的划分。
+    """
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = ()):
+        super().__init__(name, help_text, labels)
+        bounds = sorted(float(b) for b in buckets or METRICS_LATENCY_BUCKETS_SECONDS)
+        self.buckets: Tuple[float, ...] = tuple(bounds)
+        # 序列: [各桶计数（最后一个为 +Inf）, 总和, 样本数]
+        self._series: Dict[LabelValues, List[Any]] = {}
+
+    def _new_series(self) -> List[Any]:
+        return [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = self._new_series()
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, **labels) -> "_HistogramTimer":
+        """计时上下文：with histogram.time(label=...): ..."""
+        return _HistogramTimer(self, labels)
+
+    def samples(self) -> Dict[LabelValues, Dict[str, Any]]:
+        with self._lock:
+            return {
+                key: {"buckets": list(series[0]), "sum": series[1], "count": series[2]}
+                for key, series in self._series.items()
+            }
+
+    def merge_series(self, key: LabelValues, data: Dict[str, Any]) -> None:
+        counts = data.get("buckets") or []
+        if len(counts) != len(self.buckets) + 1:
+            # 桶定义不同（如部署期间新旧版本并存）的快照无法逐桶相加
+            return
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = self._new_series()
+            for i, count in enumerate(counts):
+                series[0][i] += int(count)
+            series[1] += float(data.get("sum", 0.0))
+            series[2] += int(data.get("count", 0))
+
+    def empty_copy(self) -> "Histogram":
+        return Histogram(self.name, self.help, self.label_names, self.buckets)
+
+    def quantile(self, q: float, counts: Sequence[int]) -> float:
+        """按桶估算分位数（counts 为各桶的非累计计数）"""
+        total = sum(counts)
+        if total == 0:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if count and cumulative + count >= rank:
+                if i >= len(self.buckets):
+                    # 落在 +Inf 桶：返回最大的有限上界
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+
+class _HistogramTimer:
+    """记录 with 代码块耗时（秒）的上下文管理器"""
+
+    __slots__ = ("_histogram", "_labels", "_started")
+
+    def __init__(self, histogram: Histogram, labels: Dict[str, Any]):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        labels = dict(self._labels)
+        if "outcome" in self._histogram.label_names and "outcome" not in labels:
+            labels["outcome"] = "error" if exc_type else "success"
+        self._histogram.observe(time.perf_counter() - self._started, **labels)
+        return False
+
+
+class MetricsRegistry:
+    """指标注册表：JSON / Prometheus 导出和跨进程快照合并"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = ()) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = (),
+              callback: Optional[Callable[[], Dict[LabelValues, float]]] = None,
+              merge: str = "sum") -> Gauge:
+        gauge = self._register(Gauge(name, help_text, labels, merge=merge))
+        if callback is not None:
+            gauge.add_callback(callback)
+        return gauge
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def metrics(self) -> Iterable[_Metric]:
+        return self._metrics.values()
+
+    # ------------------------------------------------------------------
+    # 快照与合并
+    # ------------------------------------------------------------------
+
+    def snapshot(self) -> Dict[str, Any]:
+        """可JSON序列化的当前值（仪表在此时读取）"""
+        return {
+            "pid": os.getpid(),
+            "time": time.time(),
+            "metrics": {
+                metric.name: [[list(key), data] for key, data in metric.samples().items()]
+                for metric in self._metrics.values()
+            },
+        }
+
+    def merged(self, snapshots: Iterable[Dict[str, Any]]) -> "MetricsRegistry":
+        """返回本注册表与其他进程快照相加后的新注册表（本进程的值始终计入）"""
+        result = MetricsRegistry()
+        for metric in self._metrics.values():
+            result._register(metric.empty_copy())
+        for snapshot in [self.snapshot(), *snapshots]:
+            for name, series in (snapshot.get("metrics") or {}).items():
+                metric = result.get(name)
+                if metric is None:
+                    continue
+                for key, data in series:
+                    metric.merge_series(tuple(key), data)
+        return result
+
+    def write_snapshot(self, directory: Path) -> Path:
+        """把本进程快照写入共享目录（先写临时文件再替换，读取方不会读到半个文件）"""
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"metrics-{os.getpid()}.json"
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.snapshot()), encoding="utf-8")
+        os.replace(tmp_path, path)
+        return path
+
+    @staticmethod
+    def load_snapshots(directory: Path, max_age: float = METRICS_SNAPSHOT_MAX_AGE_SECONDS) -> List[Dict[str, Any]]:
+        """读取共享目录中其他进程未过期的快照"""
+        snapshots = []
+        now = time.time()
+        own_pid = os.getpid()
+        for path in directory.glob("metrics-*.json"):
+            try:
+                snapshot = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if snapshot.get("pid") == own_pid or now - float(snapshot.get("time", 0)) > max_age:
+                continue
+            snapshots.append(snapshot)
+        return snapshots
+
+    # ------------------------------------------------------------------
+    # 导出
+    # ------------------------------------------------------------------
+
+    def render_prometheus(self) -> str:
+        """Prometheus 文本格式（text/plain; version=0.0.4）"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            samples = metric.samples()
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for key in sorted(samples):
+                data = samples[key]
+                if isinstance(metric, Histogram):
+                    cumulative = 0
+                    for bound, count in zip((*metric.buckets, float("inf")), data["buckets"]):
+                        cumulative += count
+                        labels = _format_labels(metric.label_names, key, ("le", _format_value(bound)))
+                        lines.append(f"{metric.name}_bucket{labels} {cumulative}")
+                    labels = _format_labels(metric.label_names, key)
+                    lines.append(f"{metric.name}_sum{labels} {_format_value(data['sum'])}")
+                    lines.append(f"{metric.name}_count{labels} {data['count']}")
+                else:
+                    labels = _format_labels(metric.label_names, key)
+                    lines.append(f"{metric.name}{labels} {_format_value(data)}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON 摘要：直方图给出样本数、平均值和 p50/p95/p99"""
+        result: Dict[str, Any] = {}
+        for metric in self._metrics.values():
+            series = []
+            for key, data in sorted(metric.samples().items()):
+                entry: Dict[str, Any] = dict(zip(metric.label_names, key))
+                if isinstance(metric, Histogram):
+                    count = data["count"]
+                    entry.update({
+                        "count": count,
+                        "avg": round(data["sum"] / count, 6) if count else 0.0,
+                        "p50": round(metric.quantile(0.50, data["buckets"]), 6),
+                        "p95": round(metric.quantile(0.95, data["buckets"]), 6),
+                        "p99": round(metric.quantile(0.99, data["buckets"]), 6),
+                    })
+                else:
+                    entry["value"] = data
+                series.append(entry)
+            result[metric.name] = series
+        return result
+
+
+# 全局指标注册表
+metrics_registry = MetricsRegistry()
+
+# HTTP 请求（路由模板作为标签，未匹配的路径统一为 unmatched）
+http_request_seconds = metrics_registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route", "status"))
+
+# 消息处理管道
+pipeline_processor_seconds = metrics_registry.histogram(
+    "pipeline_processor_duration_seconds", "MessagePipeline processor duration", ("processor", "status"))
+pipeline_seconds = metrics_registry.histogram(
+    "pipeline_duration_seconds", "MessagePipeline total duration per message")
+
+# OpenAI
+openai_request_seconds = metrics_registry.histogram(
+    "openai_request_duration_seconds", "OpenAI chat completion latency", ("model", "outcome"))
+openai_tokens = metrics_registry.histogram(
+    "openai_tokens", "OpenAI total tokens per completion", ("model",), buckets=METRICS_TOKEN_BUCKETS)
+
+# Graph API 发送
+graph_send_seconds = metrics_registry.histogram(
+    "graph_api_send_duration_seconds", "Graph API send message latency", ("platform", "page_id", "outcome"))
+
+# 数据库（Repository 方法）
+db_query_seconds = metrics_registry.histogram(
+    "db_query_duration_seconds", "Repository method duration", ("repository", "method"),
+    buckets=METRICS_DB_BUCKETS_SECONDS)
+
+# 队列深度（抓取时读取）
+queue_depth = metrics_registry.gauge("queue_depth", "Items waiting in in-process queues", ("queue",))
+# 入站队列积压按共享的数据库表统计，每个工作进程读到的是同一个值
+ingest_backlog = metrics_registry.gauge(
+    "ingest_backlog", "Messages pending or in flight in the shared ingest table", merge="max")
+
+
+def _queue_depths() -> Dict[LabelValues, float]:
+    from src.processors.ingest_queue import ingest_queue
+    from src.core.database.write_buffer import telemetry_buffer
+    from src.core.logging import get_logging_stats
+    return {
+        ("ingest_in_flight",): ingest_queue.get_stats()["in_flight"],
+        ("write_buffer",): telemetry_buffer.get_stats()["pending_rows"],
+        ("log",): get_logging_stats()["queue_size"],
+    }
+
+
+def _ingest_backlog() -> Dict[LabelValues, float]:
+    from src.processors.ingest_queue import ingest_queue
+    return {(): ingest_queue.get_stats()["pending"]}
+
+
+queue_depth.add_callback(_queue_depths)
+ingest_backlog.add_callback(_ingest_backlog)
+
+
+def collect_metrics(shared_dir: Optional[str] = None) -> MetricsRegistry:
+    """抓取用的注册表：配置共享目录时合并其他工作进程的快照"""
+    if not shared_dir:
+        return metrics_registry
+    return metrics_registry.merged(MetricsRegistry.load_snapshots(Path(shared_dir)))
+
+
+async def metrics_snapshot_loop(shared_dir: str, interval: float = METRICS_SNAPSHOT_INTERVAL_SECONDS) -> None:
+    """定期把本进程快照写入共享目录（在线程池中写文件）；取消时删除本进程的快照"""
+    import asyncio
+    directory = Path(shared_dir)
+    loop = asyncio.get_running_loop()
+    path = directory / f"metrics-{os.getpid()}.json"
+    try:
+        while True:
+            try:
+                path = await loop.run_in_executor(None, metrics_registry.write_snapshot, directory)
+            except Exception as e:
+                logger.warning(f"Failed to write metrics snapshot to {directory}: {e}")
+            await asyncio.sleep(interval)
+    finally:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+class RequestMetricsMiddleware:
+    """记录每个HTTP请求的耗时和状态码（纯ASGI中间件，不缓冲响应体）"""
+
+    def __init__(self, app):
+        from src.monitoring.health import health_checker
+        self.app = app
+        self.health_checker = health_checker
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            route = scope.get("route")
+            http_request_seconds.observe(
+                duration,
+                method=scope.get("method", ""),
+                route=getattr(route, "path", "unmatched"),
+                status=status_code,
+            )
+            self.health_checker.record_request(duration * 1000, is_error=status_code >= 500)
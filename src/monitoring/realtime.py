@@ -112,7 +112,7 @@ class RealtimeMonitor:
 
     async def get_live_stats(self, db: Session) -> Dict[str, Any]:
         """
-        获取实时统计数据
+        获取实时统计数据（读取AI回复汇总分桶，不扫描对话表）
 
         Args:
             db: 数据库会话
@@ -120,59 +120,27 @@ class RealtimeMonitor:
         Returns:
             实时统计数据
         """
-        from datetime import date, timedelta
-        from src.core.database.models import Conversation
-        from sqlalchemy import func
+        from datetime import timedelta
+        from src.statistics.rollups import AIReplyRollups
+
+        rollups = AIReplyRollups(db)
 
         # 使用UTC时区的今天日期
         today_utc = datetime.now(timezone.utc).date()
         today_start = datetime.combine(
             today_utc, datetime.min.time(), timezone.utc)
-        today_end = datetime.combine(
-            today_utc + timedelta(days=1), datetime.min.time(), timezone.utc)
-
-        # 今日统计
-        today_stats = db.query(
-            func.count(Conversation.id).label('total_replies'),
-            func.count(func.distinct(Conversation.customer_id)
-                       ).label('unique_customers')
-        ).filter(
-            Conversation.ai_replied == True,
-            Conversation.ai_reply_at >= today_start,
-            Conversation.ai_reply_at < today_end
-        ).first()
-
-        # 最近1小时统计（使用UTC时间）
-        one_hour_ago = datetime.now(timezone.utc) - timedelta(hours=1)
-        recent_stats = db.query(
-            func.count(Conversation.id).label('recent_replies')
-        ).filter(
-            Conversation.ai_replied == True,
-            Conversation.ai_reply_at >= one_hour_ago
-        ).first()
-
-        # 平台分布
-        platform_stats = db.query(
-            Conversation.platform,
-            func.count(Conversation.id).label('count')
-        ).filter(
-            Conversation.ai_replied == True,
-            Conversation.ai_reply_at >= today_start,
-            Conversation.ai_reply_at < today_end
-        ).group_by(Conversation.platform).all()
+        today_end = today_start + timedelta(days=1)
 
         return {
             "today": {
-                "total_replies": today_stats.total_replies or 0,
-                "unique_customers": today_stats.unique_customers or 0
+                "total_replies": rollups.count(today_start, today_end),
+                "unique_customers": rollups.unique_customers(today_utc)
             },
             "last_hour": {
-                "replies": recent_stats.recent_replies or 0
-            },
-            "platform_distribution": {
-                platform.value if platform else "unknown": count
-                for platform, count in platform_stats
+                # 最近1小时（按小时分桶的滑动窗口估计）
+                "replies": rollups.last_hour()
             },
+            "platform_distribution": rollups.distribution(today_start, today_end, "platform"),
             "cache_updated_at": self.stats_cache.get("updated_at")
         }
 
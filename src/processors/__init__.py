@@ -1,6 +1,7 @@
 """消息处理器模块"""
 from .base import BaseProcessor, ProcessorResult, ProcessorContext
 from .pipeline import MessagePipeline
+from .ingest_queue import IngestQueue, ingest_queue
 from .handlers import (
     MessageReceiver,
     UserInfoHandler,
@@ -16,6 +17,8 @@ __all__ = [
     'ProcessorResult',
     'ProcessorContext',
     'MessagePipeline',
+    'IngestQueue',
+    'ingest_queue',
     'MessageReceiver',
     'UserInfoHandler',
     'FilterHandler',
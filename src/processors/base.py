@@ -54,12 +54,16 @@ class ProcessorContext:
     
     # 数据库和客户端
     db: Any = None
+    async_db: Any = None  # 异步会话（仅在启用DATABASE_ASYNC且有处理器声明uses_async_db时创建）
     platform_client: Any = None
 
 
 class BaseProcessor(ABC):
     """处理器基类 - 所有处理器都应继承此类"""
     
+    # 是否支持使用 context.async_db（异步会话），未启用时处理器应回退到 context.db
+    uses_async_db: bool = False
+    
     def __init__(self, name: str, description: str = ""):
         """
         初始化处理器
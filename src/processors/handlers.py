@@ -2,6 +2,7 @@
 from typing import Dict, Any
 from .base import BaseProcessor, ProcessorResult, ProcessorStatus, ProcessorContext
 from src.core.database.models import MessageType
+from src.core.exceptions import RateLimitExceededError
 import logging
 
 logger = logging.getLogger(__name__)
@@ -47,6 +48,8 @@ class MessageReceiver(BaseProcessor):
 class UserInfoHandler(BaseProcessor):
     """用户信息处理 - 获取或创建客户"""
 
+    uses_async_db = True
+
     def __init__(self):
         super().__init__("user_info_handler", "用户信息处理")
 
@@ -57,7 +60,7 @@ class UserInfoHandler(BaseProcessor):
         """获取或创建客户信息"""
         try:
             from src.ai.conversation_manager import ConversationManager
-            conversation_manager = ConversationManager(context.db)
+            conversation_manager = ConversationManager(context.db, async_db=context.async_db)
 
             sender_id = context.message_data.get("sender_id")
 
@@ -79,7 +82,7 @@ class UserInfoHandler(BaseProcessor):
                 logger.warning(f"Failed to get user info: {str(e)}")
 
             # 获取或创建客户
-            customer = conversation_manager.get_or_create_customer(
+            customer = await conversation_manager.get_or_create_customer(
                 platform=context.platform_name,
                 platform_user_id=sender_id,
                 name=context.user_info.get("name")
@@ -106,6 +109,8 @@ class UserInfoHandler(BaseProcessor):
 class FilterHandler(BaseProcessor):
     """过滤处理器 - 应用过滤规则"""
 
+    uses_async_db = True
+
     def __init__(self):
         super().__init__("filter_handler", "消息过滤")
 
@@ -117,16 +122,17 @@ class FilterHandler(BaseProcessor):
         try:
             from src.collector.filter_engine import FilterEngine
             from src.ai.conversation_manager import ConversationManager
+            from src.utils.keyword_matcher import CATEGORY_PRODUCT, get_keyword_index
             from src.core.database.models import Platform
 
             # 保存对话记录到数据库
-            conversation_manager = ConversationManager(context.db)
+            conversation_manager = ConversationManager(context.db, async_db=context.async_db)
             message_content = context.message_data.get("content", "")
             message_type = context.message_data.get(
                 "message_type", MessageType.MESSAGE)
             
             # 保存对话记录
-            conversation = conversation_manager.save_conversation(
+            conversation = await conversation_manager.save_conversation_async(
                 customer_id=context.customer_id,
                 platform_message_id=context.message_data.get("message_id"),
                 platform=context.platform_name,
@@ -139,30 +145,30 @@ class FilterHandler(BaseProcessor):
             context.conversation_id = conversation.id
             context.conversation = conversation
 
-            # 应用过滤规则
+            # 重复投递（入站队列重投或可见性超时后重新领取）且已回复过：不再重复回复
+            if conversation.ai_replied:
+                return ProcessorResult(
+                    status=ProcessorStatus.SKIP,
+                    message="消息已处理过（重复投递），跳过处理",
+                    should_continue=False
+                )
+
+            # 应用过滤规则（关键词只扫描一次，过滤和产品关键词判断共用命中结果）
             filter_engine = FilterEngine(context.db)
+            keyword_hits = get_keyword_index().match(message_content)
             filter_result = filter_engine.filter_message(
-                conversation, message_content)
+                conversation, message_content, keyword_hits=keyword_hits)
             context.filter_result = filter_result
             context.should_review = filter_result.get("should_review", False)
 
             # 检查是否包含产品关键词（如果包含，即使被过滤也要回复）
-            message_lower = message_content.lower()
-            product_keywords = [
-                "iphone", "ip", "苹果", "apple", "loan", "borrow", "lend", "贷款", "借款", 
-                "借", "贷", "price", "cost", "费用", "价格", "多少钱", "interest", "利息",
-                "model", "型号", "容量", "storage", "apple id", "id card", "身份证",
-                "咨询", "了解", "询问", "办理", "申请", "apply", "怎么", "如何", "how",
-                "服务", "service", "客服", "customer service", "legit", "legitimate", 
-                "真实", "真的", "可靠", "reliable", "可信", "?", "？"
-            ]
-            has_product_keyword = any(keyword in message_lower for keyword in product_keywords)
+            has_product_keyword = CATEGORY_PRODUCT in keyword_hits
             
             # 应用过滤结果到对话记录
             conversation.filtered = filter_result.get("filtered", False)
             conversation.filter_reason = filter_result.get("filter_reason")
             conversation.priority = filter_result.get("priority")
-            context.db.commit()
+            await self._commit(context)
 
             # 如果被过滤且不需要审核，但包含产品关键词，仍然继续处理（确保产品相关消息被回复）
             if filter_result.get("filtered") and not filter_result.get("should_review"):
@@ -171,7 +177,7 @@ class FilterHandler(BaseProcessor):
                     # 重置过滤状态，确保消息被处理
                     conversation.filtered = False
                     conversation.filter_reason = None
-                    context.db.commit()
+                    await self._commit(context)
                 else:
                     return ProcessorResult(
                         status=ProcessorStatus.SKIP,
@@ -193,6 +199,15 @@ class FilterHandler(BaseProcessor):
             )
 
 
+    @staticmethod
+    async def _commit(context: ProcessorContext):
+        """提交对话记录的修改（对话由哪个会话创建就用哪个会话提交）"""
+        if context.async_db is not None:
+            await context.async_db.commit()
+        else:
+            context.db.commit()
+
+
 class AIReplyHandler(BaseProcessor):
     """AI回复处理器 - 使用业务服务层处理业务逻辑"""
 
@@ -258,6 +273,9 @@ class AIReplyHandler(BaseProcessor):
                 message=result.get("message", "AI回复发送成功"),
                 data={"ai_reply": ai_reply[:100] if ai_reply else ""}
             )
+        except RateLimitExceededError:
+            # 限流等待超时：交给管道返回失败，由入站队列稍后重投这条消息
+            raise
         except Exception as e:
             logger.error(f"Error in AI reply handler: {str(e)}", exc_info=True)
             return ProcessorResult(
@@ -275,7 +293,8 @@ class DataCollectionHandler(BaseProcessor):
         super().__init__("data_collection_handler", "数据收集")
 
     def get_dependencies(self) -> list:
-        return ["message_receiver"]
+        # 消息被过滤或AI回复跳过时不执行
+        return ["ai_reply_handler"]
 
     async def process(self, context: ProcessorContext) -> ProcessorResult:
         """收集数据（已在MessageReceiver中完成，这里只是确认）"""
@@ -300,8 +319,9 @@ class StatisticsHandler(BaseProcessor):
         """记录客户交互统计"""
         try:
             from src.statistics.tracker import StatisticsTracker
+            from src.core.database.write_buffer import get_telemetry_buffer
 
-            stats_tracker = StatisticsTracker(context.db)
+            stats_tracker = StatisticsTracker(context.db, write_buffer=get_telemetry_buffer())
 
             message_type = context.message_data.get(
                 "message_type", MessageType.MESSAGE)
@@ -318,10 +338,16 @@ class StatisticsHandler(BaseProcessor):
                 group_invitation_sent=context.group_invitation_sent
             )
 
+            # 经写缓冲批量写入的记录尚未持久化，没有id
+            if interaction.id is None:
+                data = {"buffered": True}
+            else:
+                data = {"interaction_id": interaction.id}
+
             return ProcessorResult(
                 status=ProcessorStatus.SUCCESS,
                 message="统计记录成功",
-                data={"interaction_id": interaction.id}
+                data=data
             )
         except Exception as e:
             logger.error(
@@ -340,7 +366,8 @@ class NotificationHandler(BaseProcessor):
         super().__init__("notification_handler", "Telegram通知")
 
     def get_dependencies(self) -> list:
-        return ["filter_handler"]
+        # AI回复跳过（页面关闭自动回复、垃圾消息等）时不发送审核通知
+        return ["ai_reply_handler"]
 
     async def process(self, context: ProcessorContext) -> ProcessorResult:
         """发送Telegram通知（如果需要审核）"""
@@ -0,0 +1,499 @@
+"""Webhook入站消息队列 - 持久化队列 + 异步工作池
+
+Webhook只负责把解析后的消息写入 ingest_queue 表并立即返回，
+由固定数量的工作协程从表中领取消息交给 MessagePipeline 处理：
+
+- 持久化：消息先落库，进程重启后未处理的消息会被重新领取
+- 有界并发：同时处理的消息数不超过 workers，突发流量只会增加积压而不会压垮进程
+- 背压：积压超过 max_pending 时 enqueue 抛出 QueueFullError，Webhook返回503让平台稍后重试；
+  积压按数据库表统计（多工作进程共享同一上限），本地计数过期或接近上限时重新统计
+- ack/重投：处理成功后删除消息；失败按指数退避重新投递，超过最大次数标记为failed；
+  领取后超过可见性超时仍未ack（如进程崩溃）的消息会被其他工作协程重新领取
+"""
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+from src.core.config import settings
+from src.core.config.constants import (
+    INGEST_QUEUE_BACKLOG_RECHECK_RATIO,
+    INGEST_QUEUE_BACKLOG_REFRESH_SECONDS,
+    INGEST_QUEUE_BATCH_SIZE,
+    INGEST_QUEUE_MAX_ATTEMPTS,
+    INGEST_QUEUE_POLL_INTERVAL_SECONDS,
+    INGEST_QUEUE_SHUTDOWN_TIMEOUT_SECONDS,
+    INGEST_QUEUE_VISIBILITY_TIMEOUT_SECONDS,
+    RETRY_BACKOFF_MULTIPLIER,
+    RETRY_DELAY_SECONDS,
+)
+from src.core.database.connection import SessionLocal
+from src.core.database.models import IngestMessage, IngestStatus
+from src.core.exceptions import QueueFullError
+
+logger = logging.getLogger(__name__)
+
+# 消息处理函数：(platform_name, message_data) -> 处理结果
+MessageHandler = Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+# 已领取的消息：(id, platform, payload, attempts, lock_token)
+ClaimedMessage = Tuple[int, str, Dict[str, Any], int, str]
+
+
+async def _default_handler(platform_name: str, message_data: Dict[str, Any]) -> Dict[str, Any]:
+    """默认处理函数：交给统一消息处理管道"""
+    from src.main_processor import process_platform_message
+    return await process_platform_message(platform_name, message_data)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class IngestQueue:
+    """持久化入站队列（数据库表 + asyncio工作池）"""
+
+    def __init__(
+        self,
+        session_factory: Callable = SessionLocal,
+        handler: Optional[MessageHandler] = None,
+        workers: int = 4,
+        max_pending: int = 5000,
+        batch_size: int = INGEST_QUEUE_BATCH_SIZE,
+        poll_interval: float = INGEST_QUEUE_POLL_INTERVAL_SECONDS,
+        visibility_timeout: float = INGEST_QUEUE_VISIBILITY_TIMEOUT_SECONDS,
+        max_attempts: int = INGEST_QUEUE_MAX_ATTEMPTS,
+        backlog_refresh_interval: float = INGEST_QUEUE_BACKLOG_REFRESH_SECONDS,
+    ):
+        """
+        初始化队列
+
+        Args:
+            session_factory: 数据库会话工厂
+            handler: 消息处理函数（默认使用 process_platform_message）
+            workers: 并发工作协程数
+            max_pending: 积压上限（0表示不限制）
+            batch_size: 单次领取的最大消息数
+            poll_interval: 空闲轮询间隔（秒）
+            visibility_timeout: 可见性超时（秒）
+            max_attempts: 最大投递次数
+            backlog_refresh_interval: 本地积压计数的有效期（秒）
+        """
+        self.session_factory = session_factory
+        self.handler = handler or _default_handler
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.backlog_refresh_interval = backlog_refresh_interval
+
+        self.running = False
+        self._queue: Optional[asyncio.Queue] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher_task: Optional[asyncio.Task] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._pending = 0
+        self._pending_refreshed_at: Optional[float] = None
+        self._in_flight = 0
+        self._stats = {
+            "enqueued": 0,
+            "acked": 0,
+            "retried": 0,
+            "dead_lettered": 0,
+            "rejected": 0,
+        }
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+
+    async def start(self):
+        """启动调度协程和工作池"""
+        if self.running:
+            logger.warning("Ingest queue is already running")
+            return
+
+        await self._refresh_pending()
+        self._queue = asyncio.Queue(maxsize=self.workers)
+        self._wakeup = asyncio.Event()
+        self.running = True
+
+        self._dispatcher_task = asyncio.create_task(self._dispatch_loop())
+        self._worker_tasks = [
+            asyncio.create_task(self._worker_loop(i)) for i in range(self.workers)
+        ]
+        logger.info(
+            f"Ingest queue started (workers={self.workers}, backlog={self._pending})")
+
+    async def stop(self, timeout: float = INGEST_QUEUE_SHUTDOWN_TIMEOUT_SECONDS):
+        """
+        停止队列
+
+        先停止领取新消息，等待处理中的消息完成（最多timeout秒），
+        已领取但尚未开始处理的消息立即释放回队列，供下次启动或其他进程处理。
+        """
+        if not self.running:
+            return
+
+        self.running = False
+        logger.info("Stopping ingest queue")
+
+        if self._dispatcher_task:
+            self._dispatcher_task.cancel()
+            try:
+                await self._dispatcher_task
+            except asyncio.CancelledError:
+                pass
+
+        # 释放本地缓冲中尚未开始处理的消息
+        released: List[ClaimedMessage] = []
+        while not self._queue.empty():
+            released.append(self._queue.get_nowait())
+            self._queue.task_done()
+        if released:
+            await self._run_db(self._release, released)
+
+        # 通知工作协程退出，并等待处理中的消息完成
+        for _ in self._worker_tasks:
+            self._queue.put_nowait(None)
+        done, pending = await asyncio.wait(self._worker_tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning(
+                f"Ingest queue stopped with {len(pending)} in-flight messages; "
+                f"they will be redelivered after the visibility timeout")
+
+        self._worker_tasks = []
+        self._dispatcher_task = None
+
+    # ------------------------------------------------------------------
+    # 生产者接口
+    # ------------------------------------------------------------------
+
+    async def enqueue(self, platform_name: str, messages: List[Dict[str, Any]]) -> int:
+        """
+        持久化消息并唤醒工作池
+
+        Args:
+            platform_name: 平台名称
+            messages: 解析后的消息列表
+
+        Returns:
+            入队的消息数
+
+        Raises:
+            QueueFullError: 积压超过上限
+        """
+        if not messages:
+            return 0
+
+        if self.max_pending and self._backlog_check_due(len(messages)):
+            await self._refresh_pending()
+
+        if self.max_pending and self._pending + len(messages) > self.max_pending:
+            self._stats["rejected"] += len(messages)
+            raise QueueFullError(
+                f"Ingest queue backlog exceeds limit ({self.max_pending})",
+                pending=self._pending
+            )
+
+        count = await self._run_db(self._insert, platform_name, messages)
+        self._pending += count
+        self._stats["enqueued"] += count
+        if self._wakeup:
+            self._wakeup.set()
+        return count
+
+    def _backlog_check_due(self, incoming: int) -> bool:
+        """
+        是否需要从数据库重新统计积压
+
+        本地计数只包含本进程的入队和ack，多个工作进程共享同一张表时会偏低：
+        计数过期或接近上限时以数据库为准，保证所有进程合计的积压不超过 max_pending。
+        """
+        if self._pending_refreshed_at is None:
+            return True
+        if time.monotonic() - self._pending_refreshed_at >= self.backlog_refresh_interval:
+            return True
+        return self._pending + incoming >= self.max_pending * INGEST_QUEUE_BACKLOG_RECHECK_RATIO
+
+    async def _refresh_pending(self):
+        """从数据库重新统计积压（待处理 + 处理中）"""
+        self._pending = await self._run_db(self._count_backlog)
+        self._pending_refreshed_at = time.monotonic()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取队列统计信息"""
+        return {
+            "running": self.running,
+            "workers": self.workers,
+            "pending": self._pending,
+            "in_flight": self._in_flight,
+            "max_pending": self.max_pending,
+            **self._stats,
+        }
+
+    # ------------------------------------------------------------------
+    # 调度与消费
+    # ------------------------------------------------------------------
+
+    async def _dispatch_loop(self):
+        """从数据库领取消息放入本地有界缓冲（缓冲满时不再领取）"""
+        while self.running:
+            try:
+                # 先清除唤醒标记，领取期间的入队/空位通知不会丢失
+                self._wakeup.clear()
+                free_slots = self._queue.maxsize - self._queue.qsize()
+                claimed: List[ClaimedMessage] = []
+                if free_slots > 0:
+                    limit = min(free_slots, self.batch_size)
+                    claimed = await self._run_db(self._claim, limit)
+                    for item in claimed:
+                        self._queue.put_nowait(item)
+                    if len(claimed) == limit and not self._queue.full():
+                        # 可能还有积压，继续领取
+                        continue
+
+                # 缓冲已满或暂无消息：等待新消息入队、工作协程空出位置或轮询超时
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error claiming ingest messages: {str(e)}", exc_info=True)
+                await asyncio.sleep(self.poll_interval)
+
+    async def _worker_loop(self, worker_id: int):
+        """工作协程：逐条处理本地缓冲中的消息"""
+        while True:
+            item = await self._queue.get()
+            try:
+                if item is None:
+                    return
+                await self._handle(item)
+            finally:
+                self._queue.task_done()
+                if self._wakeup:
+                    self._wakeup.set()
+
+    async def _handle(self, item: ClaimedMessage):
+        """处理单条消息并ack/nack"""
+        message_id, platform_name, payload, attempts, lock_token = item
+        self._in_flight += 1
+        error: Optional[str] = None
+        try:
+            result = await self.handler(platform_name, payload)
+            if isinstance(result, dict) and result.get("success") is False:
+                error = str(result.get("error") or "pipeline returned success=False")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(
+                f"Error processing ingest message {message_id}: {str(e)}", exc_info=True)
+            error = str(e)
+        finally:
+            self._in_flight -= 1
+
+        try:
+            if error is None:
+                if await self._run_db(self._ack, message_id, lock_token):
+                    self._pending = max(0, self._pending - 1)
+                    self._stats["acked"] += 1
+            else:
+                dead = await self._run_db(self._nack, message_id, lock_token, attempts, error)
+                if dead:
+                    self._pending = max(0, self._pending - 1)
+                    self._stats["dead_lettered"] += 1
+                    logger.error(
+                        f"Ingest message {message_id} failed after {attempts} attempts: {error}")
+                else:
+                    self._stats["retried"] += 1
+        except Exception as e:
+            logger.error(
+                f"Error acknowledging ingest message {message_id}: {str(e)}", exc_info=True)
+
+    # ------------------------------------------------------------------
+    # 数据库操作（同步，在线程池中执行，避免阻塞事件循环）
+    # ------------------------------------------------------------------
+
+    async def _run_db(self, func: Callable, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+    def _count_backlog(self) -> int:
+        db = self.session_factory()
+        try:
+            return db.query(IngestMessage).filter(
+                IngestMessage.status.in_([IngestStatus.PENDING.value, IngestStatus.PROCESSING.value])
+            ).count()
+        finally:
+            db.close()
+
+    def _insert(self, platform_name: str, messages: List[Dict[str, Any]]) -> int:
+        db = self.session_factory()
+        try:
+            now = _utcnow()
+            db.add_all([
+                IngestMessage(
+                    platform=platform_name,
+                    payload=message_data,
+                    status=IngestStatus.PENDING.value,
+                    attempts=0,
+                    available_at=now,
+                )
+                for message_data in messages
+            ])
+            db.commit()
+            return len(messages)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _claimable_filter(self, now: datetime):
+        stale_before = now - timedelta(seconds=self.visibility_timeout)
+        return or_(
+            and_(
+                IngestMessage.status == IngestStatus.PENDING.value,
+                IngestMessage.available_at <= now,
+            ),
+            and_(
+                IngestMessage.status == IngestStatus.PROCESSING.value,
+                IngestMessage.locked_at < stale_before,
+            ),
+        )
+
+    def _claim(self, limit: int) -> List[ClaimedMessage]:
+        """
+        领取消息
+
+        先选出候选ID，再用带条件的UPDATE写入领取令牌，最后按令牌读回。
+        条件UPDATE保证多进程（或多实例）并发领取时同一条消息只会被一方领到。
+        """
+        db = self.session_factory()
+        try:
+            now = _utcnow()
+            claimable = self._claimable_filter(now)
+            candidate_ids = [
+                row.id for row in db.query(IngestMessage.id)
+                .filter(claimable)
+                .order_by(IngestMessage.id)
+                .limit(limit)
+                .all()
+            ]
+            if not candidate_ids:
+                return []
+
+            lock_token = str(uuid.uuid4())
+            db.query(IngestMessage).filter(
+                IngestMessage.id.in_(candidate_ids),
+                claimable,
+            ).update({
+                IngestMessage.status: IngestStatus.PROCESSING.value,
+                IngestMessage.lock_token: lock_token,
+                IngestMessage.locked_at: now,
+                IngestMessage.attempts: IngestMessage.attempts + 1,
+            }, synchronize_session=False)
+            db.commit()
+
+            rows = db.query(IngestMessage).filter(
+                IngestMessage.lock_token == lock_token
+            ).order_by(IngestMessage.id).all()
+            return [
+                (row.id, row.platform, row.payload, row.attempts, lock_token)
+                for row in rows
+            ]
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _ack(self, message_id: int, lock_token: str) -> bool:
+        """确认处理成功（删除消息）。令牌不匹配说明消息已超时被重新领取，不做处理"""
+        db = self.session_factory()
+        try:
+            deleted = db.query(IngestMessage).filter(
+                IngestMessage.id == message_id,
+                IngestMessage.lock_token == lock_token,
+            ).delete(synchronize_session=False)
+            db.commit()
+            return deleted > 0
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _nack(self, message_id: int, lock_token: str, attempts: int, error: str) -> bool:
+        """
+        处理失败：按指数退避重新投递，超过最大投递次数标记为failed
+
+        Returns:
+            是否已转为死信
+        """
+        db = self.session_factory()
+        try:
+            dead = attempts >= self.max_attempts
+            values = {
+                IngestMessage.lock_token: None,
+                IngestMessage.locked_at: None,
+                IngestMessage.last_error: error[:2000],
+            }
+            if dead:
+                values[IngestMessage.status] = IngestStatus.FAILED.value
+            else:
+                delay = RETRY_DELAY_SECONDS * (RETRY_BACKOFF_MULTIPLIER ** (attempts - 1))
+                values[IngestMessage.status] = IngestStatus.PENDING.value
+                values[IngestMessage.available_at] = _utcnow() + timedelta(seconds=delay)
+
+            db.query(IngestMessage).filter(
+                IngestMessage.id == message_id,
+                IngestMessage.lock_token == lock_token,
+            ).update(values, synchronize_session=False)
+            db.commit()
+            return dead
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _release(self, items: List[ClaimedMessage]):
+        """把已领取但未处理的消息释放回队列（不计入投递次数）"""
+        db = self.session_factory()
+        try:
+            for message_id, _, _, _, lock_token in items:
+                db.query(IngestMessage).filter(
+                    IngestMessage.id == message_id,
+                    IngestMessage.lock_token == lock_token,
+                ).update({
+                    IngestMessage.status: IngestStatus.PENDING.value,
+                    IngestMessage.lock_token: None,
+                    IngestMessage.locked_at: None,
+                    IngestMessage.attempts: IngestMessage.attempts - 1,
+                }, synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+# 全局入站队列实例
+ingest_queue = IngestQueue(
+    workers=settings.ingest_queue_workers,
+    max_pending=settings.ingest_queue_max_pending,
+)
@@ -1,20 +1,37 @@
-"""消息处理管道 - 按顺序执行处理器"""
-from typing import List, Dict, Any, Optional
+"""消息处理管道 - 按依赖关系（DAG）并发执行处理器"""
+import asyncio
+import time
+from typing import List, Dict, Any, Optional, Set, Tuple
 from .base import BaseProcessor, ProcessorResult, ProcessorContext, ProcessorStatus
+from src.core.exceptions import RateLimitExceededError
 from src.core.database.connection import SessionLocal
 from src.platforms.registry import registry
 from src.core.config import settings
+from src.monitoring.metrics import pipeline_processor_seconds, pipeline_seconds
 import logging
 
 logger = logging.getLogger(__name__)
 
 
 class MessagePipeline:
-    """消息处理管道 - 管理处理器的执行顺序"""
+    """
+    消息处理管道 - 管理处理器的执行顺序
+    
+    处理器依赖图（get_dependencies）在首次处理消息时编译一次并缓存，之后每条消息
+    按依赖关系调度：依赖全部完成的处理器立即启动，互不依赖的处理器并发执行。
+    
+    跳过/停止语义：某个处理器返回 should_skip()（SKIP 或 should_continue=False 的错误）后，
+    只有直接或间接依赖它的处理器不再执行，其他分支照常执行。
+    需要在某个处理器跳过时不执行的处理器，必须声明对它的（直接或间接）依赖。
+    共用同一个数据库会话（context.db / context.async_db）的处理器必须通过依赖关系保证串行。
+    处理器抛出 RateLimitExceededError 时终止整条管道并返回 success=False，由入站队列重投消息。
+    """
     
     def __init__(self):
         self.processors: List[BaseProcessor] = []
         self.processor_map: Dict[str, BaseProcessor] = {}
+        # 编译后的依赖图：(拓扑顺序, 名称 -> 前驱集合, 名称 -> 后继列表)
+        self._graph: Optional[Tuple[List[BaseProcessor], Dict[str, Set[str]], Dict[str, List[str]]]] = None
     
     def add_processor(self, processor: BaseProcessor):
         """
@@ -25,6 +42,7 @@ class MessagePipeline:
         """
         self.processors.append(processor)
         self.processor_map[processor.name] = processor
+        self._graph = None
     
     def add_processors(self, processors: List[BaseProcessor]):
         """批量添加处理器"""
@@ -33,34 +51,65 @@ class MessagePipeline:
     
     def _resolve_dependencies(self) -> List[BaseProcessor]:
         """
-        根据依赖关系排序处理器
+        根据依赖关系排序处理器（使用编译后的依赖图）
         
         Returns:
             排序后的处理器列表
         """
-        # 简单的拓扑排序
-        sorted_processors = []
-        remaining = self.processors.copy()
-        added = set()
+        return self._get_graph()[0]
+    
+    def compile(self) -> List[BaseProcessor]:
+        """编译依赖图（添加处理器后首次处理消息时也会自动编译），返回拓扑顺序"""
+        self._graph = self._compile_graph()
+        return self._graph[0]
+    
+    def _get_graph(self) -> Tuple[List[BaseProcessor], Dict[str, Set[str]], Dict[str, List[str]]]:
+        if self._graph is None:
+            self.compile()
+        return self._graph
+    
+    def _compile_graph(self) -> Tuple[List[BaseProcessor], Dict[str, Set[str]], Dict[str, List[str]]]:
+        """
+        编译处理器依赖图（Kahn算法，同层按添加顺序）
         
+        存在循环依赖或依赖了不存在的处理器时，这些处理器按添加顺序排在最后串行执行
+        （与原有行为一致）。
+        """
+        index = {p.name: i for i, p in enumerate(self.processors)}
+        deps = {p.name: set(p.get_dependencies()) for p in self.processors}
+        
+        order: List[BaseProcessor] = []
+        added: Set[str] = set()
+        remaining = list(self.processors)
         while remaining:
-            progress = False
-            for processor in remaining[:]:
-                deps = processor.get_dependencies()
-                if all(dep in added for dep in deps):
-                    sorted_processors.append(processor)
-                    added.add(processor.name)
-                    remaining.remove(processor)
-                    progress = True
-            
-            if not progress:
-                # 如果有循环依赖，按当前顺序添加
-                for processor in remaining:
-                    sorted_processors.append(processor)
-                    added.add(processor.name)
+            ready = [p for p in remaining if deps[p.name] <= added]
+            if not ready:
                 break
+            for processor in ready:
+                order.append(processor)
+                added.add(processor.name)
+            remaining = [p for p in remaining if p.name not in added]
+        
+        predecessors = {name: set(d) for name, d in deps.items()}
+        if remaining:
+            logger.warning(
+                f"Unresolvable processor dependencies (cycle or missing processor): "
+                f"{[p.name for p in remaining]}, running them sequentially at the end")
+            previous = set(added)
+            for processor in remaining:
+                predecessors[processor.name] = previous
+                order.append(processor)
+                previous = {processor.name}
+        
+        dependents: Dict[str, List[str]] = {p.name: [] for p in self.processors}
+        for name, preds in predecessors.items():
+            for pred in preds:
+                if pred in dependents:
+                    dependents[pred].append(name)
+        for name in dependents:
+            dependents[name].sort(key=index.get)
         
-        return sorted_processors
+        return order, predecessors, dependents
     
     async def process(self, platform_name: str, message_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -74,6 +123,7 @@ class MessagePipeline:
             处理结果摘要
         """
         db = SessionLocal()
+        async_db = None
         platform_client = None
         
         try:
@@ -84,6 +134,12 @@ class MessagePipeline:
                 db=db
             )
             
+            # 有处理器支持异步会话时创建（数据库往返不阻塞事件循环）
+            if settings.database_async and any(p.uses_async_db for p in self.processors):
+                from src.core.database.connection import get_async_session_factory
+                async_db = get_async_session_factory()()
+                context.async_db = async_db
+            
             # 创建平台客户端
             if platform_name == "facebook":
                 access_token = settings.facebook_access_token
@@ -106,44 +162,8 @@ class MessagePipeline:
             
             context.platform_client = platform_client
             
-            # 按依赖关系排序处理器
-            sorted_processors = self._resolve_dependencies()
-            
-            # 执行处理器
-            results = []
-            for processor in sorted_processors:
-                try:
-                    # 验证
-                    validation_error = processor.validate(context)
-                    if validation_error:
-                        logger.warning(f"Processor {processor.name} validation failed: {validation_error}")
-                        continue
-                    
-                    # 执行
-                    result = await processor.process(context)
-                    results.append({
-                        "processor": processor.name,
-                        "status": result.status.value,
-                        "message": result.message
-                    })
-                    
-                    # 如果处理器要求跳过后续处理
-                    if result.should_skip():
-                        logger.info(f"Processor {processor.name} requested to skip remaining processors")
-                        break
-                    
-                    # 如果处理器失败且不应该继续
-                    if result.status == ProcessorStatus.ERROR and not result.should_continue:
-                        logger.error(f"Processor {processor.name} failed and stopped pipeline")
-                        break
-                        
-                except Exception as e:
-                    logger.error(f"Error in processor {processor.name}: {str(e)}", exc_info=True)
-                    results.append({
-                        "processor": processor.name,
-                        "status": "error",
-                        "message": f"Exception: {str(e)}"
-                    })
+            # 按依赖图执行处理器
+            results, timings = await self._execute_graph(context)
             
             # 返回处理结果
             return {
@@ -153,21 +173,170 @@ class MessagePipeline:
                 "summary": {
                     "ai_replied": context.ai_replied,
                     "group_invitation_sent": context.group_invitation_sent,
-                    "should_review": context.should_review
+                    "should_review": context.should_review,
+                    "timings": timings
                 }
             }
         
         except Exception as e:
             logger.error(f"Error in message pipeline: {str(e)}", exc_info=True)
             db.rollback()
+            if async_db is not None:
+                await async_db.rollback()
             return {"success": False, "error": str(e)}
         
         finally:
             db.close()
+            if async_db is not None:
+                await async_db.close()
             if platform_client:
                 await platform_client.close()
 
 
+    async def _execute_graph(self, context: ProcessorContext) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        按依赖图调度处理器
+        
+        Returns:
+            (按拓扑顺序排列的处理结果, 耗时统计)
+        """
+        order, predecessors, dependents = self._get_graph()
+        position = {p.name: i for i, p in enumerate(order)}
+        waiting = {name: len(preds) for name, preds in predecessors.items()}
+        entries: Dict[str, Dict[str, Any]] = {}
+        
+        pipeline_start = time.perf_counter()
+        ready = [p.name for p in order if waiting[p.name] == 0]
+        running: Dict[asyncio.Task, str] = {}
+        
+        def complete(name: str, entry: Optional[Dict[str, Any]], stop: bool):
+            if entry is not None:
+                entries[name] = entry
+            if stop:
+                # 依赖它的处理器永远不会就绪，其后继也随之不再执行
+                return
+            for dependent in dependents[name]:
+                waiting[dependent] -= 1
+                if waiting[dependent] == 0:
+                    ready.append(dependent)
+        
+        try:
+            while ready or running:
+                ready.sort(key=position.get)
+                
+                # 只有一个可执行且没有并发任务时直接await，避免为串行链路创建Task
+                if len(ready) == 1 and not running:
+                    name = ready.pop()
+                    complete(name, *await self._run_processor(self.processor_map[name], context, pipeline_start))
+                    continue
+                
+                for name in ready:
+                    task = asyncio.ensure_future(self._run_processor(self.processor_map[name], context, pipeline_start))
+                    running[task] = name
+                ready.clear()
+                if not running:
+                    break
+                
+                finished, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(finished, key=lambda t: position[running[t]]):
+                    complete(running.pop(task), *task.result())
+        finally:
+            # 管道本身被取消时（如关闭入站队列），不留下孤立的处理器任务
+            for task in running:
+                task.cancel()
+        
+        total_ms = (time.perf_counter() - pipeline_start) * 1000
+        pipeline_seconds.observe(total_ms / 1000)
+        results = [entries[p.name] for p in order if p.name in entries]
+        return results, self._summarize_timings(results, predecessors, total_ms)
+    
+    async def _run_processor(
+        self,
+        processor: BaseProcessor,
+        context: ProcessorContext,
+        pipeline_start: float
+    ) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        执行单个处理器（除 RateLimitExceededError 外不抛出异常）
+        
+        Returns:
+            (结果条目（验证未通过时为None）, 是否跳过依赖它的处理器)
+        """
+        # 验证
+        validation_error = processor.validate(context)
+        if validation_error:
+            logger.warning(f"Processor {processor.name} validation failed: {validation_error}")
+            return None, False
+        
+        started = time.perf_counter()
+        stop = False
+        try:
+            # 执行
+            result = await processor.process(context)
+            entry = {
+                "processor": processor.name,
+                "status": result.status.value,
+                "message": result.message
+            }
+            
+            # 如果处理器要求跳过后续处理
+            if result.should_skip():
+                logger.info(f"Processor {processor.name} requested to skip its dependent processors")
+                stop = True
+            
+            # 如果处理器失败且不应该继续
+            if result.status == ProcessorStatus.ERROR and not result.should_continue:
+                logger.error(f"Processor {processor.name} failed and stopped its dependent processors")
+                stop = True
+        except RateLimitExceededError:
+            raise
+        except Exception as e:
+            logger.error(f"Error in processor {processor.name}: {str(e)}", exc_info=True)
+            entry = {
+                "processor": processor.name,
+                "status": "error",
+                "message": f"Exception: {str(e)}"
+            }
+        
+        finished = time.perf_counter()
+        pipeline_processor_seconds.observe(finished - started, processor=processor.name, status=entry["status"])
+        entry["started_ms"] = round((started - pipeline_start) * 1000, 3)
+        entry["duration_ms"] = round((finished - started) * 1000, 3)
+        return entry, stop
+    
+    @staticmethod
+    def _summarize_timings(
+        results: List[Dict[str, Any]],
+        predecessors: Dict[str, Set[str]],
+        total_ms: float
+    ) -> Dict[str, Any]:
+        """计算总耗时和关键路径（按实际耗时计算的最长依赖链）"""
+        path_ms: Dict[str, float] = {}
+        previous: Dict[str, Optional[str]] = {}
+        for entry in results:  # results已按拓扑顺序排列
+            name = entry["processor"]
+            best = max(
+                (pred for pred in predecessors.get(name, ()) if pred in path_ms),
+                key=path_ms.get,
+                default=None
+            )
+            path_ms[name] = entry["duration_ms"] + (path_ms[best] if best else 0.0)
+            previous[name] = best
+        
+        critical_path: List[str] = []
+        node = max(path_ms, key=path_ms.get, default=None)
+        while node is not None:
+            critical_path.append(node)
+            node = previous[node]
+        critical_path.reverse()
+        
+        return {
+            "total_ms": round(total_ms, 3),
+            "critical_path": critical_path,
+            "critical_path_ms": round(path_ms[critical_path[-1]], 3) if critical_path else 0.0
+        }
+
+
 # 创建默认管道实例
 def create_default_pipeline() -> MessagePipeline:
     """创建默认的消息处理管道"""
@@ -191,6 +360,7 @@ def create_default_pipeline() -> MessagePipeline:
         StatisticsHandler(),
         NotificationHandler()
     ])
+    pipeline.compile()
     
     return pipeline
 
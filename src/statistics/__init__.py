@@ -1,11 +1,6 @@
 """统计数据模块"""
 from .tracker import StatisticsTracker
+from .reconciler import StatisticsReconciler
+from .rollups import AIReplyRollups
 
-__all__ = ['StatisticsTracker']
-
-
-
-
-
-
-
+__all__ = ['StatisticsTracker', 'StatisticsReconciler', 'AIReplyRollups']
@@ -204,21 +204,22 @@ async def get_statistics_summary(
 @router.get("/ai-replies")
 async def get_ai_replies(
     limit: int = Query(50, description="返回的记录数量，默认50"),
-    offset: int = Query(0, description="偏移量，用于分页"),
+    offset: int = Query(0, description="偏移量，用于分页（深分页较慢，建议使用 cursor）"),
     start_date: Optional[str] = Query(None, description="开始日期，格式：YYYY-MM-DD"),
     end_date: Optional[str] = Query(None, description="结束日期，格式：YYYY-MM-DD"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，传入后忽略 offset"),
+    include_total: bool = Query(True, description="是否返回总数（PostgreSQL下为规划器估计值）"),
     db: Session = Depends(get_db)
 ):
     """
     获取AI回复记录
     
-    返回所有AI回复的内容、时间、客户信息等
+    返回所有AI回复的内容、时间、客户信息等。按 (ai_reply_at, id) 键集分页，
+    使用 next_cursor 翻页时开销与表大小无关。
     """
     try:
-        from src.core.database.models import Conversation, Customer
-        from sqlalchemy import and_
-        
         from src.core.database.repositories.conversation_repo import ConversationRepository
+        from src.core.exceptions import ValidationError
         conversation_repo = ConversationRepository(db)
         
         # 日期过滤（使用UTC时区）
@@ -239,47 +240,30 @@ async def get_ai_replies(
             except ValueError:
                 return {"error": "结束日期格式错误，请使用 YYYY-MM-DD 格式"}
         
-        # 使用Repository获取数据
-        conversations, total = conversation_repo.get_ai_replied_with_customer(
-            start_date=start_dt,
-            end_date=end_dt,
-            skip=(page - 1) * page_size,
-            limit=page_size
-        )
-        
-        # 格式化结果
-        results = []
-        for conv in conversations:
-            # 确保时间有时区信息（如果数据库返回的时间没有时区，假设是UTC）
-            ai_reply_at = conv.ai_reply_at
-            if ai_reply_at and ai_reply_at.tzinfo is None:
-                ai_reply_at = ai_reply_at.replace(tzinfo=timezone.utc)
-            
-            received_at = conv.received_at
-            if received_at and received_at.tzinfo is None:
-                received_at = received_at.replace(tzinfo=timezone.utc)
-            
-            results.append({
-                "id": conv.id,
-                "conversation_id": conv.id,
-                "customer_id": conv.customer_id,
-                "customer_name": conv.customer.name if conv.customer else None,
-                "platform": conv.platform.value if conv.platform else None,
-                "message_type": conv.message_type.value if conv.message_type else None,
-                "user_message": conv.content[:200] if conv.content else None,  # 用户消息（前200字符）
-                "ai_reply": conv.ai_reply_content,
-                "ai_reply_at": ai_reply_at.isoformat() if ai_reply_at else None,  # ISO格式包含时区
-                "received_at": received_at.isoformat() if received_at else None,  # ISO格式包含时区
-            })
+        # 使用Repository获取数据（键集分页，只查询列表需要的列）
+        try:
+            page = conversation_repo.list_ai_replied_page(
+                start_date=start_dt,
+                end_date=end_dt,
+                limit=limit,
+                cursor=cursor,
+                offset=offset,
+                with_total=include_total
+            )
+        except ValidationError as e:
+            return {"success": False, "error": e.message}
+        results = [item.to_dict() for item in page.items]
         
         return {
             "success": True,
             "data": results,
             "pagination": {
-                "total": total,
+                "total": page.total,
+                "total_is_estimate": page.total_is_estimate,
                 "limit": limit,
                 "offset": offset,
-                "has_more": (offset + limit) < total
+                "has_more": page.has_more,
+                "next_cursor": page.next_cursor
             }
         }
     
@@ -297,76 +281,44 @@ async def get_ai_replies_count(
     """
     获取AI回复数量统计
     
-    返回指定日期范围内的AI回复总数和每日统计
+    返回指定日期范围内的AI回复总数和每日统计（读取按天汇总的分桶）
     """
     try:
-        from src.core.database.models import Conversation
         from datetime import timedelta
-        from sqlalchemy import func, cast, Date
+        from src.statistics.rollups import AIReplyRollups
         
-        # 构建查询
-        query = db.query(Conversation)\
-            .filter(Conversation.ai_replied == True)\
-            .filter(Conversation.ai_reply_content.isnot(None))
-        
-        # 日期过滤（使用UTC时区）
+        # 日期范围为 [start_dt, end_dt)（使用UTC时区）
+        start_dt = end_dt = None
         if start_date:
             try:
                 start = datetime.strptime(start_date, "%Y-%m-%d").date()
                 start_dt = datetime.combine(start, datetime.min.time(), timezone.utc)
-                query = query.filter(Conversation.ai_reply_at >= start_dt)
             except ValueError:
                 return {"error": "开始日期格式错误，请使用 YYYY-MM-DD 格式"}
         
         if end_date:
             try:
                 end = datetime.strptime(end_date, "%Y-%m-%d").date()
-                end_dt = datetime.combine(end, datetime.max.time(), timezone.utc)
-                query = query.filter(Conversation.ai_reply_at <= end_dt)
+                end_dt = datetime.combine(end + timedelta(days=1), datetime.min.time(), timezone.utc)
             except ValueError:
                 return {"error": "结束日期格式错误，请使用 YYYY-MM-DD 格式"}
         
-        # 如果没有指定日期，默认今天（UTC时区）
+        rollups = AIReplyRollups(db)
+        daily_counts = rollups.daily_counts(start_dt, end_dt)
+        
         if not start_date and not end_date:
+            # 如果没有指定日期，总数默认今天（UTC时区）
             today_utc = datetime.now(timezone.utc).date()
-            today_start = datetime.combine(today_utc, datetime.min.time(), timezone.utc)
-            today_end = datetime.combine(today_utc + timedelta(days=1), datetime.min.time(), timezone.utc)
-            query = query.filter(
-                Conversation.ai_reply_at >= today_start,
-                Conversation.ai_reply_at < today_end
-            )
-        
-        total_count = query.count()
-        
-        # 按日期分组统计
-        daily_query = db.query(
-            cast(Conversation.ai_reply_at, Date).label('date'),
-            func.count(Conversation.id).label('count')
-        )\
-        .filter(Conversation.ai_replied == True)\
-        .filter(Conversation.ai_reply_content.isnot(None))
-        
-        if start_date:
-            start = datetime.strptime(start_date, "%Y-%m-%d").date()
-            start_dt = datetime.combine(start, datetime.min.time(), timezone.utc)
-            daily_query = daily_query.filter(Conversation.ai_reply_at >= start_dt)
-        
-        if end_date:
-            end = datetime.strptime(end_date, "%Y-%m-%d").date()
-            end_dt = datetime.combine(end, datetime.max.time(), timezone.utc)
-            daily_query = daily_query.filter(Conversation.ai_reply_at <= end_dt)
-        
-        daily_counts = daily_query\
-            .group_by(cast(Conversation.ai_reply_at, Date))\
-            .order_by(cast(Conversation.ai_reply_at, Date).desc())\
-            .all()
+            total_count = sum(count for day, count in daily_counts if day == today_utc)
+        else:
+            total_count = sum(count for _, count in daily_counts)
         
         daily_stats = [
             {
-                "date": str(row.date),
-                "count": row.count
+                "date": str(day),
+                "count": count
             }
-            for row in daily_counts
+            for day, count in daily_counts
         ]
         
         return {
@@ -0,0 +1,110 @@
+"""每日统计对账任务 - 定期从交互明细表重新计算统计数据"""
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from src.core.config.constants import STATISTICS_RECONCILE_INTERVAL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class StatisticsReconciler:
+    """
+    统计对账任务
+
+    增量计数在并发写入或进程崩溃时可能出现少量偏差，该任务定期对今天和昨天
+    （覆盖跨零点的迟到消息）执行一次全量重算并覆盖增量结果，包括每日统计和AI回复汇总分桶。
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable] = None,
+        interval_seconds: float = STATISTICS_RECONCILE_INTERVAL_SECONDS
+    ):
+        if session_factory is None:
+            from src.core.database.connection import SessionLocal
+            session_factory = SessionLocal
+        self.session_factory = session_factory
+        self.interval_seconds = interval_seconds
+        self.running = False
+        self.task: Optional[asyncio.Task] = None
+        self.last_run: Optional[datetime] = None
+        self.runs = 0
+
+    async def start(self):
+        """启动对账任务"""
+        if self.running:
+            return
+        self.running = True
+        self.task = asyncio.create_task(self._run_periodic())
+        logger.info(f"Statistics reconciler started (every {self.interval_seconds}s)")
+
+    async def stop(self):
+        """停止对账任务"""
+        if not self.running:
+            return
+        self.running = False
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def reconcile(self, dates: Optional[List[date]] = None) -> Dict[str, Any]:
+        """
+        立即执行一次对账（在线程池中执行，不阻塞事件循环）
+
+        Args:
+            dates: 要对账的日期，默认为今天和昨天
+
+        Returns:
+            {日期: 重算后的统计}
+        """
+        if dates is None:
+            today = datetime.now(timezone.utc).date()
+            dates = [today - timedelta(days=1), today]
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, self._reconcile_sync, dates)
+        self.last_run = datetime.now(timezone.utc)
+        self.runs += 1
+        return result
+
+    def _reconcile_sync(self, dates: List[date]) -> Dict[str, Any]:
+        from src.statistics.tracker import StatisticsTracker
+        from src.statistics.rollups import AIReplyRollups
+        from src.core.database.write_buffer import telemetry_buffer
+
+        # 先写入缓冲中的交互明细，避免重算时漏掉
+        telemetry_buffer.flush()
+        db = self.session_factory()
+        try:
+            tracker = StatisticsTracker(db)
+            rollups = AIReplyRollups(db)
+            result = {}
+            for target_date in dates:
+                tracker.reconcile_daily_statistics(target_date)
+                rollups.rebuild(target_date, target_date)
+                result[target_date.isoformat()] = tracker.get_daily_statistics(target_date)
+            return result
+        finally:
+            db.close()
+
+    async def _run_periodic(self):
+        while self.running:
+            try:
+                await self.reconcile()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Statistics reconciliation failed: {str(e)}", exc_info=True)
+            try:
+                await asyncio.sleep(self.interval_seconds)
+            except asyncio.CancelledError:
+                break
+
+
+# 全局对账任务实例
+statistics_reconciler = StatisticsReconciler()
@@ -0,0 +1,237 @@
+"""AI回复汇总（物化的小时/天分桶）
+
+监控面板和统计接口原先每次请求都要对 conversations 做 COUNT、COUNT(DISTINCT customer_id)
+和按日期 GROUP BY 的扫描。写入AI回复时同步增加对应的小时桶和天桶（维度：平台、页面、消息类型），
+查询只需汇总少量分桶；历史数据通过 scripts/tools/backfill_ai_reply_rollups.py 回填，
+对账任务定期重建今天和昨天的分桶以修正并发下的少量偏差。
+"""
+import logging
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from src.core.database.repositories import AIReplyRollupRepository
+
+logger = logging.getLogger(__name__)
+
+GRANULARITY_HOUR = "hour"
+GRANULARITY_DAY = "day"
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _as_utc(moment: Optional[datetime]) -> Optional[datetime]:
+    """数据库返回无时区的时间时按UTC处理"""
+    if moment is None:
+        return None
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """返回时间所在分桶的开始时间（UTC）"""
+    moment = _as_utc(moment)
+    if granularity == GRANULARITY_DAY:
+        return datetime.combine(moment.date(), time.min, timezone.utc)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def page_id_from_raw_data(raw_data: Any) -> str:
+    """从原始平台数据中取页面ID（同步消息保存的 page_id 或 Webhook 事件的 recipient.id）"""
+    if not isinstance(raw_data, dict):
+        return ""
+    page_id = raw_data.get("page_id") or (raw_data.get("recipient") or {}).get("id")
+    return str(page_id) if page_id else ""
+
+
+def _dimension_value(value: Any) -> str:
+    if value is None:
+        return "unknown"
+    return value.value if hasattr(value, "value") else str(value)
+
+
+class AIReplyRollups:
+    """AI回复汇总的写入、查询和重建"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.repo = AIReplyRollupRepository(db)
+
+    def record_reply(self, conversation: Any, page_id: Optional[str] = None) -> None:
+        """
+        对话首次写入AI回复后调用，增加小时桶、天桶和当天去重客户（会提交事务）
+
+        Args:
+            conversation: 已更新AI回复的对话
+            page_id: 页面ID，未提供时从 raw_data 中获取
+        """
+        if not conversation.ai_reply_content:
+            return
+        replied_at = _as_utc(conversation.ai_reply_at) or datetime.now(timezone.utc)
+        dimensions = (
+            _dimension_value(conversation.platform),
+            page_id or page_id_from_raw_data(conversation.raw_data),
+            _dimension_value(conversation.message_type),
+        )
+        for granularity in (GRANULARITY_HOUR, GRANULARITY_DAY):
+            self.repo.increment(granularity, bucket_start(replied_at, granularity), *dimensions)
+        self.repo.add_customer(replied_at.date(), conversation.customer_id)
+        self.db.commit()
+
+    def count(self, start: datetime, end: datetime) -> int:
+        """[start, end) 内的AI回复数（边界精度为小时）"""
+        return sum(self._sum(start, end, None).values())
+
+    def distribution(self, start: datetime, end: datetime, dimension: str = "platform") -> Dict[str, int]:
+        """[start, end) 内按维度（platform、page_id、message_type）分组的AI回复数"""
+        return dict(self._sum(start, end, dimension))
+
+    def daily_counts(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> List[Tuple[date, int]]:
+        """每日AI回复数（日期倒序）"""
+        rows = self.repo.sum_by(
+            GRANULARITY_DAY,
+            start or _EPOCH,
+            end or datetime.now(timezone.utc) + timedelta(days=1),
+            "bucket_start"
+        )
+        return sorted(
+            ((_as_utc(day).date(), int(count or 0)) for day, count in rows),
+            reverse=True
+        )
+
+    def unique_customers(self, target_date: date) -> int:
+        """当天收到AI回复的不同客户数"""
+        return self.repo.count_customers(target_date)
+
+    def last_hour(self, now: Optional[datetime] = None) -> int:
+        """
+        最近60分钟的AI回复数（滑动窗口估计）
+
+        当前小时桶全部计入，上一小时桶按仍在窗口内的时间比例计入。
+        """
+        now = _as_utc(now) or datetime.now(timezone.utc)
+        current = bucket_start(now, GRANULARITY_HOUR)
+        previous = current - timedelta(hours=1)
+        counts = {
+            _as_utc(start): int(count or 0)
+            for start, count in self.repo.sum_by(
+                GRANULARITY_HOUR, previous, current + timedelta(hours=1), "bucket_start"
+            )
+        }
+        elapsed = (now - current).total_seconds() / 3600
+        return round(counts.get(current, 0) + counts.get(previous, 0) * (1 - elapsed))
+
+    def _sum(self, start: datetime, end: datetime, dimension: Optional[str]) -> Dict[Any, int]:
+        """完整的天使用天桶，首尾不足一天的部分使用小时桶"""
+        start, end = _as_utc(start), _as_utc(end)
+        first_day = bucket_start(start, GRANULARITY_DAY)
+        if first_day < start:
+            first_day += timedelta(days=1)
+        last_day = bucket_start(end, GRANULARITY_DAY)
+
+        if first_day < last_day:
+            spans = [
+                (GRANULARITY_HOUR, bucket_start(start, GRANULARITY_HOUR), first_day),
+                (GRANULARITY_DAY, first_day, last_day),
+                (GRANULARITY_HOUR, last_day, end),
+            ]
+        else:
+            spans = [(GRANULARITY_HOUR, bucket_start(start, GRANULARITY_HOUR), end)]
+
+        totals: Dict[Any, int] = defaultdict(int)
+        for granularity, span_start, span_end in spans:
+            if span_start >= span_end:
+                continue
+            for key, count in self.repo.sum_by(granularity, span_start, span_end, dimension):
+                totals[key] += int(count or 0)
+        return totals
+
+    def rebuild(self, start_date: date, end_date: date) -> Dict[str, int]:
+        """
+        从 conversations 重建 [start_date, end_date] 内每天的分桶（逐天提交）
+
+        Args:
+            start_date: 开始日期（包含）
+            end_date: 结束日期（包含）
+
+        Returns:
+            {"days": 重建天数, "replies": 计入的回复数}
+        """
+        days = replies = 0
+        target_date = start_date
+        while target_date <= end_date:
+            replies += self._rebuild_day(target_date)
+            days += 1
+            target_date += timedelta(days=1)
+        return {"days": days, "replies": replies}
+
+    def _rebuild_day(self, target_date: date) -> int:
+        from src.core.database.models import Conversation
+        from src.core.database.statistics_models import AIReplyRollup, AIReplyRollupCustomer
+
+        start = datetime.combine(target_date, time.min, timezone.utc)
+        end = start + timedelta(days=1)
+
+        hours: Dict[Tuple, int] = defaultdict(int)
+        customers = set()
+        rows = self.db.query(
+            Conversation.ai_reply_at,
+            Conversation.platform,
+            Conversation.message_type,
+            Conversation.customer_id,
+            Conversation.raw_data
+        ).filter(
+            Conversation.ai_replied == True,
+            Conversation.ai_reply_content.isnot(None),
+            Conversation.ai_reply_at >= start,
+            Conversation.ai_reply_at < end
+        ).yield_per(1000)
+        for row in rows:
+            key = (
+                bucket_start(row.ai_reply_at, GRANULARITY_HOUR),
+                _dimension_value(row.platform),
+                page_id_from_raw_data(row.raw_data),
+                _dimension_value(row.message_type),
+            )
+            hours[key] += 1
+            customers.add(row.customer_id)
+
+        days: Dict[Tuple, int] = defaultdict(int)
+        for (_, *dimensions), count in hours.items():
+            days[tuple(dimensions)] += count
+
+        try:
+            self.repo.delete_range(start, end, target_date, target_date + timedelta(days=1))
+            self.db.add_all(
+                AIReplyRollup(
+                    granularity=GRANULARITY_HOUR, bucket_start=hour, platform=platform,
+                    page_id=page_id, message_type=message_type, reply_count=count
+                )
+                for (hour, platform, page_id, message_type), count in hours.items()
+            )
+            self.db.add_all(
+                AIReplyRollup(
+                    granularity=GRANULARITY_DAY, bucket_start=start, platform=platform,
+                    page_id=page_id, message_type=message_type, reply_count=count
+                )
+                for (platform, page_id, message_type), count in days.items()
+            )
+            self.db.add_all(
+                AIReplyRollupCustomer(date=target_date, customer_id=customer_id)
+                for customer_id in customers
+            )
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        total = sum(hours.values())
+        logger.debug(f"Rebuilt AI reply rollups for {target_date}: {total} replies")
+        return total
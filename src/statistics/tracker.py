@@ -9,16 +9,30 @@ from src.core.database.repositories import (
     CustomerInteractionRepository,
     FrequentQuestionRepository
 )
+from src.core.database.repositories.statistics_repo import format_conversion_rate
 import logging
 
 logger = logging.getLogger(__name__)
 
 
 class StatisticsTracker:
-    """统计数据追踪器"""
+    """
+    统计数据追踪器
     
-    def __init__(self, db: Session):
+    增量模式（默认）下每次交互只对当天统计行做原子增量更新，耗时与当天消息量无关；
+    去重计数（客户数、引流数、开单客户数）通过 customer_id+date 索引判断是否为当天首次。
+    并发下的少量偏差由定期对账任务（reconcile_daily_statistics）从明细表重新计算修正。
+    增量模式下提供 write_buffer 时交互明细缓冲后批量写入，只有当天统计行的增量更新单独提交。
+    """
+    
+    def __init__(self, db: Session, incremental: Optional[bool] = None, write_buffer=None):
         self.db = db
+        if incremental is None:
+            from src.core.config import settings
+            incremental = settings.statistics_incremental
+        self.incremental = incremental
+        # 全量重算模式需要立即读到刚写入的明细，不使用写后缓冲
+        self.write_buffer = write_buffer if incremental else None
         # 使用Repository模式
         self.daily_stats_repo = DailyStatisticsRepository(db)
         self.interaction_repo = CustomerInteractionRepository(db)
@@ -62,26 +76,70 @@ class StatisticsTracker:
         if len(message_summary) > 500:
             message_summary = message_summary[:497] + "..."
         
-        # 使用Repository创建交互记录
-        interaction = self.interaction_repo.create_interaction(
+        today = datetime.now(timezone.utc).date()
+        # 需在创建记录之前判断是否为客户当天首次交互（包括尚在缓冲中的记录）
+        first_today = self.incremental and not (
+            self.interaction_repo.has_interaction(customer_id, today)
+            or (self.write_buffer is not None
+                and self.write_buffer.has_pending(CustomerInteraction, customer_id=customer_id, date=today))
+        )
+        
+        values = dict(
             customer_id=customer_id,
-            date=datetime.now(timezone.utc).date(),
+            date=today,
             platform=platform,
             message_type=message_type,
             message_summary=message_summary,
             extracted_info=extracted_info,
             ai_replied=ai_replied,
-            group_invitation_sent=group_invitation_sent
+            group_invitation_sent=group_invitation_sent,
+            interaction_time=datetime.now(timezone.utc)
         )
+        if self.write_buffer is not None:
+            # 缓冲后批量写入，返回的记录未持久化（id为None）
+            self.write_buffer.add(CustomerInteraction, **values)
+            interaction = CustomerInteraction(**values)
+        else:
+            # 使用Repository创建交互记录
+            interaction = self.interaction_repo.create_interaction(**values)
         
         # 更新每日统计
-        self._update_daily_statistics()
+        if self.incremental:
+            self.daily_stats_repo.increment_counters(
+                today,
+                total_messages=1,
+                total_customers=1 if first_today else 0,
+                group_invitations_sent=1 if group_invitation_sent else 0
+            )
+        else:
+            self._update_daily_statistics()
         
         return interaction
     
+    def _flush_pending_interactions(self, customer_id: int, target_date: date) -> None:
+        """标记前先写入该客户仍在缓冲中的交互记录，否则UPDATE找不到它们"""
+        from src.core.database.write_buffer import telemetry_buffer
+        buffers = [telemetry_buffer]
+        if self.write_buffer is not None and self.write_buffer is not telemetry_buffer:
+            buffers.append(self.write_buffer)
+        for buffer in buffers:
+            if buffer.has_pending(CustomerInteraction, customer_id=customer_id, date=target_date):
+                buffer.flush()
+    
     def mark_joined_group(self, customer_id: int) -> bool:
         """标记客户已加入群组"""
         today = datetime.now(timezone.utc).date()
+        self._flush_pending_interactions(customer_id, today)
+        
+        if self.incremental:
+            already_joined = self.interaction_repo.has_interaction(customer_id, today, joined_group=True)
+            if not self.interaction_repo.mark_flag(customer_id, today, "joined_group"):
+                return False
+            self.daily_stats_repo.increment_counters(
+                today,
+                successful_leads=0 if already_joined else 1
+            )
+            return True
         
         # 使用Repository获取今天的交互记录
         interactions = self.interaction_repo.get_by_customer_and_date(customer_id, today)
@@ -110,6 +168,19 @@ class StatisticsTracker:
     def mark_order_created(self, customer_id: int) -> bool:
         """标记客户已开单"""
         today = datetime.now(timezone.utc).date()
+        self._flush_pending_interactions(customer_id, today)
+        
+        if self.incremental:
+            already_ordered = self.interaction_repo.has_interaction(customer_id, today, order_created=True)
+            updated = self.interaction_repo.mark_flag(customer_id, today, "order_created")
+            if not updated:
+                return False
+            self.daily_stats_repo.increment_counters(
+                today,
+                total_orders=updated,
+                successful_orders=0 if already_ordered else 1
+            )
+            return True
         
         # 使用Repository获取今天的交互记录
         interactions = self.interaction_repo.get_by_customer_and_date(customer_id, today)
@@ -136,42 +207,27 @@ class StatisticsTracker:
         return False
     
     def record_frequent_question(self, question_text: str, category: str = None, sample_response: str = None):
-        """记录高频问题"""
+        """记录高频问题（单条原子upsert：计数、最后出现时间、分类和示例回复）"""
         # 清理问题文本
         question_text = question_text.strip()[:500]
         
         if not question_text:
             return
         
-        # 使用Repository增加问题出现次数
-        question = self.frequent_question_repo.increment_occurrence(question_text)
-        
-        # 更新其他字段
-        update_data = {
-            "last_seen": datetime.now(timezone.utc)
-        }
-        
-        if category:
-            update_data["question_category"] = category
-        
-        # 更新示例回复（保留最新的几个）
-        if sample_response:
-            sample_responses = question.sample_responses or []
-            sample_responses.append({
-                "response": sample_response[:200],
-                "time": datetime.now(timezone.utc).isoformat()
-            })
-            # 只保留最近5个
-            update_data["sample_responses"] = sample_responses[-5:]
-        
-        # 更新记录
-        if update_data:
-            self.frequent_question_repo.update(question.id, **update_data)
+        return self.frequent_question_repo.increment_occurrence(
+            question_text,
+            category=category,
+            sample_response=sample_response
+        )
+    
+    def reconcile_daily_statistics(self, target_date: Optional[date] = None) -> DailyStatistics:
+        """从交互明细表重新计算指定日期的统计数据（对账，修正增量计数的偏差）"""
+        return self._update_daily_statistics(target_date)
     
-    def _update_daily_statistics(self):
-        """更新每日统计数据"""
+    def _update_daily_statistics(self, target_date: Optional[date] = None) -> DailyStatistics:
+        """全量重新计算每日统计数据"""
         # 使用UTC时区的今天日期
-        today = datetime.now(timezone.utc).date()
+        today = target_date or datetime.now(timezone.utc).date()
         stats = self.get_or_create_daily_statistics(today)
         
         # 统计今天的客户数
@@ -216,15 +272,8 @@ class StatisticsTracker:
             .scalar() or 0
         
         # 计算转化率
-        lead_conversion_rate = "0%"
-        if group_invitations_sent > 0:
-            rate = (successful_leads / group_invitations_sent) * 100
-            lead_conversion_rate = f"{rate:.1f}%"
-        
-        order_conversion_rate = "0%"
-        if successful_leads > 0:
-            rate = (successful_orders / successful_leads) * 100
-            order_conversion_rate = f"{rate:.1f}%"
+        lead_conversion_rate = format_conversion_rate(successful_leads, group_invitations_sent)
+        order_conversion_rate = format_conversion_rate(successful_orders, successful_leads)
         
         # 更新统计数据
         stats.total_customers = total_customers
@@ -238,6 +287,7 @@ class StatisticsTracker:
         
         self.db.commit()
         self.db.refresh(stats)
+        return stats
     
     def get_daily_statistics(self, target_date: Optional[date] = None) -> Dict[str, Any]:
         """获取每日统计数据"""
@@ -264,10 +314,7 @@ class StatisticsTracker:
     
     def get_frequent_questions(self, limit: int = 20) -> list:
         """获取高频问题列表"""
-        # 使用Repository获取所有问题，然后排序
-        all_questions = self.frequent_question_repo.get_all(limit=limit * 2)  # 获取更多以便排序
-        # 按出现次数排序
-        questions = sorted(all_questions, key=lambda x: x.occurrence_count, reverse=True)[:limit]
+        questions = self.frequent_question_repo.get_top(limit)
         
         return [
             {
@@ -6,6 +6,7 @@ from src.core.database.connection import get_db
 from src.telegram.command_processor import CommandProcessor
 from src.telegram.notification_sender import NotificationSender
 import logging
+from src.core.logging import TELEGRAM_UPDATE_SAMPLE_KEY, telegram_update_fields, webhook_log_extra
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +22,10 @@ async def handle_telegram_webhook(request: Request):
     """
     try:
         body = await request.json()
-        logger.info(f"Received Telegram webhook: {body}")
+        fields = telegram_update_fields(body)
+        logger.info(
+            f"Received Telegram webhook: update_id={fields['update_id']} type={fields['type']} chat={fields['chat_id']}",
+            extra=webhook_log_extra(TELEGRAM_UPDATE_SAMPLE_KEY, fields))
         
         # 提取消息信息
         message = body.get("message", {})
@@ -3,6 +3,7 @@ import httpx
 from typing import Dict, Any, Optional
 from src.core.config import settings, yaml_config
 from src.core.database.models import Conversation, Customer, CollectedData
+from src.utils.http_client_pool import http_client_pool
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,8 +15,8 @@ class NotificationSender:
     def __init__(self):
         self.bot_token = settings.telegram_bot_token
         self.chat_id = settings.telegram_chat_id
-        self.base_url = f"https://api.telegram.org/bot{self.bot_token}"
-        self.client = httpx.AsyncClient(timeout=30.0)
+        self.base_url = f"{settings.telegram_api_url.rstrip('/')}/bot{self.bot_token}"
+        self.client = http_client_pool.borrow(self.base_url)
         self.notification_config = yaml_config.get("telegram", {})
 
     async def send_review_notification(
@@ -403,5 +404,5 @@ class NotificationSender:
         return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
     async def close(self):
-        """Close HTTP client"""
-        await self.client.aclose()
+        """Release HTTP client (pooled connections stay open)"""
+        await http_client_pool.release(self.client)
@@ -0,0 +1,213 @@
+"""HTTP 客户端连接池 - 应用生命周期内共享的出站 httpx 客户端"""
+import logging
+from typing import Any, Dict, Optional, Set
+
+import httpx
+
+from src.core.config import settings
+from src.core.config.constants import (
+    HTTP_POOL_DEFAULT_MAX_CONNECTIONS,
+    HTTP_POOL_HOST_MAX_CONNECTIONS,
+    HTTP_POOL_KEEPALIVE_EXPIRY_SECONDS,
+    HTTP_POOL_MAX_KEEPALIVE_CONNECTIONS,
+)
+
+logger = logging.getLogger(__name__)
+
+# httpcore 建立新TCP连接时触发的追踪事件（复用连接不会触发）
+_NEW_CONNECTION_EVENT = "connection.connect_tcp.complete"
+
+
+def _http2_available() -> bool:
+    """检查是否安装了 HTTP/2 依赖（h2）"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class HTTPClientPool:
+    """
+    按目标主机共享的 httpx.AsyncClient 池
+
+    每个主机（graph.facebook.com、api.telegram.org 等）一个长期存在的客户端，
+    各自拥有独立的连接上限与 keep-alive 配置，平台客户端从池中借用而不是每条消息
+    新建客户端，从而复用已建立的 TCP+TLS 连接。
+
+    连接池未启动时（脚本、单元测试）借出的是独立客户端，由 release 负责关闭，
+    与原先每次新建客户端的行为一致。
+    """
+
+    def __init__(
+        self,
+        http2: bool = True,
+        host_limits: Optional[Dict[str, int]] = None,
+        default_max_connections: int = HTTP_POOL_DEFAULT_MAX_CONNECTIONS,
+        max_keepalive_connections: int = HTTP_POOL_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = HTTP_POOL_KEEPALIVE_EXPIRY_SECONDS,
+        timeout: float = 30.0
+    ):
+        """
+        初始化连接池
+
+        Args:
+            http2: 是否启用HTTP/2（未安装h2时自动降级为HTTP/1.1）
+            host_limits: 按主机的最大连接数
+            default_max_connections: 未配置主机的最大连接数
+            max_keepalive_connections: 每个主机保持的空闲连接数上限
+            keepalive_expiry: 空闲连接保持时间（秒）
+            timeout: 默认请求超时（秒）
+        """
+        self.http2 = http2
+        self.host_limits = dict(HTTP_POOL_HOST_MAX_CONNECTIONS if host_limits is None else host_limits)
+        self.default_max_connections = default_max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._owned: Set[httpx.AsyncClient] = set()
+        self._running = False
+        self._http2_enabled = False
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._unpooled_clients = 0
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    async def start(self):
+        """启动连接池（应用启动时调用）"""
+        if self._running:
+            return
+        self._http2_enabled = self.http2 and _http2_available()
+        if self.http2 and not self._http2_enabled:
+            logger.warning("HTTP/2 requested but 'h2' is not installed, falling back to HTTP/1.1")
+        self._running = True
+        logger.info(f"HTTP client pool started (http2={self._http2_enabled})")
+
+    async def close(self):
+        """关闭所有共享客户端（应用关闭时调用）"""
+        self._running = False
+        clients = list(self._clients.values())
+        self._clients.clear()
+        self._owned.clear()
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"Failed to close pooled HTTP client: {e}")
+
+    def borrow(self, url: str) -> httpx.AsyncClient:
+        """
+        借用访问指定主机的客户端（共享客户端与独立客户端都使用连接池的超时）
+
+        Args:
+            url: 目标地址（完整URL或主机名）
+
+        Returns:
+            httpx.AsyncClient，使用完毕后应调用 release
+        """
+        host = self._host_of(url)
+        if not self._running:
+            self._unpooled_clients += 1
+            return httpx.AsyncClient(timeout=self.timeout)
+
+        client = self._clients.get(host)
+        if client is None or client.is_closed:
+            client = self._create_client(host)
+            self._clients[host] = client
+        return client
+
+    async def release(self, client: Optional[httpx.AsyncClient]):
+        """归还客户端：共享客户端保持打开，独立客户端直接关闭"""
+        if client is None or client in self._owned:
+            return
+        if not client.is_closed:
+            await client.aclose()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取连接复用统计"""
+        hosts = {}
+        total_requests = 0
+        total_new = 0
+        for host, stats in self._stats.items():
+            requests = stats["requests"]
+            new_connections = stats["new_connections"]
+            total_requests += requests
+            total_new += new_connections
+            hosts[host] = {
+                "max_connections": self._max_connections(host),
+                "requests": requests,
+                "new_connections": new_connections,
+                "reuse_rate": self._reuse_rate(requests, new_connections),
+            }
+
+        return {
+            "running": self._running,
+            "http2": self._http2_enabled,
+            "requests": total_requests,
+            "new_connections": total_new,
+            "reuse_rate": self._reuse_rate(total_requests, total_new),
+            "unpooled_clients": self._unpooled_clients,
+            "hosts": hosts,
+        }
+
+    def _create_client(self, host: str) -> httpx.AsyncClient:
+        max_connections = self._max_connections(host)
+        self._stats.setdefault(host, {"requests": 0, "new_connections": 0})
+        client = httpx.AsyncClient(
+            http2=self._http2_enabled,
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=min(self.max_keepalive_connections, max_connections),
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            event_hooks={"request": [self._make_request_hook(host)]},
+        )
+        self._owned.add(client)
+        logger.debug(f"Created pooled HTTP client for {host} (max_connections={max_connections})")
+        return client
+
+    def _make_request_hook(self, host: str):
+        stats = self._stats[host]
+
+        async def on_new_connection_event(event_name: str, info: Dict[str, Any]):
+            if event_name == _NEW_CONNECTION_EVENT:
+                stats["new_connections"] += 1
+
+        async def on_request(request: httpx.Request):
+            stats["requests"] += 1
+            previous_trace = request.extensions.get("trace")
+            if previous_trace is None:
+                request.extensions["trace"] = on_new_connection_event
+                return
+
+            async def chained_trace(event_name: str, info: Dict[str, Any]):
+                await on_new_connection_event(event_name, info)
+                await previous_trace(event_name, info)
+
+            request.extensions["trace"] = chained_trace
+
+        return on_request
+
+    def _max_connections(self, host: str) -> int:
+        return self.host_limits.get(host, self.default_max_connections)
+
+    @staticmethod
+    def _host_of(url: str) -> str:
+        if "://" not in url:
+            return url.lower()
+        return httpx.URL(url).host
+
+    @staticmethod
+    def _reuse_rate(requests: int, new_connections: int) -> float:
+        if requests <= 0:
+            return 0.0
+        return round(max(0.0, 1 - new_connections / requests), 4)
+
+
+# 全局连接池实例
+http_client_pool = HTTPClientPool(http2=settings.http_pool_http2)
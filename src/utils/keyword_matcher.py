@@ -0,0 +1,273 @@
+"""关键词索引：一次扫描返回消息命中的所有关键词分类
+
+过滤、垃圾信息识别、预设回复、问题分类等逻辑原先各自对消息做 lower() 后逐个关键词扫描。
+所有关键词（config.yaml 中的过滤规则、优先级规则、预设回复，以及下方的默认分类）
+编译为一个 Aho-Corasick 自动机，扫描一遍消息即可得到每个分类命中的关键词，
+耗时与关键词数量无关。config.yaml 修改后自动重新编译（按 KEYWORD_INDEX_RELOAD_CHECK_SECONDS 检查）。
+
+config.yaml 的 keywords 节可以覆盖默认分类：
+
+    keywords:
+      product: ["iphone", "贷款", ...]
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from src.core.config.constants import KEYWORD_INDEX_RELOAD_CHECK_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# 分类名称
+CATEGORY_PRODUCT = "product"
+CATEGORY_BUYING_SELLING = "buying_selling"
+CATEGORY_BUSINESS_INTENT = "business_intent"
+CATEGORY_SENTIMENT_NEGATIVE = "sentiment_negative"
+CATEGORY_SENTIMENT_POSITIVE = "sentiment_positive"
+CATEGORY_FILTER_BLOCK = "filter_block"
+CATEGORY_FILTER_SPAM = "filter_spam"
+
+# 问题分类（按顺序匹配，第一个命中的分类生效）
+QUESTION_CATEGORIES = [
+    ("question_price", "价格咨询"),
+    ("question_howto", "使用指导"),
+    ("question_problem", "问题反馈"),
+    ("question_feature", "功能介绍"),
+]
+
+
+def priority_rule_category(index: int) -> str:
+    """filtering.priority_rules 中第 index 条规则的分类名"""
+    return f"priority_rule:{index}"
+
+
+def preset_reply_category(key: str) -> str:
+    """ai_templates.preset_replies 中预设回复的分类名"""
+    return f"preset:{key}"
+
+
+# 默认分类（可由 config.yaml 的 keywords 节覆盖）
+DEFAULT_KEYWORD_CATEGORIES: Dict[str, List[str]] = {
+    # 产品相关（即使被过滤也要回复）
+    CATEGORY_PRODUCT: [
+        "iphone", "ip", "苹果", "apple", "loan", "borrow", "lend", "贷款", "借款",
+        "借", "贷", "price", "cost", "费用", "价格", "多少钱", "interest", "利息",
+        "model", "型号", "容量", "storage", "apple id", "id card", "身份证",
+        "咨询", "了解", "询问", "办理", "申请", "apply", "怎么", "如何", "how",
+        "服务", "service", "客服", "customer service", "legit", "legitimate",
+        "真实", "真的", "可靠", "reliable", "可信", "?", "？"
+    ],
+    # 买卖手机意向（垃圾信息，即使包含产品关键词）
+    CATEGORY_BUYING_SELLING: [
+        "买手机", "卖手机", "购买手机", "出售手机", "我要买", "我想买",
+        "我要卖", "我想卖", "收购", "回收", "买iphone", "卖iphone",
+        "buy phone", "sell phone", "purchase phone", "want to buy",
+        "want to sell", "looking to buy", "looking to sell", "buy iphone", "sell iphone"
+    ],
+    # 业务咨询意向（必须回复）
+    CATEGORY_BUSINESS_INTENT: [
+        "贷款", "借款", "借钱", "借", "贷", "loan", "borrow", "lend",
+        "咨询", "了解", "询问", "问", "help", "inquiry", "question", "想了解", "想咨询",
+        "办理", "申请", "apply", "application", "怎么", "如何", "how",
+        "价格", "费用", "价钱", "多少钱", "price", "cost", "interest", "利息", "利率",
+        "legit", "legitimate", "真实", "真的", "可靠", "reliable", "可信",
+        "?", "？"
+    ],
+    CATEGORY_SENTIMENT_NEGATIVE: [
+        "不满", "投诉", "问题", "错误", "失败", "糟糕",
+        "disappointed", "complaint", "problem", "error", "bad"
+    ],
+    CATEGORY_SENTIMENT_POSITIVE: [
+        "满意", "感谢", "好", "棒", "优秀",
+        "satisfied", "thanks", "good", "great", "excellent"
+    ],
+    "question_price": ["价格", "price", "cost", "费用", "收费"],
+    "question_howto": ["如何", "怎么", "how", "how to", "方法", "步骤"],
+    "question_problem": ["问题", "错误", "problem", "error", "bug", "故障"],
+    "question_feature": ["功能", "feature", "特性"],
+}
+
+
+class KeywordMatcher:
+    """多分类关键词的 Aho-Corasick 自动机（不区分大小写，子串匹配）"""
+
+    def __init__(self, categories: Mapping[str, Iterable[Any]]):
+        """
+        Args:
+            categories: {分类: 关键词列表}，命中结果按列表中的顺序返回
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        # 关键词编号 -> (分类, 原始关键词)，编号按分类和列表顺序递增
+        self._keywords: List[Tuple[str, str]] = []
+
+        for category, keywords in categories.items():
+            seen = set()
+            for keyword in keywords or []:
+                keyword = str(keyword)
+                folded = keyword.lower()
+                if not folded or folded in seen:
+                    continue
+                seen.add(folded)
+                self._add(folded, len(self._keywords))
+                self._keywords.append((category, keyword))
+        self._build()
+
+    def __len__(self) -> int:
+        return len(self._keywords)
+
+    def _add(self, folded: str, keyword_id: int) -> None:
+        state = 0
+        for ch in folded:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = next_state
+        self._out[state] += (keyword_id,)
+
+    def _build(self) -> None:
+        """广度优先计算失败指针，并把失败链上的输出合并到每个状态"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(ch, 0)
+                self._out[next_state] += self._out[self._fail[next_state]]
+                queue.append(next_state)
+
+    def match(self, text: Optional[str]) -> Dict[str, List[str]]:
+        """
+        扫描一遍文本，返回每个命中分类的关键词
+
+        Returns:
+            {分类: [命中的关键词]}，未命中的分类不出现
+        """
+        if not text or not self._keywords:
+            return {}
+
+        goto, fail, out = self._goto, self._fail, self._out
+        root = goto[0]
+        found = set()
+        state = 0
+        for ch in text.lower():
+            if state == 0:
+                state = root.get(ch, 0)
+            else:
+                while state and ch not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+
+        hits: Dict[str, List[str]] = {}
+        for keyword_id in sorted(found):
+            category, keyword = self._keywords[keyword_id]
+            hits.setdefault(category, []).append(keyword)
+        return hits
+
+
+def build_keyword_categories(config: Mapping[str, Any]) -> Dict[str, List[str]]:
+    """从 config.yaml 的内容收集所有关键词分类"""
+    categories: Dict[str, List[str]] = {
+        category: list(keywords) for category, keywords in DEFAULT_KEYWORD_CATEGORIES.items()
+    }
+    for category, keywords in (config.get("keywords") or {}).items():
+        categories[category] = list(keywords or [])
+
+    filter_config = config.get("filtering") or {}
+    keyword_filter = filter_config.get("keyword_filter") or {}
+    categories[CATEGORY_FILTER_BLOCK] = list(keyword_filter.get("block_keywords") or [])
+    categories[CATEGORY_FILTER_SPAM] = list(keyword_filter.get("spam_keywords") or [])
+    for index, rule in enumerate(filter_config.get("priority_rules") or []):
+        categories[priority_rule_category(index)] = list(rule.get("keywords") or [])
+
+    preset_replies = (config.get("ai_templates") or {}).get("preset_replies") or {}
+    for key, preset in preset_replies.items():
+        categories[preset_reply_category(key)] = list((preset or {}).get("keywords") or [])
+    return categories
+
+
+class KeywordIndex:
+    """由一份配置编译出的关键词索引（不可变，重新加载时整体替换）"""
+
+    def __init__(self, config: Mapping[str, Any]):
+        self.config = config
+        self.matcher = KeywordMatcher(build_keyword_categories(config))
+
+    def match(self, text: Optional[str]) -> Dict[str, List[str]]:
+        return self.matcher.match(text)
+
+
+class KeywordIndexLoader:
+    """编译并缓存关键词索引，config.yaml 修改后重新编译"""
+
+    def __init__(self, config_path: str = "config/config.yaml"):
+        self.config_path = config_path
+        self._index: Optional[KeywordIndex] = None
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _stat_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.config_path).st_mtime
+        except OSError:
+            return None
+
+    def get(self) -> KeywordIndex:
+        """返回当前索引（首次调用时编译，之后按间隔检查配置文件是否修改）"""
+        index = self._index
+        if index is None:
+            with self._lock:
+                if self._index is None:
+                    from src.core.config import yaml_config
+                    self._mtime = self._stat_mtime()
+                    self._checked_at = time.monotonic()
+                    self._index = KeywordIndex(yaml_config)
+                return self._index
+
+        now = time.monotonic()
+        if now - self._checked_at >= KEYWORD_INDEX_RELOAD_CHECK_SECONDS:
+            self._checked_at = now
+            mtime = self._stat_mtime()
+            if mtime != self._mtime:
+                self._mtime = mtime
+                return self.reload()
+        return index
+
+    def reload(self, config: Optional[Mapping[str, Any]] = None) -> KeywordIndex:
+        """
+        重新编译索引
+
+        Args:
+            config: 使用的配置，未提供时重新读取 config.yaml
+        """
+        from src.core.config.loader import load_yaml_config
+
+        with self._lock:
+            if config is None:
+                config = load_yaml_config(self.config_path)
+            index = KeywordIndex(config)
+            self._index = index
+        logger.info(f"Keyword index compiled ({len(index.matcher)} keywords)")
+        return index
+
+
+# 全局关键词索引
+keyword_index_loader = KeywordIndexLoader()
+
+
+def get_keyword_index() -> KeywordIndex:
+    """获取当前的全局关键词索引"""
+    return keyword_index_loader.get()
@@ -1,17 +1,285 @@
-"""请求限流器"""
+"""请求限流器（GCRA / 令牌桶）"""
+import asyncio
+import logging
+import math
 import time
-from typing import Dict, Optional
-from collections import defaultdict
-from datetime import datetime, timedelta
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from src.core.config.constants import (
+    RATE_LIMIT_ACQUIRE_TIMEOUT_SECONDS,
+    RATE_LIMIT_MAX_KEYS,
+    RATE_LIMIT_REDIS_KEY_PREFIX,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RateLimitResult:
+    """单次限流判定结果"""
+    allowed: bool
+    retry_after: float  # 被拒绝时距离下一次可用的秒数
+    remaining: int  # 当前剩余可用次数
+
+
+def _gcra(
+    tat: Optional[float],
+    now: float,
+    emission_interval: float,
+    burst_window: float,
+    cost: int = 1
+) -> Tuple[RateLimitResult, Optional[float]]:
+    """
+    GCRA（通用信元速率算法）判定，等价于容量为 max_requests 的令牌桶
+
+    每个键只保存一个浮点数 TAT（理论到达时间），判定为 O(1)。
+
+    Args:
+        tat: 已保存的理论到达时间，None表示该键从未使用
+        now: 当前时间（秒）
+        emission_interval: 补充一个令牌的间隔（window / max_requests）
+        burst_window: 突发容量对应的时长（window）
+        cost: 本次消耗的令牌数
+
+    Returns:
+        (判定结果, 新的TAT)，被拒绝时新的TAT为None（不更新状态）
+    """
+    tat = now if tat is None or tat < now else tat
+    new_tat = tat + emission_interval * cost
+    allow_at = new_tat - burst_window
+    if now < allow_at:
+        remaining = int((burst_window - (tat - now)) / emission_interval + 1e-9)
+        return RateLimitResult(False, allow_at - now, max(0, remaining)), None
+    remaining = int((burst_window - (new_tat - now)) / emission_interval + 1e-9)
+    return RateLimitResult(True, 0.0, max(0, remaining)), new_tat
+
+
+class InMemoryRateLimitBackend:
+    """进程内限流状态（默认后端，仅对当前进程生效）"""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._tats: Dict[str, float] = {}
+
+    async def consume(
+        self,
+        key: str,
+        emission_interval: float,
+        burst_window: float,
+        cost: int = 1
+    ) -> RateLimitResult:
+        now = self.clock()
+        result, new_tat = _gcra(self._tats.get(key), now, emission_interval, burst_window, cost)
+        if new_tat is not None:
+            self._tats[key] = new_tat
+            if len(self._tats) > RATE_LIMIT_MAX_KEYS:
+                self._prune(now)
+        return result
+
+    async def reset(self, key: Optional[str] = None):
+        if key:
+            self._tats.pop(key, None)
+        else:
+            self._tats.clear()
+
+    def _prune(self, now: float):
+        """清理已完全恢复的键（TAT早于当前时间的键与不存在等价）"""
+        for key in [k for k, tat in self._tats.items() if tat <= now]:
+            del self._tats[key]
+
+
+# Redis端原子执行GCRA，使用Redis服务器时间保证多个工作进程时钟一致
+_GCRA_LUA_SCRIPT = """
+local emission_interval = tonumber(ARGV[1])
+local burst_window = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat or tat < now then
+    tat = now
+end
+local new_tat = tat + emission_interval * cost
+local allow_at = new_tat - burst_window
+if now < allow_at then
+    local remaining = math.floor((burst_window - (tat - now)) / emission_interval + 1e-9)
+    return {0, tostring(allow_at - now), remaining}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+local remaining = math.floor((burst_window - (new_tat - now)) / emission_interval + 1e-9)
+return {1, '0', remaining}
+"""
+
+
+class RedisRateLimitBackend:
+    """
+    Redis 共享限流状态
+
+    多个工作进程共用同一个 Graph API 配额。只依赖 EVAL/DEL 命令，
+    任何兼容 Redis 协议的异步客户端（redis.asyncio.Redis 或测试中的假实现）都可以使用。
+    """
+
+    def __init__(self, client: Any, key_prefix: str = RATE_LIMIT_REDIS_KEY_PREFIX):
+        self.client = client
+        self.key_prefix = key_prefix
+
+    async def consume(
+        self,
+        key: str,
+        emission_interval: float,
+        burst_window: float,
+        cost: int = 1
+    ) -> RateLimitResult:
+        allowed, retry_after, remaining = await self.client.eval(
+            _GCRA_LUA_SCRIPT, 1, self.key_prefix + key,
+            repr(emission_interval), repr(burst_window), cost
+        )
+        return RateLimitResult(
+            allowed=int(allowed) == 1,
+            retry_after=float(retry_after),
+            remaining=max(0, int(remaining))
+        )
+
+    async def reset(self, key: Optional[str] = None):
+        if key:
+            await self.client.delete(self.key_prefix + key)
+
+
+def create_rate_limit_backend(redis_url: Optional[str] = None):
+    """
+    根据配置创建限流后端
+
+    配置了 Redis 地址时使用共享后端（需要安装 redis 包），否则使用进程内后端。
+    """
+    if not redis_url:
+        return InMemoryRateLimitBackend()
+    try:
+        import redis.asyncio as redis_asyncio
+    except ImportError:
+        logger.warning("RATE_LIMIT_REDIS_URL is set but 'redis' is not installed, using in-memory rate limiter")
+        return InMemoryRateLimitBackend()
+    return RedisRateLimitBackend(redis_asyncio.from_url(redis_url))
+
+
+class AsyncRateLimiter:
+    """
+    按键（API类型 + 页面ID）限流的异步限流器
+
+    acquire 会真正等待到有可用配额为止，而不是打印警告后照常发送。
+    共享后端不可用时退回进程内限流，避免Redis故障导致无法发送消息。
+    """
+
+    def __init__(
+        self,
+        backend: Any = None,
+        backend_factory: Optional[Callable[[], Any]] = None,
+        default_max: int = 100,
+        default_window: float = 60
+    ):
+        """
+        初始化限流器
+
+        Args:
+            backend: 限流后端实例
+            backend_factory: 首次使用时创建后端的工厂（backend为None时使用）
+            default_max: 未配置API类型的默认最大请求数
+            default_window: 未配置API类型的默认时间窗口（秒）
+        """
+        self._backend = backend
+        self._backend_factory = backend_factory or InMemoryRateLimitBackend
+        self._fallback = InMemoryRateLimitBackend()
+        self.limits: Dict[str, Tuple[int, float]] = {}
+        self.default_max = default_max
+        self.default_window = default_window
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = self._backend_factory()
+        return self._backend
+
+    def set_limit(self, api_type: str, max_requests: int, time_window_seconds: float = 60) -> None:
+        """
+        设置某类API的限流规则（对该类型下的每个页面分别生效）
+
+        Args:
+            api_type: API类型（如 messages）
+            max_requests: 时间窗口内最大请求数（同时也是突发容量）
+            time_window_seconds: 时间窗口（秒）
+        """
+        self.limits[api_type] = (max_requests, time_window_seconds)
+
+    @staticmethod
+    def make_key(api_type: str, page_id: Optional[str] = None) -> str:
+        """生成限流键"""
+        return f"{api_type}:{page_id or 'default'}"
+
+    async def try_acquire(self, api_type: str, page_id: Optional[str] = None, cost: int = 1) -> RateLimitResult:
+        """尝试获取配额，不等待"""
+        max_requests, window = self.limits.get(api_type, (self.default_max, self.default_window))
+        emission_interval = window / max_requests
+        key = self.make_key(api_type, page_id)
+        try:
+            return await self.backend.consume(key, emission_interval, window, cost)
+        except Exception as e:
+            logger.warning(f"Rate limit backend error, using in-memory limiter for {key}: {e}")
+            return await self._fallback.consume(key, emission_interval, window, cost)
+
+    async def acquire(
+        self,
+        api_type: str,
+        page_id: Optional[str] = None,
+        timeout: Optional[float] = RATE_LIMIT_ACQUIRE_TIMEOUT_SECONDS,
+        cost: int = 1
+    ) -> float:
+        """
+        获取配额，配额不足时等待
+
+        Args:
+            api_type: API类型
+            page_id: 页面ID
+            timeout: 最长等待时间（秒），None表示一直等待
+            cost: 本次消耗的配额数
+
+        Returns:
+            实际等待的秒数
+
+        Raises:
+            RateLimitExceededError: 超过最长等待时间仍无可用配额
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        waited = 0.0
+        while True:
+            result = await self.try_acquire(api_type, page_id, cost)
+            if result.allowed:
+                return waited
+
+            if timeout is not None and waited + result.retry_after > timeout:
+                from src.core.exceptions import RateLimitExceededError
+                raise RateLimitExceededError(
+                    f"Rate limit for {self.make_key(api_type, page_id)} not available within {timeout}s",
+                    retry_after=result.retry_after
+                )
+            await asyncio.sleep(result.retry_after)
+            waited = loop.time() - started
+
+    async def reset(self, api_type: str, page_id: Optional[str] = None) -> None:
+        """重置某个键的限流状态"""
+        key = self.make_key(api_type, page_id)
+        await self.backend.reset(key)
+        await self._fallback.reset(key)
 
 
 class RateLimiter:
-    """简单的内存限流器（生产环境建议使用Redis）"""
-    
-    def __init__(self):
-        self.requests: Dict[str, list] = defaultdict(list)
+    """简单的内存限流器（同步接口，用于请求中间件；GCRA实现，每次判定O(1)）"""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.tats: Dict[str, float] = {}
         self.limits: Dict[str, tuple] = {}  # key -> (max_requests, time_window_seconds)
-    
+
     def set_limit(
         self,
         key: str,
@@ -20,14 +288,14 @@ class RateLimiter:
     ) -> None:
         """
         设置限流规则
-        
+
         Args:
             key: 限流键（如IP地址、用户ID等）
             max_requests: 时间窗口内最大请求数
             time_window_seconds: 时间窗口（秒）
         """
         self.limits[key] = (max_requests, time_window_seconds)
-    
+
     def is_allowed(
         self,
         key: str,
@@ -36,12 +304,12 @@ class RateLimiter:
     ) -> bool:
         """
         检查是否允许请求
-        
+
         Args:
             key: 限流键
             default_max: 默认最大请求数
             default_window: 默认时间窗口
-        
+
         Returns:
             是否允许请求
         """
@@ -49,24 +317,15 @@ class RateLimiter:
             key,
             (default_max, default_window)
         )
-        
-        now = time.time()
-        cutoff = now - window
-        
-        # 清理过期记录
-        self.requests[key] = [
-            timestamp for timestamp in self.requests[key]
-            if timestamp > cutoff
-        ]
-        
-        # 检查是否超过限制
-        if len(self.requests[key]) >= max_requests:
-            return False
-        
-        # 记录本次请求
-        self.requests[key].append(now)
-        return True
-    
+
+        now = self.clock()
+        result, new_tat = _gcra(self.tats.get(key), now, window / max_requests, window)
+        if new_tat is not None:
+            self.tats[key] = new_tat
+            if len(self.tats) > RATE_LIMIT_MAX_KEYS:
+                self._prune(now)
+        return result.allowed
+
     def get_remaining(
         self,
         key: str,
@@ -75,12 +334,12 @@ class RateLimiter:
     ) -> int:
         """
         获取剩余请求次数
-        
+
         Args:
             key: 限流键
             default_max: 默认最大请求数
             default_window: 默认时间窗口
-        
+
         Returns:
             剩余请求次数
         """
@@ -88,31 +347,35 @@ class RateLimiter:
             key,
             (default_max, default_window)
         )
-        
-        now = time.time()
-        cutoff = now - window
-        
-        # 清理过期记录
-        self.requests[key] = [
-            timestamp for timestamp in self.requests[key]
-            if timestamp > cutoff
-        ]
-        
-        return max(0, max_requests - len(self.requests[key]))
-    
+
+        now = self.clock()
+        tat = max(self.tats.get(key, now), now)
+        return max(0, min(max_requests, math.floor((window - (tat - now)) / (window / max_requests) + 1e-9)))
+
     def reset(self, key: Optional[str] = None) -> None:
         """
         重置限流记录
-        
+
         Args:
             key: 要重置的键，如果为None则重置所有
         """
         if key:
-            self.requests.pop(key, None)
+            self.tats.pop(key, None)
         else:
-            self.requests.clear()
+            self.tats.clear()
+
+    def _prune(self, now: float):
+        for key in [k for k, tat in self.tats.items() if tat <= now]:
+            del self.tats[key]
+
+
+def _create_graph_api_backend():
+    from src.core.config import settings
+    return create_rate_limit_backend(settings.rate_limit_redis_url)
 
 
 # 全局限流器实例
 rate_limiter = RateLimiter()
 
+# Graph API 出站限流器（按API类型和页面ID限流，可通过Redis在多个工作进程间共享配额）
+graph_api_rate_limiter = AsyncRateLimiter(backend_factory=_create_graph_api_backend)
@@ -0,0 +1,149 @@
+"""
+启动耗时分析
+
+- 启动阶段计时（模块导入、startup事件）始终记录，开销可以忽略
+- STARTUP_PROFILE=true 时额外记录每个模块的导入耗时（类似 python -X importtime）：
+  在 sys.meta_path 最前面插入一个查找器，为每个从文件加载的模块包装 exec_module，
+  统计累计耗时（含其导入的子模块）和自身耗时
+
+导入耗时分析需要在其他模块导入之前启用，因此本模块只依赖标准库，直接读取环境变量
+而不是 settings（导入 settings 本身就会加载 pydantic 等依赖）。
+"""
+import importlib.machinery
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# 每个模块独立创建实例的加载器（可以安全地在实例上包装 exec_module）
+_PER_MODULE_LOADERS = (
+    importlib.machinery.SourceFileLoader,
+    importlib.machinery.SourcelessFileLoader,
+    importlib.machinery.ExtensionFileLoader,
+)
+
+
+def startup_profile_requested() -> bool:
+    """是否通过环境变量 STARTUP_PROFILE 启用了导入耗时分析"""
+    return os.environ.get("STARTUP_PROFILE", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+class ImportProfiler:
+    """记录每个模块的导入耗时（秒）"""
+
+    def __init__(self):
+        self.cumulative: Dict[str, float] = {}
+        self.self_time: Dict[str, float] = {}
+        self.installed = False
+        self._local = threading.local()
+
+    def install(self) -> None:
+        if not self.installed:
+            sys.meta_path.insert(0, self)
+            self.installed = True
+
+    def uninstall(self) -> None:
+        if self.installed:
+            try:
+                sys.meta_path.remove(self)
+            except ValueError:
+                pass
+            self.installed = False
+
+    def find_spec(self, fullname: str, path: Any = None, target: Any = None):
+        """委托给其余查找器，只为找到的模块包装加载过程"""
+        if getattr(self._local, "finding", False):
+            return None
+        self._local.finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._local.finding = False
+
+        if isinstance(spec.loader, _PER_MODULE_LOADERS):
+            self._wrap(spec.loader, fullname)
+        return spec
+
+    def _wrap(self, loader: Any, fullname: str) -> None:
+        exec_module = loader.exec_module
+        profiler = self
+
+        def timed_exec_module(module):
+            stack = profiler._stack()
+            stack.append(0.0)  # 子模块累计耗时
+            started = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                elapsed = time.perf_counter() - started
+                children = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                profiler.cumulative[fullname] = elapsed
+                profiler.self_time[fullname] = max(0.0, elapsed - children)
+
+        loader.exec_module = timed_exec_module
+
+    def _stack(self) -> List[float]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def top_modules(self, limit: Optional[int] = None, by: str = "self") -> List[Dict[str, Any]]:
+        """导入最慢的模块（by: self 按自身耗时，cumulative 按累计耗时）"""
+        if limit is None:
+            from src.core.config.constants import STARTUP_PROFILE_TOP_MODULES
+            limit = STARTUP_PROFILE_TOP_MODULES
+        source = self.self_time if by == "self" else self.cumulative
+        names = sorted(source, key=source.get, reverse=True)[:limit]
+        return [
+            {
+                "module": name,
+                "self_ms": round(self.self_time.get(name, 0.0) * 1000, 2),
+                "cumulative_ms": round(self.cumulative.get(name, 0.0) * 1000, 2),
+            }
+            for name in names
+        ]
+
+
+class StartupTimings:
+    """启动阶段计时"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.marks: Dict[str, float] = {}
+        self.profiler: Optional[ImportProfiler] = None
+
+    def mark(self, phase: str) -> float:
+        """记录阶段完成时间，返回距进程开始导入主应用的秒数"""
+        elapsed = time.perf_counter() - self.started_at
+        self.marks[phase] = elapsed
+        return elapsed
+
+    def get_report(self) -> Dict[str, Any]:
+        report: Dict[str, Any] = {name: round(value, 3) for name, value in self.marks.items()}
+        report["import_profile"] = self.profiler is not None
+        if self.profiler is not None:
+            report["slowest_imports"] = self.profiler.top_modules()
+        return report
+
+
+# 全局计时实例（src.main 导入时创建）
+startup_timings = StartupTimings()
+
+
+def enable_import_profile() -> ImportProfiler:
+    """启用导入耗时分析（幂等）"""
+    if startup_timings.profiler is None:
+        startup_timings.profiler = ImportProfiler()
+        startup_timings.profiler.install()
+    return startup_timings.profiler
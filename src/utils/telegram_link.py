@@ -0,0 +1,58 @@
+"""Telegram 群组链接识别"""
+from functools import lru_cache
+from typing import Optional, Tuple
+
+# 回复中出现即视为已发送群组链接的通用关键词
+GENERIC_TELEGRAM_KEYWORDS = ("t.me", "telegram", "telegram group", "telegram群组", "join our telegram")
+
+# config.yaml 示例中的占位群组名（未配置真实群组）
+PLACEHOLDER_MAIN_GROUP = "@your_group"
+
+
+def configured_main_group() -> Optional[str]:
+    """config.yaml 中配置的主群组链接/名称，未配置时返回None"""
+    from src.core.config import yaml_config
+    main_group = yaml_config.get("telegram_groups", {}).get("main_group", PLACEHOLDER_MAIN_GROUP)
+    if not main_group or main_group == PLACEHOLDER_MAIN_GROUP:
+        return None
+    return main_group
+
+
+@lru_cache(maxsize=16)
+def telegram_link_keywords(main_group: Optional[str]) -> Tuple[str, ...]:
+    """
+    识别群组链接的关键词（小写），按主群组缓存
+
+    除通用关键词外还包括主群组本身，以及从链接中提取的群组名/邀请码，
+    例如 https://t.me/+bNivsOGSM6ZlMGJl 提取 "+bnivsogsm6zlmgjl" 和 "bnivsogsm6zlmgjl"，
+    @group_name 提取 "group_name"。
+    """
+    keywords = list(GENERIC_TELEGRAM_KEYWORDS)
+    if main_group:
+        lowered = main_group.lower()
+        keywords.append(lowered)
+        if "/" in lowered:
+            group_id = lowered.rstrip("/").split("/")[-1]
+            if group_id:
+                keywords.append(group_id)
+                if group_id.startswith("+") and len(group_id) > 1:
+                    keywords.append(group_id[1:])
+        elif lowered.startswith("@") and len(lowered) > 1:
+            keywords.append(lowered[1:])
+    return tuple(dict.fromkeys(keywords))
+
+
+def contains_telegram_link(text: Optional[str], main_group: Optional[str] = None) -> bool:
+    """
+    文本中是否包含Telegram群组链接
+
+    Args:
+        text: 回复内容
+        main_group: 主群组（默认使用 config.yaml 中的配置）
+    """
+    if not text:
+        return False
+    if main_group is None:
+        main_group = configured_main_group()
+    lowered = text.lower()
+    return any(keyword in lowered for keyword in telegram_link_keywords(main_group))
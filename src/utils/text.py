@@ -0,0 +1,18 @@
+"""文本规范化工具"""
+import hashlib
+import unicodedata
+
+
+def question_fingerprint(text: str) -> str:
+    """
+    问题文本指纹：NFKC规范化、大小写折叠并去掉空白、标点和符号后取SHA-256
+
+    “如何 购买？”、“如何购买”、“如何购买!!” 得到相同的指纹，用于聚合几乎相同的问题。
+    去掉后为空（如纯标点）时使用折叠后的原文计算。
+    """
+    folded = unicodedata.normalize("NFKC", text or "").casefold()
+    normalized = "".join(
+        ch for ch in folded
+        if unicodedata.category(ch)[0] not in ("P", "S", "Z", "C")
+    )
+    return hashlib.sha256((normalized or folded.strip()).encode("utf-8")).hexdigest()
@@ -2,8 +2,19 @@
 import sys
 from pathlib import Path
 
+import pytest
+
 # 添加项目根目录到Python路径
 project_root = Path(__file__).parent.parent
 if str(project_root) not in sys.path:
     sys.path.insert(0, str(project_root))
 
+
+@pytest.fixture(autouse=True)
+def _clear_process_caches():
+    """AI回复缓存、客户缓存和对话历史窗口是进程级的，每个用例前清空，避免用例之间（各自的数据库中客户ID相同）互相命中"""
+    from src.core.cache import customer_cache, get_history_store, reply_cache
+    reply_cache.clear_sync()
+    customer_cache.clear_sync()
+    get_history_store().clear()
+    yield
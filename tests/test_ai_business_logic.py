@@ -67,7 +67,7 @@ class TestReplyGenerator:
         """测试生成回复成功"""
         generator = ReplyGenerator(db_session)
         
-        with patch.object(generator.client.chat.completions, 'create') as mock_create:
+        with patch.object(generator.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
             mock_response = Mock()
             mock_response.choices = [Mock()]
             mock_response.choices[0].message = Mock()
@@ -102,7 +102,7 @@ class TestReplyGenerator:
         """测试错误处理"""
         generator = ReplyGenerator(db_session)
         
-        with patch.object(generator.client.chat.completions, 'create') as mock_create:
+        with patch.object(generator.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
             mock_create.side_effect = Exception("API错误")
             
             # 应该能够处理错误而不崩溃
@@ -119,6 +119,84 @@ class TestReplyGenerator:
                 assert isinstance(e, Exception)
 
 
+class TestOpenAIClient:
+    """测试OpenAI异步调用路径"""
+    
+    @pytest.mark.asyncio
+    async def test_async_client_is_shared(self, db_session):
+        """测试异步模式下所有生成器共用同一个客户端"""
+        with patch('src.ai.reply_generator.settings.openai_async_client', True):
+            first = ReplyGenerator(db_session)
+            second = ReplyGenerator(db_session)
+        
+        assert first.client is second.client
+    
+    @pytest.mark.asyncio
+    async def test_completion_uses_timeout_and_is_awaited(self, db_session):
+        """测试异步模式下带单次超时await客户端"""
+        with patch('src.ai.reply_generator.settings.openai_async_client', True):
+            generator = ReplyGenerator(db_session)
+            generator.client = Mock()
+            generator.client.chat.completions.create = AsyncMock(return_value="response")
+            
+            response = await generator._create_chat_completion([{"role": "user", "content": "你好"}])
+        
+        assert response == "response"
+        kwargs = generator.client.chat.completions.create.await_args.kwargs
+        assert kwargs["timeout"] > 0
+        assert kwargs["max_tokens"] == 45
+    
+    @pytest.mark.asyncio
+    async def test_sync_client_runs_in_executor(self, db_session):
+        """测试同步模式下在线程池中调用，不阻塞事件循环"""
+        import threading
+        main_thread = threading.get_ident()
+        call_threads = []
+        
+        def create(**kwargs):
+            call_threads.append(threading.get_ident())
+            return "response"
+        
+        with patch('src.ai.reply_generator.settings.openai_async_client', False):
+            generator = ReplyGenerator(db_session)
+            generator.client = Mock()
+            generator.client.chat.completions.create = create
+            
+            response = await generator._create_chat_completion([{"role": "user", "content": "你好"}])
+        
+        assert response == "response"
+        assert call_threads and call_threads[0] != main_thread
+    
+    @pytest.mark.asyncio
+    async def test_concurrency_is_limited(self, db_session):
+        """测试并发请求数受信号量限制"""
+        import asyncio
+        active = 0
+        peak = 0
+        
+        async def create(**kwargs):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return "response"
+        
+        with patch('src.ai.openai_client._semaphore', None), \
+             patch('src.ai.openai_client.settings.openai_max_concurrency', 2), \
+             patch('src.ai.reply_generator.settings.openai_async_client', True):
+            generator = ReplyGenerator(db_session)
+            generator.client = Mock()
+            generator.client.chat.completions.create = create
+            
+            await asyncio.gather(*[
+                generator._create_chat_completion([{"role": "user", "content": "你好"}])
+                for _ in range(6)
+            ])
+        
+        assert peak == 2
+
+
 class TestConversationManager:
     """测试对话管理器"""
     
@@ -51,7 +51,7 @@ async def test_generate_reply_basic(reply_generator, db_session):
     db_session.add(customer)
     db_session.commit()
     
-    with patch.object(reply_generator.client.chat.completions, 'create') as mock_create:
+    with patch.object(reply_generator.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
         mock_response = Mock()
         mock_response.choices = [Mock(message=Mock(content="这是一个测试回复"))]
         mock_create.return_value = mock_response
@@ -98,7 +98,7 @@ async def test_generate_reply_with_context(reply_generator, db_session):
     db_session.add_all([conv1, conv2])
     db_session.commit()
     
-    with patch.object(reply_generator.client.chat.completions, 'create') as mock_create:
+    with patch.object(reply_generator.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
         mock_response = Mock()
         mock_response.choices = [Mock(message=Mock(content="我明白了，让我帮您处理"))]
         mock_create.return_value = mock_response
@@ -130,7 +130,7 @@ async def test_generate_reply_error_handling(reply_generator, db_session):
     db_session.add(customer)
     db_session.commit()
     
-    with patch.object(reply_generator.client.chat.completions, 'create') as mock_create:
+    with patch.object(reply_generator.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
         mock_create.side_effect = Exception("API错误")
         
         # 应该抛出异常
@@ -0,0 +1,231 @@
+"""异步Repository层单元测试"""
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock, AsyncMock, patch
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from src.core.database.connection import Base, get_async_database_url
+from src.core.database.models import Customer, Conversation, Platform, MessageType
+from src.core.database.repositories import (
+    AsyncCustomerRepository,
+    AsyncConversationRepository,
+    AsyncFrequentQuestionRepository,
+)
+from src.processors.base import ProcessorContext, ProcessorStatus
+from src.processors.handlers import UserInfoHandler, FilterHandler
+
+
+@pytest_asyncio.fixture
+async def async_db():
+    """创建测试异步数据库会话"""
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        poolclass=StaticPool,
+        echo=False
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session = async_sessionmaker(bind=engine, expire_on_commit=False)()
+
+    yield session
+
+    await session.close()
+    await engine.dispose()
+
+
+class TestAsyncDatabaseUrl:
+    """测试异步驱动URL转换"""
+
+    def test_postgres_urls(self):
+        assert get_async_database_url("postgresql://u:p@h:5432/db") == "postgresql+asyncpg://u:p@h:5432/db"
+        assert get_async_database_url("postgres://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+        assert get_async_database_url("postgresql+psycopg2://u@h/db") == "postgresql+asyncpg://u@h/db"
+
+    def test_sqlite_urls(self):
+        assert get_async_database_url("sqlite:///./test.db") == "sqlite+aiosqlite:///./test.db"
+        assert get_async_database_url("sqlite+aiosqlite:///x.db") == "sqlite+aiosqlite:///x.db"
+
+
+class TestAsyncCustomerRepository:
+    """测试异步客户Repository"""
+
+    @pytest.mark.asyncio
+    async def test_get_or_create(self, async_db):
+        repo = AsyncCustomerRepository(async_db)
+
+        customer = await repo.get_or_create(
+            platform=Platform.FACEBOOK,
+            platform_user_id="user_1",
+            name="测试用户"
+        )
+        again = await repo.get_or_create(platform=Platform.FACEBOOK, platform_user_id="user_1")
+
+        assert customer.id is not None
+        assert customer.facebook_id == "user_1"
+        assert again.id == customer.id
+        assert await repo.count() == 1
+
+    @pytest.mark.asyncio
+    async def test_update_and_delete(self, async_db):
+        repo = AsyncCustomerRepository(async_db)
+        customer = await repo.create(platform=Platform.INSTAGRAM, platform_user_id="ig_1")
+
+        updated = await repo.update(customer.id, name="新名称")
+        assert updated.name == "新名称"
+        assert await repo.update(9999, name="x") is None
+
+        assert await repo.delete(customer.id) is True
+        assert await repo.get(customer.id) is None
+        assert await repo.delete(customer.id) is False
+
+
+class TestAsyncConversationRepository:
+    """测试异步对话Repository"""
+
+    @pytest.mark.asyncio
+    async def test_create_and_query(self, async_db):
+        customer = await AsyncCustomerRepository(async_db).create(
+            platform=Platform.FACEBOOK, platform_user_id="user_1"
+        )
+        repo = AsyncConversationRepository(async_db)
+        now = datetime.now(timezone.utc)
+
+        older = await repo.create_conversation(
+            customer_id=customer.id,
+            platform=Platform.FACEBOOK,
+            platform_message_id="m1",
+            message_type=MessageType.MESSAGE,
+            content="第一条",
+            received_at=now - timedelta(minutes=5)
+        )
+        newer = await repo.create_conversation(
+            customer_id=customer.id,
+            platform=Platform.FACEBOOK,
+            platform_message_id="m2",
+            message_type=MessageType.MESSAGE,
+            content="第二条",
+            received_at=now
+        )
+
+        assert older.facebook_message_id == "m1"
+        found = await repo.get_by_platform_message_id(Platform.FACEBOOK, "m2")
+        assert found.id == newer.id
+
+        conversations = await repo.get_customer_conversations(customer.id)
+        assert [c.id for c in conversations] == [newer.id, older.id]
+
+        unreplied = await repo.get_unreplied_conversations()
+        assert [c.id for c in unreplied] == [older.id, newer.id]
+
+        replied = await repo.update(id=older.id, ai_replied=True, ai_reply_content="您好")
+        assert replied.ai_replied is True
+        assert len(await repo.get_unreplied_conversations()) == 1
+        assert await repo.count_by_time_range(now - timedelta(minutes=1)) == 1
+
+
+class TestAsyncFrequentQuestionRepository:
+    """测试异步高频问题Repository"""
+
+    @pytest.mark.asyncio
+    async def test_increment_occurrence(self, async_db):
+        repo = AsyncFrequentQuestionRepository(async_db)
+
+        await repo.increment_occurrence("价格是多少")
+        question = await repo.increment_occurrence("价格是多少")
+
+        assert question.occurrence_count == 2
+
+    @pytest.mark.asyncio
+    async def test_fallback_keeps_sample_responses(self, async_db):
+        repo = AsyncFrequentQuestionRepository(async_db)
+
+        with patch(
+            "src.core.database.repositories.statistics_repo.build_frequent_question_upsert",
+            return_value=None
+        ):
+            await repo.increment_occurrence("价格是多少", sample_response="请私信咨询")
+            question = await repo.increment_occurrence("价格是多少", category="价格", sample_response="详见官网")
+
+        assert question.occurrence_count == 2
+        assert question.question_category == "价格"
+        assert [s["response"] for s in question.sample_responses] == ["请私信咨询", "详见官网"]
+
+
+class TestAsyncPipelineHandlers:
+    """测试处理器使用异步会话"""
+
+    @pytest.mark.asyncio
+    async def test_user_info_and_filter_handlers_use_async_db(self, async_db):
+        platform_client = Mock()
+        platform_client.get_user_info = AsyncMock(return_value={"name": "异步用户"})
+        # 同步会话不应被使用
+        sync_db = Mock()
+
+        context = ProcessorContext(
+            platform_name="facebook",
+            message_data={
+                "sender_id": "async_user",
+                "message_id": "async_msg",
+                "content": "请问iphone贷款怎么办理？"
+            },
+            db=sync_db,
+            async_db=async_db,
+            platform_client=platform_client
+        )
+        context.message_summary = context.message_data["content"]
+
+        user_result = await UserInfoHandler().process(context)
+        filter_result = await FilterHandler().process(context)
+
+        assert user_result.status == ProcessorStatus.SUCCESS
+        assert filter_result.status == ProcessorStatus.SUCCESS
+        sync_db.commit.assert_not_called()
+
+        customer = (await async_db.execute(
+            select(Customer).where(Customer.platform_user_id == "async_user")
+        )).scalars().one()
+        conversation = (await async_db.execute(
+            select(Conversation).where(Conversation.platform_message_id == "async_msg")
+        )).scalars().one()
+        assert customer.name == "异步用户"
+        assert conversation.customer_id == customer.id
+        assert context.conversation_id == conversation.id
+
+    @pytest.mark.asyncio
+    async def test_redelivered_message_reuses_conversation(self, async_db):
+        """测试入站队列重投同一条消息时只保存一条对话，已回复的消息不再处理"""
+        platform_client = Mock()
+        platform_client.get_user_info = AsyncMock(return_value={"name": "重投用户"})
+
+        def deliver():
+            context = ProcessorContext(
+                platform_name="facebook",
+                message_data={"sender_id": "retry_user", "message_id": "retry_msg", "content": "请问价格多少？"},
+                db=Mock(),
+                async_db=async_db,
+                platform_client=platform_client
+            )
+            context.message_summary = context.message_data["content"]
+            return context
+
+        first = deliver()
+        await UserInfoHandler().process(first)
+        assert (await FilterHandler().process(first)).status == ProcessorStatus.SUCCESS
+
+        second = deliver()
+        await UserInfoHandler().process(second)
+        assert (await FilterHandler().process(second)).status == ProcessorStatus.SUCCESS
+
+        rows = (await async_db.execute(
+            select(Conversation).where(Conversation.platform_message_id == "retry_msg")
+        )).scalars().all()
+        assert len(rows) == 1
+        assert second.conversation_id == first.conversation_id
+
+        await AsyncConversationRepository(async_db).update(first.conversation_id, ai_replied=True)
+        third = deliver()
+        await UserInfoHandler().process(third)
+        result = await FilterHandler().process(third)
+        assert result.status == ProcessorStatus.SKIP
@@ -0,0 +1,132 @@
+"""缓存管理器测试"""
+import pytest
+from datetime import timedelta
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.core.cache import CacheManager, CustomerSnapshot, customer_cache, conversation_cache
+from src.core.database.connection import Base
+from src.core.database.models import Platform, MessageType
+from src.core.database.repositories import ConversationRepository, CustomerRepository
+from src.ai.conversation_manager import ConversationManager
+
+
+@pytest.fixture
+def db_session():
+    """创建测试数据库会话"""
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+
+    yield session
+
+    session.close()
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture(autouse=True)
+def clear_global_caches():
+    customer_cache.clear_sync()
+    conversation_cache.clear_sync()
+    yield
+    customer_cache.clear_sync()
+    conversation_cache.clear_sync()
+
+
+class TestCacheManager:
+    """测试有界LRU/TTL缓存"""
+
+    def test_lru_eviction(self):
+        cache = CacheManager(max_size=2)
+        cache.set_sync("a", 1)
+        cache.set_sync("b", 2)
+        assert cache.get_sync("a") == 1  # a 变为最近使用
+
+        cache.set_sync("c", 3)
+
+        assert cache.get_sync("b") is None
+        assert cache.get_sync("a") == 1
+        assert cache.get_sync("c") == 3
+        assert len(cache) == 2
+        stats = cache.get_stats()
+        assert stats["evictions"] == 1
+        assert stats["hits"] == 3
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.75
+
+    def test_ttl_expiration(self):
+        cache = CacheManager(default_ttl=timedelta(seconds=10))
+        with patch("src.core.cache.cache_manager.time.monotonic", return_value=100.0):
+            cache.set_sync("k", "v")
+            cache.set_sync("short", "v", ttl=timedelta(seconds=1))
+        with patch("src.core.cache.cache_manager.time.monotonic", return_value=105.0):
+            assert cache.get_sync("k") == "v"
+            assert cache.get_sync("short") is None
+        with patch("src.core.cache.cache_manager.time.monotonic", return_value=111.0):
+            assert cache.cleanup_expired_sync() == 1
+
+        assert len(cache) == 0
+        assert cache.get_stats()["expirations"] == 2
+
+    @pytest.mark.asyncio
+    async def test_async_api(self):
+        cache = CacheManager()
+        calls = []
+
+        async def factory():
+            calls.append(1)
+            return 0  # 假值也应被缓存
+
+        assert await cache.get_or_set("k", factory) == 0
+        assert await cache.get_or_set("k", factory) == 0
+        assert len(calls) == 1
+        assert await cache.delete("k") is True
+        assert await cache.get("k") is None
+
+
+class TestRepositoryCaching:
+    """测试Repository和对话管理器使用缓存"""
+
+    def test_conversation_lookup_uses_cached_id_in_sync_code(self, db_session):
+        """测试同步Repository可以真正命中缓存，且返回绑定会话的ORM实例"""
+        customer = CustomerRepository(db_session).create(platform=Platform.FACEBOOK, platform_user_id="u1")
+        repo = ConversationRepository(db_session)
+        conversation = repo.create_conversation(
+            customer_id=customer.id,
+            platform=Platform.FACEBOOK,
+            platform_message_id="m1",
+            message_type=MessageType.MESSAGE,
+            content="你好"
+        )
+
+        first = repo.get_by_platform_message_id(Platform.FACEBOOK, "m1")
+        hits_before = conversation_cache.hits
+        second = repo.get_by_platform_message_id(Platform.FACEBOOK, "m1")
+
+        assert first.id == second.id == conversation.id
+        assert conversation_cache.hits == hits_before + 1
+        assert second in db_session
+        assert repo.get_by_id_with_relations(conversation.id).customer.id == customer.id
+
+    @pytest.mark.asyncio
+    async def test_customer_cache_stores_snapshot(self, db_session):
+        """测试客户缓存保存快照，会话关闭后仍可读取"""
+        manager = ConversationManager(db_session)
+
+        customer = await manager.get_or_create_customer(platform_user_id="u2", platform="facebook")
+        db_session.close()
+        cached = await manager.get_or_create_customer(platform_user_id="u2", platform="facebook")
+
+        assert isinstance(cached, CustomerSnapshot)
+        assert cached.id == customer.id
+        assert cached.platform_user_id == "u2"
+
+    @pytest.mark.asyncio
+    async def test_customer_name_update_refreshes_snapshot(self, db_session):
+        manager = ConversationManager(db_session)
+        await manager.get_or_create_customer(platform_user_id="u3", platform="facebook")
+
+        updated = await manager.get_or_create_customer(platform_user_id="u3", platform="facebook", name="新名字")
+
+        assert updated.name == "新名字"
+        assert customer_cache.get_sync(("customer", "facebook", "u3")).name == "新名字"
@@ -101,7 +101,7 @@ class TestAPIErrorHandling:
         """测试OpenAI API错误"""
         generator = ReplyGenerator(db_session)
         
-        with patch.object(generator.client.chat.completions, 'create') as mock_create:
+        with patch.object(generator.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
             mock_create.side_effect = Exception("API错误")
             
             try:
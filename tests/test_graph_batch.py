@@ -0,0 +1,174 @@
+"""Graph API 批量请求与字段展开测试（使用本地假 Graph 服务器）"""
+import json
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from src.facebook.api_client import FacebookAPIClient
+
+GRAPH_URL = "http://graph.test/v18.0"
+PAGE_ID = "page1"
+OLD_TIME = "2020-01-01T00:00:00+0000"
+
+
+class FakeGraphServer:
+    """最小化的假 Graph API：对话列表（支持字段展开）、对话消息和批量请求端点"""
+
+    def __init__(self, conversations: int = 3):
+        self.requests = []
+        self.batch_sizes = []
+        self.expand_messages = True
+        self.failing_conversations = set()
+        self.timed_out_conversations = set()
+        self.messages = {
+            f"c{i}": [{
+                "id": f"m{i}",
+                "message": f"iphone price {i}?",
+                "from": {"id": f"user{i}"},
+                "created_time": OLD_TIME,
+            }]
+            for i in range(conversations)
+        }
+        self.app = FastAPI()
+        self.app.add_api_route("/v18.0/", self.batch, methods=["POST"])
+        self.app.add_api_route("/v18.0/{page_id}/conversations", self.conversations, methods=["GET"])
+        self.app.add_api_route("/v18.0/{conversation_id}/messages", self.conversation_messages, methods=["GET"])
+
+    def _messages_body(self, conversation_id: str):
+        if conversation_id in self.failing_conversations:
+            return 400, {"error": {"message": "Unsupported get request", "code": 100}}
+        return 200, {"data": self.messages.get(conversation_id, [])}
+
+    async def conversations(self, page_id: str, request: Request):
+        self.requests.append(("GET", request.url.path))
+        fields = request.query_params.get("fields", "")
+        data = []
+        for conversation_id, messages in self.messages.items():
+            conv = {"id": conversation_id, "updated_time": OLD_TIME}
+            if self.expand_messages and "messages.limit(" in fields:
+                conv["messages"] = {"data": messages}
+            data.append(conv)
+        return {"data": data}
+
+    async def conversation_messages(self, conversation_id: str, request: Request):
+        self.requests.append(("GET", request.url.path))
+        status, body = self._messages_body(conversation_id)
+        return JSONResponse(body, status_code=status)
+
+    async def batch(self, request: Request):
+        self.requests.append(("POST", request.url.path))
+        form = await request.form()
+        assert form["access_token"] == "token"
+        batch = json.loads(form["batch"])
+        self.batch_sizes.append(len(batch))
+        if len(batch) > 50:
+            return JSONResponse({"error": {"message": "Too many requests in batch", "code": 1}}, status_code=400)
+
+        responses = []
+        for item in batch:
+            conversation_id = item["relative_url"].split("/")[0]
+            if conversation_id in self.timed_out_conversations:
+                responses.append(None)
+                continue
+            status, body = self._messages_body(conversation_id)
+            responses.append({"code": status, "body": json.dumps(body)})
+        return responses
+
+
+@pytest.fixture
+def graph():
+    return FakeGraphServer()
+
+
+@pytest_asyncio.fixture
+async def client(graph):
+    api_client = FacebookAPIClient(access_token="token", base_url=GRAPH_URL)
+    await api_client.close()
+    api_client.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=graph.app))
+    yield api_client
+    await api_client.client.aclose()
+
+
+class TestFieldExpansion:
+    """测试通过字段展开一次获取对话及其消息"""
+
+    @pytest.mark.asyncio
+    async def test_page_scan_is_a_single_request(self, graph, client):
+        unreplied = await client.check_unreplied_messages(PAGE_ID)
+
+        assert [item["conversation_id"] for item in unreplied] == ["c0", "c1", "c2"]
+        assert unreplied[0]["message"]["id"] == "m0"
+        assert graph.requests == [("GET", "/v18.0/page1/conversations")]
+
+
+class TestBatchRequests:
+    """测试批量请求的拆分和逐项错误处理"""
+
+    @pytest.mark.asyncio
+    async def test_batch_get_splits_into_chunks(self):
+        graph = FakeGraphServer(conversations=120)
+        api_client = FacebookAPIClient(access_token="token", base_url=GRAPH_URL)
+        await api_client.close()
+        api_client.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=graph.app))
+
+        fetched = await api_client.get_messages_batch(list(graph.messages), PAGE_ID, limit=5)
+        await api_client.client.aclose()
+
+        assert sorted(graph.batch_sizes) == [20, 50, 50]
+        assert len(fetched) == 120
+        assert fetched["c119"][0]["id"] == "m119"
+
+    @pytest.mark.asyncio
+    async def test_scan_without_expansion_uses_one_batch(self, graph, client):
+        graph.expand_messages = False
+
+        unreplied = await client.check_unreplied_messages(PAGE_ID)
+
+        assert len(unreplied) == 3
+        assert graph.requests == [("GET", "/v18.0/page1/conversations"), ("POST", "/v18.0/")]
+
+    @pytest.mark.asyncio
+    async def test_failed_items_are_isolated_and_retried_individually(self, graph, client):
+        graph.expand_messages = False
+        graph.failing_conversations = {"c0"}
+        graph.timed_out_conversations = {"c1"}
+
+        fetched = await client.get_messages_batch(["c0", "c1", "c2"], PAGE_ID)
+        assert fetched["c0"] is None
+        assert fetched["c1"] is None
+        assert fetched["c2"][0]["id"] == "m2"
+
+        graph.requests.clear()
+        unreplied = await client.check_unreplied_messages(PAGE_ID)
+
+        # c0 单独重试仍失败被跳过，c1 单独重试成功
+        assert [item["conversation_id"] for item in unreplied] == ["c1", "c2"]
+        assert sorted(graph.requests[2:]) == [
+            ("GET", "/v18.0/c0/messages"),
+            ("GET", "/v18.0/c1/messages"),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_whole_batch_failure_returns_none_per_item(self, graph, client):
+        await client.client.aclose()
+        client.client = httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda request: httpx.Response(500, json={"error": {"message": "boom"}}))
+        )
+
+        assert await client.batch_get(["c0/messages", "c1/messages"], PAGE_ID) == [None, None]
+        assert await client.batch_get([], PAGE_ID) == []
+
+
+class TestBaseUrl:
+    """测试 Graph API 根地址配置"""
+
+    @pytest.mark.asyncio
+    async def test_settings_override_used_when_not_passed(self, monkeypatch):
+        from src.facebook import api_client as api_client_module
+
+        monkeypatch.setattr(api_client_module.settings, "facebook_graph_api_url", "http://127.0.0.1:9/v18.0/")
+        api_client = FacebookAPIClient(access_token="token")
+        await api_client.close()
+
+        assert api_client.base_url == "http://127.0.0.1:9/v18.0"
@@ -0,0 +1,163 @@
+"""对话历史窗口测试"""
+from unittest.mock import Mock, patch
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from src.ai.conversation_manager import ConversationManager
+from src.core.cache import CacheManager, ConversationHistoryStore, HistoryTurn, get_history_store
+from src.core.cache.history_store import DisabledHistoryBackend, InMemoryHistoryBackend, create_history_backend
+from src.core.database.connection import Base
+from src.core.database.models import Platform
+from src.core.database.repositories import ConversationRepository, CustomerRepository
+
+
+@pytest.fixture
+def engine():
+    """创建测试数据库引擎"""
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(engine)
+    yield engine
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def db_session(engine):
+    """创建测试数据库会话"""
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def customer(db_session):
+    return CustomerRepository(db_session).create(platform=Platform.FACEBOOK, platform_user_id="c1")
+
+
+@pytest.fixture
+def query_counter(engine):
+    """统计执行的SQL语句数"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _save(manager, customer, text):
+    return manager.save_conversation(
+        customer_id=customer.id, platform_message_id=f"m_{text}", content=text)
+
+
+class TestConversationHistoryWindow:
+    """测试历史窗口由写入路径维护"""
+
+    @pytest.mark.asyncio
+    async def test_loaded_window_served_without_queries(self, db_session, customer, query_counter):
+        manager = ConversationManager(db_session)
+        first = _save(manager, customer, "价格多少")
+        manager.update_ai_reply(first.id, "请私信咨询")
+
+        history = await manager.get_conversation_history(customer.id, limit=10)
+        assert [msg["content"] for msg in history] == ["价格多少", "请私信咨询"]
+
+        second = _save(manager, customer, "怎么申请")
+        manager.update_ai_reply(second.id, "填写表格即可")
+
+        customer_id = customer.id
+        query_counter.clear()
+        history = await manager.get_conversation_history(customer_id, limit=10)
+        assert query_counter == []
+        assert [msg["role"] for msg in history] == ["user", "assistant", "user", "assistant"]
+        assert [msg["content"] for msg in history] == ["价格多少", "请私信咨询", "怎么申请", "填写表格即可"]
+        assert history[0]["timestamp"].endswith("+00:00")
+
+        # 与直接从数据库重建的结果一致
+        get_history_store().clear()
+        assert await manager.get_conversation_history(customer.id, limit=10) == history
+
+    @pytest.mark.asyncio
+    async def test_window_is_bounded(self, db_session, customer):
+        manager = ConversationManager(db_session)
+        store = get_history_store()
+        await manager.get_conversation_history(customer.id)
+
+        for i in range(store.window + 3):
+            _save(manager, customer, f"消息{i}")
+
+        turns = store.get(customer.id)
+        assert len(turns) == store.window
+        assert turns[-1].content == f"消息{store.window + 2}"
+        history = await manager.get_conversation_history(customer.id, limit=3)
+        assert [msg["content"] for msg in history] == [f"消息{i}" for i in range(store.window, store.window + 3)]
+
+    @pytest.mark.asyncio
+    async def test_limit_beyond_window_reads_database(self, db_session, customer):
+        manager = ConversationManager(db_session)
+        for i in range(get_history_store().window + 2):
+            _save(manager, customer, f"消息{i}")
+
+        history = await manager.get_conversation_history(customer.id, limit=50)
+
+        assert len(history) == get_history_store().window + 2
+        assert history[0]["content"] == "消息0"
+
+    def test_bulk_update_invalidates_window(self, db_session, customer):
+        manager = ConversationManager(db_session)
+        store = get_history_store()
+        conversation = _save(manager, customer, "你好")
+        store.put(customer.id, [HistoryTurn.from_model(conversation)])
+
+        ConversationRepository(db_session).bulk_update_ai_reply([conversation.id], "您好")
+
+        assert store.get(customer.id) is None
+
+
+class TestConversationHistoryStore:
+    """测试加载竞争和后端故障"""
+
+    def _store(self):
+        return ConversationHistoryStore(backend=InMemoryHistoryBackend(CacheManager(name="history_test")))
+
+    def test_load_discarded_after_concurrent_write(self):
+        store = self._store()
+        token = store.load_token()
+        store.record_message(Mock(id=2, customer_id=1, content="新消息", received_at=None, ai_replied=False))
+
+        assert not store.put(1, [HistoryTurn(1, "旧消息")], token)
+        assert store.get(1) is None
+        assert store.put(1, [HistoryTurn(1, "旧消息")], store.load_token())
+
+    def test_backend_errors_fall_back(self):
+        backend = Mock()
+        backend.get.side_effect = ConnectionError("down")
+        backend.append.side_effect = ConnectionError("down")
+        store = ConversationHistoryStore(backend=backend)
+
+        assert store.get(1) is None
+        store.record_message(Mock(id=2, customer_id=1, content="你好", received_at=None, ai_replied=False))
+
+        backend.delete.assert_called_once_with(1)
+        assert store.get_stats()["errors"] == 2
+
+    @pytest.mark.asyncio
+    async def test_multiple_workers_without_redis_read_database(self, db_session, customer):
+        assert isinstance(create_history_backend(None), InMemoryHistoryBackend)
+        backend = create_history_backend(None, workers=4)
+        assert isinstance(backend, DisabledHistoryBackend)
+
+        manager = ConversationManager(db_session)
+        with patch("src.core.cache.get_history_store", return_value=ConversationHistoryStore(backend=backend)):
+            _save(manager, customer, "你好")
+            await manager.get_conversation_history(customer.id)
+            # 另一个工作进程写入的对话不经过本进程
+            ConversationRepository(db_session).create(
+                customer_id=customer.id, platform=Platform.FACEBOOK, platform_message_id="m_other",
+                message_type="message", content="其他进程的消息")
+
+            history = await manager.get_conversation_history(customer.id)
+        assert [msg["content"] for msg in history] == ["你好", "其他进程的消息"]
@@ -0,0 +1,136 @@
+"""出站HTTP连接池测试"""
+import asyncio
+import pytest
+import pytest_asyncio
+from src.utils.http_client_pool import HTTPClientPool
+
+
+@pytest_asyncio.fixture
+async def http_server():
+    """启动本地 HTTP/1.1 keep-alive 服务器，返回 (base_url, 已建立连接数)"""
+    connections = {"count": 0}
+
+    async def handle(reader, writer):
+        connections["count"] += 1
+        try:
+            while True:
+                headers = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in headers.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+                body = b'{"ok": true}'
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    yield f"http://127.0.0.1:{port}", connections
+
+    server.close()
+    await server.wait_closed()
+
+
+class TestHTTPClientPool:
+    """测试按主机共享的HTTP客户端池"""
+
+    @pytest.mark.asyncio
+    async def test_unstarted_pool_hands_out_owned_clients(self):
+        """测试未启动时借出独立客户端，归还时关闭"""
+        pool = HTTPClientPool(http2=False)
+
+        first = pool.borrow("https://graph.facebook.com/v18.0")
+        second = pool.borrow("https://graph.facebook.com/v18.0")
+
+        assert first is not second
+        await pool.release(first)
+        assert first.is_closed
+        await pool.release(second)
+        assert pool.get_stats()["unpooled_clients"] == 2
+
+    @pytest.mark.asyncio
+    async def test_started_pool_shares_client_per_host(self):
+        """测试启动后同一主机共享客户端，且release不关闭共享客户端"""
+        pool = HTTPClientPool(http2=False, host_limits={"graph.facebook.com": 7})
+        await pool.start()
+        try:
+            facebook = pool.borrow("https://graph.facebook.com/v18.0")
+            again = pool.borrow("https://graph.facebook.com/v18.0/me")
+            telegram = pool.borrow("https://api.telegram.org/bot123")
+
+            assert facebook is again
+            assert facebook is not telegram
+
+            await pool.release(facebook)
+            assert not facebook.is_closed
+        finally:
+            await pool.close()
+
+        assert facebook.is_closed
+        assert telegram.is_closed
+
+    @pytest.mark.asyncio
+    async def test_connections_are_reused(self, http_server):
+        """测试多次请求复用同一连接，并统计复用率"""
+        base_url, connections = http_server
+        pool = HTTPClientPool(http2=False)
+        await pool.start()
+        try:
+            for _ in range(5):
+                client = pool.borrow(base_url)
+                response = await client.post(f"{base_url}/messages", json={"text": "hi"})
+                assert response.json() == {"ok": True}
+                await pool.release(client)
+        finally:
+            await pool.close()
+
+        stats = pool.get_stats()
+        assert connections["count"] == 1
+        assert stats["requests"] == 5
+        assert stats["new_connections"] == 1
+        assert stats["reuse_rate"] == 0.8
+        assert stats["hosts"]["127.0.0.1"]["max_connections"] == pool.default_max_connections
+
+    @pytest.mark.asyncio
+    async def test_per_host_connection_cap(self, http_server):
+        """测试并发请求数超过主机上限时连接数不超过上限"""
+        base_url, connections = http_server
+        pool = HTTPClientPool(http2=False, host_limits={"127.0.0.1": 2})
+        await pool.start()
+        try:
+            client = pool.borrow(base_url)
+            responses = await asyncio.gather(*[client.get(f"{base_url}/ping") for _ in range(10)])
+        finally:
+            await pool.close()
+
+        assert all(r.status_code == 200 for r in responses)
+        assert connections["count"] <= 2
+        assert pool.get_stats()["new_connections"] == connections["count"]
+
+    @pytest.mark.asyncio
+    async def test_platform_client_borrows_from_pool(self, monkeypatch):
+        """测试Facebook客户端关闭时不会关闭共享客户端"""
+        from src.facebook import api_client as facebook_api_client
+
+        pool = HTTPClientPool(http2=False)
+        monkeypatch.setattr(facebook_api_client, "http_client_pool", pool)
+        await pool.start()
+        try:
+            first = facebook_api_client.FacebookAPIClient(access_token="token")
+            second = facebook_api_client.FacebookAPIClient(access_token="token")
+            assert first.client is second.client
+
+            await first.close()
+            assert not second.client.is_closed
+        finally:
+            await pool.close()
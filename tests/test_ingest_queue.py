@@ -0,0 +1,213 @@
+"""Webhook入站队列测试"""
+import asyncio
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.core.database.connection import Base
+from src.core.database.models import IngestMessage, IngestStatus
+from src.core.exceptions import QueueFullError
+from src.processors.ingest_queue import IngestQueue
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """创建测试数据库会话工厂（工作池在线程池中访问数据库，使用文件库，每个线程独立连接）"""
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'ingest.db'}",
+        connect_args={"check_same_thread": False},
+        echo=False
+    )
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+
+    yield factory
+
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+def _rows(session_factory):
+    db = session_factory()
+    try:
+        return db.query(IngestMessage).order_by(IngestMessage.id).all()
+    finally:
+        db.close()
+
+
+async def _wait_until(predicate, timeout=3.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        if loop.time() > deadline:
+            raise AssertionError("condition not met before timeout")
+        await asyncio.sleep(0.01)
+
+
+class TestIngestQueue:
+    """测试持久化入站队列"""
+
+    @pytest.mark.asyncio
+    async def test_enqueue_persists_without_workers(self, session_factory):
+        """测试未启动工作池时消息也会落库"""
+        queue = IngestQueue(session_factory=session_factory, handler=AsyncMock())
+
+        count = await queue.enqueue("facebook", [{"message_id": "m1"}, {"message_id": "m2"}])
+
+        assert count == 2
+        rows = _rows(session_factory)
+        assert [row.payload["message_id"] for row in rows] == ["m1", "m2"]
+        assert all(row.status == IngestStatus.PENDING.value for row in rows)
+
+    @pytest.mark.asyncio
+    async def test_workers_process_and_ack(self, session_factory):
+        """测试工作池处理成功后删除消息"""
+        handler = AsyncMock(return_value={"success": True})
+        queue = IngestQueue(session_factory=session_factory, handler=handler, workers=2, poll_interval=0.05)
+        await queue.start()
+        try:
+            await queue.enqueue("facebook", [{"message_id": f"m{i}"} for i in range(5)])
+            await _wait_until(lambda: queue.get_stats()["acked"] == 5)
+        finally:
+            await queue.stop()
+
+        assert handler.await_count == 5
+        assert _rows(session_factory) == []
+        assert queue.get_stats()["pending"] == 0
+
+    @pytest.mark.asyncio
+    async def test_backlog_from_previous_run_is_redelivered(self, session_factory):
+        """测试重启后处理上次遗留的消息（包括超过可见性超时的处理中消息）"""
+        db = session_factory()
+        now = datetime.now(timezone.utc)
+        db.add(IngestMessage(platform="facebook", payload={"message_id": "old"},
+                             status=IngestStatus.PENDING.value, attempts=0, available_at=now))
+        db.add(IngestMessage(platform="instagram", payload={"message_id": "crashed"},
+                             status=IngestStatus.PROCESSING.value, attempts=1, lock_token="stale",
+                             locked_at=now - timedelta(seconds=600), available_at=now))
+        db.commit()
+        db.close()
+
+        handler = AsyncMock(return_value={"success": True})
+        queue = IngestQueue(session_factory=session_factory, handler=handler,
+                            poll_interval=0.05, visibility_timeout=300)
+        await queue.start()
+        try:
+            assert queue.get_stats()["pending"] == 2
+            await _wait_until(lambda: queue.get_stats()["acked"] == 2)
+        finally:
+            await queue.stop()
+
+        platforms = sorted(call.args[0] for call in handler.await_args_list)
+        assert platforms == ["facebook", "instagram"]
+
+    @pytest.mark.asyncio
+    async def test_failed_message_is_retried_then_dead_lettered(self, session_factory):
+        """测试处理失败会退避重投，超过最大次数后标记为failed"""
+        handler = AsyncMock(side_effect=RuntimeError("boom"))
+        queue = IngestQueue(session_factory=session_factory, handler=handler,
+                            poll_interval=0.05, max_attempts=2)
+        await queue.start()
+        try:
+            await queue.enqueue("facebook", [{"message_id": "bad"}])
+            await _wait_until(lambda: queue.get_stats()["retried"] == 1)
+
+            row = _rows(session_factory)[0]
+            assert row.status == IngestStatus.PENDING.value
+            assert row.attempts == 1
+            assert row.last_error == "boom"
+
+            # 跳过退避等待
+            db = session_factory()
+            db.query(IngestMessage).update({IngestMessage.available_at: datetime.now(timezone.utc)})
+            db.commit()
+            db.close()
+            await _wait_until(lambda: queue.get_stats()["dead_lettered"] == 1)
+        finally:
+            await queue.stop()
+
+        row = _rows(session_factory)[0]
+        assert row.status == IngestStatus.FAILED.value
+        assert row.attempts == 2
+        assert queue.get_stats()["pending"] == 0
+
+    @pytest.mark.asyncio
+    async def test_pipeline_failure_result_is_retried(self, session_factory):
+        """测试管道返回success=False时不ack"""
+        handler = AsyncMock(return_value={"success": False, "error": "no client"})
+        queue = IngestQueue(session_factory=session_factory, handler=handler, poll_interval=0.05)
+        await queue.start()
+        try:
+            await queue.enqueue("facebook", [{"message_id": "m1"}])
+            await _wait_until(lambda: queue.get_stats()["retried"] == 1)
+        finally:
+            await queue.stop()
+
+        assert _rows(session_factory)[0].last_error == "no client"
+
+    @pytest.mark.asyncio
+    async def test_backpressure_rejects_when_backlog_full(self, session_factory):
+        """测试积压超过上限时拒绝入队"""
+        queue = IngestQueue(session_factory=session_factory, handler=AsyncMock(), max_pending=2)
+        await queue.enqueue("facebook", [{"message_id": "m1"}, {"message_id": "m2"}])
+
+        with pytest.raises(QueueFullError):
+            await queue.enqueue("facebook", [{"message_id": "m3"}])
+
+        assert len(_rows(session_factory)) == 2
+        assert queue.get_stats()["rejected"] == 1
+
+    @pytest.mark.asyncio
+    async def test_backpressure_counts_backlog_of_other_processes(self, session_factory):
+        """测试多个进程共享积压上限（接近上限时以数据库统计为准）"""
+        first = IngestQueue(session_factory=session_factory, handler=AsyncMock(),
+                            max_pending=4, backlog_refresh_interval=3600)
+        second = IngestQueue(session_factory=session_factory, handler=AsyncMock(),
+                             max_pending=4, backlog_refresh_interval=3600)
+        await first.enqueue("facebook", [{"message_id": "m1"}, {"message_id": "m2"}])
+        await second.enqueue("facebook", [{"message_id": "m3"}])
+
+        # 本地计数只有2条，但表中已有3条
+        with pytest.raises(QueueFullError):
+            await first.enqueue("facebook", [{"message_id": "m4"}, {"message_id": "m5"}])
+
+        assert len(_rows(session_factory)) == 3
+        assert first.get_stats()["pending"] == 3
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_bounded(self, session_factory):
+        """测试同时处理的消息数不超过工作协程数"""
+        active = 0
+        peak = 0
+
+        async def handler(platform_name, message_data):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.02)
+            active -= 1
+            return {"success": True}
+
+        queue = IngestQueue(session_factory=session_factory, handler=handler, workers=3, poll_interval=0.05)
+        await queue.start()
+        try:
+            await queue.enqueue("facebook", [{"message_id": f"m{i}"} for i in range(12)])
+            await _wait_until(lambda: queue.get_stats()["acked"] == 12)
+        finally:
+            await queue.stop()
+
+        assert peak <= 3
+
+    def test_stale_ack_is_ignored(self, session_factory):
+        """测试消息被重新领取后，旧令牌的ack不会删除消息"""
+        queue = IngestQueue(session_factory=session_factory, handler=AsyncMock(), visibility_timeout=0)
+        queue._insert("facebook", [{"message_id": "m1"}])
+
+        first = queue._claim(10)
+        second = queue._claim(10)
+
+        assert len(first) == 1 and len(second) == 1
+        assert queue._ack(first[0][0], first[0][4]) is False
+        assert queue._ack(second[0][0], second[0][4]) is True
+        assert _rows(session_factory) == []
@@ -0,0 +1,123 @@
+"""关键词索引测试"""
+import os
+import random
+from unittest.mock import patch
+
+from src.collector.filter_engine import FilterEngine
+from src.core.database.models import Priority
+from src.utils.keyword_matcher import (
+    CATEGORY_FILTER_BLOCK,
+    CATEGORY_PRODUCT,
+    KeywordIndex,
+    KeywordIndexLoader,
+    KeywordMatcher,
+    preset_reply_category,
+    priority_rule_category,
+)
+
+
+class TestKeywordMatcher:
+    """测试自动机的匹配结果与逐个子串检查一致"""
+
+    def test_overlapping_keywords_all_reported(self):
+        matcher = KeywordMatcher({
+            "loan": ["借", "借款", "款"],
+            "howto": ["how", "how to", "to"],
+        })
+
+        hits = matcher.match("HOW TO 借款?")
+
+        assert hits == {"loan": ["借", "借款", "款"], "howto": ["how", "how to", "to"]}
+
+    def test_case_insensitive_and_keeps_original_keyword(self):
+        matcher = KeywordMatcher({"product": ["iPhone", "Apple ID"]})
+
+        assert matcher.match("想用apple id借iphone") == {"product": ["iPhone", "Apple ID"]}
+        assert matcher.match("你好") == {}
+        assert matcher.match("") == {}
+        assert matcher.match(None) == {}
+
+    def test_duplicates_and_empty_keywords_ignored(self):
+        matcher = KeywordMatcher({"a": ["价格", "价格", "", "PRICE", "price"]})
+
+        assert len(matcher) == 2
+        assert matcher.match("price 价格") == {"a": ["价格", "PRICE"]}
+
+    def test_matches_naive_scan(self):
+        rng = random.Random(7)
+        alphabet = "abcab借款贷价格?"
+        categories = {
+            f"c{i}": ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(20)]
+            for i in range(5)
+        }
+        matcher = KeywordMatcher(categories)
+
+        for _ in range(200):
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+            expected = {}
+            for category, keywords in categories.items():
+                matched = []
+                for keyword in keywords:
+                    if keyword.lower() in text.lower() and keyword not in matched:
+                        matched.append(keyword)
+                if matched:
+                    expected[category] = matched
+            assert matcher.match(text) == expected
+
+
+class TestKeywordIndex:
+    """测试从配置编译的分类和热加载"""
+
+    CONFIG = {
+        "keywords": {CATEGORY_PRODUCT: ["widget"]},
+        "filtering": {
+            "keyword_filter": {"block_keywords": ["诈骗"], "spam_keywords": ["广告"]},
+            "priority_rules": [
+                {"condition": "包含紧急关键词", "keywords": ["紧急"], "priority": "high"},
+                {"condition": "默认", "priority": "low"},
+            ],
+        },
+        "ai_templates": {
+            "preset_replies": {"question_model": {"keywords": ["型号"], "reply": "请提供型号"}}
+        },
+    }
+
+    def test_config_categories(self):
+        index = KeywordIndex(self.CONFIG)
+
+        hits = index.match("紧急！这个widget型号是诈骗吗")
+
+        assert hits[CATEGORY_PRODUCT] == ["widget"]
+        assert hits[CATEGORY_FILTER_BLOCK] == ["诈骗"]
+        assert hits[priority_rule_category(0)] == ["紧急"]
+        assert hits[preset_reply_category("question_model")] == ["型号"]
+        # 配置覆盖了默认的产品关键词
+        assert CATEGORY_PRODUCT not in index.match("iphone")
+
+    def test_filter_engine_uses_index(self):
+        with patch("src.collector.filter_engine.get_keyword_index", return_value=KeywordIndex(self.CONFIG)):
+            engine = FilterEngine(db=None)
+
+        assert engine.filter_message(None, "这是诈骗")["filter_reason"] == "包含屏蔽关键词: ['诈骗']"
+        assert engine.filter_message(None, "紧急情况")["priority"] == Priority.URGENT
+        assert engine.filter_message(None, "普通消息")["priority"] == Priority.LOW
+
+    def test_reloads_after_config_change(self, tmp_path):
+        config_path = tmp_path / "config.yaml"
+        config_path.write_text("keywords:\n  product: [\"alpha\"]\n", encoding="utf-8")
+        loader = KeywordIndexLoader(str(config_path))
+        first = loader.reload()
+        loader._mtime = os.stat(config_path).st_mtime
+
+        config_path.write_text("keywords:\n  product: [\"beta\"]\n", encoding="utf-8")
+        os.utime(config_path, (loader._mtime + 10, loader._mtime + 10))
+
+        with patch("src.utils.keyword_matcher.KEYWORD_INDEX_RELOAD_CHECK_SECONDS", 0):
+            second = loader.get()
+
+        assert second is not first
+        assert CATEGORY_PRODUCT in second.match("beta")
+        assert CATEGORY_PRODUCT not in second.match("alpha")
+        # 未修改时复用同一个索引
+        with patch("src.utils.keyword_matcher.KEYWORD_INDEX_RELOAD_CHECK_SECONDS", 0):
+            assert loader.get() is second
@@ -0,0 +1,107 @@
+"""延迟加载路由与启动耗时分析测试"""
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.api.lazy_routers import LazyRouter, LazyRouterLoader, LazyRouterMiddleware
+from src.utils.startup_profile import ImportProfiler
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+
+def _app_with(routers):
+    app = FastAPI()
+    loader = LazyRouterLoader(routers)
+    loader.bind(app)
+    app.add_middleware(LazyRouterMiddleware, loader=loader)
+
+    @app.get("/health/simple")
+    async def health():
+        return {"status": "ok"}
+
+    return app, loader
+
+
+class TestLazyRouterLoader:
+    """测试首次请求时注册路由"""
+
+    def test_prefix_matching(self):
+        router = LazyRouter("x", ("/admin",))
+        assert router.matches("/admin")
+        assert router.matches("/admin/conversations")
+        assert not router.matches("/administrator")
+
+    def test_router_registered_on_first_request(self):
+        app, loader = _app_with([LazyRouter("src.api.v1.admin.templates", ("/templates",))])
+        client = TestClient(app)
+
+        assert client.get("/health/simple").status_code == 200
+        assert not any(getattr(r, "path", "").startswith("/templates") for r in app.routes)
+
+        client.get("/templates/")
+        assert any(getattr(r, "path", "").startswith("/templates") for r in app.routes)
+        assert loader.pending == []
+        assert "src.api.v1.admin.templates" in loader.get_status()["loaded"]
+
+    def test_openapi_loads_all_routers(self):
+        app, loader = _app_with([
+            LazyRouter("src.api.v1.admin.templates", ("/templates",)),
+            LazyRouter("src.api.v1.monitoring.api_usage", ("/api-usage",)),
+        ])
+        paths = TestClient(app).get("/openapi.json").json()["paths"]
+        assert any(p.startswith("/templates") for p in paths)
+        assert any(p.startswith("/api-usage") for p in paths)
+
+    def test_import_error_recorded(self):
+        app, loader = _app_with([LazyRouter("src.api.v1.does_not_exist", ("/missing",))])
+        client = TestClient(app)
+
+        assert client.get("/missing/x").status_code == 404
+        assert "src.api.v1.does_not_exist" in loader.get_status()["errors"]
+        assert client.get("/health/simple").status_code == 200
+
+
+class TestColdStartImports:
+    """冷启动回归：导入主应用时不加载延迟路由和openai SDK"""
+
+    def test_main_import_skips_lazy_modules(self):
+        script = textwrap.dedent("""
+            import sys
+            import src.main
+            heavy = [m for m in ("openai", "src.api.v1.admin.api", "src.api.v1.admin.deployment",
+                                 "src.config.page_token_manager") if m in sys.modules]
+            print("loaded:" + ",".join(heavy))
+        """)
+        result = subprocess.run(
+            [sys.executable, "-c", script], cwd=PROJECT_ROOT,
+            capture_output=True, text=True, timeout=60)
+        assert result.returncode == 0, result.stderr[-2000:]
+        assert "loaded:\n" in result.stdout
+
+
+class TestImportProfiler:
+    """测试模块导入耗时记录"""
+
+    def test_records_nested_imports(self, tmp_path, monkeypatch):
+        (tmp_path / "profiled_parent.py").write_text("import profiled_child\nVALUE = 1\n")
+        (tmp_path / "profiled_child.py").write_text("import time\ntime.sleep(0.02)\n")
+        monkeypatch.syspath_prepend(str(tmp_path))
+
+        profiler = ImportProfiler()
+        profiler.install()
+        try:
+            import profiled_parent
+        finally:
+            profiler.uninstall()
+            sys.modules.pop("profiled_parent", None)
+            sys.modules.pop("profiled_child", None)
+
+        assert profiled_parent.VALUE == 1
+        assert profiler.cumulative["profiled_parent"] >= profiler.cumulative["profiled_child"] >= 0.02
+        assert profiler.self_time["profiled_parent"] < 0.02
+        assert profiler.top_modules(limit=1)[0]["module"] == "profiled_child"
+        assert profiler not in sys.meta_path
@@ -0,0 +1,114 @@
+"""后台调度器主节点选举测试"""
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.core.database.connection import Base
+from src.core.database.leader_election import AdvisoryLockBackend, LeaderElector, LeaseBackend
+from src.core.database.models import SchedulerLease
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """多个“进程”共享的SQLite文件数据库"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'leases.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def _elector(session_factory, holder_id, ttl_seconds=30):
+    return LeaderElector(
+        backend=LeaseBackend(session_factory, ttl_seconds=ttl_seconds),
+        on_elected=AsyncMock(),
+        on_demoted=AsyncMock(),
+        holder_id=holder_id,
+        interval_seconds=3600
+    )
+
+
+class TestLeaseElection:
+    """测试租约选举和故障转移"""
+
+    @pytest.mark.asyncio
+    async def test_single_leader_and_handover_on_stop(self, session_factory):
+        first = _elector(session_factory, "worker-1")
+        second = _elector(session_factory, "worker-2")
+
+        await first.start()
+        await second.start()
+
+        assert first.is_leader and not second.is_leader
+        first.on_elected.assert_awaited_once()
+        second.on_elected.assert_not_awaited()
+        # 续约不会重复启动调度器
+        assert await first.check()
+        first.on_elected.assert_awaited_once()
+
+        await first.stop()
+        first.on_demoted.assert_awaited_once()
+        assert await second.check()
+        second.on_elected.assert_awaited_once()
+        assert second.get_status()["is_leader"] is True
+        assert second.get_status()["backend"] == "lease"
+
+        await second.stop()
+
+    @pytest.mark.asyncio
+    async def test_expired_lease_taken_over(self, session_factory):
+        crashed = _elector(session_factory, "worker-1", ttl_seconds=-1)
+        assert await crashed.check()  # 之后不再续约（模拟进程崩溃）
+
+        survivor = _elector(session_factory, "worker-2")
+        assert await survivor.check()
+
+        # 原主节点恢复后发现租约已被接管，停止调度器
+        crashed.backend.ttl_seconds = 30
+        assert not await crashed.check()
+        crashed.on_demoted.assert_awaited_once()
+
+        db = session_factory()
+        assert db.get(SchedulerLease, "schedulers").holder_id == "worker-2"
+        db.close()
+
+    @pytest.mark.asyncio
+    async def test_backend_error_demotes(self):
+        backend = MagicMock()
+        backend.acquire.side_effect = [True, RuntimeError("database unavailable")]
+        elector = LeaderElector(backend=backend, on_demoted=AsyncMock(), holder_id="worker-1")
+
+        assert await elector.check()
+        assert not await elector.check()
+        elector.on_demoted.assert_awaited_once()
+        assert elector.get_status()["last_error"] == "database unavailable"
+
+
+class TestAdvisoryLockBackend:
+    """测试PostgreSQL advisory lock后端"""
+
+    def test_lock_held_on_dedicated_connection(self):
+        conn = MagicMock()
+        conn.execute.return_value.scalar.return_value = True
+        engine = MagicMock()
+        engine.connect.return_value = conn
+        backend = AdvisoryLockBackend(engine, lock_key=42)
+
+        assert backend.acquire("worker-1")
+        assert backend.acquire("worker-1")
+        engine.connect.assert_called_once()
+
+        # 连接断开即失去锁
+        conn.execute.side_effect = ConnectionError("server closed the connection")
+        assert not backend.acquire("worker-1")
+        conn.close.assert_called_once()
+
+    def test_lock_not_acquired_closes_connection(self):
+        conn = MagicMock()
+        conn.execute.return_value.scalar.return_value = False
+        engine = MagicMock()
+        engine.connect.return_value = conn
+
+        assert not AdvisoryLockBackend(engine).acquire("worker-2")
+        conn.close.assert_called_once()
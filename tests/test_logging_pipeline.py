@@ -0,0 +1,132 @@
+"""异步日志管道测试：脱敏、采样、队列写入、JSON格式和Webhook摘要"""
+import json
+import logging
+import queue
+
+import pytest
+
+from src.core.logging.config import (
+    NonBlockingQueueHandler,
+    RedactingQueueListener,
+    SamplingFilter,
+    SensitiveDataFilter,
+    StructuredFormatter,
+)
+from src.core.logging.events import WEBHOOK_EVENT_SAMPLE_KEY, telegram_update_fields, webhook_event_fields
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+
+
+def _record(msg, level=logging.INFO, created=None, **extra):
+    record = logging.LogRecord("test", level, __file__, 1, msg, None, None)
+    if created is not None:
+        record.created = created
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+class TestSensitiveDataFilter:
+    """测试预编译脱敏规则"""
+
+    @pytest.mark.parametrize("text, expected", [
+        ("access_token=EAAGabc123", "access_token=[REDACTED]"),
+        ("API key sk-abcdefghijklmnop", "API key [REDACTED]"),
+        ("Token: " + "a" * 40, "Token: [REDACTED]"),
+        ("no secrets here " + "a" * 40, "no secrets here [REDACTED]"),
+        ("plain message " + "a" * 40, "plain message " + "a" * 40),
+    ])
+    def test_sanitize(self, text, expected):
+        assert SensitiveDataFilter()._sanitize(text) == expected
+
+    def test_record_redacted_once(self):
+        record = _record("TOKEN EAAGabcdef")
+        redact = SensitiveDataFilter()
+        assert redact.filter(record) and redact.filter(record)
+        assert record.msg == "TOKEN [REDACTED]"
+
+
+class TestSamplingFilter:
+    """测试高频事件采样"""
+
+    def test_burst_then_every_nth(self):
+        sampler = SamplingFilter(window_seconds=60, burst=2, every=3)
+        kept = [sampler.filter(_record(f"event {i}", created=100.0, sample_key="hot")) for i in range(8)]
+
+        assert kept == [True, True, False, False, True, False, False, True]
+        assert sampler.sampled_out == 4
+
+    def test_suppressed_count_reported_and_window_resets(self):
+        sampler = SamplingFilter(window_seconds=10, burst=1, every=100)
+        sampler.filter(_record("a", created=0.0, sample_key="hot"))
+        assert not sampler.filter(_record("b", created=1.0, sample_key="hot"))
+
+        record = _record("c", created=11.0, sample_key="hot")
+        assert sampler.filter(record)
+        assert record.msg == "c [+1 similar events not logged]"
+
+    def test_unkeyed_and_warnings_not_sampled(self):
+        sampler = SamplingFilter(window_seconds=60, burst=0, every=100)
+        assert sampler.filter(_record("plain"))
+        assert sampler.filter(_record("boom", level=logging.WARNING, sample_key="hot"))
+
+
+class TestQueuePipeline:
+    """测试队列处理器和后台监听线程"""
+
+    def test_records_redacted_and_written_by_listener(self):
+        log_queue = queue.Queue()
+        target = _ListHandler()
+        target.setFormatter(logging.Formatter("%(message)s"))
+        listener = RedactingQueueListener(log_queue, target)
+        handler = NonBlockingQueueHandler(log_queue)
+
+        logger = logging.getLogger("test_logging_pipeline.queue")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.addHandler(handler)
+        listener.start()
+        try:
+            logger.info("refresh_token=EAAGsecretvalue")
+            logger.info("hello %s", "world")
+        finally:
+            listener.stop()
+            logger.removeHandler(handler)
+
+        assert target.messages == ["refresh_token=[REDACTED]", "hello world"]
+
+    def test_full_queue_drops_without_blocking(self):
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+        handler.handle(_record("first"))
+        handler.handle(_record("second"))
+        assert handler.dropped == 1
+
+
+class TestStructuredOutput:
+    """测试JSON日志和Webhook摘要"""
+
+    def test_json_includes_extra_fields_and_event_time(self):
+        record = _record("Received webhook event", created=0.0, extra_fields={"events": 2})
+        data = json.loads(StructuredFormatter().format(record))
+        assert data["events"] == 2
+        assert data["timestamp"].startswith("1970-01-01T00:00:00")
+
+    def test_webhook_summary_excludes_message_content(self):
+        body = {
+            "object": "page",
+            "entry": [{"id": "123", "messaging": [{"sender": {"id": "u1"}, "message": {"text": "my phone 555"}}]}],
+        }
+        fields = webhook_event_fields(body)
+        assert fields == {"object": "page", "entries": 1, "events": 1, "page_ids": ["123"]}
+        assert "555" not in json.dumps(fields)
+        assert WEBHOOK_EVENT_SAMPLE_KEY == "webhook_event"
+
+        update = telegram_update_fields({"update_id": 7, "message": {"chat": {"id": 42}, "text": "/stats"}})
+        assert update == {"update_id": 7, "type": "message", "chat_id": 42}
@@ -0,0 +1,199 @@
+"""指标子系统测试：固定桶直方图、Prometheus导出、跨进程合并和各处埋点"""
+import json
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.core.database.repositories.base import BaseRepository
+from src.monitoring.health import HealthChecker
+from src.monitoring.metrics import (
+    Histogram,
+    MetricsRegistry,
+    RequestMetricsMiddleware,
+    db_query_seconds,
+    http_request_seconds,
+)
+from src.processors.base import BaseProcessor, ProcessorResult, ProcessorStatus
+from src.processors.pipeline import MessagePipeline
+
+
+class TestHistogram:
+    """测试固定桶直方图"""
+
+    def test_observe_counts_buckets(self):
+        histogram = Histogram("latency", "test", ("stage",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 5.0):
+            histogram.observe(value, stage="a")
+
+        data = histogram.samples()[("a",)]
+        assert data["buckets"] == [2, 1, 1]
+        assert data["count"] == 4
+        assert data["sum"] == pytest.approx(5.65)
+
+    def test_quantile_interpolates_within_bucket(self):
+        histogram = Histogram("latency", "test", buckets=(10, 20, 30))
+        for _ in range(10):
+            histogram.observe(15)
+
+        counts = histogram.samples()[()]["buckets"]
+        assert histogram.quantile(0.5, counts) == pytest.approx(15.0)
+        assert histogram.quantile(0.95, counts) == pytest.approx(19.5)
+        assert histogram.quantile(0.5, [0, 0, 0, 0]) == 0.0
+
+    def test_render_prometheus_cumulative_buckets(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("stage_seconds", "Stage duration", ("processor",), buckets=(0.1, 1.0))
+        histogram.observe(0.05, processor='say "hi"')
+        histogram.observe(2.0, processor='say "hi"')
+        registry.counter("events_total", "Events").inc(3)
+
+        text = registry.render_prometheus()
+        assert "# TYPE stage_seconds histogram" in text
+        assert 'stage_seconds_bucket{processor="say \\"hi\\"",le="0.1"} 1' in text
+        assert 'stage_seconds_bucket{processor="say \\"hi\\"",le="1"} 1' in text
+        assert 'stage_seconds_bucket{processor="say \\"hi\\"",le="+Inf"} 2' in text
+        assert 'stage_seconds_count{processor="say \\"hi\\""} 2' in text
+        assert "events_total 3" in text
+
+    def test_gauge_callback_read_at_scrape(self):
+        registry = MetricsRegistry()
+        depth = {"value": 1}
+        registry.gauge("queue_depth", "Depth", ("queue",), callback=lambda: {("ingest",): depth["value"]})
+        depth["value"] = 7
+        assert registry.to_dict()["queue_depth"] == [{"queue": "ingest", "value": 7.0}]
+
+
+class TestSnapshotMerge:
+    """测试多工作进程快照合并"""
+
+    def test_merges_fresh_snapshots_and_skips_stale(self, tmp_path):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("send_seconds", "Send", ("page_id",), buckets=(0.1, 1.0))
+        histogram.observe(0.05, page_id="p1")
+
+        other = MetricsRegistry()
+        other.histogram("send_seconds", "Send", ("page_id",), buckets=(0.1, 1.0)).observe(0.5, page_id="p1")
+        fresh = dict(other.snapshot(), pid=-1)
+        stale = dict(other.snapshot(), pid=-2, time=time.time() - 3600)
+        (tmp_path / "metrics-1.json").write_text(json.dumps(fresh))
+        (tmp_path / "metrics-2.json").write_text(json.dumps(stale))
+
+        merged = registry.merged(MetricsRegistry.load_snapshots(tmp_path, max_age=60))
+        data = merged.get("send_seconds").samples()[("p1",)]
+        assert data["buckets"] == [1, 1, 0]
+        assert data["count"] == 2
+        # 原注册表不受合并影响
+        assert histogram.samples()[("p1",)]["count"] == 1
+
+    def test_shared_gauge_not_multiplied_by_workers(self):
+        def registry_with(backlog, local):
+            registry = MetricsRegistry()
+            registry.gauge("ingest_backlog", "Shared", merge="max", callback=lambda: {(): backlog})
+            registry.gauge("queue_depth", "Local", ("queue",), callback=lambda: {("log",): local})
+            return registry
+
+        # 三个工作进程读到同一张表的积压（刷新时间不同，取最大值），本地队列相加
+        others = [dict(registry_with(40, 2).snapshot(), pid=-1), dict(registry_with(42, 3).snapshot(), pid=-2)]
+        merged = registry_with(41, 1).merged(others).to_dict()
+
+        assert merged["ingest_backlog"] == [{"value": 42.0}]
+        assert merged["queue_depth"] == [{"queue": "log", "value": 6.0}]
+
+    def test_write_snapshot_excluded_from_own_load(self, tmp_path):
+        registry = MetricsRegistry()
+        registry.counter("events_total", "Events").inc()
+        path = registry.write_snapshot(tmp_path)
+
+        assert json.loads(path.read_text())["metrics"]["events_total"] == [[[], 1.0]]
+        assert MetricsRegistry.load_snapshots(tmp_path) == []
+
+
+class TestHealthChecker:
+    """测试请求指标（原接口保持不变）"""
+
+    def test_record_request_and_get_metrics(self):
+        checker = HealthChecker()
+        for _ in range(99):
+            checker.record_request(20)
+        checker.record_request(2000, is_error=True)
+
+        metrics = checker.get_metrics()
+        assert metrics["request_count"] == 100
+        assert metrics["error_count"] == 1
+        assert metrics["error_rate_percent"] == 1.0
+        assert metrics["avg_response_time_ms"] == pytest.approx(39.8)
+        assert 10 < metrics["p95_response_time_ms"] <= 25
+
+    def test_middleware_records_route_template(self):
+        app = FastAPI()
+        app.add_middleware(RequestMetricsMiddleware)
+
+        @app.get("/items/{item_id}")
+        async def item(item_id: int):
+            return {"id": item_id}
+
+        before = http_request_seconds.samples().get(("GET", "/items/{item_id}", "200"), {"count": 0})["count"]
+        client = TestClient(app)
+        client.get("/items/1")
+        client.get("/items/2")
+        client.get("/nowhere")
+
+        samples = http_request_seconds.samples()
+        assert samples[("GET", "/items/{item_id}", "200")]["count"] == before + 2
+        assert ("GET", "unmatched", "404") in samples
+
+
+class _FakeRepository(BaseRepository):
+    def __init__(self, db):
+        super().__init__(db, MagicMock(__name__="Fake"))
+
+    def find_twice(self):
+        # 嵌套调用只按最外层方法计时
+        self.count()
+        return self.count()
+
+
+class TestRepositoryTiming:
+    """测试Repository方法耗时记录"""
+
+    def test_public_methods_timed_once_per_outer_call(self):
+        db = MagicMock()
+        db.query.return_value.count.return_value = 3
+        repo = _FakeRepository(db)
+
+        assert repo.find_twice() == 3
+        repo.count()
+
+        samples = db_query_seconds.samples()
+        assert samples[("_FakeRepository", "find_twice")]["count"] == 1
+        assert samples[("_FakeRepository", "count")]["count"] == 1
+
+
+class _StatusProcessor(BaseProcessor):
+    def __init__(self, name, status):
+        super().__init__(name)
+        self.status = status
+
+    async def process(self, context):
+        return ProcessorResult(status=self.status)
+
+
+class TestPipelineMetrics:
+    """测试管道处理器耗时记录"""
+
+    @pytest.mark.asyncio
+    async def test_processor_stage_recorded(self):
+        from src.monitoring.metrics import pipeline_processor_seconds
+
+        def count(key):
+            return pipeline_processor_seconds.samples().get(key, {"count": 0})["count"]
+
+        before = count(("metrics_stage", "success"))
+        pipeline = MessagePipeline()
+        pipeline.add_processor(_StatusProcessor("metrics_stage", ProcessorStatus.SUCCESS))
+        await pipeline._execute_graph(MagicMock())
+
+        assert count(("metrics_stage", "success")) == before + 1
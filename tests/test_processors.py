@@ -1,4 +1,5 @@
 """处理器单元测试"""
+import asyncio
 import pytest
 from unittest.mock import Mock, AsyncMock, patch
 from src.processors.base import BaseProcessor, ProcessorContext, ProcessorResult, ProcessorStatus
@@ -140,7 +141,7 @@ class TestUserInfoHandler:
             mock_manager_instance = Mock()
             mock_customer = Mock()
             mock_customer.id = 1
-            mock_manager_instance.get_or_create_customer = Mock(return_value=mock_customer)
+            mock_manager_instance.get_or_create_customer = AsyncMock(return_value=mock_customer)
             mock_manager.return_value = mock_manager_instance
             
             result = await processor.process(mock_context)
@@ -235,3 +236,248 @@ class TestMessagePipeline:
             assert result is not None
             assert "success" in result or "error" in result
 
+
+
+class _RecordingProcessor(BaseProcessor):
+    """记录执行时间线的测试处理器"""
+    
+    def __init__(self, name, deps=(), delay=0.0, status=ProcessorStatus.SUCCESS, should_continue=True, log=None):
+        super().__init__(name)
+        self.deps = list(deps)
+        self.delay = delay
+        self.status = status
+        self.should_continue = should_continue
+        self.log = log if log is not None else []
+        self.dependency_calls = 0
+    
+    def get_dependencies(self) -> list:
+        self.dependency_calls += 1
+        return self.deps
+    
+    async def process(self, context):
+        self.log.append(("start", self.name))
+        await asyncio.sleep(self.delay)
+        self.log.append(("end", self.name))
+        return ProcessorResult(status=self.status, should_continue=self.should_continue)
+
+
+class TestPipelineGraph:
+    """测试按依赖图并发执行"""
+    
+    @pytest.mark.asyncio
+    async def test_independent_processors_run_concurrently(self, mock_context):
+        log = []
+        pipeline = MessagePipeline()
+        pipeline.add_processors([
+            _RecordingProcessor("root", log=log),
+            _RecordingProcessor("slow", ["root"], delay=0.05, log=log),
+            _RecordingProcessor("fast", ["root"], delay=0.01, log=log),
+            _RecordingProcessor("join", ["slow", "fast"], log=log),
+        ])
+        
+        results, timings = await pipeline._execute_graph(mock_context)
+        
+        # slow 和 fast 同时开始，join 等待两者完成
+        assert log.index(("start", "fast")) < log.index(("end", "slow"))
+        assert log[-2:] == [("start", "join"), ("end", "join")]
+        assert [r["processor"] for r in results] == ["root", "slow", "fast", "join"]
+        assert all("duration_ms" in r and "started_ms" in r for r in results)
+        assert timings["critical_path"] == ["root", "slow", "join"]
+        assert timings["total_ms"] < 100
+    
+    @pytest.mark.asyncio
+    async def test_skip_stops_only_dependents(self, mock_context):
+        log = []
+        pipeline = MessagePipeline()
+        pipeline.add_processors([
+            _RecordingProcessor("filter", status=ProcessorStatus.SKIP, should_continue=False, log=log),
+            _RecordingProcessor("side", delay=0.02, log=log),
+            _RecordingProcessor("reply", ["filter"], log=log),
+            _RecordingProcessor("after_reply", ["reply", "side"], log=log),
+            _RecordingProcessor("after_side", ["side"], log=log),
+        ])
+        
+        results, _ = await pipeline._execute_graph(mock_context)
+        
+        # 直接和间接依赖 filter 的处理器不执行，其他分支照常执行
+        assert [r["processor"] for r in results] == ["filter", "side", "after_side"]
+        assert ("start", "reply") not in log
+        assert ("start", "after_reply") not in log
+    
+    @pytest.mark.asyncio
+    async def test_graph_compiled_once(self, mock_context):
+        processors = [_RecordingProcessor("a"), _RecordingProcessor("b", ["a"])]
+        pipeline = MessagePipeline()
+        pipeline.add_processors(processors)
+        
+        await pipeline._execute_graph(mock_context)
+        await pipeline._execute_graph(mock_context)
+        
+        assert [p.dependency_calls for p in processors] == [1, 1]
+    
+    def test_cyclic_dependencies_run_last_in_order(self):
+        pipeline = MessagePipeline()
+        pipeline.add_processors([
+            _RecordingProcessor("x", ["y"]),
+            _RecordingProcessor("ok"),
+            _RecordingProcessor("y", ["x"]),
+            _RecordingProcessor("missing_dep", ["nope"]),
+        ])
+        
+        assert [p.name for p in pipeline.compile()] == ["ok", "x", "y", "missing_dep"]
+    
+    def test_default_pipeline_order(self):
+        from src.processors.pipeline import create_default_pipeline
+        
+        order = [p.name for p in create_default_pipeline()._resolve_dependencies()]
+        
+        # 使用同步会话的处理器串行执行，AI回复之后的处理器可并发
+        assert order[:4] == ["message_receiver", "user_info_handler", "filter_handler", "ai_reply_handler"]
+        assert set(order[4:]) == {"data_collection_handler", "statistics_handler", "notification_handler"}
+
+
+def _scripted_default_pipeline(log, outcomes):
+    """默认管道（真实依赖关系），处理器按 outcomes 返回 (延迟, 状态)"""
+    from src.processors.pipeline import create_default_pipeline
+    
+    pipeline = create_default_pipeline()
+    for processor in pipeline.processors:
+        delay, status = outcomes.get(processor.name, (0.0, ProcessorStatus.SUCCESS))
+        
+        async def process(context, name=processor.name, delay=delay, status=status):
+            log.append(name)
+            await asyncio.sleep(delay)
+            return ProcessorResult(status=status)
+        
+        processor.process = process
+    return pipeline
+
+
+class TestDefaultPipelineSkips:
+    """测试默认管道的跳过语义与原串行执行一致"""
+    
+    @pytest.mark.asyncio
+    async def test_notification_skip_does_not_drop_statistics(self, mock_context):
+        # 消息被过滤但包含产品关键词：不需要审核，通知立即跳过，AI回复仍在进行
+        log = []
+        pipeline = _scripted_default_pipeline(log, {
+            "ai_reply_handler": (0.02, ProcessorStatus.SUCCESS),
+            "notification_handler": (0.0, ProcessorStatus.SKIP),
+        })
+        
+        results, _ = await pipeline._execute_graph(mock_context)
+        
+        assert "statistics_handler" in log
+        assert {r["processor"] for r in results} == {
+            "message_receiver", "user_info_handler", "filter_handler", "ai_reply_handler",
+            "data_collection_handler", "statistics_handler", "notification_handler",
+        }
+    
+    @pytest.mark.asyncio
+    async def test_ai_reply_skip_suppresses_notification(self, mock_context):
+        # 页面关闭自动回复或垃圾消息：AI回复跳过后不发送审核通知，也不记录统计
+        log = []
+        pipeline = _scripted_default_pipeline(log, {
+            "ai_reply_handler": (0.02, ProcessorStatus.SKIP),
+        })
+        
+        results, _ = await pipeline._execute_graph(mock_context)
+        
+        assert log == ["message_receiver", "user_info_handler", "filter_handler", "ai_reply_handler"]
+        assert [r["processor"] for r in results] == log
+
+
+class _RateLimitedProcessor(BaseProcessor):
+    """发送时限流等待超时的测试处理器"""
+    
+    async def process(self, context):
+        from src.core.exceptions import RateLimitExceededError
+        raise RateLimitExceededError("Rate limit wait exceeded", retry_after=5)
+
+
+class TestRateLimitRetry:
+    """测试限流超时的消息交给入站队列重投"""
+    
+    @pytest.mark.asyncio
+    async def test_pipeline_returns_failure_on_rate_limit(self):
+        log = []
+        pipeline = MessagePipeline()
+        pipeline.add_processors([
+            _RateLimitedProcessor("ai_reply_handler"),
+            _RecordingProcessor("side", delay=0.05, log=log),
+        ])
+        platform_client = Mock(close=AsyncMock())
+        
+        with patch('src.processors.pipeline.registry') as mock_registry:
+            mock_registry.create_client = Mock(return_value=platform_client)
+            result = await pipeline.process("facebook", {"sender_id": "123", "content": "hi"})
+        
+        # success=False 时入站队列会nack并按退避重投
+        assert result["success"] is False
+        assert "Rate limit" in result["error"]
+        assert ("end", "side") not in log
+        platform_client.close.assert_awaited_once()
+    
+    @pytest.mark.asyncio
+    async def test_ai_reply_handler_propagates_rate_limit(self, mock_context):
+        from src.core.exceptions import RateLimitExceededError
+        from src.processors.handlers import AIReplyHandler
+        
+        service = Mock(execute=AsyncMock(side_effect=RateLimitExceededError("Rate limit wait exceeded")))
+        with patch('src.business.registry.business_registry') as mock_business_registry:
+            mock_business_registry.get = Mock(return_value=service)
+            with pytest.raises(RateLimitExceededError):
+                await AIReplyHandler().process(mock_context)
+
+    
+    @pytest.mark.asyncio
+    async def test_auto_reply_service_defers_side_effects_on_rate_limit(self):
+        from src.business.services.auto_reply_service import AutoReplyService
+        from src.core.exceptions import RateLimitExceededError
+        
+        platform_client = Mock(send_message=AsyncMock(side_effect=RateLimitExceededError("Rate limit wait exceeded")))
+        service_context = {
+            "db": Mock(),
+            "customer_id": 1,
+            "customer": None,
+            "message_data": {"sender_id": "123", "page_id": "p1", "content": "价格多少？"},
+            "platform_client": platform_client,
+            "message_summary": "价格多少？",
+            "platform_name": "facebook",
+        }
+        
+        with patch('src.business.services.auto_reply_service.page_settings') as mock_page_settings, \
+             patch('src.business.services.auto_reply_service.ReplyGenerator') as mock_generator, \
+             patch('src.business.services.auto_reply_service.StatisticsTracker') as mock_tracker, \
+             patch.object(AutoReplyService, '_send_error_notification', new=AsyncMock()) as mock_alert:
+            mock_page_settings.is_auto_reply_enabled = Mock(return_value=True)
+            mock_generator.return_value.generate_reply = AsyncMock(return_value="您好，价格是100元")
+            with pytest.raises(RateLimitExceededError):
+                await AutoReplyService().execute(service_context)
+        
+        # 消息会被重投，高频问题和失败告警都留到最终发送时处理
+        mock_tracker.return_value.record_frequent_question.assert_not_called()
+        mock_alert.assert_not_awaited()
+
+class TestStatisticsHandler:
+    """测试统计处理器的返回数据"""
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("buffered", [False, True])
+    async def test_interaction_id_only_when_persisted(self, mock_context, buffered):
+        from src.processors.handlers import StatisticsHandler
+        
+        mock_context.customer_id = 1
+        mock_context.message_summary = "测试消息内容"
+        buffer = Mock(has_pending=Mock(return_value=False)) if buffered else None
+        
+        with patch('src.core.database.write_buffer.get_telemetry_buffer', return_value=buffer):
+            result = await StatisticsHandler().process(mock_context)
+        
+        assert result.status == ProcessorStatus.SUCCESS
+        if buffered:
+            # 缓冲中的记录没有id，不返回恒为None的 interaction_id
+            assert result.data == {"buffered": True}
+            buffer.add.assert_called_once()
+        else:
+            assert isinstance(result.data["interaction_id"], int)
@@ -0,0 +1,150 @@
+"""限流器测试"""
+import math
+import pytest
+from src.core.exceptions import RateLimitExceededError
+from src.utils.rate_limiter import (
+    AsyncRateLimiter,
+    InMemoryRateLimitBackend,
+    RateLimiter,
+    RedisRateLimitBackend,
+)
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    """模拟Redis的EVAL语义（按Lua脚本逻辑执行，使用服务器时钟）"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.store = {}
+
+    async def eval(self, script, numkeys, key, emission_interval, burst_window, cost):
+        assert numkeys == 1
+        emission_interval = float(emission_interval)
+        burst_window = float(burst_window)
+        now = self.clock()
+        tat = float(self.store[key]) if key in self.store else now
+        tat = max(tat, now)
+        new_tat = tat + emission_interval * int(cost)
+        allow_at = new_tat - burst_window
+        if now < allow_at:
+            remaining = math.floor((burst_window - (tat - now)) / emission_interval + 1e-9)
+            return [0, str(allow_at - now), remaining]
+        self.store[key] = str(new_tat)
+        remaining = math.floor((burst_window - (new_tat - now)) / emission_interval + 1e-9)
+        return [1, "0", remaining]
+
+    async def delete(self, key):
+        self.store.pop(key, None)
+
+
+class BrokenBackend:
+    async def consume(self, *args, **kwargs):
+        raise ConnectionError("redis down")
+
+    async def reset(self, key=None):
+        raise ConnectionError("redis down")
+
+
+class TestRateLimiter:
+    """测试同步限流器（中间件使用）"""
+
+    def test_burst_then_refill(self):
+        clock = FakeClock()
+        limiter = RateLimiter(clock=clock)
+
+        assert all(limiter.is_allowed("ip:1", default_max=3, default_window=60) for _ in range(3))
+        assert limiter.is_allowed("ip:1", default_max=3, default_window=60) is False
+        assert limiter.get_remaining("ip:1", default_max=3, default_window=60) == 0
+
+        # 每20秒补充一个令牌
+        clock.now += 20
+        assert limiter.get_remaining("ip:1", default_max=3, default_window=60) == 1
+        assert limiter.is_allowed("ip:1", default_max=3, default_window=60) is True
+        assert limiter.is_allowed("ip:1", default_max=3, default_window=60) is False
+
+    def test_set_limit_and_reset(self):
+        limiter = RateLimiter(clock=FakeClock())
+        limiter.set_limit("key", max_requests=1, time_window_seconds=60)
+
+        assert limiter.is_allowed("key") is True
+        assert limiter.is_allowed("key") is False
+        assert limiter.is_allowed("other") is True
+
+        limiter.reset("key")
+        assert limiter.get_remaining("key") == 1
+
+
+class TestAsyncRateLimiter:
+    """测试异步限流器"""
+
+    @pytest.mark.asyncio
+    async def test_acquire_waits_for_capacity(self):
+        limiter = AsyncRateLimiter(backend=InMemoryRateLimitBackend())
+        limiter.set_limit("messages", max_requests=2, time_window_seconds=0.2)
+
+        assert await limiter.acquire("messages", "page_1") == 0
+        assert await limiter.acquire("messages", "page_1") == 0
+        waited = await limiter.acquire("messages", "page_1")
+
+        assert waited >= 0.08
+
+    @pytest.mark.asyncio
+    async def test_pages_have_separate_budgets(self):
+        limiter = AsyncRateLimiter(backend=InMemoryRateLimitBackend(clock=FakeClock()))
+        limiter.set_limit("messages", max_requests=1, time_window_seconds=60)
+
+        assert (await limiter.try_acquire("messages", "page_1")).allowed is True
+        assert (await limiter.try_acquire("messages", "page_1")).allowed is False
+        assert (await limiter.try_acquire("messages", "page_2")).allowed is True
+
+    @pytest.mark.asyncio
+    async def test_acquire_timeout_raises(self):
+        limiter = AsyncRateLimiter(backend=InMemoryRateLimitBackend(clock=FakeClock()))
+        limiter.set_limit("messages", max_requests=1, time_window_seconds=3600)
+        await limiter.acquire("messages", "page_1")
+
+        with pytest.raises(RateLimitExceededError) as exc_info:
+            await limiter.acquire("messages", "page_1", timeout=1)
+
+        assert exc_info.value.error_code == "RATE_LIMITED"
+        assert exc_info.value.details["retry_after"] == 3600
+
+    @pytest.mark.asyncio
+    async def test_redis_backend_shares_budget_across_workers(self):
+        """测试两个工作进程通过同一个Redis共享配额"""
+        clock = FakeClock()
+        redis = FakeRedis(clock)
+        workers = [AsyncRateLimiter(backend=RedisRateLimitBackend(redis)) for _ in range(2)]
+        for limiter in workers:
+            limiter.set_limit("messages", max_requests=3, time_window_seconds=60)
+
+        results = [await workers[i % 2].try_acquire("messages", "page_1") for i in range(4)]
+
+        assert [r.allowed for r in results] == [True, True, True, False]
+        assert results[2].remaining == 0
+        assert results[3].retry_after == pytest.approx(20)
+        assert list(redis.store) == ["ratelimit:messages:page_1"]
+
+        clock.now += 20
+        assert (await workers[1].try_acquire("messages", "page_1")).allowed is True
+
+        await workers[0].reset("messages", "page_1")
+        assert redis.store == {}
+
+    @pytest.mark.asyncio
+    async def test_backend_error_falls_back_to_memory(self):
+        limiter = AsyncRateLimiter(backend=BrokenBackend())
+        limiter.set_limit("messages", max_requests=1, time_window_seconds=60)
+
+        assert (await limiter.try_acquire("messages", "page_1")).allowed is True
+        assert (await limiter.try_acquire("messages", "page_1")).allowed is False
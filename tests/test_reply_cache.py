@@ -0,0 +1,151 @@
+"""AI回复缓存测试"""
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.ai.reply_cache import ReplyCache
+from src.ai.reply_generator import ReplyGenerator
+from src.core.cache import CacheManager
+from src.core.database.connection import Base
+from src.core.database.models import APIUsageLog, Platform
+from src.core.database.repositories import CustomerRepository
+from src.monitoring.api_usage_tracker import REPLY_CACHE_ENDPOINT, APIUsageTracker
+
+
+@pytest.fixture
+def db_session():
+    """创建测试数据库会话"""
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine)
+    session = SessionLocal()
+
+    yield session
+
+    session.close()
+    Base.metadata.drop_all(engine)
+
+
+def _cache(**kwargs) -> ReplyCache:
+    return ReplyCache(memory=CacheManager(name="reply_test"), **kwargs)
+
+
+class TestReplyCache:
+    """测试缓存键、持久化和页面开关"""
+
+    def test_key_uses_normalized_message_and_history(self):
+        cache = _cache()
+        history = [{"role": "user", "content": "你好"}, {"role": "assistant", "content": "您好"}]
+
+        key = cache.make_key("v1", "How much?", history)
+
+        assert cache.make_key("v1", "how  much", history) == key
+        assert cache.make_key("v2", "How much?", history) != key
+        assert cache.make_key("v1", "How much?", []) != key
+        assert cache.make_key("v1", "legit?", history) != key
+
+    def test_hit_and_miss_counters(self):
+        cache = _cache()
+        key = cache.make_key("v1", "price?", [])
+
+        assert cache.get(key) is None
+        cache.set(key, "价格请私信咨询", tokens_used=40)
+        cached = cache.get(key)
+
+        assert cached.reply == "价格请私信咨询"
+        stats = cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+        assert stats["saved_tokens"] == 40
+
+    def test_persisted_entries_survive_restart(self, tmp_path):
+        path = str(tmp_path / "reply_cache.sqlite3")
+        first = _cache(path=path)
+        key = first.make_key("v1", "legit?", [])
+        first.set(key, "我们是正规平台", tokens_used=25)
+
+        restarted = _cache(path=path)
+        cached = restarted.get(key)
+
+        assert cached.reply == "我们是正规平台"
+        assert cached.tokens_used == 25
+        assert restarted.get_stats()["persisted_hits"] == 1
+        # 回填到内存层后不再查询持久化文件
+        restarted.get(key)
+        assert restarted.get_stats()["persisted_hits"] == 1
+
+    def test_expired_persisted_entries_are_ignored(self, tmp_path):
+        path = str(tmp_path / "reply_cache.sqlite3")
+        cache = _cache(path=path, ttl_seconds=-1)
+        key = cache.make_key("v1", "price?", [])
+        cache.set(key, "过期的回复")
+
+        assert _cache(path=path).get(key) is None
+
+    def test_page_opt_out(self):
+        cache = _cache()
+        page_configs = {"page_off": {"reply_cache_enabled": False}}
+
+        with patch("src.config.page_settings.page_settings.get_page_config",
+                   side_effect=lambda page_id: page_configs.get(page_id, {})):
+            assert cache.is_enabled("page_on") is True
+            assert cache.is_enabled("page_off") is False
+
+        with patch("src.ai.reply_cache.settings.reply_cache_enabled", False):
+            assert cache.is_enabled("page_on") is False
+
+
+class TestReplyGeneratorCache:
+    """测试回复生成器使用缓存并记录命中"""
+
+    @pytest.mark.asyncio
+    async def test_repeated_first_message_served_from_cache(self, db_session):
+        customer_repo = CustomerRepository(db_session)
+        first = customer_repo.create(platform=Platform.FACEBOOK, platform_user_id="c1", name="甲")
+        second = customer_repo.create(platform=Platform.FACEBOOK, platform_user_id="c2", name="乙")
+
+        generator = ReplyGenerator(db_session)
+        generator.reply_cache = _cache()
+        generator._ensure_telegram_link_in_reply = lambda reply, customer_id: reply
+
+        with patch.object(generator.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
+            mock_response = Mock()
+            mock_response.choices = [Mock(message=Mock(content="利息很低，欢迎咨询"))]
+            mock_response.usage = Mock(total_tokens=42)
+            mock_create.return_value = mock_response
+
+            first_reply = await generator.generate_reply(customer_id=first.id, message_content="How much?")
+            second_reply = await generator.generate_reply(customer_id=second.id, message_content="how much")
+
+        assert first_reply == second_reply == "利息很低，欢迎咨询"
+        mock_create.assert_called_once()
+
+        hit_log = db_session.query(APIUsageLog).filter(APIUsageLog.endpoint == REPLY_CACHE_ENDPOINT).one()
+        assert hit_log.extra_metadata["saved_tokens"] == 42
+        stats = APIUsageTracker(db_session).get_reply_cache_statistics()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+        assert stats["saved_tokens"] == 42
+
+    @pytest.mark.asyncio
+    async def test_page_opt_out_always_calls_openai(self, db_session):
+        customer = CustomerRepository(db_session).create(platform=Platform.FACEBOOK, platform_user_id="c1")
+        generator = ReplyGenerator(db_session)
+        generator.reply_cache = _cache()
+        generator._ensure_telegram_link_in_reply = lambda reply, customer_id: reply
+
+        with patch.object(generator.reply_cache, "is_enabled", return_value=False), \
+                patch.object(generator.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
+            mock_response = Mock()
+            mock_response.choices = [Mock(message=Mock(content="您好"))]
+            mock_create.return_value = mock_response
+
+            for _ in range(2):
+                await generator.generate_reply(customer_id=customer.id, message_content="price?", page_id="p1")
+
+        assert mock_create.call_count == 2
+        assert generator.reply_cache.get_stats()["hits"] == 0
@@ -1,5 +1,6 @@
 """Repository层单元测试"""
 import pytest
+from unittest.mock import patch
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from src.core.database.connection import Base
@@ -305,3 +306,161 @@ def test_collected_data_repo_create(collected_data_repo, conversation_repo, cust
     assert collected_data.data["email"] == "test@example.com"
     assert collected_data.data["phone"] == "1234567890"
 
+
+
+def test_get_or_create_conversation_dedupes_platform_message(conversation_repo, customer_repo):
+    """测试同一平台消息重复保存时复用已有记录（唯一索引兜底并发插入）"""
+    customer = customer_repo.create(platform=Platform.FACEBOOK, platform_user_id="dedupe")
+    kwargs = dict(
+        customer_id=customer.id,
+        platform=Platform.FACEBOOK,
+        platform_message_id="dup_msg",
+        message_type=MessageType.MESSAGE,
+        content="重复消息"
+    )
+
+    first, created = conversation_repo.get_or_create_conversation(**kwargs)
+    again, created_again = conversation_repo.get_or_create_conversation(**kwargs)
+    assert created is True and created_again is False
+    assert again.id == first.id
+
+    # 查询未命中（如并发的另一方刚提交）时，插入冲突后读取已有记录
+    with patch.object(conversation_repo, "get_by_platform_message_id", side_effect=[None, first]):
+        raced, raced_created = conversation_repo.get_or_create_conversation(**kwargs)
+    assert raced.id == first.id and raced_created is False
+    assert conversation_repo.count() == 1
+
+
+def _create_conversations(conversation_repo, customer_repo, count, same_time=False):
+    """创建测试对话：received_at 每条递增一分钟（same_time 时全部相同，测试并列排序）"""
+    from datetime import timedelta
+    customer = customer_repo.create(platform=Platform.FACEBOOK, platform_user_id="pager", name="分页用户")
+    base = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    ids = []
+    for i in range(count):
+        received_at = base if same_time else base + timedelta(minutes=i)
+        conversation = conversation_repo.create_conversation(
+            customer_id=customer.id,
+            platform=Platform.FACEBOOK,
+            platform_message_id=f"page_msg_{i}",
+            message_type=MessageType.MESSAGE,
+            content=f"消息{i}",
+            received_at=received_at,
+            ai_replied=i % 2 == 0,
+            ai_reply_content=f"回复{i}" if i % 2 == 0 else None,
+            ai_reply_at=received_at if i % 2 == 0 else None
+        )
+        ids.append(conversation.id)
+    return ids
+
+
+@pytest.mark.parametrize("same_time", [False, True])
+def test_conversation_repository_keyset_pagination(conversation_repo, customer_repo, same_time):
+    """测试键集分页按 (received_at, id) 倒序遍历全部数据且不重复"""
+    ids = _create_conversations(conversation_repo, customer_repo, 7, same_time=same_time)
+
+    seen = []
+    cursor = None
+    while True:
+        page = conversation_repo.list_page(limit=3, cursor=cursor)
+        seen.extend(conv.id for conv in page.items)
+        if not page.has_more:
+            assert page.next_cursor is None
+            break
+        cursor = page.next_cursor
+
+    assert seen == list(reversed(ids))
+    assert page.total is None  # 默认不统计总数
+
+
+def test_conversation_repository_offset_page_hands_out_cursor(conversation_repo, customer_repo):
+    """测试兼容的偏移量分页不做count，并返回可继续翻页的游标"""
+    ids = _create_conversations(conversation_repo, customer_repo, 7)
+
+    page = conversation_repo.list_page(limit=2, offset=2, with_total=True)
+    assert [conv.id for conv in page.items] == [ids[4], ids[3]]
+    assert page.total == 7
+    assert page.total_is_estimate is False  # SQLite 没有规划器估计，退回精确count
+
+    next_page = conversation_repo.list_page(limit=2, cursor=page.next_cursor)
+    assert [conv.id for conv in next_page.items] == [ids[2], ids[1]]
+
+
+def test_offset_and_keyset_pages_exclude_null_sort_values(conversation_repo, customer_repo):
+    """测试排序列为NULL的行在两种分页方式下处理一致（都不返回），总数也不计入"""
+    ids = _create_conversations(conversation_repo, customer_repo, 4)
+    replied = [ids[2], ids[0]]
+    # AI已回复但缺少回复时间的旧数据
+    conversation_repo.update(ids[1], ai_replied=True, ai_reply_content="回复1")
+
+    keyset = conversation_repo.list_ai_replied_page(limit=10, with_total=True)
+    offset = conversation_repo.list_ai_replied_page(limit=1, offset=1, with_total=True)
+
+    assert [conv.id for conv in keyset.items] == replied
+    assert [conv.id for conv in offset.items] == replied[1:]
+    assert keyset.total == offset.total == 2
+
+
+def test_ai_replied_keyset_pagination_and_invalid_cursor(conversation_repo, customer_repo):
+    """测试AI回复列表按 (ai_reply_at, id) 分页，无效游标抛出ValidationError"""
+    from src.core.exceptions import ValidationError
+
+    ids = _create_conversations(conversation_repo, customer_repo, 7)
+    replied = [ids[i] for i in (6, 4, 2, 0)]
+
+    first = conversation_repo.list_ai_replied_page(limit=3)
+    second = conversation_repo.list_ai_replied_page(limit=3, cursor=first.next_cursor)
+    assert [conv.id for conv in first.items + second.items] == replied
+    assert first.items[0].customer_name == "分页用户"
+    assert second.has_more is False
+
+    with pytest.raises(ValidationError):
+        conversation_repo.list_ai_replied_page(limit=3, cursor="not-a-cursor")
+
+
+def test_customer_repository_keyset_pagination(customer_repo):
+    """测试客户列表键集分页"""
+    from datetime import timedelta
+    base = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    ids = [
+        customer_repo.create(
+            platform=Platform.FACEBOOK,
+            platform_user_id=f"customer_{i}",
+            created_at=base + timedelta(minutes=i)
+        ).id
+        for i in range(5)
+    ]
+
+    first = customer_repo.list_page(limit=3)
+    second = customer_repo.list_page(limit=3, cursor=first.next_cursor)
+    assert [c.id for c in first.items + second.items] == list(reversed(ids))
+
+
+def test_ai_replied_page_is_a_column_projection(db_session, conversation_repo, customer_repo):
+    """测试AI回复列表只查询需要的列：返回只读行对象，不加载ORM实例，用户消息在数据库端截断"""
+    from src.core.database.read_models import AIReplyListItem
+
+    customer = customer_repo.create(platform=Platform.FACEBOOK, platform_user_id="proj", name="投影用户")
+    conversation_repo.create_conversation(
+        customer_id=customer.id,
+        platform=Platform.FACEBOOK,
+        platform_message_id="proj_msg",
+        message_type=MessageType.MESSAGE,
+        content="长" * 500,
+        raw_data={"blob": "x" * 1000},
+        ai_replied=True,
+        ai_reply_content="回复",
+        ai_reply_at=datetime(2026, 1, 1, tzinfo=timezone.utc)
+    )
+    db_session.expunge_all()
+
+    page = conversation_repo.list_ai_replied_page(limit=10)
+
+    item = page.items[0]
+    assert isinstance(item, AIReplyListItem)
+    assert len(item.user_message) == 200
+    assert not any(isinstance(obj, Conversation) for obj in db_session.identity_map.values())
+    data = item.to_dict()
+    assert data["customer_name"] == "投影用户"
+    assert data["platform"] == "facebook"
+    assert data["ai_reply_at"].endswith("+00:00")
@@ -1,4 +1,5 @@
 """调度器测试"""
+import asyncio
 import pytest
 from unittest.mock import Mock, patch, AsyncMock
 from sqlalchemy import create_engine
@@ -106,6 +107,40 @@ class TestAutoReplyScheduler:
         await scheduler.stop()
         assert scheduler.running is False
 
+    @pytest.mark.asyncio
+    async def test_pages_scanned_concurrently_with_stats(self):
+        """测试页面并发扫描（有上限），并记录每个页面的扫描耗时和积压"""
+        from src.core.config.constants import AUTO_REPLY_PAGE_CONCURRENCY
+
+        scheduler = AutoReplyScheduler()
+        pages = {f"page_{i}": f"token_{i}" for i in range(AUTO_REPLY_PAGE_CONCURRENCY + 2)}
+        in_flight = 0
+        peak = 0
+
+        async def fake_scan(db, page_id, page_token):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            if page_id == "page_0":
+                raise RuntimeError("boom")
+            return {"unreplied_count": 3, "replied_count": 1, "error_count": 0}
+
+        with patch.object(scheduler, '_get_enabled_pages', AsyncMock(return_value=pages)), \
+             patch.object(scheduler, '_scan_and_reply_page', side_effect=fake_scan), \
+             patch('src.auto_reply.auto_reply_scheduler.SessionLocal'):
+            await scheduler._check_and_reply_unanswered_messages()
+
+        assert peak == AUTO_REPLY_PAGE_CONCURRENCY
+        stats = scheduler.get_scan_stats()
+        assert stats["last_scan"]["pages_scanned"] == len(pages) - 1
+        assert stats["last_scan"]["unreplied_count"] == 3 * (len(pages) - 1)
+        assert stats["last_scan"]["error_count"] == 1
+        assert stats["pages"]["page_1"]["backlog"] == 2
+        assert stats["pages"]["page_1"]["scan_duration_ms"] >= 10
+        assert stats["pages"]["page_0"]["error_count"] == 1
+
 
 class TestSummaryScheduler:
     """测试统计汇总调度器"""
@@ -0,0 +1,139 @@
+"""语义回复缓存测试"""
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+pytest.importorskip("numpy")
+
+from src.ai.reply_cache import ReplyCache
+from src.ai.reply_generator import ReplyGenerator
+from src.ai.semantic_cache import HashedNgramVectorizer, SemanticIndex, SemanticReplyCache
+from src.core.cache import CacheManager
+from src.core.database.connection import Base
+from src.core.database.models import APIUsageLog, Platform
+from src.core.database.repositories import CustomerRepository
+
+
+@pytest.fixture
+def db_session():
+    """创建测试数据库会话"""
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine)
+    session = SessionLocal()
+
+    yield session
+
+    session.close()
+    Base.metadata.drop_all(engine)
+
+
+class TestHashedNgramVectorizer:
+    """测试本地向量化"""
+
+    def test_paraphrases_closer_than_unrelated(self):
+        vectorizer = HashedNgramVectorizer(dimensions=512)
+        base = vectorizer.transform("How much is the interest?")
+
+        paraphrase = float(base @ vectorizer.transform("how much interest"))
+        unrelated = float(base @ vectorizer.transform("我想换个手机壳"))
+
+        assert paraphrase > 0.6
+        assert paraphrase > unrelated
+        assert float(base @ base) == pytest.approx(1.0, abs=1e-5)
+        assert not vectorizer.transform("？？？").any()
+
+
+class TestSemanticIndex:
+    """测试扁平索引的持久化和扩容"""
+
+    def test_persists_and_grows(self, tmp_path):
+        vectorizer = HashedNgramVectorizer(dimensions=64)
+        directory = str(tmp_path / "index")
+        with patch("src.ai.semantic_cache._INITIAL_CAPACITY", 2):
+            index = SemanticIndex(directory, dimensions=64)
+            for i, text in enumerate(["价格多少", "利息多少", "怎么申请", "需要什么资料"]):
+                index.add(vectorizer.transform(text), "p1|v1", {"reply": f"回复{i}"})
+
+        reloaded = SemanticIndex(directory, dimensions=64)
+        entry, similarity = reloaded.search(vectorizer.transform("怎么申请"), "p1|v1")
+
+        assert len(reloaded) == 4
+        assert entry["reply"] == "回复2"
+        assert similarity == pytest.approx(1.0, abs=1e-5)
+        assert reloaded.search(vectorizer.transform("怎么申请"), "p2|v1") is None
+
+    def test_ignores_partially_written_entry(self, tmp_path):
+        vectorizer = HashedNgramVectorizer(dimensions=64)
+        directory = str(tmp_path / "index")
+        index = SemanticIndex(directory, dimensions=64)
+        index.add(vectorizer.transform("价格多少"), "g", {"reply": "a"})
+        with open(tmp_path / "index" / "entries.jsonl", "a", encoding="utf-8") as f:
+            f.write('{"reply": "b", "gro')
+
+        reloaded = SemanticIndex(directory, dimensions=64)
+        reloaded.add(vectorizer.transform("怎么申请"), "g", {"reply": "c"})
+
+        assert [entry["reply"] for entry in SemanticIndex(directory, dimensions=64)._entries] == ["a", "c"]
+
+
+class TestSemanticReplyCache:
+    """测试阈值、分组和去重"""
+
+    def test_threshold_group_and_duplicates(self):
+        cache = SemanticReplyCache(dimensions=512)
+
+        assert cache.add("How much is the interest?", "利息很低", "v1", page_id="p1", tokens_used=30)
+        assert not cache.add("how much is the interest", "另一个回复", "v1", page_id="p1")
+
+        with patch("src.ai.semantic_cache.settings.semantic_cache_threshold", 0.6):
+            match = cache.lookup("how much interest?", "v1", page_id="p1")
+            assert match.reply == "利息很低"
+            assert match.tokens_used == 30
+            # 不同提示词版本或页面不共享回复
+            assert cache.lookup("how much interest?", "v2", page_id="p1") is None
+            assert cache.lookup("how much interest?", "v1", page_id="p2") is None
+
+        page_configs = {"p1": {"semantic_cache_threshold": 0.99}}
+        with patch("src.config.page_settings.page_settings.get_page_config",
+                   side_effect=lambda page_id: page_configs.get(page_id, {})):
+            assert cache.threshold("p1") == 0.99
+            assert cache.lookup("how much interest?", "v1", page_id="p1") is None
+
+        assert cache.get_stats()["hits"] == 1
+
+
+class TestReplyGeneratorSemanticCache:
+    """测试回复生成器对首次咨询使用语义缓存"""
+
+    @pytest.mark.asyncio
+    async def test_paraphrased_first_message_reuses_reply(self, db_session):
+        customer_repo = CustomerRepository(db_session)
+        first = customer_repo.create(platform=Platform.FACEBOOK, platform_user_id="c1")
+        second = customer_repo.create(platform=Platform.FACEBOOK, platform_user_id="c2")
+
+        generator = ReplyGenerator(db_session)
+        generator.reply_cache = ReplyCache(memory=CacheManager(name="reply_test"))
+        generator.semantic_cache = SemanticReplyCache(dimensions=512)
+        generator._ensure_telegram_link_in_reply = lambda reply, customer_id: reply
+
+        with patch("src.ai.semantic_cache.settings.semantic_cache_enabled", True), \
+                patch("src.ai.semantic_cache.settings.semantic_cache_threshold", 0.6), \
+                patch.object(generator.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
+            mock_response = Mock()
+            mock_response.choices = [Mock(message=Mock(content="利息很低，欢迎咨询"))]
+            mock_response.usage = Mock(total_tokens=42)
+            mock_create.return_value = mock_response
+
+            first_reply = await generator.generate_reply(
+                customer_id=first.id, message_content="How much is the interest?")
+            second_reply = await generator.generate_reply(
+                customer_id=second.id, message_content="how much interest please")
+
+        assert first_reply == second_reply == "利息很低，欢迎咨询"
+        mock_create.assert_called_once()
+        hit_log = db_session.query(APIUsageLog).filter(APIUsageLog.endpoint == "chat.completions.cache").one()
+        assert hit_log.extra_metadata["semantic"] is True
+        assert hit_log.extra_metadata["saved_tokens"] == 42
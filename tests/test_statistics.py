@@ -1,6 +1,6 @@
 """统计服务单元测试"""
 import pytest
-from datetime import date, datetime, timezone
+from datetime import date, datetime, timedelta, timezone
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from src.core.database.connection import Base
@@ -168,3 +168,300 @@ class TestStatisticsTracker:
         
         assert len(questions) >= 2
 
+
+
+def _counters(stats):
+    return {
+        "total_customers": stats["total_customers"],
+        "total_messages": stats["total_messages"],
+        "group_invitations_sent": stats["group_invitations_sent"],
+        "successful_leads": stats["successful_leads"],
+        "lead_conversion_rate": stats["lead_conversion_rate"],
+        "total_orders": stats["total_orders"],
+        "successful_orders": stats["successful_orders"],
+        "order_conversion_rate": stats["order_conversion_rate"],
+    }
+
+
+class TestIncrementalStatistics:
+    """测试增量统计与对账"""
+    
+    def test_incremental_counters_match_full_recount(self, db_session):
+        """测试增量计数结果与全量重算一致"""
+        tracker = StatisticsTracker(db_session, incremental=True)
+        customer_ids = [
+            CustomerRepository(db_session).create(
+                platform=Platform.FACEBOOK, platform_user_id=f"user_{i}"
+            ).id
+            for i in range(3)
+        ]
+        
+        for i in range(7):
+            tracker.record_customer_interaction(
+                customer_id=customer_ids[i % 3],
+                platform="facebook",
+                message_type="message",
+                message_summary=f"消息{i}",
+                extracted_info={},
+                group_invitation_sent=(i % 2 == 0)
+            )
+        assert tracker.mark_joined_group(customer_ids[0]) is True
+        assert tracker.mark_joined_group(customer_ids[0]) is False
+        assert tracker.mark_joined_group(customer_ids[1]) is True
+        assert tracker.mark_order_created(customer_ids[0]) is True
+        # 已加入群组的客户再次发消息，再次标记不重复计入引流数
+        tracker.record_customer_interaction(
+            customer_id=customer_ids[0],
+            platform="facebook",
+            message_type="message",
+            message_summary="追加消息",
+            extracted_info={}
+        )
+        assert tracker.mark_joined_group(customer_ids[0]) is True
+        assert tracker.mark_order_created(customer_ids[0]) is True
+        
+        incremental = _counters(tracker.get_daily_statistics())
+        tracker.reconcile_daily_statistics()
+        recounted = _counters(tracker.get_daily_statistics())
+        
+        assert incremental == recounted
+        assert incremental["total_customers"] == 3
+        assert incremental["total_messages"] == 8
+        assert incremental["group_invitations_sent"] == 4
+        assert incremental["successful_leads"] == 2
+        assert incremental["lead_conversion_rate"] == "50.0%"
+        assert incremental["total_orders"] == 4
+        assert incremental["successful_orders"] == 1
+        assert incremental["order_conversion_rate"] == "50.0%"
+    
+    def test_reconcile_fixes_drift(self, db_session, customer):
+        """测试对账覆盖被篡改的计数"""
+        tracker = StatisticsTracker(db_session, incremental=True)
+        tracker.record_customer_interaction(
+            customer_id=customer.id,
+            platform="facebook",
+            message_type="message",
+            message_summary="测试消息",
+            extracted_info={}
+        )
+        stats = tracker.get_or_create_daily_statistics()
+        stats.total_messages = 42
+        db_session.commit()
+        
+        tracker.reconcile_daily_statistics()
+        
+        assert tracker.get_daily_statistics()["total_messages"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_reconciler_job(self):
+        """测试对账任务在线程池中使用独立会话重算"""
+        from sqlalchemy.pool import StaticPool
+        from src.statistics.reconciler import StatisticsReconciler
+        
+        engine = create_engine(
+            "sqlite:///:memory:",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool
+        )
+        Base.metadata.create_all(engine)
+        factory = sessionmaker(bind=engine)
+        db = factory()
+        StatisticsTracker(db, incremental=True).record_customer_interaction(
+            customer_id=1,
+            platform="facebook",
+            message_type="message",
+            message_summary="测试消息",
+            extracted_info={}
+        )
+        db.close()
+        
+        reconciler = StatisticsReconciler(session_factory=factory, interval_seconds=3600)
+        result = await reconciler.reconcile()
+        
+        today = datetime.now(timezone.utc).date().isoformat()
+        assert result[today]["total_messages"] == 1
+        assert result[today]["total_customers"] == 1
+        assert reconciler.runs == 1
+        Base.metadata.drop_all(engine)
+
+
+def _replied_conversation(db_session, customer_id, message_id, replied_at, page_id="page_1", platform=Platform.FACEBOOK):
+    """创建一条已AI回复的对话"""
+    from src.core.database.models import Conversation, MessageType
+    conversation = Conversation(
+        customer_id=customer_id,
+        platform=platform,
+        platform_message_id=message_id,
+        message_type=MessageType.MESSAGE,
+        content="请问iPhone贷款怎么办理？",
+        raw_data={"page_id": page_id},
+        ai_replied=True,
+        ai_reply_content="您好",
+        ai_reply_at=replied_at,
+        received_at=replied_at
+    )
+    db_session.add(conversation)
+    db_session.commit()
+    return conversation
+
+
+class TestAIReplyRollups:
+    """测试AI回复汇总分桶"""
+    
+    def test_update_ai_reply_increments_buckets_once(self, db_session, customer):
+        """测试写入AI回复时增量更新分桶，重复写入不重复计数，结果与重建一致"""
+        from src.ai.conversation_manager import ConversationManager
+        from src.statistics.rollups import AIReplyRollups
+        
+        manager = ConversationManager(db_session)
+        first = manager.save_conversation(
+            customer_id=customer.id, platform_message_id="m1", content="你好",
+            raw_data={"recipient": {"id": "page_1"}}
+        )
+        second = manager.save_conversation(
+            customer_id=customer.id, platform_message_id="m2", content="在吗", platform="instagram"
+        )
+        manager.update_ai_reply(first.id, "您好")
+        manager.update_ai_reply(first.id, "您好（重发）")
+        manager.update_ai_reply(second.id, "您好", page_id="page_2")
+        
+        rollups = AIReplyRollups(db_session)
+        today = datetime.now(timezone.utc).date()
+        start = datetime.combine(today, datetime.min.time(), timezone.utc)
+        end = start + timedelta(days=1)
+        incremental = (
+            rollups.count(start, end),
+            rollups.distribution(start, end, "platform"),
+            rollups.distribution(start, end, "page_id"),
+            rollups.unique_customers(today),
+        )
+        
+        assert incremental == (2, {"facebook": 1, "instagram": 1}, {"page_1": 1, "page_2": 1}, 1)
+        assert rollups.last_hour() == 2
+        
+        rollups.rebuild(today, today)
+        rebuilt = (
+            rollups.count(start, end),
+            rollups.distribution(start, end, "platform"),
+            rollups.distribution(start, end, "page_id"),
+            rollups.unique_customers(today),
+        )
+        # second 未提供 raw_data，重建时页面维度为空
+        assert rebuilt[:2] == incremental[:2]
+        assert rebuilt[2] == {"page_1": 1, "": 1}
+        assert rebuilt[3] == 1
+    
+    def test_ranges_combine_day_and_hour_buckets(self, db_session, customer):
+        """测试完整的天读取天桶、首尾不足一天的部分读取小时桶"""
+        from src.statistics.rollups import AIReplyRollups
+        
+        times = [
+            datetime(2026, 1, 1, 22, 30, tzinfo=timezone.utc),
+            datetime(2026, 1, 2, 8, 0, tzinfo=timezone.utc),
+            datetime(2026, 1, 2, 9, 0, tzinfo=timezone.utc),
+            datetime(2026, 1, 3, 1, 15, tzinfo=timezone.utc),
+            datetime(2026, 1, 3, 5, 0, tzinfo=timezone.utc),
+        ]
+        for i, replied_at in enumerate(times):
+            _replied_conversation(db_session, customer.id, f"m{i}", replied_at)
+        rollups = AIReplyRollups(db_session)
+        
+        assert rollups.rebuild(date(2026, 1, 1), date(2026, 1, 3)) == {"days": 3, "replies": 5}
+        # 2026-01-01 22:00 ~ 2026-01-03 02:00：小时桶 + 1月2日天桶 + 小时桶
+        assert rollups.count(
+            datetime(2026, 1, 1, 22, 0, tzinfo=timezone.utc),
+            datetime(2026, 1, 3, 2, 0, tzinfo=timezone.utc)
+        ) == 4
+        assert rollups.count(
+            datetime(2026, 1, 2, 8, 30, tzinfo=timezone.utc),
+            datetime(2026, 1, 2, 10, 0, tzinfo=timezone.utc)
+        ) == 2
+        assert rollups.daily_counts() == [
+            (date(2026, 1, 3), 2), (date(2026, 1, 2), 2), (date(2026, 1, 1), 1)
+        ]
+        assert rollups.daily_counts(
+            datetime(2026, 1, 2, tzinfo=timezone.utc), datetime(2026, 1, 3, tzinfo=timezone.utc)
+        ) == [(date(2026, 1, 2), 2)]
+        # 01:45 的最近1小时窗口包含 01:15 的回复（当前小时桶）和上一小时桶的 25%
+        assert rollups.last_hour(datetime(2026, 1, 3, 1, 45, tzinfo=timezone.utc)) == 1
+    
+    @pytest.mark.asyncio
+    async def test_live_stats_read_rollups(self, db_session, customer):
+        """测试实时统计读取分桶，不扫描对话表"""
+        from sqlalchemy import event
+        from src.monitoring.realtime import RealtimeMonitor
+        from src.statistics.rollups import AIReplyRollups
+        
+        now = datetime.now(timezone.utc)
+        _replied_conversation(db_session, customer.id, "m1", now, platform=Platform.INSTAGRAM)
+        AIReplyRollups(db_session).rebuild(now.date(), now.date())
+        
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+        try:
+            stats = await RealtimeMonitor().get_live_stats(db_session)
+        finally:
+            event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+        
+        assert stats["today"] == {"total_replies": 1, "unique_customers": 1}
+        assert stats["platform_distribution"] == {"instagram": 1}
+        assert stats["last_hour"]["replies"] >= 0
+        assert not any("FROM conversations" in statement for statement in statements)
+
+
+class TestFrequentQuestionUpsert:
+    """测试高频问题的原子upsert与指纹聚合"""
+    
+    def test_near_identical_questions_aggregate_in_one_statement(self, db_session, statistics_tracker):
+        """测试几乎相同的问题聚合到同一行，每次记录只执行一条SQL"""
+        from sqlalchemy import event
+        
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+        try:
+            statistics_tracker.record_frequent_question("如何 购买？", "购买咨询", "回复0")
+            statistics_tracker.record_frequent_question("如何购买", None, "回复1")
+            statistics_tracker.record_frequent_question("  如何購買!! ", "购买咨询", None)
+            statistics_tracker.record_frequent_question("How to BUY?", "购买咨询", "回复2")
+        finally:
+            event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+        
+        assert len(statements) == 4
+        assert all("ON CONFLICT" in statement for statement in statements)
+        
+        questions = statistics_tracker.get_frequent_questions(limit=10)
+        by_text = {q["question"]: q for q in questions}
+        # NFKC 不会做繁简转换，"購買" 单独成行
+        assert set(by_text) == {"如何 购买？", "如何購買!!", "How to BUY?"}
+        assert by_text["如何 购买？"]["count"] == 2
+        assert by_text["如何 购买？"]["category"] == "购买咨询"
+        assert [s["response"] for s in by_text["如何 购买？"]["sample_responses"]] == ["回复0", "回复1"]
+        assert questions[0]["question"] == "如何 购买？"
+    
+    def test_sample_responses_keep_latest(self, statistics_tracker):
+        """测试示例回复只保留最近几条"""
+        for i in range(7):
+            statistics_tracker.record_frequent_question("价格多少", "价格咨询", f"回复{i}")
+        
+        question = statistics_tracker.get_frequent_questions(limit=1)[0]
+        
+        assert question["count"] == 7
+        assert [s["response"] for s in question["sample_responses"]] == [f"回复{i}" for i in range(2, 7)]
+    
+    def test_fallback_without_on_conflict(self, statistics_tracker):
+        """测试不支持 ON CONFLICT 的数据库退回先读后写"""
+        from unittest.mock import patch
+        
+        with patch(
+            "src.core.database.repositories.statistics_repo.build_frequent_question_upsert",
+            return_value=None
+        ):
+            statistics_tracker.record_frequent_question("在吗？", "其他", "在的")
+            statistics_tracker.record_frequent_question("在吗", None, "您好")
+        
+        question = statistics_tracker.get_frequent_questions(limit=1)[0]
+        assert question["count"] == 2
+        assert question["category"] == "其他"
+        assert len(question["sample_responses"]) == 2
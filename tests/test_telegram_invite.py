@@ -0,0 +1,92 @@
+"""Telegram群组链接发送标记测试"""
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.ai.conversation_manager import ConversationManager
+from src.ai.reply_generator import ReplyGenerator
+from src.core.database.connection import Base
+from src.core.database.models import Customer, Platform
+from src.core.database.repositories import CustomerRepository
+from src.utils.telegram_link import contains_telegram_link, telegram_link_keywords
+
+MAIN_GROUP = "https://t.me/+AbC123"
+
+
+@pytest.fixture
+def db_session():
+    """创建测试数据库会话"""
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine)
+    session = SessionLocal()
+
+    yield session
+
+    session.close()
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def customer(db_session):
+    return CustomerRepository(db_session).create(platform=Platform.FACEBOOK, platform_user_id="c1")
+
+
+class TestTelegramLinkDetection:
+    """测试链接识别关键词"""
+
+    def test_keywords_include_group_forms(self):
+        assert "+abc123" in telegram_link_keywords(MAIN_GROUP)
+        assert "abc123" in telegram_link_keywords(MAIN_GROUP)
+        assert "my_group" in telegram_link_keywords("@My_Group")
+
+    def test_contains_link(self):
+        assert contains_telegram_link("Join us: ABC123", MAIN_GROUP)
+        assert contains_telegram_link("加入我们的 Telegram群组")
+        assert not contains_telegram_link("价格请私信咨询", MAIN_GROUP)
+        assert not contains_telegram_link(None, MAIN_GROUP)
+
+
+class TestTelegramInviteMarker:
+    """测试发送含链接的回复后记录标记"""
+
+    def test_update_ai_reply_marks_first_invite(self, db_session, customer):
+        manager = ConversationManager(db_session)
+        first = manager.save_conversation(customer_id=customer.id, platform_message_id="m1", content="hi")
+        second = manager.save_conversation(customer_id=customer.id, platform_message_id="m2", content="price?")
+
+        with patch("src.utils.telegram_link.configured_main_group", return_value=MAIN_GROUP):
+            manager.update_ai_reply(first.id, "您好")
+            assert db_session.get(Customer, customer.id).telegram_invite_sent_at is None
+
+            manager.update_ai_reply(second.id, f"请加入群组 {MAIN_GROUP}")
+
+        db_session.expire_all()
+        sent_at = db_session.get(Customer, customer.id).telegram_invite_sent_at
+        assert sent_at is not None
+        assert not CustomerRepository(db_session).mark_telegram_invite_sent(customer.id)
+        db_session.expire_all()
+        assert db_session.get(Customer, customer.id).telegram_invite_sent_at == sent_at
+
+    def test_link_added_until_invite_sent(self, db_session, customer):
+        generator = ReplyGenerator(db_session)
+        conversation = generator.conversation_manager.save_conversation(
+            customer_id=customer.id, platform_message_id="m1", content="hi")
+
+        with patch("src.utils.telegram_link.configured_main_group", return_value=MAIN_GROUP), \
+                patch("src.ai.reply_generator.configured_main_group", return_value=MAIN_GROUP):
+            reply = generator._ensure_telegram_link_in_reply("您好", customer.id)
+            assert reply == f"您好. Join our Telegram group: {MAIN_GROUP}"
+
+            generator.conversation_manager.update_ai_reply(conversation.id, reply)
+            assert generator._ensure_telegram_link_in_reply("您好", customer.id) == "您好"
+
+    def test_sent_marker_is_cached(self, db_session, customer):
+        repo = CustomerRepository(db_session)
+        assert not repo.has_received_telegram_invite(customer.id)
+        repo.mark_telegram_invite_sent(customer.id)
+
+        with patch.object(db_session, "query", side_effect=AssertionError("should not query")):
+            assert repo.has_received_telegram_invite(customer.id)
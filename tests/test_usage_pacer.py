@@ -0,0 +1,129 @@
+"""Graph API 用量自适应节流测试"""
+import asyncio
+import json
+import pytest
+from unittest.mock import AsyncMock, patch
+from src.facebook.api_client import FacebookAPIClient
+from src.facebook.usage_pacer import (
+    GraphAPIUsagePacer,
+    parse_business_usage_header,
+    parse_usage_header,
+)
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def app_usage(percent):
+    return json.dumps({"call_count": percent, "total_time": 1, "total_cputime": 1})
+
+
+class TestUsageHeaders:
+    """测试用量响应头解析"""
+
+    def test_parse_headers(self):
+        assert parse_usage_header(app_usage(42))["percent"] == 42
+        assert parse_usage_header("not json") is None
+        assert parse_usage_header(None) is None
+
+        business = parse_business_usage_header(json.dumps({
+            "p1": [
+                {"type": "pages", "call_count": 10, "total_time": 55, "estimated_time_to_regain_access": 0},
+                {"type": "messenger", "call_count": 100, "estimated_time_to_regain_access": 2},
+            ]
+        }))
+        assert business == {"p1": {"percent": 100.0, "regain_seconds": 120.0}}
+
+
+class TestGraphAPIUsagePacer:
+    """测试按用量调整并发和等待时间"""
+
+    def test_concurrency_and_delay_follow_usage(self):
+        clock = FakeClock()
+        pacer = GraphAPIUsagePacer(slowdown_percent=70, throttle_percent=90, max_delay=30, clock=clock)
+
+        assert pacer.concurrency("p1", 6) == 6
+        assert pacer.delay("p1") == 0
+
+        pacer.update_from_headers({"X-App-Usage": app_usage(80)}, "p1")
+        assert pacer.concurrency("p1", 6) == 3
+        assert pacer.delay("p1") == 0
+
+        pacer.update_from_headers({"x-business-use-case-usage": json.dumps({"p1": [{"call_count": 95}]})}, "p1")
+        assert pacer.usage_percent("p1") == 95
+        assert pacer.usage_percent("p2") == 80  # 其他页面只受应用级用量影响
+        assert pacer.concurrency("p1", 6) == 1
+        assert pacer.delay("p1") == 15
+
+        # 用量数据过期后恢复全速
+        clock.now += pacer.stale_seconds + 1
+        assert pacer.concurrency("p1", 6) == 6
+        assert pacer.delay("p1") == 0
+
+    def test_regain_access_time_counts_down(self):
+        clock = FakeClock()
+        pacer = GraphAPIUsagePacer(max_delay=300, clock=clock)
+        pacer.update_from_headers({
+            "x-business-use-case-usage": json.dumps({"p1": [{"call_count": 100, "estimated_time_to_regain_access": 1}]})
+        })
+
+        assert pacer.delay("p1") == 60
+        clock.now += 45
+        assert pacer.delay("p1") == 15
+        assert pacer.get_stats()["pages"]["p1"]["regain_seconds"] == 15
+
+    @pytest.mark.asyncio
+    async def test_limiter_reduces_concurrency_as_usage_rises(self):
+        pacer = GraphAPIUsagePacer(slowdown_percent=70, throttle_percent=90, max_delay=0.01)
+        limiter = pacer.limiter("p1", 4)
+
+        async def task():
+            async with limiter:
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(task() for _ in range(6)))
+        assert limiter.peak_in_flight == 4
+        assert limiter.in_flight == 0
+
+        pacer.update_from_headers({"x-app-usage": app_usage(95)}, "p1")
+        limiter = pacer.limiter("p1", 4)
+        await asyncio.gather(*(task() for _ in range(3)))
+        assert limiter.peak_in_flight == 1
+
+
+class TestCheckUnrepliedMessages:
+    """测试未回复消息扫描并发拉取对话"""
+
+    @pytest.mark.asyncio
+    async def test_batch_failures_fall_back_to_concurrent_fetches(self):
+        client = FacebookAPIClient(access_token="token")
+        in_flight = 0
+        peak = 0
+
+        async def fake_messages(conversation_id, page_id=None, limit=10):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return [{
+                "id": f"m_{conversation_id}",
+                "message": "iphone price?",
+                "from": {"id": "user" if conversation_id != "c2" else "page1"},
+                "created_time": "2020-01-01T00:00:00+0000",
+            }]
+
+        with patch("src.facebook.api_client.graph_api_usage_pacer", GraphAPIUsagePacer()), \
+             patch.object(client, "get_conversations_with_messages", AsyncMock(return_value=[{"id": f"c{i}"} for i in range(6)])), \
+             patch.object(client, "get_messages_batch", AsyncMock(return_value={})), \
+             patch.object(client, "get_conversation_messages", side_effect=fake_messages):
+            unreplied = await client.check_unreplied_messages("page1", max_concurrency=3)
+
+        assert [item["conversation_id"] for item in unreplied] == ["c0", "c1", "c3", "c4", "c5"]
+        assert peak == 3
+        await client.close()
@@ -0,0 +1,200 @@
+"""遥测明细写后缓冲测试"""
+import asyncio
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.core.database.connection import Base
+from src.core.database.models import APIUsageLog, Customer, Platform, PromptUsageLog
+from src.core.database.statistics_models import CustomerInteraction
+from src.core.database.write_buffer import WriteBehindBuffer
+from src.ai.prompt_ab_testing import PromptABTesting
+from src.monitoring.api_usage_tracker import APIUsageTracker
+from src.statistics.tracker import StatisticsTracker
+
+
+@pytest.fixture
+def engine():
+    """线程间共享的内存数据库（批量写入在线程池中执行）"""
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(engine)
+    yield engine
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(bind=engine)
+
+
+def _usage_row(i: int) -> dict:
+    return dict(
+        api_type="openai",
+        endpoint="chat.completions",
+        success=True,
+        response_time_ms=100 + i,
+        timestamp=datetime.now(timezone.utc),
+        error_message=None,
+        tokens_used=10,
+        cost_usd=None,
+        extra_metadata={"i": i}
+    )
+
+
+def _count(session_factory, model) -> int:
+    db = session_factory()
+    try:
+        return db.query(model).count()
+    finally:
+        db.close()
+
+
+class TestWriteBehindBuffer:
+    """测试缓冲、批量写入和关闭时排空"""
+
+    def test_writes_through_when_not_started(self, session_factory):
+        buffer = WriteBehindBuffer(session_factory=session_factory)
+
+        buffer.add(APIUsageLog, **_usage_row(0))
+
+        assert buffer.pending_count == 0
+        assert _count(session_factory, APIUsageLog) == 1
+
+    @pytest.mark.asyncio
+    async def test_batches_rows_into_one_statement_and_drains_on_stop(self, engine, session_factory):
+        buffer = WriteBehindBuffer(session_factory=session_factory, batch_size=1000, flush_interval_seconds=3600)
+        await buffer.start()
+
+        statements = []
+        listener = lambda conn, cursor, statement, params, context, executemany: statements.append(
+            (statement, executemany))
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            for i in range(25):
+                buffer.add(APIUsageLog, **_usage_row(i))
+            assert buffer.pending_count == 25
+            assert _count(session_factory, APIUsageLog) == 0
+
+            await buffer.stop()
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+
+        inserts = [s for s in statements if s[0].startswith("INSERT INTO api_usage_logs")]
+        assert len(inserts) == 1
+        assert _count(session_factory, APIUsageLog) == 25
+        assert buffer.get_stats()["flushed_rows"] == 25
+        assert buffer.pending_count == 0
+
+    @pytest.mark.asyncio
+    async def test_size_threshold_wakes_flusher(self, session_factory):
+        buffer = WriteBehindBuffer(session_factory=session_factory, batch_size=5, flush_interval_seconds=3600)
+        await buffer.start()
+        try:
+            for i in range(5):
+                buffer.add(APIUsageLog, **_usage_row(i))
+            for _ in range(100):
+                if buffer.flushes:
+                    break
+                await asyncio.sleep(0.01)
+            assert _count(session_factory, APIUsageLog) == 5
+        finally:
+            await buffer.stop()
+
+    def test_failed_rows_are_retried_then_dropped(self):
+        db = MagicMock()
+        db.execute.side_effect = RuntimeError("database is down")
+        buffer = WriteBehindBuffer(session_factory=lambda: db, max_attempts=2)
+        buffer.running = True  # 不启动后台任务，手动写入
+
+        buffer.add(APIUsageLog, **_usage_row(0))
+        buffer.add(APIUsageLog, **_usage_row(1))
+
+        assert buffer.flush() == 0
+        assert buffer.pending_count == 2
+        assert db.rollback.called
+
+        assert buffer.flush() == 0
+        assert buffer.pending_count == 0
+        assert buffer.dropped_rows == 2
+
+    def test_rows_beyond_max_pending_are_dropped(self):
+        buffer = WriteBehindBuffer(session_factory=MagicMock(), max_pending=2)
+        buffer.running = True
+
+        for i in range(3):
+            buffer.add(APIUsageLog, **_usage_row(i))
+
+        assert buffer.pending_count == 2
+        assert buffer.dropped_rows == 1
+
+
+class TestBufferedTelemetry:
+    """测试遥测调用方在缓冲模式下不再单独提交"""
+
+    def test_api_usage_tracker_does_not_commit(self):
+        db = MagicMock()
+        buffer = WriteBehindBuffer(session_factory=MagicMock())
+        buffer.running = True
+
+        APIUsageTracker(db, write_buffer=buffer).record_api_call(
+            api_type="openai", endpoint="chat.completions", success=True,
+            response_time_ms=120.0, tokens_used=100, model="gpt-4o-mini",
+            metadata={"customer_id": 1}
+        )
+
+        assert not db.commit.called
+        assert buffer.has_pending(APIUsageLog, api_type="openai", extra_metadata={"customer_id": 1})
+
+    def test_unbuffered_prompt_usage_committed_without_version(self, session_factory):
+        db = session_factory()
+        # 版本查询未命中时 increment_usage 不提交，使用日志也不能丢
+        PromptABTesting(db).record_usage(
+            prompt_version_id=999, customer_id=1, conversation_id=1, response_time_ms=80)
+        db.close()
+
+        assert _count(session_factory, PromptUsageLog) == 1
+
+    def test_interactions_buffered_and_flushed_before_marking(self, session_factory):
+        db = session_factory()
+        customer = Customer(platform=Platform.FACEBOOK, platform_user_id="u1")
+        db.add(customer)
+        db.commit()
+
+        buffer = WriteBehindBuffer(session_factory=session_factory)
+        buffer.running = True
+        tracker = StatisticsTracker(db, incremental=True, write_buffer=buffer)
+        for i in range(3):
+            interaction = tracker.record_customer_interaction(
+                customer_id=customer.id,
+                platform="facebook",
+                message_type="message",
+                message_summary=f"消息{i}",
+                extracted_info={},
+                group_invitation_sent=(i == 0)
+            )
+        assert interaction.id is None
+        assert buffer.pending_count == 3
+        # 缓冲中的记录也参与当天首次交互的判断
+        stats = tracker.get_daily_statistics()
+        assert stats["total_messages"] == 3
+        assert stats["total_customers"] == 1
+
+        # 标记加入群组前先写入该客户缓冲中的记录
+        assert tracker.mark_joined_group(customer.id) is True
+        assert buffer.pending_count == 0
+        assert _count(session_factory, CustomerInteraction) == 3
+
+        tracker.reconcile_daily_statistics()
+        reconciled = tracker.get_daily_statistics()
+        assert reconciled["total_messages"] == 3
+        assert reconciled["total_customers"] == 1
+        assert reconciled["successful_leads"] == 1
+        db.close()